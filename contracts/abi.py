@@ -0,0 +1,46 @@
+from typing import Any, Dict, List
+
+from algosdk.abi import Contract, Method
+from pyteal import Bytes, Cond, Expr, Txn
+
+
+def contract_description(name: str, signatures: List[str]) -> Contract:
+    """An ARC-4 contract description of the methods with `signatures`.
+
+    The approval programs dispatch on the selectors of these methods, in the
+    order they are listed, so the most frequent calls should come first.
+    """
+    return Contract(name, [Method.from_signature(signature) for signature in signatures])
+
+
+def get_method(contract: Contract, name: str) -> Method:
+    for method in contract.methods:
+        if method.name == name:
+            return method
+    raise KeyError(name)
+
+
+def method_selector(contract: Contract, name: str) -> bytes:
+    """The 4 byte selector a call to the method `name` starts with."""
+    return get_method(contract, name).get_selector()
+
+
+def encode_call(contract: Contract, name: str, *args: Any) -> List[bytes]:
+    """The application arguments of a call to the method `name`: its selector
+    followed by each of `args` ARC-4 encoded."""
+    method = get_method(contract, name)
+    if len(args) != len(method.args):
+        raise ValueError("{} takes {} arguments".format(method.get_signature(), len(method.args)))
+    return [method.get_selector()] + [arg.type.encode(value) for arg, value in zip(method.args, args)]
+
+
+def dispatch(contract: Contract, handlers: Dict[str, Expr]) -> Expr:
+    """A Cond running the handler of the method the first application
+    argument selects, testing the selectors in the order of `contract`.
+
+    A call selecting none of the methods fails.
+    """
+    selector = Txn.application_args[0]
+    return Cond(
+        *[[selector == Bytes(method.get_selector()), handlers[method.name]] for method in contract.methods]
+    )
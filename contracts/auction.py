@@ -1,32 +1,209 @@
+from typing import Dict, List, Tuple, Union
+
 from pyteal import *
 
+from contracts.abi import contract_description, dispatch, get_method
+from contracts.funding import MIN_TXN_FEE, app_funding
+from utils.cse import cacheRepeatedReads
+from utils.opcodes import MAX_APP_TXN_ACCOUNTS
+from utils.peephole import optimizeTeal
+
+# Fee pooling for inner transactions needs TEAL v6
+TEAL_VERSION = 6
+
+# Fees of the inner transactions of each call, paid on top of the call's own
+# fee when fees are pooled
+# setup: the opt-in
+SETUP_INNER_FEES = 1 * MIN_TXN_FEE
+# bid: the refund of the previous lead bidder, unless it is credited to the
+# bidder's local state with pull refunds
+BID_INNER_FEES = 1 * MIN_TXN_FEE
+# withdraw: the payment of each refund owed
+WITHDRAW_INNER_FEES = 1 * MIN_TXN_FEE
+# settle: closing the asset holding, and paying the seller or refunding the
+# lead bidder
+SETTLE_INNER_FEES = 2 * MIN_TXN_FEE
+# delete: closing the asset holding, paying the seller or refunding the lead
+# bidder, and closing the account
+DELETE_INNER_FEES = 3 * MIN_TXN_FEE
+
+# The methods of the auction, most frequently called first
+CONTRACT = contract_description(
+    "auction",
+    [
+        "bid()void",
+        "setup()void",
+        "create(address,uint64,uint64,uint64,uint64,uint64,uint64)void",
+    ],
+)
+
+# The methods of an auction with pull refunds, which adds the withdrawal of
+# refunds and the settlement before the delete
+PULL_CONTRACT = contract_description(
+    "auction",
+    [
+        "bid()void",
+        "withdraw()void",
+        "setup()void",
+        "settle()void",
+        "create(address,uint64,uint64,uint64,uint64,uint64,uint64)void",
+    ],
+)
+
 
 # 0.1 ALGO (min account balance)
 # 0.1 ALGO (holding asset)
-# 4 x 1000 microAlgo (transaction fees, see below)
+# 4 x 1000 microAlgo (transaction fees without fee pooling, see below)
 # 1. opt in to asset
 # 2. transfer asset to winner
 # 3. transfer bid amount to seller
 # 4. transfer royalty to creator
-def approval_program():
-    seller_key = Bytes("seller")
-    fee_percent_key = Bytes("fee_percent")
-    nft_id_key = Bytes("nft_id")
-    start_time_key = Bytes("start")
-    end_time_key = Bytes("end")
-    reserve_amount_key = Bytes("reserve_amount")
-    min_bid_increment_key = Bytes("min_bid_inc")
-    num_bids_key = Bytes("num_bids")
-    lead_bid_amount_key = Bytes("bid_amount")
-    lead_bid_account_key = Bytes("bid_account")
-    # 0.1 ALGO (min account balance)
-    # 0.1 ALGO (holding asset)
-    # 4 x 1000 microAlgo (transaction fees, see below)
-    # 1. opt in to asset
-    # 2. transfer asset to winner
-    # 3. transfer bid amount to seller
-    # 4. transfer royalty to creator
-    escrow_min_balance = Int(204_000)
+def setup_funding(pool_fees: bool = True) -> int:
+    """The payment to the auction account setup expects."""
+    return app_funding(assets=1, inner_txns=0 if pool_fees else 4)
+
+
+# Global state layout
+# The auction keeps its state in two byte slices of fixed-width fields, so
+# its global schema is 0 uints and 2 byte slices. Addresses take 32 bytes and
+# integers 8 bytes, big-endian:
+#
+# "p" -- auction parameters, written once on creation (80 bytes)
+#   [0:32]  seller          address of the seller
+#   [32:40] nft_id          ID of the auctioned asset
+#   [40:48] start           UNIX timestamp the auction starts at
+#   [48:56] end             UNIX timestamp the auction ends at
+#   [56:64] reserve_amount  lowest winning bid
+#   [64:72] min_bid_inc     smallest raise of the lead bid
+#   [72:80] fee_percent     percentage of the winning bid kept as fee
+#
+# "b" -- the lead bid, rewritten with every successful bid (48 bytes)
+#   [0:32]  bid_account     lead bidder, the zero address before any bid
+#   [32:40] bid_amount      lead bid
+#   [40:48] num_bids        number of successful bids
+#
+# With pull refunds, the auction also keeps two uints:
+#
+# "o" -- the sum of the refunds owed to outbid bidders
+# "s" -- 1 once the auction has been settled, see settle
+#
+# and every bidder opted in to the auction a uint of local state:
+#
+# "r" -- the refund owed to the bidder, paid out by withdraw
+ADDRESS = 32
+UINT64 = 8
+
+PARAMS_KEY = b"p"
+PARAMS_FIELDS = [
+    ("seller", ADDRESS),
+    ("nft_id", UINT64),
+    ("start", UINT64),
+    ("end", UINT64),
+    ("reserve_amount", UINT64),
+    ("min_bid_inc", UINT64),
+    ("fee_percent", UINT64),
+]
+
+BID_KEY = b"b"
+BID_FIELDS = [
+    ("bid_account", ADDRESS),
+    ("bid_amount", UINT64),
+    ("num_bids", UINT64),
+]
+
+REFUNDS_OWED_KEY = b"o"
+SETTLED_KEY = b"s"
+REFUND_KEY = b"r"
+
+
+def field_offset(fields: List[Tuple[str, int]], name: str) -> Tuple[int, int]:
+    """The offset and width of the field `name` in a packed value."""
+    offset = 0
+    for field, width in fields:
+        if field == name:
+            return offset, width
+        offset += width
+    raise KeyError(name)
+
+
+def encode_state(fields: List[Tuple[str, int]], values: Dict[str, Union[int, bytes]]) -> bytes:
+    """Pack `values` into a global state value laid out as `fields`."""
+    encoded = b""
+    for name, width in fields:
+        value = values[name]
+        if width == UINT64:
+            value = value.to_bytes(UINT64, "big")
+        if len(value) != width:
+            raise ValueError("{} must be {} bytes long".format(name, width))
+        encoded += value
+    return encoded
+
+
+def decode_state(globalState: Dict[bytes, Union[int, bytes]]) -> Dict[str, Union[int, bytes]]:
+    """Unpack the fields of an auction's global state.
+
+    Addresses are returned as their 32 bytes and integers as ints, keyed by
+    the field names of PARAMS_FIELDS and BID_FIELDS. With pull refunds, the
+    sum of the refunds owed is returned as "refunds_owed", and whether the
+    auction has been settled as "settled".
+    """
+    decoded: Dict[str, Union[int, bytes]] = {}
+    for key, fields in ((PARAMS_KEY, PARAMS_FIELDS), (BID_KEY, BID_FIELDS)):
+        value = globalState[key]
+        offset = 0
+        for name, width in fields:
+            data = value[offset:offset + width]
+            decoded[name] = int.from_bytes(data, "big") if width == UINT64 else data
+            offset += width
+    if REFUNDS_OWED_KEY in globalState:
+        decoded["refunds_owed"] = globalState[REFUNDS_OWED_KEY]
+        decoded["settled"] = globalState.get(SETTLED_KEY, 0)
+    return decoded
+
+
+def state_schemas(pull_refunds: bool = False) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """The (uints, byte slices) of the global and local state schemas of an
+    auction."""
+    if pull_refunds:
+        return (2, 2), (1, 0)
+    return (0, 2), (0, 0)
+
+
+def approval_program(optimize: bool = True, pool_fees: bool = True, pull_refunds: bool = False):
+    """The auction's approval program.
+
+    With `pull_refunds`, an outbid bidder opted in to the auction has the bid
+    credited to its local state rather than paid back by the new bid, and
+    withdraws it later with the withdraw method, on its own or along with
+    other bidders. Bids then cost no inner transaction. Once the auction has
+    ended, anyone can settle it with the settle method, paying out the NFT and
+    the winning bid, but its account is only closed by deleting it once every
+    refund owed has been withdrawn.
+    """
+    contract = PULL_CONTRACT if pull_refunds else CONTRACT
+    params_key = Bytes(PARAMS_KEY)
+    bid_key = Bytes(BID_KEY)
+    refunds_owed_key = Bytes(REFUNDS_OWED_KEY)
+    settled_key = Bytes(SETTLED_KEY)
+    refund_key = Bytes(REFUND_KEY)
+    escrow_min_balance = Int(setup_funding(pool_fees))
+    # with fee pooling, inner transactions leave their fee to the outer
+    # transaction triggering them
+    inner_fee = {TxnField.fee: Int(0)} if pool_fees else {}
+
+    def getField(value: Expr, fields: List[Tuple[str, int]], name: str) -> Expr:
+        offset, width = field_offset(fields, name)
+        if width == UINT64:
+            return ExtractUint64(value, Int(offset))
+        return Extract(value, Int(offset), Int(width))
+
+    def getParam(name: str) -> Expr:
+        return getField(App.globalGet(params_key), PARAMS_FIELDS, name)
+
+    def packBid(account: Expr, amount: Expr, numBids: Expr) -> Expr:
+        # every successful bid changes all of the fields, so the value is
+        # rebuilt rather than patched
+        return Concat(account, Itob(amount), Itob(numBids))
 
     @Subroutine(TealType.none)
     def closeNFTTo(assetID: Expr, account: Expr) -> Expr:
@@ -43,6 +220,7 @@ def approval_program():
                             TxnField.type_enum: TxnType.AssetTransfer,
                             TxnField.xfer_asset: assetID,
                             TxnField.asset_close_to: account,
+                            **inner_fee,
                         }
                     ),
                     InnerTxnBuilder.Submit(),
@@ -57,13 +235,53 @@ def approval_program():
             InnerTxnBuilder.SetFields(
                 {
                     TxnField.type_enum: TxnType.Payment,
-                    TxnField.amount: prevLeadBidAmount - Global.min_txn_fee(),
+                    TxnField.amount: (
+                        prevLeadBidAmount
+                        if pool_fees
+                        # without fee pooling the refund pays its own fee
+                        else prevLeadBidAmount - Global.min_txn_fee()
+                    ),
                     TxnField.receiver: prevLeadBidder,
+                    **inner_fee,
                 }
             ),
             InnerTxnBuilder.Submit(),
         )
 
+    @Subroutine(TealType.none)
+    def creditRefund(bidder: Expr, amount: Expr) -> Expr:
+        # a bidder without local state, never opted in or since closed out,
+        # is paid back right away
+        return (
+            If(App.optedIn(bidder, Global.current_application_id()))
+            .Then(
+                Seq(
+                    App.localPut(bidder, refund_key, App.localGet(bidder, refund_key) + amount),
+                    App.globalPut(refunds_owed_key, App.globalGet(refunds_owed_key) + amount),
+                )
+            )
+            .Else(repayPreviousLeadBidder(bidder, amount))
+        )
+
+    pay_refund_amount = ScratchVar(TealType.uint64)
+
+    @Subroutine(TealType.none)
+    def payRefund(bidder: Expr) -> Expr:
+        return If(App.optedIn(bidder, Global.current_application_id())).Then(
+            Seq(
+                pay_refund_amount.store(App.localGet(bidder, refund_key)),
+                If(pay_refund_amount.load() > Int(0)).Then(
+                    Seq(
+                        App.localPut(bidder, refund_key, Int(0)),
+                        App.globalPut(
+                            refunds_owed_key, App.globalGet(refunds_owed_key) - pay_refund_amount.load()
+                        ),
+                        repayPreviousLeadBidder(bidder, pay_refund_amount.load()),
+                    )
+                ),
+            )
+        )
+
     @Subroutine(TealType.none)
     def closeAccountTo(account: Expr) -> Expr:
         return If(Balance(Global.current_application_address()) != Int(0)).Then(
@@ -73,6 +291,7 @@ def approval_program():
                     {
                         TxnField.type_enum: TxnType.Payment,
                         TxnField.close_remainder_to: account,
+                        **inner_fee,
                     }
                 ),
                 InnerTxnBuilder.Submit(),
@@ -80,44 +299,49 @@ def approval_program():
         )
 
     @Subroutine(TealType.none)
-    def sendBidToSeller() -> Expr:
+    def sendBidToSeller(seller: Expr, bidAmount: Expr, feePercent: Expr) -> Expr:
         return Seq(
             InnerTxnBuilder.Begin(),
             InnerTxnBuilder.SetFields(
                 {
                     TxnField.type_enum: TxnType.Payment,
-                    TxnField.receiver: App.globalGet(seller_key),
-                    TxnField.amount: (
-                        App.globalGet(lead_bid_amount_key)
-                        - (
-                            (
-                                App.globalGet(fee_percent_key)
-                                * App.globalGet(lead_bid_amount_key)
-                            )
-                            / Int(100)
-                        )
-                    ),
+                    TxnField.receiver: seller,
+                    TxnField.amount: bidAmount - feePercent * bidAmount / Int(100),
+                    **inner_fee,
                 }
             ),
             InnerTxnBuilder.Submit(),
         )
 
-    on_create_start_time = Btoi(Txn.application_args[2])
-    on_create_end_time = Btoi(Txn.application_args[3])
+    # Create Application Function
+    # Arguments: seller, nft_id, start, end, reserve_amount, min_bid_inc and
+    # fee_percent, in the order of PARAMS_FIELDS
+    on_create_start_time = Btoi(Txn.application_args[3])
+    on_create_end_time = Btoi(Txn.application_args[4])
     on_create = Seq(
-        App.globalPut(seller_key, Txn.application_args[0]),
-        App.globalPut(nft_id_key, Btoi(Txn.application_args[1])),
-        App.globalPut(start_time_key, on_create_start_time),
-        App.globalPut(end_time_key, on_create_end_time),
-        App.globalPut(reserve_amount_key, Btoi(Txn.application_args[4])),
-        App.globalPut(min_bid_increment_key, Btoi(Txn.application_args[5])),
-        App.globalPut(fee_percent_key, Btoi(Txn.application_args[6])),
-        App.globalPut(lead_bid_account_key, Global.zero_address()),
+        Assert(
+            And(
+                Txn.application_id() == Int(0),
+                Txn.application_args.length() == Int(len(get_method(contract, "create").args) + 1),
+                Len(Txn.application_args[1]) == Int(ADDRESS),
+            )
+        ),
+        # Btoi rejects integers longer than 8 bytes, and Itob pads the
+        # shorter ones to the width of their field
+        App.globalPut(
+            params_key,
+            Concat(
+                Txn.application_args[1],
+                *[Itob(Btoi(Txn.application_args[index])) for index in range(2, len(PARAMS_FIELDS) + 1)],
+            ),
+        ),
+        # no lead bidder yet: the zero address, no amount and no bids
+        App.globalPut(bid_key, BytesZero(Int(ADDRESS + 2 * UINT64))),
         Assert(
             And(
                 # ensure that the fee percent is between 0 and 100
-                App.globalGet(fee_percent_key) >= Int(0),
-                App.globalGet(fee_percent_key) <= Int(100),
+                Btoi(Txn.application_args[7]) >= Int(0),
+                Btoi(Txn.application_args[7]) <= Int(100),
                 # ensure that start time is after the current time
                 Global.latest_timestamp() < on_create_start_time,
                 # ensure that the end time is after the start time
@@ -128,19 +352,20 @@ def approval_program():
         Approve(),
     )
 
+    # the setup call pays SETUP_INNER_FEES on top of its fee
     on_setup_payment_txn_index = Txn.group_index() - Int(1)
     on_setup_asset_txn_index = Txn.group_index() + Int(1)
     on_setup = Seq(
         Assert(
             And(
-                Global.latest_timestamp() < App.globalGet(start_time_key),
+                Global.latest_timestamp() < getParam("start"),
                 # assert previous txn is payment of min balance
                 Gtxn[on_setup_payment_txn_index].type_enum() == TxnType.Payment,
                 Or(
                     Gtxn[on_setup_payment_txn_index].sender()
                     == Global.creator_address(),
                     Gtxn[on_setup_payment_txn_index].sender()
-                    == App.globalGet(seller_key),
+                    == getParam("seller"),
                 ),
                 Gtxn[on_setup_payment_txn_index].receiver()
                 == Global.current_application_address(),
@@ -150,13 +375,13 @@ def approval_program():
                 Or(
                     Gtxn[on_setup_asset_txn_index].sender() == Global.creator_address(),
                     Gtxn[on_setup_asset_txn_index].sender()
-                    == App.globalGet(seller_key),
+                    == getParam("seller"),
                 ),
                 Gtxn[on_setup_asset_txn_index].asset_receiver()
                 == Global.current_application_address(),
                 Gtxn[on_setup_asset_txn_index].asset_amount() >= Int(1),
                 Gtxn[on_setup_asset_txn_index].xfer_asset()
-                == App.globalGet(nft_id_key),
+                == getParam("nft_id"),
             )
         ),
         # opt into NFT asset -- because you can't opt in if you're already opted in, this is what
@@ -165,21 +390,28 @@ def approval_program():
         InnerTxnBuilder.SetFields(
             {
                 TxnField.type_enum: TxnType.AssetTransfer,
-                TxnField.xfer_asset: App.globalGet(nft_id_key),
+                TxnField.xfer_asset: getParam("nft_id"),
                 TxnField.asset_receiver: Global.current_application_address(),
+                **inner_fee,
             }
         ),
         InnerTxnBuilder.Submit(),
         Approve(),
     )
 
+    # the bid call pays BID_INNER_FEES on top of its fee once there is a lead
+    # bidder to refund
     on_bid_txn_index = Txn.group_index() - Int(1)
     on_bid_nft_holding = AssetHolding.balance(
-        Global.current_application_address(), App.globalGet(nft_id_key)
+        Global.current_application_address(), getParam("nft_id")
     )
     on_bid_bidder_holding = AssetHolding.balance(
-        Txn.sender(), App.globalGet(nft_id_key)
+        Txn.sender(), getParam("nft_id")
     )
+    # the lead bid is rewritten by the call, so it is read once before
+    on_bid_lead = ScratchVar(TealType.bytes)
+    on_bid_lead_account = getField(on_bid_lead.load(), BID_FIELDS, "bid_account")
+    on_bid_lead_amount = getField(on_bid_lead.load(), BID_FIELDS, "bid_amount")
     on_bid = Seq(
         on_bid_nft_holding,
         on_bid_bidder_holding,
@@ -189,9 +421,9 @@ def approval_program():
                 on_bid_nft_holding.hasValue(),
                 on_bid_nft_holding.value() > Int(0),
                 # the auction has started
-                App.globalGet(start_time_key) <= Global.latest_timestamp(),
+                getParam("start") <= Global.latest_timestamp(),
                 # the auction has not ended
-                Global.latest_timestamp() < App.globalGet(end_time_key),
+                Global.latest_timestamp() < getParam("end"),
                 # the actual bid payment is before the app call
                 Gtxn[on_bid_txn_index].type_enum() == TxnType.Payment,
                 Gtxn[on_bid_txn_index].sender() == Txn.sender(),
@@ -203,89 +435,134 @@ def approval_program():
                 on_bid_nft_holding.value() >= Int(0),
             )
         ),
+        on_bid_lead.store(App.globalGet(bid_key)),
         If(
             Gtxn[on_bid_txn_index].amount()
-            >= App.globalGet(lead_bid_amount_key) + App.globalGet(min_bid_increment_key)
+            >= on_bid_lead_amount + getParam("min_bid_inc")
         ).Then(
             Seq(
-                If(App.globalGet(lead_bid_account_key) != Global.zero_address()).Then(
-                    repayPreviousLeadBidder(
-                        App.globalGet(lead_bid_account_key),
-                        App.globalGet(lead_bid_amount_key),
-                    )
+                If(on_bid_lead_account != Global.zero_address()).Then(
+                    creditRefund(on_bid_lead_account, on_bid_lead_amount)
+                    if pull_refunds
+                    else repayPreviousLeadBidder(on_bid_lead_account, on_bid_lead_amount)
+                ),
+                App.globalPut(
+                    bid_key,
+                    packBid(
+                        Gtxn[on_bid_txn_index].sender(),
+                        Gtxn[on_bid_txn_index].amount(),
+                        getField(on_bid_lead.load(), BID_FIELDS, "num_bids") + Int(1),
+                    ),
                 ),
-                App.globalPut(lead_bid_amount_key, Gtxn[on_bid_txn_index].amount()),
-                App.globalPut(lead_bid_account_key, Gtxn[on_bid_txn_index].sender()),
-                App.globalPut(num_bids_key, App.globalGet(num_bids_key) + Int(1)),
                 Approve(),
             )
         ),
         Reject(),
     )
 
-    on_call_method = Txn.application_args[0]
-    on_call = Cond(
-        [on_call_method == Bytes("setup"), on_setup],
-        [on_call_method == Bytes("bid"), on_bid],
+    # the refunds owed to the sender and to the other accounts of the call;
+    # the call pays WITHDRAW_INNER_FEES on top of its fee for every refund.
+    # The accounts are unrolled rather than looped over, to keep the cost of
+    # the call bounded.
+    on_withdraw = Seq(
+        *[
+            If(Txn.accounts.length() >= Int(index)).Then(payRefund(Txn.accounts[index]))
+            for index in range(MAX_APP_TXN_ACCOUNTS + 1)
+        ],
+        Approve(),
+    )
+
+    lead_account = getField(App.globalGet(bid_key), BID_FIELDS, "bid_account")
+    lead_amount = getField(App.globalGet(bid_key), BID_FIELDS, "bid_amount")
+
+    def payOut() -> Expr:
+        # the auction has ended, pay out assets
+        return (
+            If(lead_account != Global.zero_address())
+            .Then(
+                If(lead_amount >= getParam("reserve_amount"))
+                .Then(
+                    Seq(
+                        # the auction was successful: send lead bid account the nft
+                        closeNFTTo(getParam("nft_id"), lead_account),
+                        # send the bid minus the fee to the seller
+                        sendBidToSeller(
+                            getParam("seller"),
+                            lead_amount,
+                            getParam("fee_percent"),
+                        ),
+                    )
+                )
+                .Else(
+                    Seq(
+                        # the auction was not successful because the reserve was not met: return
+                        # the nft to the seller and repay the lead bidder
+                        closeNFTTo(getParam("nft_id"), getParam("seller")),
+                        # TODO: should we prevent bids less than reserve amount?
+                        repayPreviousLeadBidder(lead_account, lead_amount),
+                    )
+                )
+            )
+            .Else(
+                # the auction was not successful because no bids were placed: return the nft to the seller
+                closeNFTTo(getParam("nft_id"), getParam("seller"))
+            )
+        )
+
+    # with pull refunds, the auction is paid out by the settle call once it
+    # has ended, whatever refunds are still owed; the call pays
+    # SETTLE_INNER_FEES on top of its fee
+    on_settle = Seq(
+        Assert(
+            And(
+                getParam("end") <= Global.latest_timestamp(),
+                App.globalGet(settled_key) == Int(0),
+            )
+        ),
+        payOut(),
+        App.globalPut(settled_key, Int(1)),
+        Approve(),
     )
 
+    if optimize:
+        # evaluate the repeated state reads and group fields of each branch once
+        on_create = cacheRepeatedReads(on_create)
+        on_setup = cacheRepeatedReads(on_setup)
+        on_bid = cacheRepeatedReads(on_bid)
+        on_settle = cacheRepeatedReads(on_settle)
+
+    # the other methods fail on creation, as the parameters they read are
+    # not set yet
+    handlers = {"bid": on_bid, "setup": on_setup, "create": on_create}
+    if pull_refunds:
+        handlers.update({"withdraw": on_withdraw, "settle": on_settle})
+    on_call = dispatch(contract, handlers)
+
+    # the delete call pays DELETE_INNER_FEES on top of its fee
     on_delete = Seq(
-        If(Global.latest_timestamp() < App.globalGet(start_time_key)).Then(
+        If(Global.latest_timestamp() < getParam("start")).Then(
             Seq(
                 # the auction has not yet started, it's ok to delete
                 Assert(
                     Or(
                         # sender must either be the seller or the auction creator
-                        Txn.sender() == App.globalGet(seller_key),
+                        Txn.sender() == getParam("seller"),
                         Txn.sender() == Global.creator_address(),
                     )
                 ),
                 # if the auction contract account has opted into the nft, close it out
-                closeNFTTo(App.globalGet(nft_id_key), App.globalGet(seller_key)),
+                closeNFTTo(getParam("nft_id"), getParam("seller")),
                 # if the auction contract still has funds, send them all to the creator
                 closeAccountTo(Global.creator_address()),
                 Approve(),
             )
         ),
-        If(App.globalGet(end_time_key) <= Global.latest_timestamp()).Then(
+        If(getParam("end") <= Global.latest_timestamp()).Then(
             Seq(
-                # the auction has ended, pay out assets
-                If(App.globalGet(lead_bid_account_key) != Global.zero_address())
-                .Then(
-                    If(
-                        App.globalGet(lead_bid_amount_key)
-                        >= App.globalGet(reserve_amount_key)
-                    )
-                    .Then(
-                        Seq(
-                            # the auction was successful: send lead bid account the nft
-                            closeNFTTo(
-                                App.globalGet(nft_id_key),
-                                App.globalGet(lead_bid_account_key),
-                            ),
-                            # send the bid minus the fee to the seller
-                            sendBidToSeller(),
-                        )
-                    )
-                    .Else(
-                        Seq(
-                            # the auction was not successful because the reserve was not met: return
-                            # the nft to the seller and repay the lead bidder
-                            closeNFTTo(
-                                App.globalGet(nft_id_key), App.globalGet(seller_key)
-                            ),
-                            # TODO: should we prevent bids less than reserve amount?
-                            repayPreviousLeadBidder(
-                                App.globalGet(lead_bid_account_key),
-                                App.globalGet(lead_bid_amount_key),
-                            ),
-                        )
-                    )
-                )
-                .Else(
-                    # the auction was not successful because no bids were placed: return the nft to the seller
-                    closeNFTTo(App.globalGet(nft_id_key), App.globalGet(seller_key))
-                ),
+                If(App.globalGet(settled_key) == Int(0)).Then(payOut()) if pull_refunds else payOut(),
+                # the account is closed to the creator, so every refund owed
+                # must have been withdrawn
+                Assert(App.globalGet(refunds_owed_key) == Int(0)) if pull_refunds else Seq(),
                 # send remaining funds to the creator
                 closeAccountTo(Global.creator_address()),
                 Approve(),
@@ -294,36 +571,63 @@ def approval_program():
         Reject(),
     )
 
+    if optimize:
+        on_delete = cacheRepeatedReads(on_delete)
+
+    if pull_refunds:
+        # bidders opt in to be credited their refunds, and are paid what they
+        # are owed when closing out
+        on_optin_closeout = [
+            [Txn.on_completion() == OnComplete.OptIn, Approve()],
+            [Txn.on_completion() == OnComplete.CloseOut, Seq(payRefund(Txn.sender()), Approve())],
+            [Txn.on_completion() == OnComplete.UpdateApplication, Reject()],
+        ]
+    else:
+        on_optin_closeout = [
+            [
+                Or(
+                    Txn.on_completion() == OnComplete.OptIn,
+                    Txn.on_completion() == OnComplete.CloseOut,
+                    Txn.on_completion() == OnComplete.UpdateApplication,
+                ),
+                Reject(),
+            ],
+        ]
+
+    # the application is created by the create method, a NoOp call
     program = Cond(
-        [Txn.application_id() == Int(0), on_create],
         [Txn.on_completion() == OnComplete.NoOp, on_call],
         [
             Txn.on_completion() == OnComplete.DeleteApplication,
             on_delete,
         ],
-        [
-            Or(
-                Txn.on_completion() == OnComplete.OptIn,
-                Txn.on_completion() == OnComplete.CloseOut,
-                Txn.on_completion() == OnComplete.UpdateApplication,
-            ),
-            Reject(),
-        ],
+        *on_optin_closeout,
     )
 
     return program
 
 
-def clear_state_program():
+def clear_state_program(pull_refunds: bool = False):
     print("Clear Program")
+    if pull_refunds:
+        # a bidder clearing its local state forfeits its refund, which goes
+        # to the creator with the rest of the account when the auction is
+        # deleted
+        return Seq(
+            App.globalPut(
+                Bytes(REFUNDS_OWED_KEY),
+                App.globalGet(Bytes(REFUNDS_OWED_KEY)) - App.localGet(Int(0), Bytes(REFUND_KEY)),
+            ),
+            Approve(),
+        )
     return Approve()
 
 
 if __name__ == "__main__":
     with open("compiled/auction_approval.teal", "w") as f:
-        compiled = compileTeal(approval_program(), mode=Mode.Application, version=5)
+        compiled = optimizeTeal(compileTeal(approval_program(), mode=Mode.Application, version=TEAL_VERSION))
         f.write(compiled)
 
     with open("compiled/auction_clear_state.teal", "w") as f:
-        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=5)
+        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=TEAL_VERSION)
         f.write(compiled)
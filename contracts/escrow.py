@@ -1,7 +1,109 @@
+from typing import Tuple
+
 from pyteal import *
 
+from contracts.abi import contract_description, dispatch, get_method, method_selector
+from contracts.funding import MIN_TXN_FEE, app_funding
+from utils.cse import cacheRepeatedReads
+from utils.peephole import optimizeTeal
+
+# Inner group settlement and fee pooling need TEAL v6
+TEAL_VERSION = 6
+
+# Fees of the inner transactions of each call, paid on top of the call's own
+# fee when fees are pooled
+# on_setup: the opt-in
+SETUP_INNER_FEES = 1 * MIN_TXN_FEE
+# on_buy: the asset transfer, fee payment and seller payout
+BUY_INNER_FEES = 3 * MIN_TXN_FEE
+# delete: closing the asset holding and the account
+DELETE_INNER_FEES = 2 * MIN_TXN_FEE
+# delete of an escrow created by the escrow factory: the closes, the release
+# call to the factory and its repayment of the listing deposit to the seller
+FACTORY_DELETE_INNER_FEES = DELETE_INNER_FEES + 2 * MIN_TXN_FEE
+# withdraw: the asset transfer back to the seller
+WITHDRAW_INNER_FEES = 1 * MIN_TXN_FEE
+
+# The methods of the escrow, most frequently called first
+CONTRACT = contract_description(
+    "escrow",
+    [
+        "on_buy(uint64)void",
+        "on_setup(uint64)void",
+        "create(uint64,address,uint64)void",
+    ],
+)
+
+# The methods of an escrow created by the escrow factory, which is created
+# for the seller by the factory rather than by the seller itself
+FACTORY_CONTRACT = contract_description(
+    "escrow",
+    [
+        "on_buy(uint64)void",
+        "on_setup(uint64)void",
+        "create(uint64,address,uint64,address)void",
+    ],
+)
+
+# The method of the escrow factory an escrow it created calls as it is
+# deleted, see escrow_factory.approval_program
+FACTORY_RELEASE = contract_description("escrow_factory", ["release()void"])
+
+
+# The methods of a persistent escrow, which sells units of its asset until
+# none is left
+PERSISTENT_CONTRACT = contract_description(
+    "escrow",
+    [
+        "on_buy(uint64)void",
+        "set_price(uint64)void",
+        "withdraw(uint64)void",
+        "on_setup(uint64)void",
+        "create(uint64,address,uint64)void",
+    ],
+)
+
+
+def setup_funding(pool_fees: bool = True) -> int:
+    """The payment to the escrow account on_setup expects."""
+    if pool_fees:
+        return app_funding(assets=1)
+    # without fee pooling the escrow pays for every inner transaction itself
+    inner_fees = SETUP_INNER_FEES + BUY_INNER_FEES + DELETE_INNER_FEES
+    return app_funding(assets=1, inner_txns=inner_fees // MIN_TXN_FEE)
+
+
+def global_schema(factory: bool = False) -> Tuple[int, int]:
+    """The (uints, byte slices) of an escrow's global state."""
+    return (4, 2) if factory else (4, 1)
+
+
+def approval_program(
+    optimize: bool = True,
+    pool_fees: bool = True,
+    factory: bool = False,
+    persistent: bool = False,
+):
+    """The escrow's approval program.
+
+    An escrow created by the escrow factory (`factory` True) keeps its
+    seller in global state: the factory funds and sets it up as its
+    creator, while the proceeds, and the asset and funds left on delete, go
+    to the seller. Its delete has the factory pay the seller back the
+    deposit of the listing. Its fees are pooled, as the factory's repayment
+    is paid by the delete.
+
+    A persistent escrow (`persistent` True) stays on sale after a purchase,
+    until every unit of its asset is bought or withdrawn. The seller may
+    change the price with set_price and take units back with withdraw. Its
+    inner transactions are paid by the calls, so it needs `pool_fees`.
+    """
+    if persistent and (factory or not pool_fees):
+        raise ValueError("a persistent escrow is created by its seller and pools its fees")
+    if factory and not pool_fees:
+        raise ValueError("an escrow created by the factory pools its fees")
+    contract = PERSISTENT_CONTRACT if persistent else FACTORY_CONTRACT if factory else CONTRACT
 
-def approval_program():
     # Asset Info
     asset_id_key = Bytes("aid")
     asset_price_key = Bytes("ap")
@@ -13,63 +115,21 @@ def approval_program():
     # APP State
     app_state = Bytes("as")
 
+    # Seller, the creator unless created by the factory
+    seller_key = Bytes("sl")
+    seller = App.globalGet(seller_key) if factory else Global.creator_address()
+
     # Variables
-    # Every internal transaction costs 1_000
-    # Minimum balance held in escrow 200_000
-    transactions_count = 5
-    escrow_min_balance = Int(200_000 + (1_000 * transactions_count))
+    # Minimum balance held in escrow, and the fees of its inner transactions
+    # unless every inner transaction leaves its fee to the outer transaction
+    escrow_min_balance = Int(setup_funding(pool_fees))
+    inner_fee = {TxnField.fee: Int(0)} if pool_fees else {}
 
     # APP States Enum
     STATUS_NOT_INIT = Int(0)
     STATUS_ACTIVE = Int(1)
     STATUS_IN_PROGRESS = Int(2)
 
-    @Subroutine(TealType.none)
-    def sendAssetTo(assetID: Expr, account: Expr, amount: Expr) -> Expr:
-        asset_holding = AssetHolding.balance(
-            Global.current_application_address(), assetID
-        )
-        return Seq(
-            asset_holding,
-            If(
-                And(
-                    asset_holding.hasValue(),
-                    asset_holding.value() >= amount
-                )
-            ).Then(
-                Seq(
-                    InnerTxnBuilder.Begin(),
-                    InnerTxnBuilder.SetFields(
-                        {
-                            TxnField.type_enum: TxnType.AssetTransfer,
-                            TxnField.xfer_asset: assetID,
-                            TxnField.asset_receiver: account,
-                            TxnField.asset_amount: amount
-                        }
-                    ),
-                    InnerTxnBuilder.Submit(),
-                )
-            ),
-        )
-
-    @Subroutine(TealType.none)
-    def sendPaymentTo(account: Expr, amount: Expr) -> Expr:
-        return Seq(
-            If(Balance(Global.current_application_address()) >= amount).Then(
-                Seq(
-                    InnerTxnBuilder.Begin(),
-                    InnerTxnBuilder.SetFields(
-                        {
-                            TxnField.type_enum: TxnType.Payment,
-                            TxnField.receiver: account,
-                            TxnField.amount: amount
-                        }
-                    ),
-                    InnerTxnBuilder.Submit(),
-                )
-            ),
-        )
-
     @Subroutine(TealType.none)
     def closeAssetTo(assetID: Expr, account: Expr) -> Expr:
         asset_holding = AssetHolding.balance(
@@ -85,6 +145,7 @@ def approval_program():
                             TxnField.type_enum: TxnType.AssetTransfer,
                             TxnField.xfer_asset: assetID,
                             TxnField.asset_close_to: account,
+                            **inner_fee,
                         }
                     ),
                     InnerTxnBuilder.Submit(),
@@ -101,6 +162,7 @@ def approval_program():
                     {
                         TxnField.type_enum: TxnType.Payment,
                         TxnField.close_remainder_to: account,
+                        **inner_fee,
                     }
                 ),
                 InnerTxnBuilder.Submit(),
@@ -108,12 +170,20 @@ def approval_program():
         )
 
     # Create Application Function
+    # Arguments: asset_id, fee_receiver, fee_percent, and the seller if
+    # created by the factory
     on_create = Seq(
-        Assert(Txn.application_args.length() == Int(3)),
+        Assert(
+            And(
+                Txn.application_id() == Int(0),
+                Txn.application_args.length() == Int(len(get_method(contract, "create").args) + 1),
+            )
+        ),
+        *([App.globalPut(seller_key, Txn.application_args[4])] if factory else []),
         App.globalPut(app_state, STATUS_NOT_INIT),
-        App.globalPut(asset_id_key, Btoi(Txn.application_args[0])),
-        App.globalPut(fee_receiver_key, Txn.application_args[1]),
-        App.globalPut(fee_percent_key, Btoi(Txn.application_args[2])),
+        App.globalPut(asset_id_key, Btoi(Txn.application_args[1])),
+        App.globalPut(fee_receiver_key, Txn.application_args[2]),
+        App.globalPut(fee_percent_key, Btoi(Txn.application_args[3])),
         Assert(
             And(
                 # ensure that the fee percent is between 0 and 100
@@ -127,7 +197,7 @@ def approval_program():
     # On Setup Function
     # Transaction Group:
     # [1] Payment for escrow account
-    # [2] Application call - on_setup
+    # [2] Application call - on_setup, paying SETUP_INNER_FEES on top of its fee
     #     - [1] sale_price: bigint
     # [3] Transfer of Asset
     tx_index_current = Txn.group_index()
@@ -184,6 +254,7 @@ def approval_program():
                 TxnField.type_enum: TxnType.AssetTransfer,
                 TxnField.xfer_asset: App.globalGet(asset_id_key),
                 TxnField.asset_receiver: Global.current_application_address(),
+                **inner_fee,
             }
         ),
         InnerTxnBuilder.Submit(),
@@ -194,7 +265,10 @@ def approval_program():
     # Transaction Group:
     # [1] Maybe Optin ?
     # [2] Transfer of funds
-    # [3] Application call - on_buy
+    # [3] Application call - on_buy, paying BUY_INNER_FEES on top of its fee
+    #     - accounts: [buyer, fee_receiver, creator]
+    # The payment is found relative to the call, so purchases from several
+    # escrows can share a group, as in a cart checkout.
     tx_index_buy = Txn.group_index() - Int(1)
 
     # @var NFT Balance
@@ -208,6 +282,8 @@ def approval_program():
     )
     # The requested amount of the asset
     asset_amount = Btoi(Txn.application_args[1])
+    sale_total = App.globalGet(asset_price_key) * asset_amount
+    sale_fee = App.globalGet(fee_percent_key) * sale_total / Int(100)
     on_buy = Seq(
         asset_balance,
         buyer_asset_balance,
@@ -222,51 +298,153 @@ def approval_program():
 
                 # ensure the buyer is opted-in to the NFT
                 buyer_asset_balance.hasValue(),
+                *([asset_amount > Int(0)] if persistent else []),
 
                 # Check if the purchase payment is valid
                 And(
                     Gtxn[tx_index_buy].type_enum() == TxnType.Payment,
                     Gtxn[tx_index_buy].sender() == Txn.sender(),
                     Gtxn[tx_index_buy].receiver() == Global.current_application_address(),
-                    Gtxn[tx_index_buy].amount() == App.globalGet(asset_price_key) * asset_amount,
+                    Gtxn[tx_index_buy].amount() == sale_total,
                 ),
             )
         ),
-        # Set the status as not selling
-        App.globalPut(app_state, STATUS_ACTIVE),
+        # Set the status as not selling, once sold out if persistent
+        If(asset_balance.value() == asset_amount).Then(App.globalPut(app_state, STATUS_ACTIVE))
+        if persistent
+        else App.globalPut(app_state, STATUS_ACTIVE),
 
+        # settle the purchase in one inner group
+        InnerTxnBuilder.Begin(),
         # send the asset to the buyer
-        sendAssetTo(App.globalGet(asset_id_key), Gtxn[tx_index_buy].sender(), asset_amount),
-
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: App.globalGet(asset_id_key),
+                TxnField.asset_receiver: Gtxn[tx_index_buy].sender(),
+                TxnField.asset_amount: asset_amount,
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Next(),
         # send the fee to the fee receiver
-        sendPaymentTo(
-            App.globalGet(fee_receiver_key),
-            (
-                (
-                    App.globalGet(fee_percent_key)
-                    * (App.globalGet(asset_price_key) * asset_amount)
-                ) / Int(100)
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: App.globalGet(fee_receiver_key),
+                TxnField.amount: sale_fee,
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Next(),
+        # send the rest of the payment to the seller
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: seller,
+                TxnField.amount: sale_total - sale_fee,
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+
+        Approve(),
+    )
+
+    # Change the price of a persistent escrow on sale
+    # Arguments: sale_price
+    on_set_price = Seq(
+        Assert(
+            And(
+                Txn.sender() == seller,
+                App.globalGet(app_state) == STATUS_IN_PROGRESS,
             )
         ),
+        App.globalPut(asset_price_key, Btoi(Txn.application_args[1])),
+        Approve(),
+    )
 
+    # Take units of the asset of a persistent escrow back, paying
+    # WITHDRAW_INNER_FEES on top of its fee
+    # Arguments: asset_amount
+    #     - assets: [asset]
+    withdraw_balance = AssetHolding.balance(
+        Global.current_application_address(),
+        App.globalGet(asset_id_key)
+    )
+    on_withdraw = Seq(
+        withdraw_balance,
+        Assert(
+            And(
+                Txn.sender() == seller,
+                App.globalGet(app_state) == STATUS_IN_PROGRESS,
+                asset_amount > Int(0),
+                withdraw_balance.value() >= asset_amount,
+            )
+        ),
+        # the sale ends with the last unit
+        If(withdraw_balance.value() == asset_amount).Then(App.globalPut(app_state, STATUS_ACTIVE)),
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: App.globalGet(asset_id_key),
+                TxnField.asset_receiver: seller,
+                TxnField.asset_amount: asset_amount,
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Submit(),
         Approve(),
     )
 
+    if optimize:
+        # evaluate the repeated state reads and group fields of each branch once
+        on_create = cacheRepeatedReads(on_create)
+        on_setup = cacheRepeatedReads(on_setup)
+        on_buy = cacheRepeatedReads(on_buy)
+        on_set_price = cacheRepeatedReads(on_set_price)
+        on_withdraw = cacheRepeatedReads(on_withdraw)
+
     # Define method and method handler
-    handle_noop_method = Txn.application_args[0]
-    handle_noop = Cond(
-        [handle_noop_method == Bytes("on_setup"), on_setup],
-        [handle_noop_method == Bytes("on_buy"), on_buy],
+    # The other methods fail on creation: without an asset to sell, neither
+    # a purchase nor the asset transfer of the setup can be valid
+    handlers = {"on_buy": on_buy, "on_setup": on_setup, "create": on_create}
+    if persistent:
+        handlers.update({"set_price": on_set_price, "withdraw": on_withdraw})
+    handle_noop = dispatch(contract, handlers)
+
+    # Have the factory pay the deposit of the listing back to the seller,
+    # checking that the factory named is the creator
+    #     - applications: [factory]
+    factory_address = AppParam.address(Txn.applications[1])
+    release_deposit = Seq(
+        factory_address,
+        Assert(factory_address.value() == Global.creator_address()),
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.ApplicationCall,
+                TxnField.application_id: Txn.applications[1],
+                TxnField.on_completion: OnComplete.NoOp,
+                TxnField.application_args: [Bytes(method_selector(FACTORY_RELEASE, "release"))],
+                TxnField.accounts: [seller],
+                TxnField.applications: [Global.current_application_id()],
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Submit(),
     )
 
-    # Delete app and return the funds
+    # Delete app and return the funds, paying DELETE_INNER_FEES on top of its
+    # fee, or FACTORY_DELETE_INNER_FEES if created by the factory
     handle_deleteapp = Seq(
         Assert(
             Or(
-                # Transaction sender must be the creator if status is in progress
+                # Transaction sender must be the seller if status is in progress
                 And(
                     App.globalGet(app_state) == STATUS_IN_PROGRESS,
-                    Txn.sender() == Global.creator_address()
+                    Txn.sender() == seller
                 ),
                 # Or transaction sender maybe anyone if status is not in progress
                 And(
@@ -275,27 +453,33 @@ def approval_program():
             )
         ),
 
-        # send the asset to the creator
-        closeAssetTo(App.globalGet(asset_id_key), Global.creator_address()),
+        # send the asset to the seller
+        closeAssetTo(App.globalGet(asset_id_key), seller),
+
+        # release the listing deposit, while the escrow can still send
+        *([release_deposit] if factory else []),
 
-        # send the remainder of funds back to the creator
-        closeAccountTo(Global.creator_address()),
+        # send the remainder of funds back to the seller
+        closeAccountTo(seller),
 
         Approve(),
     )
 
+    if optimize:
+        handle_deleteapp = cacheRepeatedReads(handle_deleteapp)
+
     # Handle Opt-in function
     handle_optin = Reject()
     handle_closeout = Reject()
     handle_updateapp = Reject()
 
+    # The application is created by the create method, a NoOp call
     program = Cond(
-        [Txn.application_id() == Int(0), on_create],
         [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+        [Txn.on_completion() == OnComplete.DeleteApplication, handle_deleteapp],
         [Txn.on_completion() == OnComplete.OptIn, handle_optin],
         [Txn.on_completion() == OnComplete.CloseOut, handle_closeout],
         [Txn.on_completion() == OnComplete.UpdateApplication, handle_updateapp],
-        [Txn.on_completion() == OnComplete.DeleteApplication, handle_deleteapp],
     )
 
     return program
@@ -308,9 +492,9 @@ def clear_state_program():
 
 if __name__ == "__main__":
     with open("compiled/escrow_approval.teal", "w") as f:
-        compiled = compileTeal(approval_program(), mode=Mode.Application, version=5)
+        compiled = optimizeTeal(compileTeal(approval_program(), mode=Mode.Application, version=TEAL_VERSION))
         f.write(compiled)
 
     with open("compiled/escrow_clear_state.teal", "w") as f:
-        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=5)
+        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=TEAL_VERSION)
         f.write(compiled)
@@ -0,0 +1,282 @@
+from typing import Tuple
+
+from pyteal import *
+
+from contracts import escrow
+from contracts.abi import contract_description, dispatch, method_selector
+from contracts.funding import MIN_TXN_FEE, app_funding, app_params_funding
+from utils.assembler import assemble
+from utils.peephole import optimizeTeal
+
+# Inner app creation and calls need TEAL v6
+TEAL_VERSION = 6
+
+# Fees of the inner transactions of each call, paid on top of the call's own
+# fee
+# accept: the factory's opt-in to the asset
+ACCEPT_INNER_FEES = 1 * MIN_TXN_FEE
+# list: the escrow's creation, funding, setup call with its opt-in, and the
+# asset transfer
+LIST_INNER_FEES = 4 * MIN_TXN_FEE + escrow.SETUP_INNER_FEES
+# release: the repayment of the seller, paid by the escrow's delete, see
+# escrow.FACTORY_DELETE_INNER_FEES
+RELEASE_INNER_FEES = 1 * MIN_TXN_FEE
+
+# The transactions of a listing group, see approval_program
+LISTING_GROUP_SIZE = 4
+
+# The methods of the factory, in the order of a listing group, then the
+# release of a listing called by its escrow as it is deleted
+CONTRACT = contract_description(
+    "escrow_factory",
+    [
+        "accept(uint64)void",
+        "list(uint64,uint64)void",
+        "release()void",
+        "create(address,uint64)void",
+    ],
+)
+
+
+def factory_funding() -> int:
+    """The payment to the factory account after its creation, so that it can
+    hold the asset of a listing until it passes it on."""
+    return app_funding(assets=1)
+
+
+def global_schema() -> Tuple[int, int]:
+    """The (uints, byte slices) of the factory's global state schema."""
+    return 2, 1
+
+
+def listing_deposit() -> int:
+    """The increase of the factory's minimum balance as the creator of an
+    escrow, paid back to the seller by release as the escrow is deleted."""
+    return app_params_funding(*escrow.global_schema(factory=True))
+
+
+def listing_funding() -> int:
+    """The payment to the factory of every listing: the escrow's own funding,
+    and the deposit of listing_deposit."""
+    return escrow.setup_funding() + listing_deposit()
+
+
+def child_programs() -> Tuple[bytes, bytes]:
+    """The assembled approval and clear state programs of the escrows the
+    factory creates."""
+    approval = optimizeTeal(
+        compileTeal(escrow.approval_program(factory=True), mode=Mode.Application, version=escrow.TEAL_VERSION)
+    )
+    clear = compileTeal(escrow.clear_state_program(), mode=Mode.Application, version=escrow.TEAL_VERSION)
+    return assemble(approval), assemble(clear)
+
+
+def approval_program():
+    # Fee Receiver, passed on to every escrow
+    fee_receiver_key = Bytes("fr")
+    fee_percent_key = Bytes("fp")
+
+    # The number of listings created
+    listings_key = Bytes("n")
+
+    child_approval, child_clear = child_programs()
+    child_uints, child_byte_slices = escrow.global_schema(factory=True)
+
+    # Create Application Function
+    # Arguments: fee_receiver, fee_percent
+    on_create = Seq(
+        Assert(
+            And(
+                Txn.application_id() == Int(0),
+                Txn.application_args.length() == Int(3),
+                Len(Txn.application_args[1]) == Int(32),
+                Btoi(Txn.application_args[2]) <= Int(100),
+            )
+        ),
+        App.globalPut(fee_receiver_key, Txn.application_args[1]),
+        App.globalPut(fee_percent_key, Btoi(Txn.application_args[2])),
+        App.globalPut(listings_key, Int(0)),
+        Approve(),
+    )
+
+    # A listing is a single group, sent by the seller:
+    # [0] Payment of listing_funding to the factory
+    # [1] Application call - accept, paying ACCEPT_INNER_FEES on top of its fee
+    #     - [1] asset_id: uint64
+    # [2] Transfer of the asset to the factory
+    # [3] Application call - list, paying LIST_INNER_FEES on top of its fee
+    #     - [1] asset_id: uint64
+    #     - [2] sale_price: uint64
+    # The factory holds the asset from [2] to [3] only, so it is opted in to
+    # no asset outside of a listing group.
+    funding_txn = Gtxn[0]
+    accept_txn = Gtxn[1]
+    asset_txn = Gtxn[2]
+    list_txn = Gtxn[3]
+    is_listing_group = And(
+        Global.group_size() == Int(LISTING_GROUP_SIZE),
+        funding_txn.type_enum() == TxnType.Payment,
+        funding_txn.sender() == Txn.sender(),
+        funding_txn.receiver() == Global.current_application_address(),
+        funding_txn.amount() == Int(listing_funding()),
+        accept_txn.application_id() == Global.current_application_id(),
+        accept_txn.application_args[0] == Bytes(method_selector(CONTRACT, "accept")),
+        asset_txn.type_enum() == TxnType.AssetTransfer,
+        asset_txn.sender() == Txn.sender(),
+        asset_txn.asset_receiver() == Global.current_application_address(),
+        asset_txn.xfer_asset() == Btoi(accept_txn.application_args[1]),
+        asset_txn.asset_amount() == Int(1),
+        list_txn.sender() == Txn.sender(),
+        list_txn.application_id() == Global.current_application_id(),
+        list_txn.application_args[0] == Bytes(method_selector(CONTRACT, "list")),
+        list_txn.application_args[1] == accept_txn.application_args[1],
+    )
+
+    on_accept = Seq(
+        Assert(And(Txn.group_index() == Int(1), is_listing_group)),
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: Btoi(Txn.application_args[1]),
+                TxnField.asset_receiver: Global.current_application_address(),
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+        Approve(),
+    )
+
+    child = ScratchVar(TealType.uint64)
+    child_address = AppParam.address(child.load())
+    on_list = Seq(
+        Assert(And(Txn.group_index() == Int(3), is_listing_group)),
+
+        # create the escrow, with the factory as its creator
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.ApplicationCall,
+                TxnField.on_completion: OnComplete.NoOp,
+                TxnField.approval_program: Bytes(child_approval),
+                TxnField.clear_state_program: Bytes(child_clear),
+                TxnField.global_num_uints: Int(child_uints),
+                TxnField.global_num_byte_slices: Int(child_byte_slices),
+                TxnField.application_args: [
+                    Bytes(method_selector(escrow.FACTORY_CONTRACT, "create")),
+                    Txn.application_args[1],
+                    App.globalGet(fee_receiver_key),
+                    Itob(App.globalGet(fee_percent_key)),
+                    Txn.sender(),
+                ],
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+        child.store(InnerTxn.created_application_id()),
+        child_address,
+        Assert(child_address.hasValue()),
+
+        # and set it up, as on_setup expects its creator to
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: child_address.value(),
+                TxnField.amount: Int(escrow.setup_funding()),
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Next(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.ApplicationCall,
+                TxnField.application_id: child.load(),
+                TxnField.on_completion: OnComplete.NoOp,
+                TxnField.application_args: [
+                    Bytes(method_selector(escrow.FACTORY_CONTRACT, "on_setup")),
+                    Txn.application_args[2],
+                ],
+                TxnField.assets: [Btoi(Txn.application_args[1])],
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Next(),
+        # the factory's holding is closed along with the transfer
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: Btoi(Txn.application_args[1]),
+                TxnField.asset_receiver: child_address.value(),
+                TxnField.asset_amount: Int(1),
+                TxnField.asset_close_to: child_address.value(),
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+
+        # record the listing: the escrow, seller, asset and price
+        App.globalPut(listings_key, App.globalGet(listings_key) + Int(1)),
+        Log(Concat(Itob(child.load()), Txn.sender(), Txn.application_args[1], Txn.application_args[2])),
+        Approve(),
+    )
+
+    # Pay the deposit of a listing back to its seller, called by its escrow
+    # as it is deleted. The escrows the factory created are the only callers
+    # it accepts, and each names its own seller, so the factory keeps no
+    # record of the deposits.
+    #     - accounts: [seller]
+    #     - applications: [escrow]
+    caller_creator = AppParam.creator(Global.caller_app_id())
+    on_release = Seq(
+        caller_creator,
+        Assert(
+            And(
+                Global.caller_app_id() != Int(0),
+                caller_creator.hasValue(),
+                caller_creator.value() == Global.current_application_address(),
+            )
+        ),
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: Txn.accounts[1],
+                TxnField.amount: Int(listing_deposit()),
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+        Approve(),
+    )
+
+    handle_noop = dispatch(
+        CONTRACT,
+        {"accept": on_accept, "list": on_list, "release": on_release, "create": on_create},
+    )
+
+    # The escrows keep the factory's minimum balance up, so it is never
+    # deleted
+    program = Cond(
+        [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+        [Txn.on_completion() == OnComplete.DeleteApplication, Reject()],
+        [Txn.on_completion() == OnComplete.OptIn, Reject()],
+        [Txn.on_completion() == OnComplete.CloseOut, Reject()],
+        [Txn.on_completion() == OnComplete.UpdateApplication, Reject()],
+    )
+
+    return program
+
+
+def clear_state_program():
+    return Approve()
+
+
+if __name__ == "__main__":
+    with open("compiled/escrow_factory_approval.teal", "w") as f:
+        compiled = optimizeTeal(compileTeal(approval_program(), mode=Mode.Application, version=TEAL_VERSION))
+        f.write(compiled)
+
+    with open("compiled/escrow_factory_clear_state.teal", "w") as f:
+        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=TEAL_VERSION)
+        f.write(compiled)
@@ -1,21 +1,378 @@
+from typing import Dict, List, Tuple, Union
+
+from algosdk import encoding
 from pyteal import *
 
+from contracts.abi import contract_description, dispatch
+from contracts.funding import MIN_TXN_FEE, app_funding
+from utils.cse import cacheRepeatedReads
+from utils.opcodes import MAX_APP_TXN_ACCOUNTS
+from utils.peephole import optimizeTeal
 
-def approval_program():
-    print("Approval Program")
-    return Approve()
+# Inner group settlement and fee pooling need TEAL v6
+TEAL_VERSION = 6
+
+# Royalty shares are given in basis points of the sale price
+BASIS_POINTS = 10_000
+
+# The buy call references the fee receiver, the seller and every royalty
+# recipient, all of which count against the accounts of the call
+MAX_ROYALTY_RECIPIENTS = MAX_APP_TXN_ACCOUNTS - 2
+
+# Every recipient takes a 32 byte address followed by its uint16 share, as
+# the ARC-4 encoding of (address,uint16) lays them out
+RECIPIENT_SIZE = 34
+SHARE_OFFSET = 32
+
+# Fees of the inner transactions of each call, paid on top of the call's own
+# fee
+# on_setup: the opt-in
+SETUP_INNER_FEES = 1 * MIN_TXN_FEE
+# on_buy: the asset transfer, fee payment and seller payout, and a payment
+# per royalty recipient on top, see buy_inner_fees
+BUY_INNER_FEES = 3 * MIN_TXN_FEE
+ROYALTY_INNER_FEE = MIN_TXN_FEE
+# delete: closing the asset holding and the account
+DELETE_INNER_FEES = 2 * MIN_TXN_FEE
+
+# The methods of the royalty escrow, most frequently called first
+CONTRACT = contract_description(
+    "escrow_royalty",
+    [
+        "on_buy(uint64)void",
+        "on_setup(uint64)void",
+        "create(uint64,address,uint64,(address,uint16)[])void",
+    ],
+)
+
+# (address, share in basis points) of a royalty recipient
+Royalty = Tuple[str, int]
+
+
+def setup_funding() -> int:
+    """The payment to the escrow account on_setup expects."""
+    return app_funding(assets=1)
+
+
+def buy_inner_fees(recipients: int) -> int:
+    """The inner fees the buy call pays for an escrow with `recipients`
+    royalty recipients."""
+    return BUY_INNER_FEES + recipients * ROYALTY_INNER_FEE
+
+
+def decode_royalties(globalState: Dict[bytes, Union[int, bytes]]) -> List[Royalty]:
+    """The royalty recipients an escrow's global state holds, in the order
+    they are paid."""
+    packed = globalState.get(b"rr", b"")
+    return [
+        (
+            encoding.encode_address(packed[offset:offset + SHARE_OFFSET]),
+            int.from_bytes(packed[offset + SHARE_OFFSET:offset + RECIPIENT_SIZE], "big"),
+        )
+        for offset in range(0, len(packed), RECIPIENT_SIZE)
+    ]
+
+
+def approval_program(optimize: bool = True):
+    # Asset Info
+    asset_id_key = Bytes("aid")
+    asset_price_key = Bytes("ap")
+
+    # Fee Receiver
+    fee_receiver_key = Bytes("fr")
+    fee_percent_key = Bytes("fp")
+
+    # Royalty recipients, packed as RECIPIENT_SIZE byte records
+    royalties_key = Bytes("rr")
+
+    # APP State
+    app_state = Bytes("as")
+
+    # Variables
+    escrow_min_balance = Int(setup_funding())
+    inner_fee = {TxnField.fee: Int(0)}
+
+    # APP States Enum
+    STATUS_NOT_INIT = Int(0)
+    STATUS_ACTIVE = Int(1)
+    STATUS_IN_PROGRESS = Int(2)
+
+    @Subroutine(TealType.none)
+    def closeAssetTo(assetID: Expr, account: Expr) -> Expr:
+        asset_holding = AssetHolding.balance(
+            Global.current_application_address(), assetID
+        )
+        return Seq(
+            asset_holding,
+            If(asset_holding.hasValue()).Then(
+                Seq(
+                    InnerTxnBuilder.Begin(),
+                    InnerTxnBuilder.SetFields(
+                        {
+                            TxnField.type_enum: TxnType.AssetTransfer,
+                            TxnField.xfer_asset: assetID,
+                            TxnField.asset_close_to: account,
+                            **inner_fee,
+                        }
+                    ),
+                    InnerTxnBuilder.Submit(),
+                )
+            ),
+        )
+
+    @Subroutine(TealType.none)
+    def closeAccountTo(account: Expr) -> Expr:
+        return If(Balance(Global.current_application_address()) != Int(0)).Then(
+            Seq(
+                InnerTxnBuilder.Begin(),
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.Payment,
+                        TxnField.close_remainder_to: account,
+                        **inner_fee,
+                    }
+                ),
+                InnerTxnBuilder.Submit(),
+            )
+        )
+
+    # Create Application Function
+    # Arguments: asset_id, fee_receiver, fee_percent, royalties
+    # The royalties are validated here once, so a sale only reads them
+    royalties_arg = Txn.application_args[4]
+    royalties_count = ExtractUint16(royalties_arg, Int(0))
+    royalties_total = ScratchVar(TealType.uint64)
+    on_create = Seq(
+        Assert(
+            And(
+                Txn.application_id() == Int(0),
+                Txn.application_args.length() == Int(5),
+                Len(Txn.application_args[2]) == Int(32),
+                # ensure that the fee percent is between 0 and 100
+                Btoi(Txn.application_args[3]) <= Int(100),
+                royalties_count <= Int(MAX_ROYALTY_RECIPIENTS),
+                Len(royalties_arg) == Int(2) + royalties_count * Int(RECIPIENT_SIZE),
+            )
+        ),
+        royalties_total.store(Int(0)),
+        *[
+            If(royalties_count > Int(index)).Then(
+                Seq(
+                    # a recipient with no share would only cost a payment
+                    Assert(ExtractUint16(royalties_arg, Int(2 + index * RECIPIENT_SIZE + SHARE_OFFSET)) > Int(0)),
+                    royalties_total.store(
+                        royalties_total.load()
+                        + ExtractUint16(royalties_arg, Int(2 + index * RECIPIENT_SIZE + SHARE_OFFSET))
+                    ),
+                )
+            )
+            for index in range(MAX_ROYALTY_RECIPIENTS)
+        ],
+        # the fee and royalties together cannot exceed the sale price
+        Assert(royalties_total.load() + Btoi(Txn.application_args[3]) * Int(BASIS_POINTS // 100) <= Int(BASIS_POINTS)),
+        App.globalPut(app_state, STATUS_NOT_INIT),
+        App.globalPut(asset_id_key, Btoi(Txn.application_args[1])),
+        App.globalPut(fee_receiver_key, Txn.application_args[2]),
+        App.globalPut(fee_percent_key, Btoi(Txn.application_args[3])),
+        App.globalPut(royalties_key, Suffix(royalties_arg, Int(2))),
+        Approve()
+    )
+
+    # On Setup Function
+    # Transaction Group:
+    # [1] Payment for escrow account
+    # [2] Application call - on_setup, paying SETUP_INNER_FEES on top of its fee
+    #     - [1] sale_price: bigint
+    # [3] Transfer of Asset
+    tx_index_current = Txn.group_index()
+    tx_index_escrow_payment = tx_index_current - Int(1)
+    tx_index_asset_transfer = tx_index_current + Int(1)
+    on_setup = Seq(
+        Assert(
+            And(
+                Global.group_size() == Int(3),
+                App.globalGet(app_state) != STATUS_IN_PROGRESS,
+
+                # the escrow payment, from the creator
+                Gtxn[tx_index_escrow_payment].type_enum() == TxnType.Payment,
+                Gtxn[tx_index_escrow_payment].sender() == Global.creator_address(),
+                Gtxn[tx_index_escrow_payment].receiver() == Global.current_application_address(),
+                Gtxn[tx_index_escrow_payment].amount() == escrow_min_balance,
+
+                # the asset, from the creator
+                Gtxn[tx_index_asset_transfer].type_enum() == TxnType.AssetTransfer,
+                Gtxn[tx_index_asset_transfer].sender() == Global.creator_address(),
+                Gtxn[tx_index_asset_transfer].asset_receiver() == Global.current_application_address(),
+                Gtxn[tx_index_asset_transfer].asset_amount() >= Int(1),
+                Gtxn[tx_index_asset_transfer].xfer_asset() == App.globalGet(asset_id_key),
+            )
+        ),
+        App.globalPut(asset_price_key, Btoi(Txn.application_args[1])),
+        App.globalPut(app_state, STATUS_IN_PROGRESS),
+
+        # opt into the asset
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: App.globalGet(asset_id_key),
+                TxnField.asset_receiver: Global.current_application_address(),
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+        Approve(),
+    )
+
+    # Buy Asset from escrow
+    # Transaction Group:
+    # [1] Maybe Optin ?
+    # [2] Transfer of funds
+    # [3] Application call - on_buy, paying buy_inner_fees on top of its fee
+    #     - accounts: [fee_receiver, creator, *royalty recipients]
+    tx_index_buy = Txn.group_index() - Int(1)
+
+    asset_balance = AssetHolding.balance(
+        Global.current_application_address(),
+        App.globalGet(asset_id_key)
+    )
+    buyer_asset_balance = AssetHolding.balance(
+        Txn.sender(), App.globalGet(asset_id_key)
+    )
+    asset_amount = Btoi(Txn.application_args[1])
+    sale_total = App.globalGet(asset_price_key) * asset_amount
+    sale_fee = App.globalGet(fee_percent_key) * sale_total / Int(100)
+    recipients = Len(App.globalGet(royalties_key)) / Int(RECIPIENT_SIZE)
+    royalty = ScratchVar(TealType.uint64)
+    royalties_paid = ScratchVar(TealType.uint64)
+
+    def payRoyalty(index: int) -> Expr:
+        offset = index * RECIPIENT_SIZE
+        return If(recipients > Int(index)).Then(
+            Seq(
+                royalty.store(
+                    sale_total * ExtractUint16(App.globalGet(royalties_key), Int(offset + SHARE_OFFSET)) / Int(BASIS_POINTS)
+                ),
+                royalties_paid.store(royalties_paid.load() + royalty.load()),
+                InnerTxnBuilder.Next(),
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.Payment,
+                        TxnField.receiver: Extract(App.globalGet(royalties_key), Int(offset), Int(SHARE_OFFSET)),
+                        TxnField.amount: royalty.load(),
+                        **inner_fee,
+                    }
+                ),
+            )
+        )
+
+    on_buy = Seq(
+        asset_balance,
+        buyer_asset_balance,
+        Assert(
+            And(
+                asset_balance.hasValue(),
+                asset_balance.value() >= asset_amount,
+                App.globalGet(app_state) == STATUS_IN_PROGRESS,
+                # ensure the buyer is opted-in to the NFT
+                buyer_asset_balance.hasValue(),
+                And(
+                    Gtxn[tx_index_buy].type_enum() == TxnType.Payment,
+                    Gtxn[tx_index_buy].sender() == Txn.sender(),
+                    Gtxn[tx_index_buy].receiver() == Global.current_application_address(),
+                    Gtxn[tx_index_buy].amount() == sale_total,
+                ),
+            )
+        ),
+        App.globalPut(app_state, STATUS_ACTIVE),
+        royalties_paid.store(Int(0)),
+
+        # settle the purchase, fee and royalties in one inner group
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: App.globalGet(asset_id_key),
+                TxnField.asset_receiver: Gtxn[tx_index_buy].sender(),
+                TxnField.asset_amount: asset_amount,
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Next(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: App.globalGet(fee_receiver_key),
+                TxnField.amount: sale_fee,
+                **inner_fee,
+            }
+        ),
+        *[payRoyalty(index) for index in range(MAX_ROYALTY_RECIPIENTS)],
+        InnerTxnBuilder.Next(),
+        # the seller gets what the fee and royalties leave
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: Global.creator_address(),
+                TxnField.amount: sale_total - sale_fee - royalties_paid.load(),
+                **inner_fee,
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+
+        Approve(),
+    )
+
+    if optimize:
+        on_create = cacheRepeatedReads(on_create)
+        on_setup = cacheRepeatedReads(on_setup)
+        on_buy = cacheRepeatedReads(on_buy)
+
+    handle_noop = dispatch(
+        CONTRACT,
+        {"on_buy": on_buy, "on_setup": on_setup, "create": on_create},
+    )
+
+    # Delete app and return the funds, paying DELETE_INNER_FEES on top of its fee
+    handle_deleteapp = Seq(
+        Assert(
+            Or(
+                # only the creator can withdraw an asset on sale
+                And(
+                    App.globalGet(app_state) == STATUS_IN_PROGRESS,
+                    Txn.sender() == Global.creator_address()
+                ),
+                App.globalGet(app_state) != STATUS_IN_PROGRESS,
+            )
+        ),
+        closeAssetTo(App.globalGet(asset_id_key), Global.creator_address()),
+        closeAccountTo(Global.creator_address()),
+        Approve(),
+    )
+
+    if optimize:
+        handle_deleteapp = cacheRepeatedReads(handle_deleteapp)
+
+    program = Cond(
+        [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+        [Txn.on_completion() == OnComplete.DeleteApplication, handle_deleteapp],
+        [Txn.on_completion() == OnComplete.OptIn, Reject()],
+        [Txn.on_completion() == OnComplete.CloseOut, Reject()],
+        [Txn.on_completion() == OnComplete.UpdateApplication, Reject()],
+    )
+
+    return program
 
 
 def clear_state_program():
-    print("Clear Program")
     return Approve()
 
 
 if __name__ == "__main__":
     with open("compiled/escrow_royalty_approval.teal", "w") as f:
-        compiled = compileTeal(approval_program(), mode=Mode.Application, version=5)
+        compiled = optimizeTeal(compileTeal(approval_program(), mode=Mode.Application, version=TEAL_VERSION))
         f.write(compiled)
 
     with open("compiled/escrow_royalty_clear_state.teal", "w") as f:
-        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=5)
+        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=TEAL_VERSION)
         f.write(compiled)
@@ -0,0 +1,36 @@
+# Minimum balance of every account, and its increase for every asset held
+MIN_BALANCE = 100_000
+ASSET_MIN_BALANCE = 100_000
+# and for opting in to an app or creating one, on top of every uint and byte
+# slice of its local or global state
+APP_OPT_IN_MIN_BALANCE = 100_000
+APP_PARAMS_MIN_BALANCE = 100_000
+UINT_MIN_BALANCE = 28_500
+BYTE_SLICE_MIN_BALANCE = 50_000
+
+# Every transaction, inner ones included, costs 1_000
+MIN_TXN_FEE = 1_000
+
+
+def app_funding(assets: int, inner_txns: int = 0) -> int:
+    """The amount an app account is funded with when it is set up.
+
+    This covers the minimum balance of the account holding `assets` assets
+    and the fees of the `inner_txns` inner transactions it pays for itself.
+    With fee pooling every inner transaction is paid for by the outer
+    transaction triggering it, so nothing but the minimum balance is locked
+    in the app.
+    """
+    return MIN_BALANCE + assets * ASSET_MIN_BALANCE + inner_txns * MIN_TXN_FEE
+
+
+def opt_in_funding(uints: int, byte_slices: int) -> int:
+    """The minimum balance of an account opted in to a single app, with
+    `uints` and `byte_slices` in its local state."""
+    return MIN_BALANCE + APP_OPT_IN_MIN_BALANCE + uints * UINT_MIN_BALANCE + byte_slices * BYTE_SLICE_MIN_BALANCE
+
+
+def app_params_funding(uints: int, byte_slices: int) -> int:
+    """The increase of its creator's minimum balance an app causes, with
+    `uints` and `byte_slices` in its global state."""
+    return APP_PARAMS_MIN_BALANCE + uints * UINT_MIN_BALANCE + byte_slices * BYTE_SLICE_MIN_BALANCE
@@ -0,0 +1,68 @@
+from pyteal import *
+
+TEAL_VERSION = 5
+
+# Template variables of the listing program, filled in for every listing
+TMPL_SELLER = "TMPL_SELLER"
+TMPL_ASSET_ID = "TMPL_ASSET_ID"
+TMPL_ASSET_AMOUNT = "TMPL_ASSET_AMOUNT"
+TMPL_PRICE = "TMPL_PRICE"
+TMPL_FEE_RECEIVER = "TMPL_FEE_RECEIVER"
+TMPL_FEE = "TMPL_FEE"
+TMPL_EXPIRY = "TMPL_EXPIRY"
+
+
+def listing_fee(price: int, fee_percent: int) -> int:
+    """The fee a buyer pays on top of `price`, rounded down like the
+    escrow's."""
+    return fee_percent * price // 100
+
+
+def listing_program():
+    """A delegated LogicSig the seller signs to list an asset.
+
+    It approves the transfer of asset_amount units of the asset from the
+    seller to whoever, in the same group, pays price to the seller and fee to
+    the fee receiver. Buying takes one atomic group:
+    [1] Payment of the price from the buyer to the seller, paying the fees
+        of the group
+    [2] Payment of the fee from the buyer to the fee receiver
+    [3] Asset transfer from the seller to the buyer, signed by this program
+    The group may start with other transactions, such as the buyer's opt-in.
+
+    The authorization holds until the expiry round, or until the seller no
+    longer holds the asset or rekeys the account.
+    """
+    seller = Tmpl.Addr(TMPL_SELLER)
+    payment = Gtxn[Txn.group_index() - Int(2)]
+    fee_payment = Gtxn[Txn.group_index() - Int(1)]
+    return And(
+        # the listed asset, sent by the seller
+        Txn.type_enum() == TxnType.AssetTransfer,
+        Txn.sender() == seller,
+        Txn.xfer_asset() == Tmpl.Int(TMPL_ASSET_ID),
+        Txn.asset_amount() == Tmpl.Int(TMPL_ASSET_AMOUNT),
+        # neither clawed back, nor closing the seller's holding or account,
+        # and paid for by the buyer
+        Txn.asset_sender() == Global.zero_address(),
+        Txn.asset_close_to() == Global.zero_address(),
+        Txn.rekey_to() == Global.zero_address(),
+        Txn.fee() == Int(0),
+        Txn.last_valid() <= Tmpl.Int(TMPL_EXPIRY),
+        # the price, paid by the buyer to the seller
+        payment.type_enum() == TxnType.Payment,
+        payment.sender() == Txn.asset_receiver(),
+        payment.receiver() == seller,
+        payment.amount() == Tmpl.Int(TMPL_PRICE),
+        # the fee, paid by the buyer to the fee receiver
+        fee_payment.type_enum() == TxnType.Payment,
+        fee_payment.sender() == Txn.asset_receiver(),
+        fee_payment.receiver() == Tmpl.Addr(TMPL_FEE_RECEIVER),
+        fee_payment.amount() == Tmpl.Int(TMPL_FEE),
+    )
+
+
+if __name__ == "__main__":
+    with open("compiled/listing.teal", "w") as f:
+        compiled = compileTeal(listing_program(), mode=Mode.Signature, version=TEAL_VERSION)
+        f.write(compiled)
@@ -0,0 +1,296 @@
+from pyteal import *
+
+from utils.opcodes import MAX_GLOBAL_SCHEMA_ENTRIES
+
+TEAL_VERSION = 5
+
+# Every listing is stored in global state, so one application holds at most
+# this many listings; the two remaining slots keep the fee receiver (a byte
+# slice) and the fee percent (a uint)
+MAX_LISTINGS = MAX_GLOBAL_SCHEMA_ENTRIES - 2
+
+# Inner transactions are paid for by the caller whose call issues them
+INNER_TXN_FEE = 1_000
+# Paid by the seller with every listing: the minimum balance of the app's
+# asset holding and the fee of the opt-in
+LISTING_DEPOSIT = 100_000 + INNER_TXN_FEE
+# Added to the price by the buyer: asset transfer, fee and seller payments
+BUY_INNER_FEES = 3 * INNER_TXN_FEE
+# Kept from the refunded deposit on delisting: asset transfer and refund payment
+DELIST_INNER_FEES = 2 * INNER_TXN_FEE
+
+
+def approval_program():
+    # Fee Receiver
+    fee_receiver_key = Bytes("fr")
+    fee_percent_key = Bytes("fp")
+
+    # the opt-in fee is kept even when another listing of the asset made the
+    # opt-in unnecessary
+    listing_deposit = Int(LISTING_DEPOSIT)
+    listing_refund = Int(LISTING_DEPOSIT - INNER_TXN_FEE)
+
+    # Listings
+    # key: asset_id (8 bytes) + seller address (32 bytes)
+    # value: price per unit (8 bytes) + quantity (8 bytes)
+    @Subroutine(TealType.bytes)
+    def listingKey(assetID: Expr, seller: Expr) -> Expr:
+        return Concat(Itob(assetID), seller)
+
+    @Subroutine(TealType.bytes)
+    def listingValue(price: Expr, quantity: Expr) -> Expr:
+        return Concat(Itob(price), Itob(quantity))
+
+    @Subroutine(TealType.none)
+    def sendAssetTo(assetID: Expr, account: Expr, amount: Expr) -> Expr:
+        asset_holding = AssetHolding.balance(
+            Global.current_application_address(), assetID
+        )
+        return Seq(
+            asset_holding,
+            Assert(asset_holding.value() >= amount),
+            InnerTxnBuilder.Begin(),
+            If(asset_holding.value() == amount)
+            .Then(
+                # the last units of the asset, so give up the holding and
+                # its minimum balance as well
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.AssetTransfer,
+                        TxnField.xfer_asset: assetID,
+                        TxnField.asset_close_to: account,
+                    }
+                )
+            )
+            .Else(
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.AssetTransfer,
+                        TxnField.xfer_asset: assetID,
+                        TxnField.asset_receiver: account,
+                        TxnField.asset_amount: amount,
+                    }
+                )
+            ),
+            InnerTxnBuilder.Submit(),
+        )
+
+    @Subroutine(TealType.none)
+    def sendPaymentTo(account: Expr, amount: Expr) -> Expr:
+        return Seq(
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields(
+                {
+                    TxnField.type_enum: TxnType.Payment,
+                    TxnField.receiver: account,
+                    TxnField.amount: amount,
+                }
+            ),
+            InnerTxnBuilder.Submit(),
+        )
+
+    # Create Application Function
+    on_create = Seq(
+        Assert(Txn.application_args.length() == Int(2)),
+        App.globalPut(fee_receiver_key, Txn.application_args[0]),
+        App.globalPut(fee_percent_key, Btoi(Txn.application_args[1])),
+        Assert(
+            And(
+                # ensure that the fee percent is between 0 and 100
+                App.globalGet(fee_percent_key) >= Int(0),
+                App.globalGet(fee_percent_key) <= Int(100),
+            )
+        ),
+        Approve()
+    )
+
+    # On Setup Function
+    # Transaction Group:
+    # [1] Payment of the listing deposit
+    # [2] Application call - on_setup
+    #     - [1] sale_price: bigint
+    #     - foreign assets: [asset_id]
+    # [3] Transfer of Asset
+    tx_index_current = Txn.group_index()
+    tx_index_deposit = tx_index_current - Int(1)
+    tx_index_asset_transfer = tx_index_current + Int(1)
+    setup_asset_id = Gtxn[tx_index_asset_transfer].xfer_asset()
+    setup_key = ScratchVar(TealType.bytes)
+    setup_listing = App.globalGetEx(Int(0), setup_key.load())
+    setup_holding = AssetHolding.balance(
+        Global.current_application_address(), setup_asset_id
+    )
+    on_setup = Seq(
+        setup_key.store(listingKey(setup_asset_id, Txn.sender())),
+        setup_listing,
+        setup_holding,
+        Assert(
+            And(
+                # Match group txn size
+                Global.group_size() == Int(3),
+
+                # One listing per asset and seller
+                Not(setup_listing.hasValue()),
+
+                # Check if the first transaction is the deposit of the seller
+                Gtxn[tx_index_deposit].type_enum() == TxnType.Payment,
+                Gtxn[tx_index_deposit].sender() == Txn.sender(),
+                Gtxn[tx_index_deposit].receiver() == Global.current_application_address(),
+                Gtxn[tx_index_deposit].amount() == listing_deposit,
+
+                # Check if the final transaction sends the asset from the seller to the app
+                Gtxn[tx_index_asset_transfer].type_enum() == TxnType.AssetTransfer,
+                Gtxn[tx_index_asset_transfer].sender() == Txn.sender(),
+                Gtxn[tx_index_asset_transfer].asset_receiver() == Global.current_application_address(),
+                Gtxn[tx_index_asset_transfer].asset_close_to() == Global.zero_address(),
+                Gtxn[tx_index_asset_transfer].asset_amount() >= Int(1),
+            )
+        ),
+        App.globalPut(
+            setup_key.load(),
+            listingValue(Btoi(Txn.application_args[1]), Gtxn[tx_index_asset_transfer].asset_amount()),
+        ),
+
+        # opt into the asset unless another listing already holds it
+        If(Not(setup_holding.hasValue())).Then(
+            Seq(
+                InnerTxnBuilder.Begin(),
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.AssetTransfer,
+                        TxnField.xfer_asset: setup_asset_id,
+                        TxnField.asset_receiver: Global.current_application_address(),
+                    }
+                ),
+                InnerTxnBuilder.Submit(),
+            )
+        ),
+        Approve(),
+    )
+
+    # Buy Asset from a listing
+    # Transaction Group:
+    # [1] Transfer of funds: price * quantity + BUY_INNER_FEES
+    # [2] Application call - on_buy
+    #     - [1] quantity: bigint
+    #     - accounts: [seller, fee_receiver]
+    #     - foreign assets: [asset_id]
+    tx_index_buy = Txn.group_index() - Int(1)
+    buy_asset_id = Txn.assets[0]
+    buy_seller = Txn.accounts[1]
+    buy_key = ScratchVar(TealType.bytes)
+    buy_listing = App.globalGetEx(Int(0), buy_key.load())
+    buy_price = ExtractUint64(buy_listing.value(), Int(0))
+    buy_quantity = ExtractUint64(buy_listing.value(), Int(8))
+    buyer_asset_balance = AssetHolding.balance(Txn.sender(), buy_asset_id)
+    # The requested amount of the asset
+    asset_amount = Btoi(Txn.application_args[1])
+    total = ScratchVar(TealType.uint64)
+    fee = ScratchVar(TealType.uint64)
+    on_buy = Seq(
+        buy_key.store(listingKey(buy_asset_id, buy_seller)),
+        buy_listing,
+        buyer_asset_balance,
+        Assert(
+            And(
+                # Check if the listing exists and has enough units
+                buy_listing.hasValue(),
+                asset_amount >= Int(1),
+                buy_quantity >= asset_amount,
+
+                # ensure the buyer is opted-in to the NFT
+                buyer_asset_balance.hasValue(),
+
+                # the fee receiver is passed to receive the fee
+                Txn.accounts[2] == App.globalGet(fee_receiver_key),
+            )
+        ),
+        total.store(buy_price * asset_amount),
+        fee.store(App.globalGet(fee_percent_key) * total.load() / Int(100)),
+        Assert(
+            And(
+                # Check if the purchase payment is valid
+                Gtxn[tx_index_buy].type_enum() == TxnType.Payment,
+                Gtxn[tx_index_buy].sender() == Txn.sender(),
+                Gtxn[tx_index_buy].receiver() == Global.current_application_address(),
+                Gtxn[tx_index_buy].amount() == total.load() + Int(BUY_INNER_FEES),
+            )
+        ),
+
+        # send the asset to the buyer
+        sendAssetTo(buy_asset_id, Txn.sender(), asset_amount),
+
+        # send the fee to the fee receiver
+        sendPaymentTo(App.globalGet(fee_receiver_key), fee.load()),
+
+        # pay the seller, refunding the deposit once the listing is sold out
+        If(buy_quantity == asset_amount)
+        .Then(
+            Seq(
+                App.globalDel(buy_key.load()),
+                sendPaymentTo(buy_seller, total.load() - fee.load() + listing_refund),
+            )
+        )
+        .Else(
+            Seq(
+                App.globalPut(buy_key.load(), listingValue(buy_price, buy_quantity - asset_amount)),
+                sendPaymentTo(buy_seller, total.load() - fee.load()),
+            )
+        ),
+        Approve(),
+    )
+
+    # Delist an asset, returning the unsold units and the deposit to the seller
+    # [1] Application call - on_delist
+    #     - foreign assets: [asset_id]
+    delist_asset_id = Txn.assets[0]
+    delist_key = ScratchVar(TealType.bytes)
+    delist_listing = App.globalGetEx(Int(0), delist_key.load())
+    on_delist = Seq(
+        delist_key.store(listingKey(delist_asset_id, Txn.sender())),
+        delist_listing,
+        Assert(delist_listing.hasValue()),
+        App.globalDel(delist_key.load()),
+        sendAssetTo(delist_asset_id, Txn.sender(), ExtractUint64(delist_listing.value(), Int(8))),
+        sendPaymentTo(Txn.sender(), listing_refund - Int(DELIST_INNER_FEES)),
+        Approve(),
+    )
+
+    # Define method and method handler
+    handle_noop_method = Txn.application_args[0]
+    handle_noop = Cond(
+        [handle_noop_method == Bytes("on_setup"), on_setup],
+        [handle_noop_method == Bytes("on_buy"), on_buy],
+        [handle_noop_method == Bytes("on_delist"), on_delist],
+    )
+
+    handle_optin = Reject()
+    handle_closeout = Reject()
+    handle_updateapp = Reject()
+    # listed assets are held by the app, so it can never be deleted
+    handle_deleteapp = Reject()
+
+    program = Cond(
+        [Txn.application_id() == Int(0), on_create],
+        [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+        [Txn.on_completion() == OnComplete.OptIn, handle_optin],
+        [Txn.on_completion() == OnComplete.CloseOut, handle_closeout],
+        [Txn.on_completion() == OnComplete.UpdateApplication, handle_updateapp],
+        [Txn.on_completion() == OnComplete.DeleteApplication, handle_deleteapp],
+    )
+
+    return program
+
+
+def clear_state_program():
+    return Approve()
+
+
+if __name__ == "__main__":
+    with open("compiled/marketplace_approval.teal", "w") as f:
+        compiled = compileTeal(approval_program(), mode=Mode.Application, version=TEAL_VERSION)
+        f.write(compiled)
+
+    with open("compiled/marketplace_clear_state.teal", "w") as f:
+        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=TEAL_VERSION)
+        f.write(compiled)
@@ -1,21 +1,384 @@
 from pyteal import *
 
+from contracts.abi import contract_description, dispatch
+from contracts.funding import MIN_TXN_FEE, opt_in_funding
+from utils.cse import cacheRepeatedReads
+from utils.opcodes import MAX_LOCAL_SCHEMA_ENTRIES
+from utils.peephole import optimizeTeal
 
-def approval_program():
-    print("Approval Program")
-    return Approve()
+# Inner transactions with pooled fees need TEAL v6
+TEAL_VERSION = 6
+
+# The pool of asset IDs is an array of 8 byte IDs, split into pages. A page
+# is the local state of an account opted in to the shuffle: the uint
+# PAGE_INDEX_KEY numbering it, and byte slices of ENTRY_ITEMS IDs each,
+# keyed by their index within the page as a single byte.
+ITEM_SIZE = 8
+ENTRY_ITEMS = 15
+ENTRY_SIZE = ENTRY_ITEMS * ITEM_SIZE
+PAGE_ENTRIES = MAX_LOCAL_SCHEMA_ENTRIES - 1
+PAGE_ITEMS = PAGE_ENTRIES * ENTRY_ITEMS
+PAGE_INDEX_KEY = b"i"
+
+# Purchases not claimed yet, each kept in global state under its number:
+# the buyer's address followed by the ID of the buy call and the round
+# bought, rewritten by the draw to the buyer's address followed by the drawn
+# ID and the round drawn
+MAX_PENDING = 16
+ADDRESS = 32
+TXID_SIZE = 32
+ROUND_SIZE = 8
+PURCHASE_SIZE = ADDRESS + TXID_SIZE + ROUND_SIZE
+DRAWN_SIZE = ADDRESS + ITEM_SIZE + ROUND_SIZE
+
+# Rounds a purchase can be drawn in, and a drawn item claimed in, after
+# which the purchase can be refunded instead, so neither a creator no longer
+# drawing nor buyers never claiming can hold up the drop
+CLAIM_ROUNDS = 1000
+
+GLOBAL_UINTS = 6
+GLOBAL_BYTE_SLICES = 1 + MAX_PENDING
+
+# Fees of the inner transactions of each call, paid on top of the call's own
+# fee
+# claim: the clawback of the drawn asset
+CLAIM_INNER_FEES = 1 * MIN_TXN_FEE
+# expire: the refund of the price
+EXPIRE_INNER_FEES = 1 * MIN_TXN_FEE
+# delete: closing the account
+DELETE_INNER_FEES = 1 * MIN_TXN_FEE
+
+# The methods of the shuffle, most frequently called first
+CONTRACT = contract_description(
+    "shuffle",
+    [
+        "buy()void",
+        "draw(byte[32])void",
+        "claim(uint64)void",
+        "load(byte[])void",
+        "expire(uint64)void",
+        "create(uint64,byte[32])void",
+    ],
+)
+
+
+def page_funding() -> int:
+    """The minimum balance of a page account, opted in to the shuffle."""
+    return opt_in_funding(uints=1, byte_slices=PAGE_ENTRIES)
+
+
+def approval_program(optimize: bool = True):
+    price_key = Bytes("p")
+    # the number of IDs in the pool
+    remaining_key = Bytes("n")
+    pages_key = Bytes("g")
+    # the numbers of purchases, draws and claims so far
+    purchases_key = Bytes("k")
+    draws_key = Bytes("d")
+    claims_key = Bytes("c")
+    # the last value revealed by the beacon
+    beacon_key = Bytes("s")
+    page_index_key = Bytes(PAGE_INDEX_KEY)
+
+    def entryKey(index: Expr) -> Expr:
+        return Extract(Itob(index % Int(PAGE_ITEMS) / Int(ENTRY_ITEMS)), Int(7), Int(1))
+
+    def slotOffset(index: Expr) -> Expr:
+        return index % Int(ENTRY_ITEMS) * Int(ITEM_SIZE)
+
+    def readItem(page: Expr, index: Expr) -> Expr:
+        return Extract(App.localGet(page, entryKey(index)), slotOffset(index), Int(ITEM_SIZE))
+
+    def writeItem(page: Expr, index: Expr, item: Expr) -> Expr:
+        entry = App.localGet(page, entryKey(index))
+        return App.localPut(
+            page,
+            entryKey(index),
+            Concat(
+                Extract(entry, Int(0), slotOffset(index)),
+                item,
+                Substring(entry, slotOffset(index) + Int(ITEM_SIZE), Len(entry)),
+            ),
+        )
+
+    def isPage(page: Expr, index: Expr) -> Expr:
+        return App.localGet(page, page_index_key) == index / Int(PAGE_ITEMS)
+
+    # Create Application Function
+    # Arguments: price, beacon commitment
+    on_create = Seq(
+        Assert(
+            And(
+                Txn.application_id() == Int(0),
+                Txn.application_args.length() == Int(3),
+                Len(Txn.application_args[2]) == Int(32),
+            )
+        ),
+        App.globalPut(price_key, Btoi(Txn.application_args[1])),
+        App.globalPut(beacon_key, Txn.application_args[2]),
+        App.globalPut(remaining_key, Int(0)),
+        App.globalPut(pages_key, Int(0)),
+        App.globalPut(purchases_key, Int(0)),
+        App.globalPut(draws_key, Int(0)),
+        App.globalPut(claims_key, Int(0)),
+        Approve(),
+    )
+
+    # Load asset IDs into the pool, until the first purchase
+    # Arguments: up to PAGE_ITEMS packed IDs, filling a page from its start
+    #     - accounts: [page]
+    items = Suffix(Txn.application_args[1], Int(2))
+    page = Txn.accounts[1]
+    on_load = Seq(
+        Assert(
+            And(
+                Txn.sender() == Global.creator_address(),
+                App.globalGet(purchases_key) == Int(0),
+                App.globalGet(remaining_key) % Int(PAGE_ITEMS) == Int(0),
+                Len(items) > Int(0),
+                Len(items) <= Int(PAGE_ITEMS * ITEM_SIZE),
+                Len(items) % Int(ITEM_SIZE) == Int(0),
+                isPage(page, App.globalGet(remaining_key)),
+            )
+        ),
+        *[
+            If(Len(items) > Int(entry * ENTRY_SIZE)).Then(
+                App.localPut(
+                    page,
+                    Bytes(bytes([entry])),
+                    Substring(
+                        items,
+                        Int(entry * ENTRY_SIZE),
+                        If(Len(items) > Int((entry + 1) * ENTRY_SIZE), Int((entry + 1) * ENTRY_SIZE), Len(items)),
+                    ),
+                )
+            )
+            for entry in range(PAGE_ENTRIES)
+        ],
+        App.globalPut(remaining_key, App.globalGet(remaining_key) + Len(items) / Int(ITEM_SIZE)),
+        Approve(),
+    )
+
+    # Buy a draw
+    # Transaction Group:
+    # [1] Payment of the price to the shuffle
+    # [2] Application call - buy
+    tx_index_payment = Txn.group_index() - Int(1)
+    purchase_key = Itob(App.globalGet(purchases_key))
+    unclaimed = App.globalGet(purchases_key) - App.globalGet(claims_key)
+    on_buy = Seq(
+        Assert(
+            And(
+                Gtxn[tx_index_payment].type_enum() == TxnType.Payment,
+                Gtxn[tx_index_payment].sender() == Txn.sender(),
+                Gtxn[tx_index_payment].receiver() == Global.current_application_address(),
+                Gtxn[tx_index_payment].amount() == App.globalGet(price_key),
+                unclaimed < Int(MAX_PENDING),
+                # every purchase not drawn yet has an item left to draw
+                App.globalGet(purchases_key) - App.globalGet(draws_key) < App.globalGet(remaining_key),
+            )
+        ),
+        # the ID of the call, which the creator cannot know ahead, seeds the
+        # draw along with the beacon
+        App.globalPut(purchase_key, Concat(Txn.sender(), Txn.tx_id(), Itob(Global.round()))),
+        App.globalPut(purchases_key, App.globalGet(purchases_key) + Int(1)),
+        Approve(),
+    )
+
+    # Draw the item of the oldest purchase not drawn yet
+    # Arguments: the next value of the beacon, whose hash is the last one
+    #     - accounts: [page of the drawn index, page of the last index]
+    # The drawn index takes the last ID of the pool, which shrinks by one,
+    # so a draw costs the same however many IDs the pool holds.
+    reveal = Txn.application_args[1]
+    draw_key = Itob(App.globalGet(draws_key))
+    purchase = App.globalGet(draw_key)
+    index = ScratchVar(TealType.uint64)
+    last = ScratchVar(TealType.uint64)
+    on_draw = Seq(
+        Assert(
+            And(
+                App.globalGet(draws_key) < App.globalGet(purchases_key),
+                Sha256(reveal) == App.globalGet(beacon_key),
+            )
+        ),
+        index.store(
+            Btoi(Extract(Sha256(Concat(reveal, Extract(purchase, Int(ADDRESS), Int(TXID_SIZE)))), Int(0), Int(ITEM_SIZE)))
+            % App.globalGet(remaining_key)
+        ),
+        last.store(App.globalGet(remaining_key) - Int(1)),
+        Assert(And(isPage(Txn.accounts[1], index.load()), isPage(Txn.accounts[2], last.load()))),
+        # the purchase keeps the drawn ID and the round behind the buyer
+        # until claimed
+        App.globalPut(
+            draw_key,
+            Concat(
+                Extract(purchase, Int(0), Int(ADDRESS)),
+                readItem(Txn.accounts[1], index.load()),
+                Itob(Global.round()),
+            ),
+        ),
+        writeItem(Txn.accounts[1], index.load(), readItem(Txn.accounts[2], last.load())),
+        App.globalPut(remaining_key, last.load()),
+        App.globalPut(beacon_key, reveal),
+        App.globalPut(draws_key, App.globalGet(draws_key) + Int(1)),
+        Approve(),
+    )
+
+    # Claim a drawn item for its buyer, paying CLAIM_INNER_FEES on top of its
+    # fee. Anyone can send the call, the item only goes to the buyer.
+    # Arguments: the number of the purchase
+    #     - accounts: [creator, buyer]
+    #     - assets: [drawn asset]
+    # The buyer opts in to the drawn asset first, in the same group or before.
+    claim_key = Itob(Btoi(Txn.application_args[1]))
+    claim_buyer = Extract(App.globalGet(claim_key), Int(0), Int(ADDRESS))
+    on_claim = Seq(
+        Assert(Len(App.globalGet(claim_key)) == Int(DRAWN_SIZE)),
+        # the asset is clawed back from the creator, it stays there until drawn
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: ExtractUint64(App.globalGet(claim_key), Int(ADDRESS)),
+                TxnField.asset_sender: Global.creator_address(),
+                TxnField.asset_receiver: claim_buyer,
+                TxnField.asset_amount: Int(1),
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+        App.globalDel(claim_key),
+        App.globalPut(claims_key, App.globalGet(claims_key) + Int(1)),
+        Approve(),
+    )
+
+    # Refund a purchase not drawn within CLAIM_ROUNDS of its purchase, or a
+    # drawn item not claimed within CLAIM_ROUNDS of its draw, paying
+    # EXPIRE_INNER_FEES on top of its fee. Anyone can send the call, the
+    # price only goes back to the buyer and a drawn item stays with the
+    # creator.
+    # Arguments: the number of the purchase
+    #     - accounts: [buyer]
+    # Purchases are drawn in order, so an undrawn purchase is refunded once
+    # it is the oldest, and the next draw moves on to the purchase after it.
+    on_expire = Seq(
+        If(Len(App.globalGet(claim_key)) == Int(PURCHASE_SIZE))
+        .Then(
+            Seq(
+                Assert(
+                    And(
+                        Btoi(Txn.application_args[1]) == App.globalGet(draws_key),
+                        ExtractUint64(App.globalGet(claim_key), Int(ADDRESS + TXID_SIZE)) + Int(CLAIM_ROUNDS)
+                        <= Global.round(),
+                    )
+                ),
+                App.globalPut(draws_key, App.globalGet(draws_key) + Int(1)),
+            )
+        )
+        .Else(
+            Assert(
+                And(
+                    Len(App.globalGet(claim_key)) == Int(DRAWN_SIZE),
+                    ExtractUint64(App.globalGet(claim_key), Int(ADDRESS + ITEM_SIZE)) + Int(CLAIM_ROUNDS)
+                    <= Global.round(),
+                )
+            )
+        ),
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: claim_buyer,
+                TxnField.amount: App.globalGet(price_key),
+                TxnField.fee: Int(0),
+            }
+        ),
+        InnerTxnBuilder.Submit(),
+        App.globalDel(claim_key),
+        App.globalPut(claims_key, App.globalGet(claims_key) + Int(1)),
+        Approve(),
+    )
+
+    if optimize:
+        on_create = cacheRepeatedReads(on_create)
+        on_load = cacheRepeatedReads(on_load)
+        on_buy = cacheRepeatedReads(on_buy)
+        on_draw = cacheRepeatedReads(on_draw)
+        on_claim = cacheRepeatedReads(on_claim)
+        on_expire = cacheRepeatedReads(on_expire)
+
+    handle_noop = dispatch(
+        CONTRACT,
+        {
+            "buy": on_buy,
+            "draw": on_draw,
+            "claim": on_claim,
+            "load": on_load,
+            "expire": on_expire,
+            "create": on_create,
+        },
+    )
+
+    # Opt in a page, grouped behind a transaction of the creator
+    handle_optin = Seq(
+        Assert(
+            And(
+                Gtxn[0].sender() == Global.creator_address(),
+                App.globalGet(purchases_key) == Int(0),
+            )
+        ),
+        App.localPut(Txn.sender(), page_index_key, App.globalGet(pages_key)),
+        App.globalPut(pages_key, App.globalGet(pages_key) + Int(1)),
+        Approve(),
+    )
+
+    # Delete app and send the proceeds to the creator, paying
+    # DELETE_INNER_FEES on top of its fee, once every purchase is claimed or
+    # refunded
+    handle_deleteapp = Seq(
+        Assert(
+            And(
+                Txn.sender() == Global.creator_address(),
+                App.globalGet(claims_key) == App.globalGet(purchases_key),
+            )
+        ),
+        If(Balance(Global.current_application_address()) != Int(0)).Then(
+            Seq(
+                InnerTxnBuilder.Begin(),
+                InnerTxnBuilder.SetFields(
+                    {
+                        TxnField.type_enum: TxnType.Payment,
+                        TxnField.close_remainder_to: Global.creator_address(),
+                        TxnField.fee: Int(0),
+                    }
+                ),
+                InnerTxnBuilder.Submit(),
+            )
+        ),
+        Approve(),
+    )
+
+    program = Cond(
+        [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+        [Txn.on_completion() == OnComplete.OptIn, handle_optin],
+        [Txn.on_completion() == OnComplete.DeleteApplication, handle_deleteapp],
+        [Txn.on_completion() == OnComplete.CloseOut, Reject()],
+        [Txn.on_completion() == OnComplete.UpdateApplication, Reject()],
+    )
+
+    return program
 
 
 def clear_state_program():
-    print("Clear Program")
     return Approve()
 
 
 if __name__ == "__main__":
     with open("compiled/shuffle_approval.teal", "w") as f:
-        compiled = compileTeal(approval_program(), mode=Mode.Application, version=5)
+        compiled = optimizeTeal(compileTeal(approval_program(), mode=Mode.Application, version=TEAL_VERSION))
         f.write(compiled)
 
     with open("compiled/shuffle_clear_state.teal", "w") as f:
-        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=5)
+        compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=TEAL_VERSION)
         f.write(compiled)
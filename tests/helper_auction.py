@@ -1,38 +1,66 @@
+from typing import Dict, List, Optional, Tuple
+
 from algosdk import encoding
 from algosdk.future import transaction
 from algosdk.logic import get_application_address
 from algosdk.v2client.algod import AlgodClient
 
 from contracts import __version__
-from contracts.auction import approval_program, clear_state_program
+from contracts.abi import encode_call
+from contracts.auction import (
+    BID_INNER_FEES,
+    CONTRACT,
+    DELETE_INNER_FEES,
+    PULL_CONTRACT,
+    REFUND_KEY,
+    SETTLE_INNER_FEES,
+    SETUP_INNER_FEES,
+    TEAL_VERSION,
+    WITHDRAW_INNER_FEES,
+    approval_program,
+    clear_state_program,
+    decode_state,
+    setup_funding,
+    state_schemas,
+)
+from contracts.funding import MIN_TXN_FEE
 from utils.account import Account
-from utils.helper import fullyCompileContract, waitForTransaction
+from utils.helper import (
+    decodeState,
+    fullyCompileContract,
+    waitForTransaction,
+    getAppGlobalState,
+    getAppCreator,
+    sendPacked,
+)
+from utils.opcodes import MAX_APP_TXN_ACCOUNTS
+from utils.params import getSuggestedParams, withFlatFee
 
-# Global program
-APPROVAL_PROGRAM = b''
-CLEAR_STATE_PROGRAM = b''
+# Global programs, by whether refunds are pulled
+PROGRAMS: Dict[bool, Tuple[bytes, bytes]] = {}
 
 
 def test_version():
     assert __version__ == '0.1.0'
 
 
-def getContracts(client: AlgodClient) -> [bytes, bytes]:
+def getContracts(client: AlgodClient, pullRefunds: bool = False) -> Tuple[bytes, bytes]:
     """Get the compiled TEAL contracts for the auction.
     Args:
         client: An algod client that has the ability to compile TEAL programs.
+        pullRefunds: Whether outbid bidders withdraw their refunds, see
+            contracts.auction.approval_program.
     Returns:
         A tuple of 2 byte strings. The first is the approval program, and the
         second is the clear state program.
     """
-    global APPROVAL_PROGRAM
-    global CLEAR_STATE_PROGRAM
-
-    if len(APPROVAL_PROGRAM) == 0:
-        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program())
-        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program())
+    if pullRefunds not in PROGRAMS:
+        PROGRAMS[pullRefunds] = (
+            fullyCompileContract(client, approval_program(pull_refunds=pullRefunds), version=TEAL_VERSION),
+            fullyCompileContract(client, clear_state_program(pull_refunds=pullRefunds), version=TEAL_VERSION),
+        )
 
-    return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
+    return PROGRAMS[pullRefunds]
 
 
 def createApp(
@@ -44,6 +72,7 @@ def createApp(
     endTime: int,
     reserve: int,
     minBidIncrement: int,
+    pullRefunds: bool = False,
 ) -> int:
     """Create a new escrow.
     Args:
@@ -62,25 +91,22 @@ def createApp(
             the NFT will return to the seller.
         minBidIncrement: The minimum different required between a new bid and
             the current leading bid.
+        pullRefunds: Whether outbid bidders are credited their bids, to be
+            withdrawn with withdrawRefunds, instead of paid back by the next
+            bid.
     Returns:
         The ID of the newly created auction app.
     """
-    approval, clear = getContracts(client)
+    approval, clear = getContracts(client, pullRefunds)
 
-    globalSchema = transaction.StateSchema(num_uints=7, num_byte_slices=2)
-    localSchema = transaction.StateSchema(num_uints=0, num_byte_slices=0)
+    # the parameters and the lead bid, see the layout in contracts.auction
+    (globalUints, globalByteSlices), (localUints, localByteSlices) = state_schemas(pullRefunds)
+    globalSchema = transaction.StateSchema(num_uints=globalUints, num_byte_slices=globalByteSlices)
+    localSchema = transaction.StateSchema(num_uints=localUints, num_byte_slices=localByteSlices)
 
     fee = 1
 
-    app_args = [
-        encoding.decode_address(seller),
-        assetID.to_bytes(8, "big"),
-        startTime.to_bytes(8, "big"),
-        endTime.to_bytes(8, "big"),
-        reserve.to_bytes(8, "big"),
-        minBidIncrement.to_bytes(8, "big"),
-        fee.to_bytes(8, "big")
-    ]
+    app_args = encode_call(CONTRACT, "create", seller, assetID, startTime, endTime, reserve, minBidIncrement, fee)
 
     txn = transaction.ApplicationCreateTxn(
         sender=sender.getAddress(),
@@ -90,7 +116,7 @@ def createApp(
         global_schema=globalSchema,
         local_schema=localSchema,
         app_args=app_args,
-        sp=client.suggested_params(),
+        sp=getSuggestedParams(client),
     )
 
     signedTxn = txn.sign(sender.getPrivateKey())
@@ -114,8 +140,8 @@ def setupApp(
     This operation funds the app auction escrow account, opts that account into
     the NFT, and sends the NFT to the escrow account, all in one atomic
     transaction group. The auction must not have started yet.
-    The escrow account requires a total of 0.203 Algos for funding. See the code
-    below for a breakdown of this amount.
+    The escrow account is funded with its minimum balance, see setup_funding;
+    the setup call pays the fee of the opt-in.
     Args:
         client: An algod client.
         appID: The app ID of the auction.
@@ -128,16 +154,9 @@ def setupApp(
     """
     appAddr = get_application_address(appID)
 
-    suggestedParams = client.suggested_params()
+    suggestedParams = getSuggestedParams(client)
 
-    fundingAmount = (
-        # min account balance
-        100_000
-        # additional min balance to opt into NFT
-        + 100_000
-        # 4 * min txn fee
-        + 4 * 1_000
-    )
+    fundingAmount = setup_funding()
     print("fundingAmount " + fundingAmount.__str__())
 
     fundAppTxn = transaction.PaymentTxn(
@@ -152,9 +171,10 @@ def setupApp(
         sender=funder.getAddress(),
         index=appID,
         on_complete=transaction.OnComplete.NoOpOC,
-        app_args=[b"setup"],
+        app_args=encode_call(CONTRACT, "setup"),
         foreign_assets=[nftID],
-        sp=suggestedParams,
+        # pays for the opt-in
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + SETUP_INNER_FEES),
     )
     print("setupTxn " + setupTxn.__str__())
 
@@ -177,3 +197,269 @@ def setupApp(
 
     waitForTransaction(client, signedFundAppTxn.get_txid())
 
+
+def buildBidTxns(client: AlgodClient, appID: int, bidder: str, bidAmount: int) -> List[transaction.Transaction]:
+    """Build the grouped bid payment and app call transactions of a bid on
+    an active auction, against the lead bid the auction holds now.
+    Args:
+        client: An Algod client.
+        appID: The app ID of the auction.
+        bidder: The address of the bidder.
+        bidAmount: The amount of the bid.
+    Returns:
+        The payment and the app call, with their group ID assigned.
+    """
+    appAddr = get_application_address(appID)
+    appGlobalState = decode_state(getAppGlobalState(client, appID))
+
+    nftID = appGlobalState["nft_id"]
+
+    if any(appGlobalState["bid_account"]):
+        # if "bid_account" is not the zero address
+        prevBidLeader = encoding.encode_address(appGlobalState["bid_account"])
+    else:
+        prevBidLeader = None
+
+    suggestedParams = getSuggestedParams(client)
+    # the bid call pays for refunding the previous lead bidder, unless the
+    # refund is credited to the bidder's local state
+    innerFees = 0
+    if prevBidLeader is not None and getRefund(client, appID, prevBidLeader) is None:
+        innerFees = BID_INNER_FEES
+
+    payTxn = transaction.PaymentTxn(
+        sender=bidder,
+        receiver=appAddr,
+        amt=bidAmount,
+        sp=suggestedParams,
+    )
+
+    appCallTxn = transaction.ApplicationCallTxn(
+        sender=bidder,
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "bid"),
+        foreign_assets=[nftID],
+        # must include the previous lead bidder here so the app can refund that bidder's payment
+        accounts=[prevBidLeader] if prevBidLeader is not None else [],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + innerFees),
+    )
+
+    transaction.assign_group_id([payTxn, appCallTxn])
+    return [payTxn, appCallTxn]
+
+
+def placeBid(client: AlgodClient, appID: int, bidder: Account, bidAmount: int) -> None:
+    """Place a bid on an active auction.
+    Args:
+        client: An Algod client.
+        appID: The app ID of the auction.
+        bidder: The account providing the bid. It must already be opted in to
+            the NFT being auctioned.
+        bidAmount: The amount of the bid.
+    """
+    payTxn, appCallTxn = buildBidTxns(client, appID, bidder.getAddress(), bidAmount)
+
+    signedPayTxn = payTxn.sign(bidder.getPrivateKey())
+    signedAppCallTxn = appCallTxn.sign(bidder.getPrivateKey())
+
+    client.send_transactions([signedPayTxn, signedAppCallTxn])
+
+    waitForTransaction(client, appCallTxn.get_txid())
+
+
+def buildCloseTxn(client: AlgodClient, appID: int, closer: str) -> transaction.Transaction:
+    """Build the delete call closing an auction, referencing the accounts
+    its state holds now.
+    Args:
+        client: An Algod client.
+        appID: The app ID of the auction.
+        closer: The address of the account sending the call and paying for
+            its inner transactions.
+    Returns:
+        The delete call.
+    """
+    appGlobalState = decode_state(getAppGlobalState(client, appID))
+
+    nftID = appGlobalState["nft_id"]
+
+    accounts: List[str] = [encoding.encode_address(appGlobalState["seller"])]
+
+    if any(appGlobalState["bid_account"]):
+        # if "bid_account" is not the zero address
+        accounts.append(encoding.encode_address(appGlobalState["bid_account"]))
+    # the remaining funds are returned to the creator
+    accounts.append(getAppCreator(client, appID))
+
+    return transaction.ApplicationDeleteTxn(
+        sender=closer,
+        index=appID,
+        accounts=accounts,
+        foreign_assets=[nftID],
+        sp=withFlatFee(getSuggestedParams(client), MIN_TXN_FEE + DELETE_INNER_FEES),
+    )
+
+
+def closeAuction(client: AlgodClient, appID: int, closer: Account) -> None:
+    """Close an auction.
+    This action can only happen before an auction has begun, in which case it is
+    cancelled, or after an auction has ended.
+    If called after the auction has ended and the auction was successful, the
+    NFT is transferred to the winning bidder and the auction proceeds are
+    transferred to the seller. If the auction was not successful, the NFT and
+    all funds are transferred to the seller.
+    Args:
+        client: An Algod client.
+        appID: The app ID of the auction.
+        closer: The account initiating the close transaction. This must be
+            either the seller or auction creator if you wish to close the
+            auction before it starts. Otherwise, this can be any account.
+    """
+    deleteTxn = buildCloseTxn(client, appID, closer.getAddress())
+    signedDeleteTxn = deleteTxn.sign(closer.getPrivateKey())
+
+    client.send_transaction(signedDeleteTxn)
+
+    waitForTransaction(client, signedDeleteTxn.get_txid())
+
+
+def buildSettleTxn(client: AlgodClient, appID: int, sender: str) -> transaction.Transaction:
+    """Build the settle call of an ended auction with pull refunds,
+    referencing the accounts its state holds now.
+    Args:
+        client: An Algod client.
+        appID: The app ID of the auction.
+        sender: The address of the account sending the call and paying for
+            its inner transactions.
+    Returns:
+        The settle call.
+    """
+    appGlobalState = decode_state(getAppGlobalState(client, appID))
+
+    accounts: List[str] = [encoding.encode_address(appGlobalState["seller"])]
+    if any(appGlobalState["bid_account"]):
+        accounts.append(encoding.encode_address(appGlobalState["bid_account"]))
+
+    return transaction.ApplicationCallTxn(
+        sender=sender,
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(PULL_CONTRACT, "settle"),
+        accounts=accounts,
+        foreign_assets=[appGlobalState["nft_id"]],
+        sp=withFlatFee(getSuggestedParams(client), MIN_TXN_FEE + SETTLE_INNER_FEES),
+    )
+
+
+def settleAuction(client: AlgodClient, appID: int, sender: Account) -> None:
+    """Settle an ended auction with pull refunds.
+    The NFT and the winning bid are paid out as closing the auction would,
+    but the auction is left in place until the refunds it owes have been
+    withdrawn. Anyone can settle an auction.
+    Args:
+        client: An Algod client.
+        appID: The app ID of the auction.
+        sender: The account sending the call and paying for its inner
+            transactions.
+    """
+    settleTxn = buildSettleTxn(client, appID, sender.getAddress())
+    signedSettleTxn = settleTxn.sign(sender.getPrivateKey())
+
+    client.send_transaction(signedSettleTxn)
+
+    waitForTransaction(client, signedSettleTxn.get_txid())
+
+
+def optInToAuction(client: AlgodClient, appID: int, bidder: Account) -> None:
+    """Opt a bidder in to an auction with pull refunds, so the bidder is
+    credited its bid when outbid."""
+    txn = transaction.ApplicationOptInTxn(
+        sender=bidder.getAddress(),
+        index=appID,
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(bidder.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+
+    waitForTransaction(client, signedTxn.get_txid())
+
+
+def getRefund(client: AlgodClient, appID: int, bidder: str) -> Optional[int]:
+    """The refund an auction owes a bidder, or None if the bidder is not
+    opted in to the auction."""
+    accountInfo = client.account_info(bidder)
+    for localState in accountInfo.get("apps-local-state", []):
+        if localState["id"] == appID:
+            return decodeState(localState.get("key-value", [])).get(REFUND_KEY, 0)
+    return None
+
+
+def buildWithdrawTxns(
+    client: AlgodClient, appID: int, sender: str, bidders: List[str]
+) -> Tuple[List[transaction.Transaction], int]:
+    """Build the withdraw calls paying out the refunds an auction owes to
+    `bidders`.
+    Every withdraw call pays the refunds of the accounts it references, up
+    to MAX_APP_TXN_ACCOUNTS of them besides the sender. Anyone can send
+    them, the refunds are only paid to the bidders they are owed to.
+    Args:
+        client: An algod client.
+        appID: The app ID of the auction.
+        sender: The address of the account sending the calls and paying
+            their fees.
+        bidders: The addresses of the bidders to pay out. Bidders owed
+            nothing are skipped.
+    Returns:
+        The withdraw calls, and the total amount they pay out.
+    """
+    owed = {bidder: getRefund(client, appID, bidder) or 0 for bidder in set(bidders)}
+    # the sender's own refund is paid by every call, so by the first
+    senderRefund = owed.pop(sender, 0)
+    others = sorted(bidder for bidder, refund in owed.items() if refund > 0)
+
+    batches = [others[start:start + MAX_APP_TXN_ACCOUNTS] for start in range(0, len(others), MAX_APP_TXN_ACCOUNTS)]
+    if not batches and senderRefund > 0:
+        batches = [[]]
+
+    suggestedParams = getSuggestedParams(client)
+    txns = []
+    for index, accounts in enumerate(batches):
+        refunds = len(accounts) + (1 if index == 0 and senderRefund > 0 else 0)
+        txns.append(
+            transaction.ApplicationCallTxn(
+                sender=sender,
+                index=appID,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=encode_call(PULL_CONTRACT, "withdraw"),
+                accounts=accounts,
+                sp=withFlatFee(suggestedParams, MIN_TXN_FEE + refunds * WITHDRAW_INNER_FEES),
+            )
+        )
+
+    return txns, senderRefund + sum(owed[bidder] for bidder in others)
+
+
+def withdrawRefunds(client: AlgodClient, appID: int, sender: Account, bidders: List[str]) -> int:
+    """Pay out the refunds an auction owes to `bidders`, in batches.
+    The withdraw calls of buildWithdrawTxns are sent packed into atomic
+    groups.
+    Args:
+        client: An algod client.
+        appID: The app ID of the auction.
+        sender: The account sending the calls and paying their fees.
+        bidders: The addresses of the bidders to pay out. Bidders owed
+            nothing are skipped.
+    Returns:
+        The total amount paid out.
+    """
+    txns, total = buildWithdrawTxns(client, appID, sender.getAddress(), bidders)
+
+    results = sendPacked(client, sender, txns)
+    for txID, error in results:
+        if txID is None:
+            raise Exception("Withdraw failed: {}".format(error))
+    if results:
+        waitForTransaction(client, results[-1][0])
+
+    return total
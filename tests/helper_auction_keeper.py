@@ -0,0 +1,155 @@
+import heapq
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Set, Tuple
+
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from algosdk.v2client.algod import AlgodClient
+
+from contracts.auction import decode_state
+from tests.helper_auction import buildCloseTxn, buildSettleTxn, buildWithdrawTxns
+from utils.account import Account
+from utils.helper import getAppGlobalState, getLastBlockTimestamp, sendPacked
+from utils.tracker import ConfirmationTracker
+
+# How many rounds a failing close is retried in before the keeper gives up
+MAX_ATTEMPTS = 3
+
+
+class AuctionKeeper:
+    """Closes auctions as soon as they end.
+
+    Tracked auctions are kept in a queue ordered by end time, so every round
+    only the auctions that ended since are looked at, however many are
+    tracked. Their delete calls are sent packed into atomic groups of up to
+    16 by sendPacked, which pays out the winners, sellers and creators, and
+    the keeper pays their fees.
+
+    An auction with pull refunds can only be deleted once it owes nothing,
+    so its delete call is preceded by a settle call, paying out the winner
+    and the seller whatever is owed, and by the withdraw calls of the
+    refunds owed to the bidders it was tracked with.
+
+    Closing is idempotent: an auction closed by someone else is dropped, and
+    a close rejected by the ledger or failing to confirm is retried in the
+    following rounds, up to `maxAttempts` times in all.
+    """
+
+    def __init__(self, client: AlgodClient, keeper: Account, maxAttempts: int = MAX_ATTEMPTS) -> None:
+        self.client = client
+        self.keeper = keeper
+        self.maxAttempts = maxAttempts
+        # (end time, app ID) of the auctions to close
+        self.queue: List[Tuple[int, int]] = []
+        self.tracked: Set[int] = set()
+        # the bidders of the auctions with pull refunds, whose refunds are
+        # withdrawn before the close
+        self.bidders: Dict[int, Set[str]] = {}
+        self.attempts: Dict[int, int] = {}
+        # the last error of the auctions the keeper gave up on
+        self.failed: Dict[int, str] = {}
+
+    def track(self, appID: int, bidders: Iterable[str] = ()) -> None:
+        """Close the auction `appID` once it ends, withdrawing the refunds
+        it owes to `bidders` first. Tracking an auction twice only adds to
+        its bidders."""
+        self.bidders.setdefault(appID, set()).update(bidders)
+        if appID in self.tracked:
+            return
+        state = decode_state(getAppGlobalState(self.client, appID))
+        heapq.heappush(self.queue, (state["end"], appID))
+        self.tracked.add(appID)
+
+    def pending(self) -> int:
+        """The number of auctions tracked and not closed yet."""
+        return len(self.queue)
+
+    def settleDue(self) -> List[int]:
+        """Close every tracked auction whose end time the last block reached.
+
+        Returns:
+            The app IDs of the auctions closed, by end time.
+        """
+        _, timestamp = getLastBlockTimestamp(self.client)
+
+        due: List[Tuple[int, int]] = []
+        while self.queue and self.queue[0][0] <= timestamp:
+            due.append(heapq.heappop(self.queue))
+
+        # the calls of every auction, ending with its delete call
+        closing: List[Tuple[int, int, int]] = []
+        txns = []
+        for endTime, appID in due:
+            try:
+                txns += self._buildCloseTxns(appID)
+            except AlgodHTTPError:
+                # already closed by someone else
+                self._forget(appID)
+                continue
+            closing.append((endTime, appID, len(txns)))
+
+        # the tracker follows the blocks from before the calls are sent
+        tracker = ConfirmationTracker(self.client)
+        results = sendPacked(self.client, self.keeper, txns)
+
+        confirming: List[Tuple[int, int, Future]] = []
+        start = 0
+        for endTime, appID, end in closing:
+            errors = [error or "" for txID, error in results[start:end] if txID is None]
+            start = end
+            if errors:
+                self._retry(endTime, appID, errors[-1])
+                continue
+            # the delete call is the last to confirm
+            confirming.append((endTime, appID, tracker.track(results[end - 1][0])))
+
+        tracker.wait()
+        settled: List[int] = []
+        for endTime, appID, future in confirming:
+            error = future.exception()
+            if error is not None:
+                self._retry(endTime, appID, str(error))
+                continue
+            settled.append(appID)
+            self._forget(appID)
+        return settled
+
+    def run(self, rounds: int) -> List[int]:
+        """Close the auctions that end during the next `rounds` rounds, one
+        round at a time.
+
+        Returns:
+            The app IDs of the auctions closed, in the order they were.
+        """
+        settled: List[int] = []
+        for _ in range(rounds):
+            settled += self.settleDue()
+            lastRound = self.client.status()["last-round"]
+            self.client.status_after_block(lastRound + 1)
+        return settled
+
+    def _buildCloseTxns(self, appID: int) -> List[transaction.Transaction]:
+        state = decode_state(getAppGlobalState(self.client, appID))
+        txns = []
+        if "refunds_owed" in state:
+            if not state["settled"]:
+                txns.append(buildSettleTxn(self.client, appID, self.keeper.getAddress()))
+            withdrawTxns, _ = buildWithdrawTxns(
+                self.client, appID, self.keeper.getAddress(), sorted(self.bidders.get(appID, ()))
+            )
+            txns += withdrawTxns
+        txns.append(buildCloseTxn(self.client, appID, self.keeper.getAddress()))
+        return txns
+
+    def _retry(self, endTime: int, appID: int, error: str) -> None:
+        self.attempts[appID] = self.attempts.get(appID, 0) + 1
+        if self.attempts[appID] < self.maxAttempts:
+            heapq.heappush(self.queue, (endTime, appID))
+        else:
+            self.failed[appID] = error
+            self._forget(appID)
+
+    def _forget(self, appID: int) -> None:
+        self.tracked.discard(appID)
+        self.bidders.pop(appID, None)
+        self.attempts.pop(appID, None)
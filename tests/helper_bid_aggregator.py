@@ -0,0 +1,200 @@
+import json
+from base64 import b64decode
+from copy import copy
+from typing import Any, Dict, List, Optional
+
+from algosdk import encoding, util
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+
+from contracts.abi import method_selector
+from contracts.auction import CONTRACT, decode_state
+from utils.account import Account
+from utils.helper import getAppGlobalState, waitForTransaction
+
+# What became of a collected bid
+FORWARDED = "forwarded"
+# another bid of the same round was higher
+OUTBID = "outbid"
+# the ledger rejected the bid when it was forwarded
+REJECTED = "rejected"
+
+# The payment and the bid call of placeBid
+BID_GROUP_SIZE = 2
+
+
+class BidReceipt:
+    """The aggregator's signed statement of what it did with a bid."""
+
+    def __init__(
+        self,
+        appID: int,
+        bidder: str,
+        bidAmount: int,
+        txID: str,
+        round: int,
+        status: str,
+        signature: str = "",
+    ) -> None:
+        self.appID = appID
+        self.bidder = bidder
+        self.bidAmount = bidAmount
+        # the ID of the bid's app call, to look up once forwarded
+        self.txID = txID
+        # the round the aggregator flushed the bid in
+        self.round = round
+        self.status = status
+        self.signature = signature
+
+    def message(self) -> bytes:
+        """The bytes the aggregator signs: the receipt's fields as canonical
+        JSON."""
+        fields = self.toJson()
+        del fields["signature"]
+        return json.dumps(fields, sort_keys=True, separators=(",", ":")).encode()
+
+    def verify(self, aggregator: str) -> bool:
+        """Whether the receipt was signed by the aggregator with address
+        `aggregator`."""
+        try:
+            return util.verify_bytes(self.message(), self.signature, aggregator)
+        except (BadSignatureError, ValueError):
+            return False
+
+    def toJson(self) -> Dict[str, Any]:
+        return {
+            "appID": self.appID,
+            "bidder": self.bidder,
+            "bidAmount": self.bidAmount,
+            "txID": self.txID,
+            "round": self.round,
+            "status": self.status,
+            "signature": self.signature,
+        }
+
+    @staticmethod
+    def fromJson(data: Dict[str, Any]) -> "BidReceipt":
+        return BidReceipt(
+            data["appID"],
+            data["bidder"],
+            data["bidAmount"],
+            data["txID"],
+            data["round"],
+            data["status"],
+            data["signature"],
+        )
+
+
+class _PendingBid:
+    def __init__(self, group: List[transaction.SignedTransaction], order: int) -> None:
+        self.group = group
+        self.order = order
+        payTxn, appCallTxn = group[0].transaction, group[1].transaction
+        self.appID: int = appCallTxn.index
+        self.bidder: str = appCallTxn.sender
+        self.bidAmount: int = payTxn.amt
+        self.txID: str = appCallTxn.get_txid()
+
+
+def _validSignature(signedTxn: transaction.SignedTransaction) -> bool:
+    txn = signedTxn.transaction
+    if signedTxn.authorizing_address is not None or not signedTxn.signature:
+        return False
+    message = b"TX" + b64decode(encoding.msgpack_encode(txn))
+    try:
+        VerifyKey(encoding.decode_address(txn.sender)).verify(message, b64decode(signedTxn.signature))
+    except BadSignatureError:
+        return False
+    return True
+
+
+class BidAggregator:
+    """Collects signed bid groups during a round and forwards only the
+    highest bid of each auction.
+
+    Bidders build and sign their groups as placeBid does (see
+    tests.helper_auction.buildBidTxns) and hand them to collect() rather
+    than to algod. Calling flush() once per round sends the highest bid
+    collected for every auction, and returns a receipt for every bid,
+    signed by the aggregator. The bids outbid within the round are never
+    sent, so they neither pay fees nor cost the auction an inner refund.
+    """
+
+    def __init__(self, client: AlgodClient, aggregator: Account) -> None:
+        self.client = client
+        self.aggregator = aggregator
+        self.pending: Dict[int, List[_PendingBid]] = {}
+        self.collected = 0
+
+    def collect(self, group: List[transaction.SignedTransaction]) -> None:
+        """Accept a signed bid group until the next flush.
+
+        Raises ValueError if the group is not a bid signed by its bidder,
+        or if the bid is too low for the auction's lead bid.
+        """
+        if len(group) != BID_GROUP_SIZE:
+            raise ValueError("A bid is a group of {} transactions".format(BID_GROUP_SIZE))
+        payTxn, appCallTxn = group[0].transaction, group[1].transaction
+        if not isinstance(payTxn, transaction.PaymentTxn) or not isinstance(appCallTxn, transaction.ApplicationCallTxn):
+            raise ValueError("A bid is a payment followed by an app call")
+        if payTxn.sender != appCallTxn.sender or payTxn.receiver != get_application_address(appCallTxn.index):
+            raise ValueError("The bid must be paid by the bidder to the auction")
+        if not appCallTxn.app_args or appCallTxn.app_args[0] != method_selector(CONTRACT, "bid"):
+            raise ValueError("The app call must call the bid method")
+        # the group ID is the hash of the transactions without it
+        ungrouped = [copy(signedTxn.transaction) for signedTxn in group]
+        for txn in ungrouped:
+            txn.group = None
+        groupID = transaction.calculate_group_id(ungrouped)
+        if any(signedTxn.transaction.group != groupID for signedTxn in group):
+            raise ValueError("The transactions must be grouped together")
+        if not all(_validSignature(signedTxn) for signedTxn in group):
+            raise ValueError("The bid must be signed by the bidder")
+
+        state = decode_state(getAppGlobalState(self.client, appCallTxn.index))
+        if payTxn.amt < state["bid_amount"] + state["min_bid_inc"]:
+            raise ValueError("The bid must raise the lead bid by at least {}".format(state["min_bid_inc"]))
+
+        self.pending.setdefault(appCallTxn.index, []).append(_PendingBid(group, self.collected))
+        self.collected += 1
+
+    def flush(self) -> List[BidReceipt]:
+        """Forward the highest bid collected for every auction, the earliest
+        one among equal bids, and start collecting the next round's.
+
+        If the ledger rejects a bid, for instance because the lead bid moved
+        since it was collected, the next highest is tried.
+        """
+        lastRound = self.client.status()["last-round"]
+        pending, self.pending = self.pending, {}
+
+        receipts = []
+        forwarded = []
+        for bids in pending.values():
+            bids = sorted(bids, key=lambda bid: (-bid.bidAmount, bid.order))
+            winner: Optional[_PendingBid] = None
+            for bid in bids:
+                if winner is not None:
+                    receipts.append(self._receipt(bid, lastRound, OUTBID))
+                    continue
+                try:
+                    self.client.send_transactions(bid.group)
+                except AlgodHTTPError:
+                    receipts.append(self._receipt(bid, lastRound, REJECTED))
+                    continue
+                winner = bid
+                forwarded.append(bid.txID)
+                receipts.append(self._receipt(bid, lastRound, FORWARDED))
+
+        for txID in forwarded:
+            waitForTransaction(self.client, txID)
+        return receipts
+
+    def _receipt(self, bid: _PendingBid, lastRound: int, status: str) -> BidReceipt:
+        receipt = BidReceipt(bid.appID, bid.bidder, bid.bidAmount, bid.txID, lastRound, status)
+        receipt.signature = util.sign_bytes(receipt.message(), self.aggregator.getPrivateKey())
+        return receipt
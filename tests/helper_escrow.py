@@ -1,14 +1,38 @@
-from datetime import time
-from typing import List
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
 
-from algosdk import encoding
+from algosdk.encoding import encode_address
+from algosdk.error import AlgodHTTPError
 from algosdk.future import transaction
 from algosdk.logic import get_application_address
 from algosdk.v2client.algod import AlgodClient
 
-from contracts.escrow import approval_program, clear_state_program
+from contracts.abi import encode_call
+from contracts.escrow import (
+    BUY_INNER_FEES,
+    CONTRACT,
+    DELETE_INNER_FEES,
+    FACTORY_DELETE_INNER_FEES,
+    SETUP_INNER_FEES,
+    TEAL_VERSION,
+    approval_program,
+    clear_state_program,
+    global_schema,
+    setup_funding,
+)
+from contracts.funding import MIN_TXN_FEE
 from utils.account import Account
-from utils.helper import fullyCompileContract, waitForTransaction, getAppGlobalState, getAppCreator
+from utils.helper import fullyCompileContract, waitForTransaction, getAppGlobalState, getAppCreator, getBalances, sendPacked
+from utils.opcodes import (
+    MAX_APP_TOTAL_TXN_REFERENCES,
+    MAX_APP_TXN_ACCOUNTS,
+    MAX_APP_TXN_FOREIGN_APPS,
+    MAX_APP_TXN_FOREIGN_ASSETS,
+    MAX_TXN_GROUP_SIZE,
+)
+from utils.params import getSuggestedParams, withFlatFee
+from utils.tracker import ConfirmationTracker
 
 
 # Global program
@@ -28,12 +52,42 @@ def getContracts(client: AlgodClient) -> [bytes, bytes]:
     global CLEAR_STATE_PROGRAM
 
     if len(APPROVAL_PROGRAM) == 0:
-        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program())
-        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program())
+        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program(), version=TEAL_VERSION)
+        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program(), version=TEAL_VERSION)
 
     return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
 
 
+FEE_RECEIVER = 'DPANDA7MC3CHRPXCORO4YBB56NKKCEEMREWO6VW2WT2NYXSADUTBRZCXWU'
+FEE_PERCENT = 5
+
+
+def buildCreateAppTxn(
+    creator: Account,
+    assetID: int,
+    approval: bytes,
+    clear: bytes,
+    suggestedParams: transaction.SuggestedParams,
+) -> transaction.ApplicationCreateTxn:
+    """Build the transaction creating an escrow for assetID."""
+    globalUints, globalByteSlices = global_schema()
+    globalSchema = transaction.StateSchema(num_uints=globalUints, num_byte_slices=globalByteSlices)
+    localSchema = transaction.StateSchema(num_uints=0, num_byte_slices=0)
+
+    app_args = encode_call(CONTRACT, "create", assetID, FEE_RECEIVER, FEE_PERCENT)
+
+    return transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=globalSchema,
+        local_schema=localSchema,
+        app_args=app_args,
+        sp=suggestedParams,
+    )
+
+
 def createApp(
     client: AlgodClient,
     creator: Account,
@@ -60,29 +114,7 @@ def createApp(
         The ID of the newly created auction app.
     """
     approval, clear = getContracts(client)
-
-    globalSchema = transaction.StateSchema(num_uints=4, num_byte_slices=1)
-    localSchema = transaction.StateSchema(num_uints=0, num_byte_slices=0)
-
-    feeReceiver = 'DPANDA7MC3CHRPXCORO4YBB56NKKCEEMREWO6VW2WT2NYXSADUTBRZCXWU'
-    feePercent = 5
-
-    app_args = [
-        assetID.to_bytes(8, "big"),
-        encoding.decode_address(feeReceiver),
-        feePercent.to_bytes(8, "big")
-    ]
-
-    txn = transaction.ApplicationCreateTxn(
-        sender=creator.getAddress(),
-        on_complete=transaction.OnComplete.NoOpOC,
-        approval_program=approval,
-        clear_program=clear,
-        global_schema=globalSchema,
-        local_schema=localSchema,
-        app_args=app_args,
-        sp=client.suggested_params(),
-    )
+    txn = buildCreateAppTxn(creator, assetID, approval, clear, getSuggestedParams(client))
 
     signedTxn = txn.sign(creator.getPrivateKey())
 
@@ -92,55 +124,31 @@ def createApp(
     assert response.applicationIndex is not None and response.applicationIndex > 0
     return response.applicationIndex
 
-def setupApp(
-    client: AlgodClient,
+def buildSetupTxns(
     appID: int,
     funder: Account,
     assetID: int,
     assetPrice: int,
-) -> None:
-    """Finish setting up an auction.
-    This operation funds the app auction escrow account, opts that account into
-    the NFT, and sends the NFT to the escrow account, all in one atomic
-    transaction group. The auction must not have started yet.
-    The escrow account requires a total of 0.203 Algos for funding. See the code
-    below for a breakdown of this amount.
-    Args:
-        client: An algod client.
-        appID: The app ID of the auction.
-        funder: The account providing the funding for the escrow account.
-        nftHolder: The account holding the NFT.
-        nftID: The NFT ID.
-        nftAmount: The NFT amount being auctioned. Some NFTs has a total supply
-            of 1, while others are fractional NFTs with a greater total supply,
-            so use a value that makes sense for the NFT being auctioned.
-    """
+    suggestedParams: transaction.SuggestedParams,
+) -> List[transaction.Transaction]:
+    """Build the grouped fund, setup and NFT transfer transactions of setupApp."""
     appAddr = get_application_address(appID)
-    suggestedParams = client.suggested_params()
-
-    fundingAmount = (
-        # min account balance
-        100_000
-        # additional min balance to opt into NFT
-        + 100_000
-        # 4 * min txn fee
-        + 5 * 1_000
-    )
 
     fundAppTxn = transaction.PaymentTxn(
         sender=funder.getAddress(),
         receiver=appAddr,
-        amt=fundingAmount,
+        amt=setup_funding(),
         sp=suggestedParams,
     )
 
+    # the setup call pays for the escrow's opt-in
     setupTxn = transaction.ApplicationCallTxn(
         sender=funder.getAddress(),
         index=appID,
         on_complete=transaction.OnComplete.NoOpOC,
-        app_args=[b"on_setup", assetPrice],
+        app_args=encode_call(CONTRACT, "on_setup", assetPrice),
         foreign_assets=[assetID],
-        sp=suggestedParams,
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + SETUP_INNER_FEES),
     )
 
     fundNftTxn = transaction.AssetTransferTxn(
@@ -151,53 +159,72 @@ def setupApp(
         sp=suggestedParams,
     )
 
-    transaction.assign_group_id([fundAppTxn, setupTxn, fundNftTxn])
-
-    signedFundAppTxn = fundAppTxn.sign(funder.getPrivateKey())
-    signedSetupTxn = setupTxn.sign(funder.getPrivateKey())
-    signedFundNftTxn = fundNftTxn.sign(funder.getPrivateKey())
-
-    client.send_transactions([signedFundAppTxn, signedSetupTxn, signedFundNftTxn])
+    return transaction.assign_group_id([fundAppTxn, setupTxn, fundNftTxn])
 
-    waitForTransaction(client, signedFundAppTxn.get_txid())
 
-def placeOrder(
+def setupApp(
     client: AlgodClient,
     appID: int,
-    buyer: Account,
+    funder: Account,
     assetID: int,
     assetPrice: int,
 ) -> None:
+    """Finish setting up an auction.
+    This operation funds the app auction escrow account, opts that account into
+    the NFT, and sends the NFT to the escrow account, all in one atomic
+    transaction group. The auction must not have started yet.
+    The escrow account is funded with its minimum balance, see setup_funding;
+    the setup call pays the fee of the opt-in.
+    Args:
+        client: An algod client.
+        appID: The app ID of the auction.
+        funder: The account providing the funding for the escrow account.
+        nftHolder: The account holding the NFT.
+        nftID: The NFT ID.
+        nftAmount: The NFT amount being auctioned. Some NFTs has a total supply
+            of 1, while others are fractional NFTs with a greater total supply,
+            so use a value that makes sense for the NFT being auctioned.
     """
-    Something here
+    txns = buildSetupTxns(appID, funder, assetID, assetPrice, getSuggestedParams(client))
+    signedTxns = [txn.sign(funder.getPrivateKey()) for txn in txns]
 
-    :param client:
-    :param appID:
-    :param buyer:
-    :param assetID:
-    :param assetPrice:
-    :return:
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[0].get_txid())
+
+
+def buildOrderTxns(
+    appID: int,
+    buyer: Account,
+    assetID: int,
+    assetPrice: int,
+    creator: str,
+    suggestedParams: transaction.SuggestedParams,
+    factoryID: int = 0,
+) -> List[transaction.Transaction]:
+    """Build the grouped opt-in, payment, buy and close transactions of placeOrder.
+
+    The close of an escrow created by the escrow factory `factoryID` names
+    the factory, which pays the seller back the listing deposit.
     """
     appAddr = get_application_address(appID)
-    suggestedParams = client.suggested_params()
     qty = 1
 
-    feeReceiver = 'DPANDA7MC3CHRPXCORO4YBB56NKKCEEMREWO6VW2WT2NYXSADUTBRZCXWU'
-
     optInTx = transaction.AssetOptInTxn(
         sender=buyer.getAddress(),
         index=assetID,
         sp=suggestedParams,
     )
 
+    # the buy call pays for the inner transactions settling the purchase
     buyTxn = transaction.ApplicationCallTxn(
         sender=buyer.getAddress(),
         index=appID,
         on_complete=transaction.OnComplete.NoOpOC,
-        app_args=[b"on_buy", qty.to_bytes(8, "big")],
+        app_args=encode_call(CONTRACT, "on_buy", qty),
         foreign_assets=[assetID],
-        accounts=[buyer.getAddress(), feeReceiver],
-        sp=suggestedParams,
+        accounts=[buyer.getAddress(), FEE_RECEIVER, creator],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + BUY_INNER_FEES),
     )
 
     payTxn = transaction.PaymentTxn(
@@ -210,18 +237,283 @@ def placeOrder(
     closeTxn = transaction.ApplicationDeleteTxn(
         sender=buyer.getAddress(),
         index=appID,
-        accounts=[getAppCreator(client, appID)],
+        accounts=[creator],
         foreign_assets=[assetID],
-        sp=client.suggested_params(),
+        foreign_apps=[factoryID] if factoryID else None,
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + (FACTORY_DELETE_INNER_FEES if factoryID else DELETE_INNER_FEES)),
     )
 
-    transaction.assign_group_id([optInTx, payTxn, buyTxn, closeTxn])
+    return transaction.assign_group_id([optInTx, payTxn, buyTxn, closeTxn])
+
+
+def placeOrder(
+    client: AlgodClient,
+    appID: int,
+    buyer: Account,
+    assetID: int,
+    assetPrice: int,
+) -> None:
+    """
+    Something here
+
+    :param client:
+    :param appID:
+    :param buyer:
+    :param assetID:
+    :param assetPrice:
+    :return:
+    """
+    txns = buildOrderTxns(appID, buyer, assetID, assetPrice, getAppCreator(client, appID), getSuggestedParams(client))
+    signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in txns]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[-1].get_txid())
+
+
+def _checkReferences(txn: transaction.Transaction) -> None:
+    """Raise ValueError if an app call references more accounts, assets or
+    apps than a transaction may."""
+    accounts = len(getattr(txn, "accounts", None) or [])
+    assets = len(getattr(txn, "foreign_assets", None) or [])
+    apps = len(getattr(txn, "foreign_apps", None) or [])
+    if (
+        accounts > MAX_APP_TXN_ACCOUNTS
+        or assets > MAX_APP_TXN_FOREIGN_ASSETS
+        or apps > MAX_APP_TXN_FOREIGN_APPS
+        or accounts + assets + apps > MAX_APP_TOTAL_TXN_REFERENCES
+    ):
+        raise ValueError(
+            "call to app {} references {} accounts, {} assets and {} apps".format(txn.index, accounts, assets, apps)
+        )
 
-    signedOptInTxn = optInTx.sign(buyer.getPrivateKey())
-    signedPayTxn = payTxn.sign(buyer.getPrivateKey())
-    signedBuyTxn = buyTxn.sign(buyer.getPrivateKey())
-    signedCloseTxn = closeTxn.sign((buyer.getPrivateKey()))
 
-    client.send_transactions([signedOptInTxn, signedPayTxn, signedBuyTxn, signedCloseTxn])
+def buildCartGroups(
+    client: AlgodClient,
+    buyer: Account,
+    appIDs: List[int],
+    suggestedParams: transaction.SuggestedParams,
+) -> List[List[transaction.Transaction]]:
+    """Build the groups of a cart checkout, buying the asset on sale in
+    every escrow of `appIDs`.
+
+    The payment, buy and close transactions of each escrow are those of
+    placeOrder, packed into as few groups of up to 16 as they fit in. The
+    buyer opts in once per asset, in the group of its first purchase, and not
+    at all to the assets it is already opted in to. on_buy finds its payment
+    right before it, wherever the purchase sits in its group. Raises
+    ValueError for a cart buying twice from an escrow, or a call over the
+    limits of the foreign arrays.
+    """
+    if len(set(appIDs)) != len(appIDs):
+        raise ValueError("cart buys from an escrow twice: {}".format(appIDs))
+
+    optedIn = set(getBalances(client, buyer.getAddress()))
+    groups: List[List[transaction.Transaction]] = []
+    optIns: List[transaction.Transaction] = []
+    purchases: List[transaction.Transaction] = []
+    for appID in appIDs:
+        state = getAppGlobalState(client, appID)
+        assetID = state[b"aid"]
+        # escrows created by the escrow factory pay the seller they keep
+        seller = encode_address(state[b"sl"]) if b"sl" in state else getAppCreator(client, appID)
+
+        optInTxn, *purchase = buildOrderTxns(appID, buyer, assetID, state[b"ap"], seller, suggestedParams)
+        for txn in [optInTxn] + purchase:
+            txn.group = None
+            _checkReferences(txn)
+
+        needsOptIn = assetID not in optedIn
+        if len(optIns) + needsOptIn + len(purchases) + len(purchase) > MAX_TXN_GROUP_SIZE:
+            groups.append(optIns + purchases)
+            optIns, purchases = [], []
+        if needsOptIn:
+            optIns.append(optInTxn)
+            optedIn.add(assetID)
+        purchases += purchase
+
+    if purchases:
+        groups.append(optIns + purchases)
+    return [transaction.assign_group_id(group) for group in groups]
+
+
+class CartGroupResult:
+    def __init__(self, appIDs: List[int], buyTxIDs: List[str]) -> None:
+        self.appIDs = appIDs
+        self.buyTxIDs = buyTxIDs
+        self.bought = False
+        self.error: Optional[str] = None
+
+
+def checkoutCart(client: AlgodClient, buyer: Account, appIDs: List[int]) -> List[CartGroupResult]:
+    """Buy the asset on sale in every escrow of `appIDs` and close the
+    escrows.
+
+    The cart is sent as the groups of buildCartGroups, all of them before
+    waiting for any so that a node can confirm them in the same round, and
+    every group is then followed to its confirmation. A cart of up to 4 new
+    assets, or 5 assets the buyer is opted in to, fits in one group and is
+    bought whole or not at all. A larger cart can be partly filled: each
+    group is atomic on its own, so a group rejected or failing to confirm
+    leaves its escrows on sale while the other groups go through.
+
+    Returns one CartGroupResult per group, in the order of `appIDs`, with
+    the escrows of the group and the IDs of their buy calls. `bought` is set
+    once the group is confirmed, `error` if it is not.
+    """
+    if not appIDs:
+        return []
+
+    groups = buildCartGroups(client, buyer, appIDs, getSuggestedParams(client))
+    # the tracker follows the blocks from before the groups are sent
+    tracker = ConfirmationTracker(client)
+    results: List[CartGroupResult] = []
+
+    def onConfirmed(result: CartGroupResult, future: Future) -> None:
+        if future.exception() is not None:
+            result.error = str(future.exception())
+        else:
+            result.bought = True
+
+    for group in groups:
+        signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in group]
+        # the buy call is the one before every close
+        closes = [
+            (signedTxn, nextTxn)
+            for signedTxn, nextTxn in zip(signedTxns, signedTxns[1:])
+            if getattr(nextTxn.transaction, "on_complete", None) == transaction.OnComplete.DeleteApplicationOC
+        ]
+        result = CartGroupResult(
+            [nextTxn.transaction.index for _, nextTxn in closes],
+            [signedTxn.get_txid() for signedTxn, _ in closes],
+        )
+        results.append(result)
+        try:
+            client.send_transactions(signedTxns)
+        except AlgodHTTPError as e:
+            result.error = str(e)
+            continue
+        tracker.track(signedTxns[-1].get_txid(), lambda future, result=result: onConfirmed(result, future))
+
+    tracker.wait()
+    return results
+
+
+# listings being created or set up at once by bulkList
+BULK_WINDOW = 1_024
+
+
+class ListingResult:
+    def __init__(self, assetID: int, assetPrice: int) -> None:
+        self.assetID = assetID
+        self.assetPrice = assetPrice
+        self.appID: Optional[int] = None
+        self.listed = False
+        self.error: Optional[str] = None
+
+
+def bulkList(
+    client: AlgodClient,
+    seller: Account,
+    items: List[Tuple[int, int]],
+    window: int = BULK_WINDOW,
+) -> List[ListingResult]:
+    """List many (assetID, assetPrice) pairs, each in its own escrow.
+
+    App creations are sent packed in groups of 16 and each listing's setup
+    group is sent as soon as its escrow is confirmed, so creations and setups
+    of different listings share rounds. Up to `window` listings are in flight
+    at once. Returns one ListingResult per item, in order; failed items have
+    `error` set and may have an appID if only the setup failed.
+    """
+    approval, clear = getContracts(client)
+    results = [ListingResult(assetID, assetPrice) for assetID, assetPrice in items]
+    queue = deque(range(len(results)))
+    tracker = ConfirmationTracker(client)
+    inFlight = 0
+
+    def onSetup(index: int, future: Future) -> None:
+        nonlocal inFlight
+        inFlight -= 1
+        if future.exception() is not None:
+            results[index].error = str(future.exception())
+        else:
+            results[index].listed = True
+
+    def onCreated(index: int, future: Future) -> None:
+        nonlocal inFlight
+        result = results[index]
+        if future.exception() is not None:
+            inFlight -= 1
+            result.error = str(future.exception())
+            return
+        result.appID = future.result().applicationIndex
+
+        txns = buildSetupTxns(result.appID, seller, result.assetID, result.assetPrice, getSuggestedParams(client))
+        signedTxns = [txn.sign(seller.getPrivateKey()) for txn in txns]
+        try:
+            client.send_transactions(signedTxns)
+        except AlgodHTTPError as e:
+            inFlight -= 1
+            result.error = str(e)
+            return
+        tracker.track(signedTxns[0].get_txid(), lambda f: onSetup(index, f))
+
+    while queue or len(tracker):
+        batch = []
+        while queue and inFlight + len(batch) < window:
+            batch.append(queue.popleft())
+        if batch:
+            params = getSuggestedParams(client)
+            txns = [buildCreateAppTxn(seller, results[i].assetID, approval, clear, params) for i in batch]
+            for index, (txID, error) in zip(batch, sendPacked(client, seller, txns)):
+                if txID is None:
+                    results[index].error = error
+                    continue
+                inFlight += 1
+                tracker.track(txID, lambda f, index=index: onCreated(index, f))
+        if len(tracker):
+            tracker.waitForBlock()
+
+    return results
+
+
+def bulkDelist(
+    client: AlgodClient,
+    seller: Account,
+    listings: List[Tuple[int, int]],
+    factoryID: int = 0,
+) -> List[Optional[str]]:
+    """Delete many escrows given as (appID, assetID) pairs, returning the
+    NFT and remaining funds to the seller. Escrows created by the escrow
+    factory `factoryID` also return the listing deposit.
+
+    The deletes are sent packed in groups of 16. Returns the error of each
+    listing, or None once it is deleted.
+    """
+    tracker = ConfirmationTracker(client)
+    params = withFlatFee(
+        getSuggestedParams(client), MIN_TXN_FEE + (FACTORY_DELETE_INNER_FEES if factoryID else DELETE_INNER_FEES)
+    )
+    txns = [
+        transaction.ApplicationDeleteTxn(
+            sender=seller.getAddress(),
+            index=appID,
+            foreign_assets=[assetID],
+            foreign_apps=[factoryID] if factoryID else None,
+            sp=params,
+        )
+        for appID, assetID in listings
+    ]
 
-    waitForTransaction(client, signedCloseTxn.get_txid())
+    errors: List[Optional[str]] = []
+    futures: List[Optional[Future]] = []
+    for txID, error in sendPacked(client, seller, txns):
+        errors.append(error)
+        futures.append(tracker.track(txID) if txID is not None else None)
+    tracker.wait()
+
+    for index, future in enumerate(futures):
+        if future is not None and future.exception() is not None:
+            errors[index] = str(future.exception())
+    return errors
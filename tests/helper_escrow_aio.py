@@ -0,0 +1,58 @@
+
+from contracts.escrow import TEAL_VERSION, approval_program, clear_state_program
+from tests.helper_escrow import buildCreateAppTxn, buildOrderTxns, buildSetupTxns
+from utils.account import Account
+from utils.aio import AsyncAlgodClient, fullyCompileContract, getAppCreator, waitForTransaction
+from utils.params import getSuggestedParams
+
+
+# Global program
+APPROVAL_PROGRAM = b''
+CLEAR_STATE_PROGRAM = b''
+
+
+async def getContracts(client: AsyncAlgodClient) -> [bytes, bytes]:
+    """Get the compiled TEAL contracts for the escrow."""
+    global APPROVAL_PROGRAM
+    global CLEAR_STATE_PROGRAM
+
+    if len(APPROVAL_PROGRAM) == 0:
+        APPROVAL_PROGRAM = await fullyCompileContract(client, approval_program(), version=TEAL_VERSION)
+        CLEAR_STATE_PROGRAM = await fullyCompileContract(client, clear_state_program(), version=TEAL_VERSION)
+
+    return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
+
+
+async def createApp(client: AsyncAlgodClient, creator: Account, assetID: int) -> int:
+    """Create a new escrow, see tests.helper_escrow.createApp."""
+    approval, clear = await getContracts(client)
+    txn = buildCreateAppTxn(creator, assetID, approval, clear, await getSuggestedParams(client))
+
+    signedTxn = txn.sign(creator.getPrivateKey())
+
+    await client.send_transaction(signedTxn)
+
+    response = await waitForTransaction(client, signedTxn.get_txid())
+    assert response.applicationIndex is not None and response.applicationIndex > 0
+    return response.applicationIndex
+
+
+async def setupApp(client: AsyncAlgodClient, appID: int, funder: Account, assetID: int, assetPrice: int) -> None:
+    """Fund an escrow and move the NFT into it, see tests.helper_escrow.setupApp."""
+    txns = buildSetupTxns(appID, funder, assetID, assetPrice, await getSuggestedParams(client))
+    signedTxns = [txn.sign(funder.getPrivateKey()) for txn in txns]
+
+    await client.send_transactions(signedTxns)
+
+    await waitForTransaction(client, signedTxns[0].get_txid())
+
+
+async def placeOrder(client: AsyncAlgodClient, appID: int, buyer: Account, assetID: int, assetPrice: int) -> None:
+    """Buy the NFT of an escrow, see tests.helper_escrow.placeOrder."""
+    creator = await getAppCreator(client, appID)
+    txns = buildOrderTxns(appID, buyer, assetID, assetPrice, creator, await getSuggestedParams(client))
+    signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in txns]
+
+    await client.send_transactions(signedTxns)
+
+    await waitForTransaction(client, signedTxns[-1].get_txid())
@@ -0,0 +1,181 @@
+from typing import Tuple
+
+from algosdk.encoding import encode_address
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+
+from contracts.abi import encode_call
+from contracts.escrow_factory import (
+    ACCEPT_INNER_FEES,
+    CONTRACT,
+    LIST_INNER_FEES,
+    TEAL_VERSION,
+    approval_program,
+    clear_state_program,
+    factory_funding,
+    global_schema,
+    listing_funding,
+)
+from contracts.funding import MIN_TXN_FEE
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER, buildOrderTxns
+from utils.account import Account
+from utils.helper import fullyCompileContract, getAppGlobalState, waitForTransaction
+from utils.params import getSuggestedParams, withFlatFee
+
+# Global program
+APPROVAL_PROGRAM = b''
+CLEAR_STATE_PROGRAM = b''
+
+
+def getContracts(client: AlgodClient) -> Tuple[bytes, bytes]:
+    """Get the compiled TEAL contracts for the escrow factory.
+    Args:
+        client: An algod client that has the ability to compile TEAL programs.
+    Returns:
+        A tuple of 2 byte strings. The first is the approval program, and the
+        second is the clear state program.
+    """
+    global APPROVAL_PROGRAM
+    global CLEAR_STATE_PROGRAM
+
+    if len(APPROVAL_PROGRAM) == 0:
+        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program(), version=TEAL_VERSION)
+        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program(), version=TEAL_VERSION)
+
+    return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
+
+
+def createFactory(client: AlgodClient, creator: Account, feePercent: int = FEE_PERCENT) -> int:
+    """Create and fund a new escrow factory.
+    Args:
+        client: An algod client.
+        creator: The account creating the factory.
+        feePercent: The percentage of the sale price of every listing paid to
+            FEE_RECEIVER.
+    Returns:
+        The ID of the newly created factory app.
+    """
+    approval, clear = getContracts(client)
+    suggestedParams = getSuggestedParams(client)
+    globalUints, globalByteSlices = global_schema()
+
+    txn = transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=transaction.StateSchema(num_uints=globalUints, num_byte_slices=globalByteSlices),
+        local_schema=transaction.StateSchema(num_uints=0, num_byte_slices=0),
+        app_args=encode_call(CONTRACT, "create", FEE_RECEIVER, feePercent),
+        sp=suggestedParams,
+    )
+    signedTxn = txn.sign(creator.getPrivateKey())
+    client.send_transaction(signedTxn)
+    response = waitForTransaction(client, signedTxn.get_txid())
+    assert response.applicationIndex is not None and response.applicationIndex > 0
+
+    fundTxn = transaction.PaymentTxn(
+        sender=creator.getAddress(),
+        receiver=get_application_address(response.applicationIndex),
+        amt=factory_funding(),
+        sp=suggestedParams,
+    )
+    signedFundTxn = fundTxn.sign(creator.getPrivateKey())
+    client.send_transaction(signedFundTxn)
+    waitForTransaction(client, signedFundTxn.get_txid())
+
+    return response.applicationIndex
+
+
+def createListing(
+    client: AlgodClient,
+    factoryID: int,
+    seller: Account,
+    assetID: int,
+    assetPrice: int,
+) -> int:
+    """Put the asset on sale at `assetPrice` through the factory, in one
+    atomic group: the factory creates the escrow, funds it, opts it in and
+    hands it the asset.
+    Args:
+        client: An algod client.
+        factoryID: The app ID of the factory.
+        seller: The account selling the asset, and holding it.
+        assetID: The ID of the asset.
+        assetPrice: The price of the asset.
+    Returns:
+        The ID of the escrow app created for the listing.
+    """
+    factoryAddr = get_application_address(factoryID)
+    suggestedParams = getSuggestedParams(client)
+
+    fundTxn = transaction.PaymentTxn(
+        sender=seller.getAddress(),
+        receiver=factoryAddr,
+        amt=listing_funding(),
+        sp=suggestedParams,
+    )
+    acceptTxn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=factoryID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "accept", assetID),
+        foreign_assets=[assetID],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + ACCEPT_INNER_FEES),
+    )
+    assetTxn = transaction.AssetTransferTxn(
+        sender=seller.getAddress(),
+        receiver=factoryAddr,
+        index=assetID,
+        amt=1,
+        sp=suggestedParams,
+    )
+    listTxn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=factoryID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "list", assetID, assetPrice),
+        foreign_assets=[assetID],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + LIST_INNER_FEES),
+    )
+
+    txns = transaction.assign_group_id([fundTxn, acceptTxn, assetTxn, listTxn])
+    signedTxns = [txn.sign(seller.getPrivateKey()) for txn in txns]
+
+    client.send_transactions(signedTxns)
+
+    # the escrow is the app created by the first inner transaction of list
+    response = waitForTransaction(client, signedTxns[-1].get_txid())
+    appID = response.innerTxns[0].get("application-index", 0)
+    assert appID > 0
+    return appID
+
+
+def placeOrder(
+    client: AlgodClient,
+    factoryID: int,
+    appID: int,
+    buyer: Account,
+    assetID: int,
+    assetPrice: int,
+) -> None:
+    """Buy the asset of a listing created by the factory and close its
+    escrow. The escrow pays its seller, kept in its global state, rather
+    than its creator, and has the factory pay back the listing deposit.
+    Args:
+        client: An algod client.
+        factoryID: The app ID of the factory that created the escrow.
+        appID: The app ID of the escrow.
+        buyer: The account buying the asset.
+        assetID: The ID of the asset.
+        assetPrice: The price of the asset.
+    """
+    seller = encode_address(getAppGlobalState(client, appID)[b"sl"])
+    txns = buildOrderTxns(appID, buyer, assetID, assetPrice, seller, getSuggestedParams(client), factoryID)
+    signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in txns]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[-1].get_txid())
+
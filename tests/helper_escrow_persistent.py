@@ -0,0 +1,239 @@
+from typing import Tuple
+
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+
+from contracts.abi import encode_call
+from contracts.escrow import (
+    BUY_INNER_FEES,
+    DELETE_INNER_FEES,
+    PERSISTENT_CONTRACT,
+    SETUP_INNER_FEES,
+    TEAL_VERSION,
+    WITHDRAW_INNER_FEES,
+    approval_program,
+    clear_state_program,
+    global_schema,
+    setup_funding,
+)
+from contracts.funding import MIN_TXN_FEE
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER
+from utils.account import Account
+from utils.helper import fullyCompileContract, getAppCreator, getBalances, waitForTransaction
+from utils.params import getSuggestedParams, withFlatFee
+
+# Global program
+APPROVAL_PROGRAM = b''
+CLEAR_STATE_PROGRAM = b''
+
+
+def getContracts(client: AlgodClient) -> Tuple[bytes, bytes]:
+    """Get the compiled TEAL contracts for the persistent escrow.
+    Args:
+        client: An algod client that has the ability to compile TEAL programs.
+    Returns:
+        A tuple of 2 byte strings. The first is the approval program, and the
+        second is the clear state program.
+    """
+    global APPROVAL_PROGRAM
+    global CLEAR_STATE_PROGRAM
+
+    if len(APPROVAL_PROGRAM) == 0:
+        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program(persistent=True), version=TEAL_VERSION)
+        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program(), version=TEAL_VERSION)
+
+    return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
+
+
+def createListing(
+    client: AlgodClient,
+    seller: Account,
+    assetID: int,
+    assetAmount: int,
+    assetPrice: int,
+) -> int:
+    """Create a persistent escrow and put `assetAmount` units of the asset on
+    sale at `assetPrice` each, funding and setting it up in one atomic
+    group.
+    Args:
+        client: An algod client.
+        seller: The account selling the asset, and holding its units.
+        assetID: The ID of the asset.
+        assetAmount: The number of units on sale.
+        assetPrice: The price of a unit.
+    Returns:
+        The ID of the newly created escrow app.
+    """
+    approval, clear = getContracts(client)
+    suggestedParams = getSuggestedParams(client)
+    globalUints, globalByteSlices = global_schema()
+
+    createTxn = transaction.ApplicationCreateTxn(
+        sender=seller.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=transaction.StateSchema(num_uints=globalUints, num_byte_slices=globalByteSlices),
+        local_schema=transaction.StateSchema(num_uints=0, num_byte_slices=0),
+        app_args=encode_call(PERSISTENT_CONTRACT, "create", assetID, FEE_RECEIVER, FEE_PERCENT),
+        sp=suggestedParams,
+    )
+    signedTxn = createTxn.sign(seller.getPrivateKey())
+    client.send_transaction(signedTxn)
+    response = waitForTransaction(client, signedTxn.get_txid())
+    assert response.applicationIndex is not None and response.applicationIndex > 0
+    appID = response.applicationIndex
+    appAddr = get_application_address(appID)
+
+    fundAppTxn = transaction.PaymentTxn(
+        sender=seller.getAddress(),
+        receiver=appAddr,
+        amt=setup_funding(),
+        sp=suggestedParams,
+    )
+    setupTxn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(PERSISTENT_CONTRACT, "on_setup", assetPrice),
+        foreign_assets=[assetID],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + SETUP_INNER_FEES),
+    )
+    fundNftTxn = transaction.AssetTransferTxn(
+        sender=seller.getAddress(),
+        receiver=appAddr,
+        index=assetID,
+        amt=assetAmount,
+        sp=suggestedParams,
+    )
+
+    txns = transaction.assign_group_id([fundAppTxn, setupTxn, fundNftTxn])
+    signedTxns = [txn.sign(seller.getPrivateKey()) for txn in txns]
+    client.send_transactions(signedTxns)
+    waitForTransaction(client, signedTxns[0].get_txid())
+
+    return appID
+
+
+def buyUnits(
+    client: AlgodClient,
+    appID: int,
+    buyer: Account,
+    assetID: int,
+    assetAmount: int,
+    assetPrice: int,
+) -> str:
+    """Buy `assetAmount` units from a persistent escrow, which stays on sale
+    for the units left. The buyer is opted in to the asset in the same group
+    if it is not yet.
+    Args:
+        client: An algod client.
+        appID: The app ID of the escrow.
+        buyer: The account buying the units.
+        assetID: The ID of the asset.
+        assetAmount: The number of units bought.
+        assetPrice: The price of a unit.
+    Returns:
+        The ID of the buy call.
+    """
+    appAddr = get_application_address(appID)
+    suggestedParams = getSuggestedParams(client)
+
+    txns = []
+    if assetID not in getBalances(client, buyer.getAddress()):
+        txns.append(
+            transaction.AssetOptInTxn(
+                sender=buyer.getAddress(),
+                index=assetID,
+                sp=suggestedParams,
+            )
+        )
+    txns.append(
+        transaction.PaymentTxn(
+            sender=buyer.getAddress(),
+            receiver=appAddr,
+            amt=assetPrice * assetAmount,
+            sp=suggestedParams,
+        )
+    )
+    txns.append(
+        transaction.ApplicationCallTxn(
+            sender=buyer.getAddress(),
+            index=appID,
+            on_complete=transaction.OnComplete.NoOpOC,
+            app_args=encode_call(PERSISTENT_CONTRACT, "on_buy", assetAmount),
+            foreign_assets=[assetID],
+            accounts=[buyer.getAddress(), FEE_RECEIVER, getAppCreator(client, appID)],
+            sp=withFlatFee(suggestedParams, MIN_TXN_FEE + BUY_INNER_FEES),
+        )
+    )
+
+    signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in transaction.assign_group_id(txns)]
+    client.send_transactions(signedTxns)
+    waitForTransaction(client, signedTxns[-1].get_txid())
+    return signedTxns[-1].get_txid()
+
+
+def setPrice(client: AlgodClient, appID: int, seller: Account, assetPrice: int) -> None:
+    """Change the price of a unit of a persistent escrow on sale.
+    Args:
+        client: An algod client.
+        appID: The app ID of the escrow.
+        seller: The account selling the asset.
+        assetPrice: The new price of a unit.
+    """
+    txn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(PERSISTENT_CONTRACT, "set_price", assetPrice),
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(seller.getPrivateKey())
+    client.send_transaction(signedTxn)
+    waitForTransaction(client, signedTxn.get_txid())
+
+
+def withdrawUnits(client: AlgodClient, appID: int, seller: Account, assetID: int, assetAmount: int) -> None:
+    """Take `assetAmount` units of a persistent escrow on sale back to the
+    seller. Withdrawing the last unit ends the sale.
+    Args:
+        client: An algod client.
+        appID: The app ID of the escrow.
+        seller: The account selling the asset.
+        assetID: The ID of the asset.
+        assetAmount: The number of units withdrawn.
+    """
+    txn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(PERSISTENT_CONTRACT, "withdraw", assetAmount),
+        foreign_assets=[assetID],
+        sp=withFlatFee(getSuggestedParams(client), MIN_TXN_FEE + WITHDRAW_INNER_FEES),
+    )
+    signedTxn = txn.sign(seller.getPrivateKey())
+    client.send_transaction(signedTxn)
+    waitForTransaction(client, signedTxn.get_txid())
+
+
+def closeListing(client: AlgodClient, appID: int, sender: Account, assetID: int) -> None:
+    """Delete a persistent escrow, returning the units left and its funds to
+    the seller. Only the seller may close an escrow still on sale.
+    Args:
+        client: An algod client.
+        appID: The app ID of the escrow.
+        sender: The account deleting the escrow.
+        assetID: The ID of the asset.
+    """
+    txn = transaction.ApplicationDeleteTxn(
+        sender=sender.getAddress(),
+        index=appID,
+        accounts=[getAppCreator(client, appID)],
+        foreign_assets=[assetID],
+        sp=withFlatFee(getSuggestedParams(client), MIN_TXN_FEE + DELETE_INNER_FEES),
+    )
+    signedTxn = txn.sign(sender.getPrivateKey())
+    client.send_transaction(signedTxn)
+    waitForTransaction(client, signedTxn.get_txid())
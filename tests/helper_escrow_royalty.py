@@ -0,0 +1,193 @@
+from typing import List, Tuple
+
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+
+from contracts.abi import encode_call
+from contracts.escrow_royalty import (
+    CONTRACT,
+    DELETE_INNER_FEES,
+    SETUP_INNER_FEES,
+    TEAL_VERSION,
+    Royalty,
+    approval_program,
+    buy_inner_fees,
+    clear_state_program,
+    decode_royalties,
+    setup_funding,
+)
+from contracts.funding import MIN_TXN_FEE
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER
+from utils.account import Account
+from utils.helper import fullyCompileContract, getAppCreator, getAppGlobalState, waitForTransaction
+from utils.params import getSuggestedParams, withFlatFee
+
+# Global program
+APPROVAL_PROGRAM = b''
+CLEAR_STATE_PROGRAM = b''
+
+
+def getContracts(client: AlgodClient) -> Tuple[bytes, bytes]:
+    """Get the compiled TEAL contracts for the royalty escrow.
+    Args:
+        client: An algod client that has the ability to compile TEAL programs.
+    Returns:
+        A tuple of 2 byte strings. The first is the approval program, and the
+        second is the clear state program.
+    """
+    global APPROVAL_PROGRAM
+    global CLEAR_STATE_PROGRAM
+
+    if len(APPROVAL_PROGRAM) == 0:
+        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program(), version=TEAL_VERSION)
+        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program(), version=TEAL_VERSION)
+
+    return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
+
+
+def createApp(
+    client: AlgodClient,
+    creator: Account,
+    assetID: int,
+    royalties: List[Royalty],
+    feePercent: int = FEE_PERCENT,
+) -> int:
+    """Create a new royalty escrow.
+    Args:
+        client: An algod client.
+        creator: The account creating the escrow, which sells the asset.
+        assetID: The ID of the asset on sale.
+        royalties: The (address, share) of every royalty recipient, with the
+            share in basis points of the sale price.
+        feePercent: The percentage of the sale price paid to FEE_RECEIVER.
+    Returns:
+        The ID of the newly created escrow app.
+    """
+    approval, clear = getContracts(client)
+
+    txn = transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=transaction.StateSchema(num_uints=4, num_byte_slices=2),
+        local_schema=transaction.StateSchema(num_uints=0, num_byte_slices=0),
+        app_args=encode_call(CONTRACT, "create", assetID, FEE_RECEIVER, feePercent, royalties),
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(creator.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+
+    response = waitForTransaction(client, signedTxn.get_txid())
+    assert response.applicationIndex is not None and response.applicationIndex > 0
+    return response.applicationIndex
+
+
+def setupApp(
+    client: AlgodClient,
+    appID: int,
+    funder: Account,
+    assetID: int,
+    assetPrice: int,
+) -> None:
+    """Fund the escrow, opt it in to the asset and put the asset on sale at
+    `assetPrice`, in one atomic group.
+    Args:
+        client: An algod client.
+        appID: The app ID of the escrow.
+        funder: The creator of the escrow, holding the asset.
+        assetID: The ID of the asset.
+        assetPrice: The price of the asset.
+    """
+    appAddr = get_application_address(appID)
+    suggestedParams = getSuggestedParams(client)
+
+    fundAppTxn = transaction.PaymentTxn(
+        sender=funder.getAddress(),
+        receiver=appAddr,
+        amt=setup_funding(),
+        sp=suggestedParams,
+    )
+    setupTxn = transaction.ApplicationCallTxn(
+        sender=funder.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "on_setup", assetPrice),
+        foreign_assets=[assetID],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + SETUP_INNER_FEES),
+    )
+    fundNftTxn = transaction.AssetTransferTxn(
+        sender=funder.getAddress(),
+        receiver=appAddr,
+        index=assetID,
+        amt=1,
+        sp=suggestedParams,
+    )
+
+    signedTxns = [txn.sign(funder.getPrivateKey()) for txn in transaction.assign_group_id([fundAppTxn, setupTxn, fundNftTxn])]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[0].get_txid())
+
+
+def placeOrder(
+    client: AlgodClient,
+    appID: int,
+    buyer: Account,
+    assetID: int,
+    assetPrice: int,
+) -> str:
+    """Buy the asset on sale and close the escrow. The buy call pays the
+    marketplace fee, every royalty and the seller in one inner group.
+    Args:
+        client: An algod client.
+        appID: The app ID of the escrow.
+        buyer: The account buying the asset.
+        assetID: The ID of the asset.
+        assetPrice: The price of the asset.
+    Returns:
+        The ID of the buy call.
+    """
+    appAddr = get_application_address(appID)
+    creator = getAppCreator(client, appID)
+    recipients = [address for address, _ in decode_royalties(getAppGlobalState(client, appID))]
+    suggestedParams = getSuggestedParams(client)
+
+    optInTxn = transaction.AssetOptInTxn(
+        sender=buyer.getAddress(),
+        index=assetID,
+        sp=suggestedParams,
+    )
+    payTxn = transaction.PaymentTxn(
+        sender=buyer.getAddress(),
+        receiver=appAddr,
+        amt=assetPrice,
+        sp=suggestedParams,
+    )
+    buyTxn = transaction.ApplicationCallTxn(
+        sender=buyer.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "on_buy", 1),
+        foreign_assets=[assetID],
+        accounts=[FEE_RECEIVER, creator] + recipients,
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + buy_inner_fees(len(recipients))),
+    )
+    closeTxn = transaction.ApplicationDeleteTxn(
+        sender=buyer.getAddress(),
+        index=appID,
+        accounts=[creator],
+        foreign_assets=[assetID],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + DELETE_INNER_FEES),
+    )
+
+    txns = transaction.assign_group_id([optInTxn, payTxn, buyTxn, closeTxn])
+    signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in txns]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[-1].get_txid())
+    return signedTxns[2].get_txid()
@@ -0,0 +1,204 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from algosdk import encoding
+from algosdk.future import transaction
+from algosdk.v2client.algod import AlgodClient
+from pyteal import Mode, compileTeal
+
+from contracts.funding import MIN_TXN_FEE
+from contracts.listing import (
+    TEAL_VERSION,
+    TMPL_ASSET_AMOUNT,
+    TMPL_ASSET_ID,
+    TMPL_EXPIRY,
+    TMPL_FEE,
+    TMPL_FEE_RECEIVER,
+    TMPL_PRICE,
+    TMPL_SELLER,
+    listing_fee,
+    listing_program,
+)
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER
+from utils.account import Account
+from utils.helper import waitForTransaction
+from utils.params import getSuggestedParams, withFlatFee
+from utils.template import ProgramTemplate
+
+# Listings stay valid for about a week of rounds unless asked otherwise
+DEFAULT_VALID_ROUNDS = 200_000
+
+# Global template
+LISTING_TEMPLATE: Optional[ProgramTemplate] = None
+
+
+def getListingTemplate() -> ProgramTemplate:
+    """Get the listing program, assembled once with its template variables."""
+    global LISTING_TEMPLATE
+
+    if LISTING_TEMPLATE is None:
+        LISTING_TEMPLATE = ProgramTemplate(
+            compileTeal(listing_program(), mode=Mode.Signature, version=TEAL_VERSION)
+        )
+
+    return LISTING_TEMPLATE
+
+
+class Listing:
+    """A seller's signed authorization to sell assetAmount units of assetID
+    for price, plus fee to the fee receiver, until the expiry round."""
+
+    def __init__(
+        self,
+        seller: str,
+        assetID: int,
+        assetAmount: int,
+        price: int,
+        feeReceiver: str,
+        fee: int,
+        expiry: int,
+        lsig: transaction.LogicSigAccount,
+    ) -> None:
+        self.seller = seller
+        self.assetID = assetID
+        self.assetAmount = assetAmount
+        self.price = price
+        self.feeReceiver = feeReceiver
+        self.fee = fee
+        self.expiry = expiry
+        self.lsig = lsig
+
+    def toJson(self) -> Dict[str, Any]:
+        return {
+            "seller": self.seller,
+            "assetID": self.assetID,
+            "assetAmount": self.assetAmount,
+            "price": self.price,
+            "feeReceiver": self.feeReceiver,
+            "fee": self.fee,
+            "expiry": self.expiry,
+            "lsig": encoding.msgpack_encode(self.lsig),
+        }
+
+    @staticmethod
+    def fromJson(data: Dict[str, Any]) -> "Listing":
+        return Listing(
+            data["seller"],
+            data["assetID"],
+            data["assetAmount"],
+            data["price"],
+            data["feeReceiver"],
+            data["fee"],
+            data["expiry"],
+            encoding.future_msgpack_decode(data["lsig"]),
+        )
+
+
+def createListing(
+    client: AlgodClient,
+    seller: Account,
+    assetID: int,
+    price: int,
+    assetAmount: int = 1,
+    validRounds: int = DEFAULT_VALID_ROUNDS,
+) -> Listing:
+    """List an asset for sale, off-chain.
+    The seller signs the listing program filled in with the listing's terms,
+    which delegates the asset transfer of a sale to it. The program is
+    patched from the listing template, so nothing is compiled or sent to the
+    network.
+    Args:
+        client: An algod client, telling the current round.
+        seller: The account holding the asset.
+        assetID: The ID of the listed asset.
+        price: The price paid to the seller for assetAmount units.
+        assetAmount: The number of units sold with every purchase.
+        validRounds: The number of rounds from now the listing is valid for.
+    Returns:
+        The signed listing.
+    """
+    fee = listing_fee(price, FEE_PERCENT)
+    expiry = client.status()["last-round"] + validRounds
+    program = getListingTemplate().fill(
+        {
+            TMPL_SELLER: seller.getAddress(),
+            TMPL_ASSET_ID: assetID,
+            TMPL_ASSET_AMOUNT: assetAmount,
+            TMPL_PRICE: price,
+            TMPL_FEE_RECEIVER: FEE_RECEIVER,
+            TMPL_FEE: fee,
+            TMPL_EXPIRY: expiry,
+        },
+    )
+    lsig = transaction.LogicSigAccount(program)
+    lsig.sign(seller.getPrivateKey())
+    return Listing(seller.getAddress(), assetID, assetAmount, price, FEE_RECEIVER, fee, expiry, lsig)
+
+
+def saveListings(path: str, listings: List[Listing]) -> None:
+    """Store signed listings in a JSON file."""
+    with open(path, "w") as f:
+        json.dump([listing.toJson() for listing in listings], f)
+
+
+def loadListings(path: str) -> List[Listing]:
+    """Load the signed listings saveListings stored."""
+    with open(path) as f:
+        return [Listing.fromJson(data) for data in json.load(f)]
+
+
+def buildBuyTxns(
+    listing: Listing,
+    buyer: Account,
+    suggestedParams: transaction.SuggestedParams,
+) -> List[transaction.Transaction]:
+    """Build the grouped price payment, fee payment and asset transfer
+    transactions buying a listing. The price payment pays the fees of the
+    whole group."""
+    payTxn = transaction.PaymentTxn(
+        sender=buyer.getAddress(),
+        receiver=listing.seller,
+        amt=listing.price,
+        sp=withFlatFee(suggestedParams, 3 * MIN_TXN_FEE),
+    )
+
+    feeTxn = transaction.PaymentTxn(
+        sender=buyer.getAddress(),
+        receiver=listing.feeReceiver,
+        amt=listing.fee,
+        sp=withFlatFee(suggestedParams, 0),
+    )
+
+    transferTxn = transaction.AssetTransferTxn(
+        sender=listing.seller,
+        receiver=buyer.getAddress(),
+        index=listing.assetID,
+        amt=listing.assetAmount,
+        sp=withFlatFee(suggestedParams, 0),
+    )
+    # a listing can't be used past its expiry
+    transferTxn.last_valid_round = min(transferTxn.last_valid_round, listing.expiry)
+
+    transaction.assign_group_id([payTxn, feeTxn, transferTxn])
+    return [payTxn, feeTxn, transferTxn]
+
+
+def buyListing(client: AlgodClient, listing: Listing, buyer: Account) -> None:
+    """Buy a listing in one atomic group.
+    Args:
+        client: An algod client.
+        listing: The signed listing.
+        buyer: The account buying the listed asset. It must already be opted
+            in to the asset.
+    """
+    payTxn, feeTxn, transferTxn = buildBuyTxns(listing, buyer, getSuggestedParams(client))
+
+    signedTxns = [
+        payTxn.sign(buyer.getPrivateKey()),
+        feeTxn.sign(buyer.getPrivateKey()),
+        transaction.LogicSigTransaction(transferTxn, listing.lsig),
+    ]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[-1].get_txid())
@@ -0,0 +1,221 @@
+from typing import Dict, List, Optional, Tuple
+
+from algosdk import encoding
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+
+from contracts.marketplace import BUY_INNER_FEES, LISTING_DEPOSIT, MAX_LISTINGS, approval_program, clear_state_program
+from utils.account import Account
+from utils.helper import fullyCompileContract, getAppGlobalState, waitForTransaction
+from utils.params import getSuggestedParams
+
+# Global program
+APPROVAL_PROGRAM = b''
+CLEAR_STATE_PROGRAM = b''
+
+# the marketplace app account's own minimum balance
+APP_MIN_BALANCE = 100_000
+
+
+def getContracts(client: AlgodClient) -> Tuple[bytes, bytes]:
+    """Get the compiled TEAL contracts for the marketplace."""
+    global APPROVAL_PROGRAM
+    global CLEAR_STATE_PROGRAM
+
+    if len(APPROVAL_PROGRAM) == 0:
+        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program())
+        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program())
+
+    return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
+
+
+def createMarketplace(client: AlgodClient, creator: Account, feeReceiver: str, feePercent: int) -> int:
+    """Create a marketplace application and fund its account.
+    Args:
+        client: An algod client.
+        creator: The account creating the marketplace and paying the minimum
+            balance of its global state.
+        feeReceiver: The address receiving the fee of every sale.
+        feePercent: The fee, as a percentage of the sale price.
+    Returns:
+        The ID of the marketplace app.
+    """
+    approval, clear = getContracts(client)
+
+    txn = transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=transaction.StateSchema(num_uints=1, num_byte_slices=1 + MAX_LISTINGS),
+        local_schema=transaction.StateSchema(num_uints=0, num_byte_slices=0),
+        app_args=[encoding.decode_address(feeReceiver), feePercent.to_bytes(8, "big")],
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(creator.getPrivateKey())
+    client.send_transaction(signedTxn)
+    response = waitForTransaction(client, signedTxn.get_txid())
+    appID = response.applicationIndex
+
+    fundTxn = transaction.PaymentTxn(
+        sender=creator.getAddress(),
+        receiver=get_application_address(appID),
+        amt=APP_MIN_BALANCE,
+        sp=getSuggestedParams(client),
+    )
+    signedFundTxn = fundTxn.sign(creator.getPrivateKey())
+    client.send_transaction(signedFundTxn)
+    waitForTransaction(client, signedFundTxn.get_txid())
+
+    return appID
+
+
+def listingKey(assetID: int, seller: str) -> bytes:
+    return assetID.to_bytes(8, "big") + encoding.decode_address(seller)
+
+
+def getListings(client: AlgodClient, appID: int) -> Dict[Tuple[int, str], Tuple[int, int]]:
+    """Return the price and quantity of every listing, keyed by asset ID and seller."""
+    listings = {}
+    for key, value in getAppGlobalState(client, appID).items():
+        if len(key) != 40:
+            continue
+        assetID = int.from_bytes(key[:8], "big")
+        seller = encoding.encode_address(key[8:])
+        listings[(assetID, seller)] = (int.from_bytes(value[:8], "big"), int.from_bytes(value[8:], "big"))
+    return listings
+
+
+def buildListTxns(
+    appID: int,
+    seller: Account,
+    assetID: int,
+    assetPrice: int,
+    quantity: int,
+    suggestedParams: transaction.SuggestedParams,
+) -> List[transaction.Transaction]:
+    """Build the grouped deposit, setup and asset transfer of a listing."""
+    appAddr = get_application_address(appID)
+
+    depositTxn = transaction.PaymentTxn(
+        sender=seller.getAddress(),
+        receiver=appAddr,
+        amt=LISTING_DEPOSIT,
+        sp=suggestedParams,
+    )
+
+    setupTxn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[b"on_setup", assetPrice],
+        foreign_assets=[assetID],
+        sp=suggestedParams,
+    )
+
+    assetTxn = transaction.AssetTransferTxn(
+        sender=seller.getAddress(),
+        receiver=appAddr,
+        index=assetID,
+        amt=quantity,
+        sp=suggestedParams,
+    )
+
+    return transaction.assign_group_id([depositTxn, setupTxn, assetTxn])
+
+
+def listAsset(
+    client: AlgodClient,
+    appID: int,
+    seller: Account,
+    assetID: int,
+    assetPrice: int,
+    quantity: int = 1,
+) -> None:
+    """List `quantity` units of an asset at `assetPrice` microAlgos each.
+
+    The seller pays LISTING_DEPOSIT, refunded when the listing sells out or
+    is delisted.
+    """
+    txns = buildListTxns(appID, seller, assetID, assetPrice, quantity, getSuggestedParams(client))
+    signedTxns = [txn.sign(seller.getPrivateKey()) for txn in txns]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[1].get_txid())
+
+
+def buildBuyTxns(
+    appID: int,
+    buyer: Account,
+    seller: str,
+    assetID: int,
+    total: int,
+    quantity: int,
+    feeReceiver: str,
+    suggestedParams: transaction.SuggestedParams,
+) -> List[transaction.Transaction]:
+    """Build the grouped payment and buy call of a purchase."""
+    payTxn = transaction.PaymentTxn(
+        sender=buyer.getAddress(),
+        receiver=get_application_address(appID),
+        amt=total + BUY_INNER_FEES,
+        sp=suggestedParams,
+    )
+
+    buyTxn = transaction.ApplicationCallTxn(
+        sender=buyer.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[b"on_buy", quantity.to_bytes(8, "big")],
+        foreign_assets=[assetID],
+        accounts=[seller, feeReceiver],
+        sp=suggestedParams,
+    )
+
+    return transaction.assign_group_id([payTxn, buyTxn])
+
+
+def buyListing(
+    client: AlgodClient,
+    appID: int,
+    buyer: Account,
+    seller: str,
+    assetID: int,
+    quantity: int = 1,
+    price: Optional[int] = None,
+) -> None:
+    """Buy `quantity` units of the seller's listing of an asset.
+
+    The buyer must be opted in to the asset. The price is read from the
+    listing unless given.
+    """
+    state = getAppGlobalState(client, appID)
+    if price is None:
+        price = int.from_bytes(state[listingKey(assetID, seller)][:8], "big")
+    feeReceiver = encoding.encode_address(state[b"fr"])
+
+    txns = buildBuyTxns(appID, buyer, seller, assetID, price * quantity, quantity, feeReceiver, getSuggestedParams(client))
+    signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in txns]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[1].get_txid())
+
+
+def delistAsset(client: AlgodClient, appID: int, seller: Account, assetID: int) -> None:
+    """Return the unsold units of a listing and the deposit to the seller."""
+    txn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=[b"on_delist"],
+        foreign_assets=[assetID],
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(seller.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+
+    waitForTransaction(client, signedTxn.get_txid())
@@ -0,0 +1,123 @@
+import json
+import re
+import threading
+from base64 import b64encode
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from algosdk.error import AlgodHTTPError
+
+from utils.ledger import LocalAlgodClient
+
+
+class LedgerServer(ThreadingHTTPServer):
+    """Serves the algod REST API of a LocalAlgodClient over keep-alive HTTP."""
+
+    daemon_threads = True
+
+    def __init__(self, client: LocalAlgodClient) -> None:
+        super().__init__(("127.0.0.1", 0), _LedgerHandler)
+        self.client = client
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    @property
+    def address(self) -> str:
+        return "http://{}:{}".format(*self.server_address)
+
+    def route(self, method: str, path: str, query: dict, body: bytes) -> Tuple[Any, bool]:
+        """Return the response of a request and whether it is raw bytes."""
+        client = self.client
+        responseFormat = query.get("format", ["json"])[0]
+        if method == "POST" and path == "/v2/transactions":
+            return {"txId": client.send_raw_transaction(b64encode(body))}, False
+        if method == "POST" and path == "/v2/teal/compile":
+            return client.compile(body.decode()), False
+        if path == "/versions":
+            return client.versions(), False
+        if path == "/v2/status":
+            return client.status(), False
+        if path == "/v2/transactions/params":
+            sp = client.suggested_params()
+            return {
+                "fee": sp.fee,
+                "last-round": sp.first,
+                "genesis-hash": sp.gh,
+                "genesis-id": sp.gen,
+                "consensus-version": sp.consensus_version,
+                "min-fee": sp.min_fee,
+            }, False
+        match = re.fullmatch(r"/v2/status/wait-for-block-after/(\d+)", path)
+        if match:
+            return client.status_after_block(int(match.group(1))), False
+        match = re.fullmatch(r"/v2/transactions/pending/(\w+)", path)
+        if match:
+            return client.pending_transaction_info(match.group(1)), False
+        match = re.fullmatch(r"/v2/accounts/(\w+)", path)
+        if match:
+            return client.account_info(match.group(1)), False
+        match = re.fullmatch(r"/v2/applications/(\d+)", path)
+        if match:
+            return client.application_info(int(match.group(1))), False
+        match = re.fullmatch(r"/v2/assets/(\d+)", path)
+        if match:
+            return client.asset_info(int(match.group(1))), False
+        match = re.fullmatch(r"/v2/blocks/(\d+)", path)
+        if match:
+            block = client.block_info(int(match.group(1)), response_format=responseFormat)
+            return block, responseFormat == "msgpack"
+        raise AlgodHTTPError("not found", 404)
+
+
+class _LedgerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: LedgerServer
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def _handle(self, method: str) -> None:
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            with self.server.lock:
+                self.server.requests += 1
+                content, raw = self.server.route(method, url.path, parse_qs(url.query), body)
+            code = 200
+        except AlgodHTTPError as e:
+            code = e.code or 500
+            content, raw = {"message": str(e)}, False
+        payload = content if raw else json.dumps(content).encode()
+
+        self.send_response(code)
+        self.send_header("Content-Type", "application/msgpack" if raw else "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@contextmanager
+def serveLedger(client: LocalAlgodClient) -> Iterator[LedgerServer]:
+    server = LedgerServer(client)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
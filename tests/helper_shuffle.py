@@ -0,0 +1,381 @@
+from base64 import b64decode
+from hashlib import sha256
+from typing import List, Optional, Tuple
+
+from algosdk import account, encoding
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from algosdk.v2client.algod import AlgodClient
+
+from contracts.abi import encode_call
+from contracts.funding import MIN_TXN_FEE
+from contracts.shuffle import (
+    ADDRESS,
+    CLAIM_INNER_FEES,
+    CONTRACT,
+    DELETE_INNER_FEES,
+    DRAWN_SIZE,
+    ENTRY_ITEMS,
+    EXPIRE_INNER_FEES,
+    PURCHASE_SIZE,
+    GLOBAL_BYTE_SLICES,
+    GLOBAL_UINTS,
+    ITEM_SIZE,
+    PAGE_ENTRIES,
+    PAGE_ITEMS,
+    TEAL_VERSION,
+    TXID_SIZE,
+    approval_program,
+    clear_state_program,
+    page_funding,
+)
+from utils.account import Account
+from utils.helper import (
+    decodeState,
+    fullyCompileContract,
+    getAppCreator,
+    getAppGlobalState,
+    sendPacked,
+    waitForTransaction,
+)
+from utils.params import getSuggestedParams, withFlatFee
+
+# Global program
+APPROVAL_PROGRAM = b''
+CLEAR_STATE_PROGRAM = b''
+
+# Pages opted in per group, each behind the creator's payment funding it
+PAGES_PER_GROUP = 8
+
+
+def getContracts(client: AlgodClient) -> Tuple[bytes, bytes]:
+    """Get the compiled TEAL contracts for the shuffle.
+    Args:
+        client: An algod client that has the ability to compile TEAL programs.
+    Returns:
+        A tuple of 2 byte strings. The first is the approval program, and the
+        second is the clear state program.
+    """
+    global APPROVAL_PROGRAM
+    global CLEAR_STATE_PROGRAM
+
+    if len(APPROVAL_PROGRAM) == 0:
+        APPROVAL_PROGRAM = fullyCompileContract(client, approval_program(), version=TEAL_VERSION)
+        CLEAR_STATE_PROGRAM = fullyCompileContract(client, clear_state_program(), version=TEAL_VERSION)
+
+    return APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM
+
+
+class HashChainBeacon:
+    """The randomness of a shuffle's draws: a chain of `length` hashes of a
+    secret seed, revealed from its end.
+
+    The shuffle is created with the commitment, the hash of the first value,
+    and every draw reveals the next value, which must hash to the previous
+    one. The values are fixed once the shuffle is created, so whoever holds
+    the seed can withhold draws but not pick their outcome.
+    """
+
+    def __init__(self, seed: bytes, length: int) -> None:
+        values = [sha256(seed).digest()]
+        for _ in range(length):
+            values.append(sha256(values[-1]).digest())
+        values.reverse()
+        self.commitment = values[0]
+        self.values = values[1:]
+
+    def reveal(self, last: bytes) -> bytes:
+        """The value revealed after `last`, the value hashing to it. Draws
+        skipped by expired purchases reveal nothing, so the draws are not
+        counted."""
+        for value in self.values:
+            if sha256(value).digest() == last:
+                return value
+        raise ValueError("beacon has no value after {}".format(last.hex()))
+
+
+def createApp(client: AlgodClient, creator: Account, price: int, beacon: HashChainBeacon) -> int:
+    """Create a new shuffle.
+    Args:
+        client: An algod client.
+        creator: The account creating the shuffle, which holds the assets of
+            the drop and draws them.
+        price: The price of a draw.
+        beacon: The beacon seeding the draws.
+    Returns:
+        The ID of the newly created shuffle app.
+    """
+    approval, clear = getContracts(client)
+
+    txn = transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=transaction.StateSchema(num_uints=GLOBAL_UINTS, num_byte_slices=GLOBAL_BYTE_SLICES),
+        local_schema=transaction.StateSchema(num_uints=1, num_byte_slices=PAGE_ENTRIES),
+        app_args=encode_call(CONTRACT, "create", price, beacon.commitment),
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(creator.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+
+    response = waitForTransaction(client, signedTxn.get_txid())
+    assert response.applicationIndex is not None and response.applicationIndex > 0
+    return response.applicationIndex
+
+
+def mintDrop(client: AlgodClient, creator: Account, appID: int, count: int) -> List[int]:
+    """Create the `count` NFTs of a drop, held by the creator with the
+    shuffle as their clawback, so that drawing one transfers it. The
+    creations are sent packed into groups of 16.
+    Returns:
+        The IDs of the NFTs.
+    """
+    suggestedParams = getSuggestedParams(client)
+    txns = [
+        transaction.AssetCreateTxn(
+            sender=creator.getAddress(),
+            sp=suggestedParams,
+            total=1,
+            decimals=0,
+            default_frozen=False,
+            unit_name="DROP",
+            asset_name="Drop #{}".format(number),
+            clawback=get_application_address(appID),
+        )
+        for number in range(count)
+    ]
+
+    assetIDs = []
+    for txID, error in sendPacked(client, creator, txns):
+        if txID is None:
+            raise Exception("Mint failed: {}".format(error))
+        assetIDs.append(waitForTransaction(client, txID).assetIndex)
+    return assetIDs
+
+
+def addPages(client: AlgodClient, creator: Account, appID: int, count: int) -> List[Account]:
+    """Create `count` page accounts holding the pool of a shuffle. The
+    creator funds each one with page_funding and opts it in, several pages
+    per group.
+    Returns:
+        The page accounts, in the order of their page index.
+    """
+    pages = [Account(account.generate_account()[0]) for _ in range(count)]
+    suggestedParams = getSuggestedParams(client)
+    # the payment pays the opt-in's fee, leaving the page its minimum balance
+    payParams = withFlatFee(suggestedParams, 2 * MIN_TXN_FEE)
+    optInParams = withFlatFee(suggestedParams, 0)
+
+    for start in range(0, count, PAGES_PER_GROUP):
+        txns = []
+        for page in pages[start:start + PAGES_PER_GROUP]:
+            txns.append(transaction.PaymentTxn(creator.getAddress(), payParams, page.getAddress(), page_funding()))
+            txns.append(transaction.ApplicationOptInTxn(page.getAddress(), optInParams, appID))
+        transaction.assign_group_id(txns)
+        signers = [creator if index % 2 == 0 else pages[start + index // 2] for index in range(len(txns))]
+        signedTxns = [txn.sign(signer.getPrivateKey()) for txn, signer in zip(txns, signers)]
+
+        client.send_transactions(signedTxns)
+
+        waitForTransaction(client, signedTxns[-1].get_txid())
+    return pages
+
+
+def loadPool(client: AlgodClient, creator: Account, appID: int, pages: List[Account], assetIDs: List[int]) -> None:
+    """Load the IDs of a drop into an empty shuffle, filling a page per
+    call. The calls are sent packed into groups of 16, thousands of IDs per
+    group.
+    Args:
+        client: An algod client.
+        creator: The creator of the shuffle.
+        appID: The app ID of the shuffle.
+        pages: The page accounts of the shuffle, in order, enough of them to
+            hold every ID.
+        assetIDs: The IDs to load.
+    """
+    suggestedParams = getSuggestedParams(client)
+    txns = []
+    for page, start in zip(pages, range(0, len(assetIDs), PAGE_ITEMS)):
+        items = b"".join(assetID.to_bytes(ITEM_SIZE, "big") for assetID in assetIDs[start:start + PAGE_ITEMS])
+        txns.append(
+            transaction.ApplicationCallTxn(
+                sender=creator.getAddress(),
+                index=appID,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=encode_call(CONTRACT, "load", items),
+                accounts=[page.getAddress()],
+                sp=suggestedParams,
+            )
+        )
+
+    results = sendPacked(client, creator, txns)
+    for txID, error in results:
+        if txID is None:
+            raise Exception("Load failed: {}".format(error))
+    waitForTransaction(client, results[-1][0])
+
+
+def buyDraw(client: AlgodClient, appID: int, buyer: Account, price: int) -> int:
+    """Pay for a draw from a shuffle.
+    Returns:
+        The number of the purchase, to claim the drawn NFT with.
+    """
+    suggestedParams = getSuggestedParams(client)
+
+    payTxn = transaction.PaymentTxn(buyer.getAddress(), suggestedParams, get_application_address(appID), price)
+    buyTxn = transaction.ApplicationCallTxn(
+        sender=buyer.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "buy"),
+        # tells repeated purchases of the buyer apart within a round
+        note=getAppGlobalState(client, appID)[b"k"].to_bytes(8, "big"),
+        sp=suggestedParams,
+    )
+    signedTxns = [txn.sign(buyer.getPrivateKey()) for txn in transaction.assign_group_id([payTxn, buyTxn])]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[-1].get_txid())
+    # the purchase is stored under its number, the one byte slice the call sets
+    for change in client.pending_transaction_info(signedTxns[-1].get_txid())["global-state-delta"]:
+        if change["value"]["action"] == 1:
+            return int.from_bytes(b64decode(change["key"]), "big")
+    raise Exception("Purchase not recorded")
+
+
+def _readItem(client: AlgodClient, appID: int, page: str, index: int) -> int:
+    for localState in client.account_info(page).get("apps-local-state", []):
+        if localState["id"] == appID:
+            entries = decodeState(localState.get("key-value", []))
+            entry = entries[bytes([index % PAGE_ITEMS // ENTRY_ITEMS])]
+            offset = index % ENTRY_ITEMS * ITEM_SIZE
+            return int.from_bytes(entry[offset:offset + ITEM_SIZE], "big")
+    raise ValueError("{} is not a page of the shuffle".format(page))
+
+
+def drawItem(
+    client: AlgodClient,
+    appID: int,
+    drawer: Account,
+    beacon: HashChainBeacon,
+    pages: List[Account],
+) -> Tuple[int, int, str]:
+    """Draw the NFT of the oldest purchase of a shuffle not drawn yet.
+    The draw's index follows from the beacon's next value and the ID of the
+    purchase's buy call, so the pages the call references are known before
+    it is sent.
+    Returns:
+        The number of the purchase, the ID of the NFT drawn for it and the
+        ID of the draw call.
+    """
+    state = getAppGlobalState(client, appID)
+    draw = state[b"d"]
+    remaining = state[b"n"]
+    reveal = beacon.reveal(state[b"s"])
+    buyTxID = state.get(draw.to_bytes(8, "big"), b"")[ADDRESS:ADDRESS + TXID_SIZE]
+
+    index = int.from_bytes(sha256(reveal + buyTxID).digest()[:ITEM_SIZE], "big") % remaining
+    page = pages[index // PAGE_ITEMS].getAddress()
+    lastPage = pages[(remaining - 1) // PAGE_ITEMS].getAddress()
+    assetID = _readItem(client, appID, page, index)
+
+    txn = transaction.ApplicationCallTxn(
+        sender=drawer.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "draw", reveal),
+        accounts=[page, lastPage],
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(drawer.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+
+    waitForTransaction(client, signedTxn.get_txid())
+    return draw, assetID, signedTxn.get_txid()
+
+
+def _drawnItem(client: AlgodClient, appID: int, purchase: int) -> Tuple[str, int]:
+    claim = getAppGlobalState(client, appID).get(purchase.to_bytes(8, "big"), b"")
+    if len(claim) != DRAWN_SIZE:
+        raise ValueError("Purchase {} has no NFT to claim".format(purchase))
+    return encoding.encode_address(claim[:ADDRESS]), int.from_bytes(claim[ADDRESS:ADDRESS + ITEM_SIZE], "big")
+
+
+def claimItem(
+    client: AlgodClient, appID: int, buyer: Account, purchase: int, claimer: Optional[Account] = None
+) -> int:
+    """Opt in to the NFT drawn for a purchase and claim it.
+    Args:
+        client: An algod client.
+        appID: The app ID of the shuffle.
+        buyer: The buyer of the purchase, opting in to the NFT.
+        purchase: The number of the purchase.
+        claimer: The account sending the claim call, by default the buyer.
+            The NFT goes to the buyer whoever sends it.
+    Returns:
+        The ID of the NFT.
+    """
+    claimer = claimer or buyer
+    _, assetID = _drawnItem(client, appID, purchase)
+    suggestedParams = getSuggestedParams(client)
+
+    optInTxn = transaction.AssetOptInTxn(buyer.getAddress(), suggestedParams, assetID)
+    claimTxn = transaction.ApplicationCallTxn(
+        sender=claimer.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "claim", purchase),
+        accounts=[getAppCreator(client, appID), buyer.getAddress()],
+        foreign_assets=[assetID],
+        sp=withFlatFee(suggestedParams, MIN_TXN_FEE + CLAIM_INNER_FEES),
+    )
+    transaction.assign_group_id([optInTxn, claimTxn])
+    signedTxns = [optInTxn.sign(buyer.getPrivateKey()), claimTxn.sign(claimer.getPrivateKey())]
+
+    client.send_transactions(signedTxns)
+
+    waitForTransaction(client, signedTxns[-1].get_txid())
+    return assetID
+
+
+def expirePurchase(client: AlgodClient, appID: int, sender: Account, purchase: int) -> None:
+    """Refund the price of a purchase not drawn within CLAIM_ROUNDS of its
+    purchase, or whose NFT was not claimed within CLAIM_ROUNDS of its draw.
+    Anyone can send the call, the price goes back to the buyer."""
+    record = getAppGlobalState(client, appID).get(purchase.to_bytes(8, "big"), b"")
+    if len(record) not in (PURCHASE_SIZE, DRAWN_SIZE):
+        raise ValueError("Purchase {} is not pending".format(purchase))
+    buyer = encoding.encode_address(record[:ADDRESS])
+    txn = transaction.ApplicationCallTxn(
+        sender=sender.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "expire", purchase),
+        accounts=[buyer],
+        sp=withFlatFee(getSuggestedParams(client), MIN_TXN_FEE + EXPIRE_INNER_FEES),
+    )
+    signedTxn = txn.sign(sender.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+
+    waitForTransaction(client, signedTxn.get_txid())
+
+
+def closeShuffle(client: AlgodClient, appID: int, creator: Account) -> None:
+    """Delete a shuffle whose purchases are all claimed or refunded, sending
+    the proceeds to the creator."""
+    txn = transaction.ApplicationDeleteTxn(
+        sender=creator.getAddress(),
+        index=appID,
+        sp=withFlatFee(getSuggestedParams(client), MIN_TXN_FEE + DELETE_INNER_FEES),
+    )
+    signedTxn = txn.sign(creator.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+
+    waitForTransaction(client, signedTxn.get_txid())
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+
+from tests.helper_escrow import FEE_RECEIVER
+from tests.helper_escrow_aio import createApp, placeOrder, setupApp
+from tests.helper_server import serveLedger
+from utils.aio import AsyncAlgodClient, gatherLimited, getAppGlobalState, getBalances
+from utils.helper import createDummyAsset
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+
+
+async def listAndBuy(client, creator, buyer, assetID, assetPrice):
+    appID = await createApp(client, creator, assetID)
+    await setupApp(client, appID, creator, assetID, assetPrice)
+    assert (await getAppGlobalState(client, appID))[b"as"] == 2
+    await placeOrder(client, appID, buyer, assetID, assetPrice)
+    return appID
+
+
+def test_escrow_flow():
+    ledger = LocalAlgodClient()
+    ledger.fund(FEE_RECEIVER, 1_000_000)
+    creator = getTemporaryAccount(ledger)
+    buyer = getTemporaryAccount(ledger)
+    assetID = createDummyAsset(ledger, 1, creator)
+
+    async def run(address):
+        async with AsyncAlgodClient("", address) as client:
+            appID = await listAndBuy(client, creator, buyer, assetID, 1_000_000)
+            return await getBalances(client, get_application_address(appID)), await getBalances(client, buyer.getAddress())
+
+    with serveLedger(ledger) as server:
+        escrowBalances, buyerBalances = asyncio.run(run(server.address))
+
+    assert escrowBalances == {0: 0}
+    assert buyerBalances[assetID] == 1
+
+
+def test_concurrent_flows_share_connections():
+    ledger = LocalAlgodClient()
+    ledger.fund(FEE_RECEIVER, 1_000_000)
+    flows = []
+    for _ in range(12):
+        creator = getTemporaryAccount(ledger)
+        flows.append((creator, getTemporaryAccount(ledger), createDummyAsset(ledger, 1, creator)))
+
+    async def run(address):
+        async with AsyncAlgodClient("", address, maxConnections=3) as client:
+            return await gatherLimited(
+                (listAndBuy(client, creator, buyer, assetID, 1_000_000) for creator, buyer, assetID in flows),
+                limit=8,
+            )
+
+    with serveLedger(ledger) as server:
+        appIDs = asyncio.run(run(server.address))
+
+    assert len(set(appIDs)) == len(flows)
+    for (_, buyer, assetID) in flows:
+        assert ledger.account_info(buyer.getAddress())["assets"][0]["amount"] == 1
+    # every request went over one of at most three kept-alive connections
+    assert server.connections <= 3
+    assert server.requests > 10 * server.connections
+
+
+def test_http_errors():
+    async def run(address):
+        async with AsyncAlgodClient("", address) as client:
+            await client.application_info(12345)
+
+    with serveLedger(LocalAlgodClient()) as server:
+        with pytest.raises(AlgodHTTPError) as e:
+            asyncio.run(run(server.address))
+
+    assert e.value.code == 404
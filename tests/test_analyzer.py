@@ -0,0 +1,97 @@
+import json
+
+import msgpack
+
+from contracts.abi import method_selector
+from contracts.escrow import CONTRACT
+from tests.helper_escrow import createApp, placeOrder, setupApp, FEE_RECEIVER
+from utils.analyzer import DEFAULT_THRESHOLDS_PATH, UNBOUNDED, analyzeProgram, checkThresholds, contractReports
+from utils.helper import createDummyAsset
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.tracker import restoreBlockTxn, txIDFromMsgpack
+
+PROGRAM = """#pragma version 5
+txn ApplicationID
+int 0
+==
+bnz main_create
+txna ApplicationArgs 0
+byte "hash"
+==
+bnz main_hash
+txna ApplicationArgs 0
+byte "loop"
+==
+bnz main_loop
+err
+main_create:
+int 1
+return
+main_hash:
+byte "x"
+sha256
+callsub submit_0
+len
+return
+main_loop:
+int 1
+bnz main_loop
+int 1
+return
+submit_0:
+itxn_begin
+itxn_submit
+retsub
+"""
+
+
+def test_branches():
+    report = analyzeProgram(PROGRAM)
+
+    assert [branch.name for branch in report.branches] == ["create", "hash", "loop"]
+    create = report.branch("create")
+    # the prepended bytecblock, the dispatch test and the branch itself
+    assert create.cost == 1 + 4 + 2
+    assert create.innerTxns == 0
+
+    hash = report.branch("hash")
+    assert hash.cost == 1 + 8 + 1 + 35 + 1 + 3 + 2
+    assert hash.innerTxns == 1
+    assert hash.calls == ["submit_0"]
+    assert report.subroutines[0].size == 3
+
+    assert report.branch("loop").cost == UNBOUNDED
+    assert checkThresholds(report, {}) == ["program: branch loop cost unbounded exceeds 700"]
+
+
+def test_thresholds():
+    reports = contractReports()
+    with open(DEFAULT_THRESHOLDS_PATH) as f:
+        thresholds = json.load(f)
+
+    assert [v for report in reports for v in checkThresholds(report, thresholds)] == []
+
+    escrow = reports[0]
+    onBuy = escrow.branch("NoOp/on_buy")
+    tightened = {escrow.name: {"NoOp/on_buy": {"cost": onBuy.cost - 1}}}
+    assert checkThresholds(escrow, tightened) == [
+        "escrow_approval: branch NoOp/on_buy cost {} exceeds {}".format(onBuy.cost, onBuy.cost - 1)
+    ]
+
+
+def test_worst_case_bounds_measured_cost():
+    client = LocalAlgodClient()
+    client.fund(FEE_RECEIVER, 1_000_000)
+    creator = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetID = createDummyAsset(client, 1, creator)
+
+    appID = createApp(client, creator, assetID)
+    setupApp(client, appID, creator, assetID, 1_000_000)
+    placeOrder(client, appID, buyer, assetID, 1_000_000)
+
+    block = msgpack.unpackb(client.block_info(client.status()["last-round"], response_format="msgpack"), raw=False)["block"]
+    buyEntry = next(entry for entry in block["txns"] if entry["txn"].get("apaa", [b""])[0] == method_selector(CONTRACT, "on_buy"))
+    measured = client.getOpcodeCost(txIDFromMsgpack(restoreBlockTxn(buyEntry, block)))
+
+    assert 0 < measured <= contractReports()[0].branch("NoOp/on_buy").cost
@@ -0,0 +1,129 @@
+import json
+import os
+from base64 import b64encode
+from glob import glob
+
+import pytest
+from pyteal import Mode, compileTeal
+
+from contracts import auction, escrow, escrow_factory, listing
+from utils.assembler import assemble, assembleProgram, disassemble
+from utils.avm import UnknownOpcodeError
+from utils.cache import programHash
+from utils.peephole import optimizeTeal
+
+# Assembled programs: "algod" fixtures are recorded from algod's compile, and
+# check that the assembler matches it. "snapshot" fixtures are recorded from
+# the assembler itself, and only catch changes to its output.
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "teal")
+# The snapshots of the deployed contracts, see __main__
+CONTRACTS_DIR = os.path.join(FIXTURES_DIR, "contracts")
+
+# The approval programs as fullyCompileContract deploys them
+CONTRACTS = {
+    "escrow_approval": (escrow.approval_program, escrow.TEAL_VERSION),
+    "escrow_clear_state": (escrow.clear_state_program, escrow.TEAL_VERSION),
+    "escrow_factory_child_approval": (lambda: escrow.approval_program(factory=True), escrow.TEAL_VERSION),
+    "escrow_factory_approval": (escrow_factory.approval_program, escrow_factory.TEAL_VERSION),
+    "auction_approval": (auction.approval_program, auction.TEAL_VERSION),
+    "auction_clear_state": (auction.clear_state_program, auction.TEAL_VERSION),
+}
+
+# The listing program with its template variables filled in
+LISTING_VALUES = {
+    listing.TMPL_SELLER: "DPANDA7MC3CHRPXCORO4YBB56NKKCEEMREWO6VW2WT2NYXSADUTBRZCXWU",
+    listing.TMPL_ASSET_ID: "1234",
+    listing.TMPL_ASSET_AMOUNT: "1",
+    listing.TMPL_PRICE: "1000000",
+    listing.TMPL_FEE_RECEIVER: "DPANDA7MC3CHRPXCORO4YBB56NKKCEEMREWO6VW2WT2NYXSADUTBRZCXWU",
+    listing.TMPL_FEE: "50000",
+    listing.TMPL_EXPIRY: "200000",
+}
+
+
+def contractSource(name: str) -> str:
+    """The TEAL of a recorded contract, as it is deployed."""
+    if name == "listing":
+        teal = compileTeal(listing.listing_program(), mode=Mode.Signature, version=listing.TEAL_VERSION)
+        # longest names first, so no name is replaced inside another
+        for variable in sorted(LISTING_VALUES, key=len, reverse=True):
+            teal = teal.replace(variable, LISTING_VALUES[variable])
+        return teal
+    contract, version = CONTRACTS[name]
+    return optimizeTeal(compileTeal(contract(), mode=Mode.Application, version=version))
+
+
+RECORDED = sorted(CONTRACTS) + ["listing"]
+
+
+def loadFixtures():
+    fixtures = []
+    for path in sorted(glob(os.path.join(FIXTURES_DIR, "*.json"))):
+        with open(path) as f:
+            fixtures.append(pytest.param(json.load(f), id=os.path.basename(path)[:-5]))
+    return fixtures
+
+
+@pytest.mark.parametrize("fixture", loadFixtures())
+def test_matches_fixture(fixture):
+    assert fixture["origin"] in ("algod", "snapshot")
+    program = assemble(fixture["source"])
+
+    assert b64encode(program).decode() == fixture["result"]
+    assert programHash(program) == fixture["hash"]
+
+
+@pytest.mark.parametrize("name", sorted(CONTRACTS))
+def test_contract_round_trip(name):
+    contract, version = CONTRACTS[name]
+    teal = compileTeal(contract(), mode=Mode.Application, version=version)
+    program = assemble(teal)
+
+    # re-encoding the disassembly keeps every byte, including the constant blocks
+    assert assembleProgram(disassemble(program)) == program
+
+
+@pytest.mark.parametrize("name", RECORDED)
+def test_contract_matches_snapshot(name):
+    with open(os.path.join(CONTRACTS_DIR, name + ".json")) as f:
+        fixture = json.load(f)
+
+    # a change to the contract has to be recorded again, see __main__
+    assert fixture["source"] == contractSource(name)
+    program = assemble(fixture["source"])
+    assert b64encode(program).decode() == fixture["result"]
+    assert programHash(program) == fixture["hash"]
+
+
+def test_unknown_opcode():
+    with pytest.raises(UnknownOpcodeError):
+        assemble("#pragma version 5\nint 1\nbox_len\n")
+
+
+if __name__ == "__main__":
+    # Record the snapshots of the contracts for test_contract_matches_snapshot,
+    # or with --algod their compilation by the node of utils.setup
+    import sys
+
+    client = None
+    if "--algod" in sys.argv[1:]:
+        from utils.setup import getAlgodClient
+
+        client = getAlgodClient()
+    os.makedirs(CONTRACTS_DIR, exist_ok=True)
+    for name in RECORDED:
+        teal = contractSource(name)
+        if client is not None:
+            response = client.compile(teal)
+            fixture = {"origin": "algod", "source": teal, "result": response["result"], "hash": response["hash"]}
+        else:
+            program = assemble(teal)
+            fixture = {
+                "origin": "snapshot",
+                "source": teal,
+                "result": b64encode(program).decode(),
+                "hash": programHash(program),
+            }
+        with open(os.path.join(CONTRACTS_DIR, name + ".json"), "w") as f:
+            json.dump(fixture, f, indent=2)
+            f.write("\n")
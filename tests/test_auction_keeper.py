@@ -0,0 +1,217 @@
+from time import time
+
+import pytest
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+
+from tests.helper_auction import (
+    createApp,
+    setupApp,
+    placeBid,
+    closeAuction,
+    optInToAuction,
+    withdrawRefunds,
+)
+from tests.helper_auction_keeper import AuctionKeeper
+from utils.helper import createDummyAsset, getBalances, optInToAsset
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+
+
+def createAuction(client, seller, startTime, endTime, pullRefunds=False):
+    nftID = createDummyAsset(client, 1, seller)
+    appID = createApp(
+        client=client,
+        sender=seller,
+        seller=seller.getAddress(),
+        assetID=nftID,
+        startTime=startTime,
+        endTime=endTime,
+        reserve=1_000_000,
+        minBidIncrement=100_000,
+        pullRefunds=pullRefunds,
+    )
+    setupApp(client=client, appID=appID, funder=seller, nftHolder=seller, nftID=nftID, nftAmount=1)
+    return appID, nftID
+
+
+def isClosed(client, appID):
+    try:
+        client.application_info(appID)
+    except AlgodHTTPError:
+        return True
+    return False
+
+
+def test_settles_ended_auctions_in_batches():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    bidder = getTemporaryAccount(client)
+    keeper = AuctionKeeper(client, getTemporaryAccount(client))
+
+    startTime = int(time()) + 10
+    auctions = [createAuction(client, seller, startTime, startTime + 30 + i % 2 * 60) for i in range(20)]
+    for appID, nftID in auctions:
+        keeper.track(appID)
+        keeper.track(appID)
+    assert keeper.pending() == len(auctions)
+
+    client.advanceTo(startTime + 5)
+    for appID, nftID in auctions[:4]:
+        optInToAsset(client, nftID, bidder)
+        placeBid(client, appID, bidder, 1_000_000)
+    assert keeper.settleDue() == []
+
+    # closed by hand before the keeper gets to it
+    client.advanceTo(startTime + 30)
+    closeAuction(client, auctions[2][0], seller)
+
+    roundBefore = client.status()["last-round"]
+    settled = keeper.settleDue()
+
+    # the 9 remaining auctions ending first fit a single group
+    assert sorted(settled) == sorted(appID for appID, _ in auctions[0::2] if appID != auctions[2][0])
+    assert client.status()["last-round"] == roundBefore + 1
+    assert all(isClosed(client, appID) for appID, _ in auctions[0::2])
+    assert getBalances(client, bidder.getAddress())[auctions[0][1]] == 1
+    assert getBalances(client, bidder.getAddress())[auctions[2][1]] == 1
+    assert keeper.pending() == 10
+
+    client.advanceTo(startTime + 90)
+    assert sorted(keeper.run(rounds=2)) == sorted(appID for appID, _ in auctions[1::2])
+    assert getBalances(client, bidder.getAddress())[auctions[1][1]] == 1
+    assert keeper.pending() == 0
+    assert keeper.failed == {}
+
+
+def test_retries_rejected_close():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    bidders = [getTemporaryAccount(client) for _ in range(2)]
+    keeper = AuctionKeeper(client, getTemporaryAccount(client), maxAttempts=2)
+
+    startTime = int(time()) + 10
+    appID, nftID = createAuction(client, seller, startTime, startTime + 30, pullRefunds=True)
+    keeper.track(appID)
+    for bidder in bidders:
+        optInToAsset(client, nftID, bidder)
+        optInToAuction(client, appID, bidder)
+
+    client.advanceTo(startTime + 5)
+    placeBid(client, appID, bidders[0], 1_000_000)
+    placeBid(client, appID, bidders[1], 1_100_000)
+
+    # the auction is settled, but cannot be deleted while it owes a refund
+    # to a bidder the keeper does not know of
+    client.advanceTo(startTime + 30)
+    assert keeper.settleDue() == []
+    assert keeper.pending() == 1
+    assert getBalances(client, bidders[1].getAddress())[nftID] == 1
+
+    withdrawRefunds(client, appID, bidders[0], [bidders[0].getAddress()])
+    assert keeper.settleDue() == [appID]
+    assert isClosed(client, appID)
+
+
+def test_withdraws_refunds_before_close():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    bidders = [getTemporaryAccount(client) for _ in range(6)]
+    keeper = AuctionKeeper(client, getTemporaryAccount(client))
+
+    startTime = int(time()) + 10
+    appID, nftID = createAuction(client, seller, startTime, startTime + 30, pullRefunds=True)
+    keeper.track(appID, [bidder.getAddress() for bidder in bidders[:3]])
+    keeper.track(appID, [bidder.getAddress() for bidder in bidders[3:]])
+
+    client.advanceTo(startTime + 5)
+    for index, bidder in enumerate(bidders):
+        optInToAsset(client, nftID, bidder)
+        optInToAuction(client, appID, bidder)
+        placeBid(client, appID, bidder, 1_000_000 + index * 100_000)
+    before = [getBalances(client, bidder.getAddress())[0] for bidder in bidders]
+
+    # the 5 refunds take two withdraw calls, sent along with the settle and
+    # delete calls
+    client.advanceTo(startTime + 30)
+    assert keeper.settleDue() == [appID]
+    assert isClosed(client, appID)
+    assert [getBalances(client, bidder.getAddress())[0] for bidder in bidders] == [
+        balance + 1_000_000 + index * 100_000 for index, balance in enumerate(before[:5])
+    ] + [before[5]]
+    assert getBalances(client, bidders[5].getAddress())[nftID] == 1
+    assert keeper.failed == {}
+
+
+class DroppingClient(LocalAlgodClient):
+    """Accepts the first delete call of `dropApp` without committing it, and
+    reports it dropped from the pool."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.dropApp = None
+        self.dropped = None
+
+    def send_transaction(self, txn, **kwargs):
+        isDelete = (
+            isinstance(txn.transaction, transaction.ApplicationDeleteTxn) and txn.transaction.index == self.dropApp
+        )
+        if self.dropped is None and isDelete:
+            self.dropped = txn.get_txid()
+            return self.dropped
+        return super().send_transaction(txn, **kwargs)
+
+    def pending_transaction_info(self, transaction_id, *args, **kwargs):
+        if transaction_id == self.dropped:
+            return {"pool-error": "overspend", "txn": {}}
+        return super().pending_transaction_info(transaction_id, *args, **kwargs)
+
+
+def test_gives_up_after_max_attempts():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    bidders = [getTemporaryAccount(client) for _ in range(2)]
+    keeper = AuctionKeeper(client, getTemporaryAccount(client), maxAttempts=2)
+
+    startTime = int(time()) + 10
+    appID, nftID = createAuction(client, seller, startTime, startTime + 30, pullRefunds=True)
+    keeper.track(appID)
+    for bidder in bidders:
+        optInToAsset(client, nftID, bidder)
+        optInToAuction(client, appID, bidder)
+
+    client.advanceTo(startTime + 5)
+    placeBid(client, appID, bidders[0], 1_000_000)
+    placeBid(client, appID, bidders[1], 1_100_000)
+
+    # a refund is still owed to a bidder the keeper does not know of
+    client.advanceTo(startTime + 30)
+    assert keeper.run(rounds=3) == []
+    assert keeper.pending() == 0
+    assert appID in keeper.failed
+    assert not isClosed(client, appID)
+    # but the winner and the seller have been paid out
+    assert getBalances(client, bidders[1].getAddress())[nftID] == 1
+    with pytest.raises(AlgodHTTPError):
+        closeAuction(client, appID, seller)
+
+
+def test_requeues_dropped_close():
+    client = DroppingClient()
+    seller = getTemporaryAccount(client)
+    keeper = AuctionKeeper(client, getTemporaryAccount(client))
+
+    startTime = int(time()) + 10
+    appID, nftID = createAuction(client, seller, startTime, startTime + 30)
+    keeper.track(appID)
+    client.dropApp = appID
+
+    # accepted by algod, but dropped before confirming
+    client.advanceTo(startTime + 30)
+    assert keeper.settleDue() == []
+    assert client.dropped is not None
+    assert keeper.pending() == 1
+    assert not isClosed(client, appID)
+
+    assert keeper.settleDue() == [appID]
+    assert isClosed(client, appID)
+    assert keeper.failed == {}
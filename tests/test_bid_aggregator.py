@@ -0,0 +1,116 @@
+from time import time
+
+import pytest
+from algosdk import encoding
+
+from contracts.auction import decode_state
+from tests.helper_auction import buildBidTxns, createApp, setupApp
+from tests.helper_bid_aggregator import FORWARDED, OUTBID, REJECTED, BidAggregator, BidReceipt
+from utils.helper import createDummyAsset, getAppGlobalState, getBalances, optInToAsset
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+
+
+def createAuction(client):
+    seller = getTemporaryAccount(client)
+    nftID = createDummyAsset(client, 1, seller)
+    startTime = int(time()) + 10
+
+    appID = createApp(
+        client=client,
+        sender=seller,
+        seller=seller.getAddress(),
+        assetID=nftID,
+        startTime=startTime,
+        endTime=startTime + 60,
+        reserve=1_000_000,
+        minBidIncrement=100_000,
+    )
+    setupApp(client=client, appID=appID, funder=seller, nftHolder=seller, nftID=nftID, nftAmount=1)
+    client.advanceTo(startTime + 5)
+    return appID, nftID
+
+
+def signBid(client, appID, bidder, amount):
+    return [txn.sign(bidder.getPrivateKey()) for txn in buildBidTxns(client, appID, bidder.getAddress(), amount)]
+
+
+def test_forwards_highest_bid():
+    client = LocalAlgodClient()
+    appID, nftID = createAuction(client)
+    aggregator = getTemporaryAccount(client)
+    bidders = [getTemporaryAccount(client) for _ in range(10)]
+    for bidder in bidders:
+        optInToAsset(client, nftID, bidder)
+    balances = {bidder.getAddress(): getBalances(client, bidder.getAddress())[0] for bidder in bidders}
+
+    service = BidAggregator(client, aggregator)
+    amounts = [500_000 + 10_000 * ((3 * index) % 10) for index in range(10)]
+    for bidder, amount in zip(bidders, amounts):
+        service.collect(signBid(client, appID, bidder, amount))
+    receipts = service.flush()
+
+    # a single group reaches the ledger for the ten bids
+    assert [receipt.status for receipt in receipts].count(FORWARDED) == 1
+    assert [receipt.status for receipt in receipts].count(OUTBID) == 9
+    [winner] = [receipt for receipt in receipts if receipt.status == FORWARDED]
+    assert winner.bidAmount == max(amounts)
+    state = decode_state(getAppGlobalState(client, appID))
+    assert (state["bid_amount"], state["num_bids"]) == (max(amounts), 1)
+    assert state["bid_account"] == encoding.decode_address(winner.bidder)
+    assert client.pending_transaction_info(winner.txID)["confirmed-round"] > 0
+    for bidder in bidders:
+        if bidder.getAddress() != winner.bidder:
+            assert getBalances(client, bidder.getAddress())[0] == balances[bidder.getAddress()]
+
+    for receipt in receipts:
+        assert BidReceipt.fromJson(receipt.toJson()).verify(aggregator.getAddress())
+        assert not receipt.verify(bidders[0].getAddress())
+    winner.bidAmount += 1
+    assert not winner.verify(aggregator.getAddress())
+
+    # the next round's bids are built against the new lead bid
+    outbid = next(bidder for bidder in bidders if bidder.getAddress() != receipts[0].bidder)
+    service.collect(signBid(client, appID, outbid, max(amounts) + 100_000))
+    assert [receipt.status for receipt in service.flush()] == [FORWARDED]
+    assert decode_state(getAppGlobalState(client, appID))["num_bids"] == 2
+
+
+def test_collect_rejects_invalid_bids():
+    client = LocalAlgodClient()
+    appID, nftID = createAuction(client)
+    bidder = getTemporaryAccount(client)
+    other = getTemporaryAccount(client)
+    optInToAsset(client, nftID, bidder)
+    service = BidAggregator(client, getTemporaryAccount(client))
+
+    payTxn, appCallTxn = buildBidTxns(client, appID, bidder.getAddress(), 500_000)
+    with pytest.raises(ValueError):
+        service.collect([payTxn.sign(other.getPrivateKey()), appCallTxn.sign(bidder.getPrivateKey())])
+    with pytest.raises(ValueError):
+        service.collect([appCallTxn.sign(bidder.getPrivateKey())])
+
+    service.collect(signBid(client, appID, bidder, 500_000))
+    assert [receipt.status for receipt in service.flush()] == [FORWARDED]
+    # below the lead bid plus the minimum increment
+    with pytest.raises(ValueError):
+        service.collect(signBid(client, appID, other, 550_000))
+
+
+def test_rejected_bid_falls_back():
+    client = LocalAlgodClient()
+    appID, nftID = createAuction(client)
+    bidder = getTemporaryAccount(client)
+    # not opted in to the NFT, so the auction rejects the bid
+    highBidder = getTemporaryAccount(client)
+    optInToAsset(client, nftID, bidder)
+    service = BidAggregator(client, getTemporaryAccount(client))
+
+    service.collect(signBid(client, appID, bidder, 500_000))
+    service.collect(signBid(client, appID, highBidder, 900_000))
+    receipts = service.flush()
+
+    assert [(receipt.bidder, receipt.status) for receipt in receipts] == [
+        (highBidder.getAddress(), REJECTED),
+        (bidder.getAddress(), FORWARDED),
+    ]
+    assert decode_state(getAppGlobalState(client, appID))["bid_amount"] == 500_000
@@ -0,0 +1,126 @@
+from multiprocessing import Pool
+
+from contracts.escrow import TEAL_VERSION, approval_program
+from utils.cache import CompileCache, compilerIdentity, nodeBuild, programHash
+from utils.helper import fullyCompileContract
+from utils.ledger import LocalAlgodClient
+
+
+class CountingCache(CompileCache):
+    def __init__(self, directory) -> None:
+        super().__init__(directory)
+        self.puts = 0
+
+    def put(self, key, program, hash):
+        self.puts += 1
+        super().put(key, program, hash)
+
+
+def test_compile_is_reused(tmp_path):
+    client = LocalAlgodClient()
+
+    firstCache = CountingCache(tmp_path)
+    first = fullyCompileContract(client, approval_program(), firstCache, TEAL_VERSION)
+    # a fresh cache object over the same directory, as after a restart
+    secondCache = CountingCache(tmp_path)
+    second = fullyCompileContract(client, approval_program(), secondCache, TEAL_VERSION)
+
+    assert first == second
+    assert firstCache.puts == 1
+    assert secondCache.puts == 0
+
+
+def test_assembler_change_is_a_miss(tmp_path, monkeypatch):
+    client = LocalAlgodClient()
+    cache = CountingCache(tmp_path)
+    fullyCompileContract(client, approval_program(), cache, TEAL_VERSION)
+
+    # as after a fix to utils/assembler.py
+    monkeypatch.setattr("utils.assembler._IDENTITY", "utils.assembler:fixed")
+    fullyCompileContract(client, approval_program(), cache, TEAL_VERSION)
+    fullyCompileContract(client, approval_program(), cache, TEAL_VERSION)
+
+    assert cache.puts == 2
+
+
+def test_key_separates_version_and_compiler():
+    keys = {
+        CompileCache.key("int 1", 5, "algod:a"),
+        CompileCache.key("int 1", 6, "algod:a"),
+        CompileCache.key("int 1", 5, "algod:b"),
+        CompileCache.key("int 2", 5, "algod:a"),
+    }
+    assert len(keys) == 4
+
+
+class UpgradingClient(LocalAlgodClient):
+    def __init__(self, build) -> None:
+        super().__init__()
+        self.build = build
+        self.asked = 0
+
+    def versions(self, **kwargs):
+        self.asked += 1
+        versions = super().versions()
+        versions["build"]["build_number"] = self.build
+        return versions
+
+
+def test_identity_follows_node_build():
+    client = UpgradingClient(1)
+    upgraded = UpgradingClient(2)
+
+    identity = compilerIdentity(client, nodeBuild(client))
+    assert compilerIdentity(client, nodeBuild(client)) == identity
+    # the build is asked once per client
+    assert client.asked == 1
+    assert compilerIdentity(upgraded, nodeBuild(upgraded)) != identity
+
+
+def test_damaged_entry_is_a_miss(tmp_path):
+    cache = CompileCache(tmp_path)
+    key = cache.key("int 1", 5, "test")
+    cache.put(key, b"\x05\x81\x01", programHash(b"\x05\x81\x01"))
+
+    cache.path(key).write_text("{not json")
+    assert cache.get(key) is None
+    assert not cache.path(key).exists()
+
+    cache.put(key, b"\x05\x81\x01", programHash(b"\x05\x81\x02"))
+    assert cache.get(key) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    program = bytes(1000)
+    cache = CompileCache(tmp_path, maxBytes=3_000)
+
+    keys = [cache.key(str(i), 5, "test") for i in range(3)]
+    for key in keys:
+        cache.put(key, program, programHash(program))
+    assert all(cache.get(key) is not None for key in keys[1:])
+
+    # the entries are ~1.4kB each, so only two fit
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is not None
+
+    cache.put(cache.key("3", 5, "test"), program, programHash(program))
+    assert cache.get(keys[2]) is None
+    assert cache.get(keys[1]) is not None
+
+
+def _putAndGet(args):
+    directory, index = args
+    cache = CompileCache(directory, maxBytes=20_000)
+    program = bytes([5]) + index.to_bytes(2, "big") * 100
+    key = cache.key(str(index % 4), 5, "test")
+    cache.put(key, program, programHash(program))
+    entry = cache.get(key)
+    return entry is None or entry[1] == programHash(entry[0])
+
+
+def test_concurrent_writers(tmp_path):
+    with Pool(4) as pool:
+        results = pool.map(_putAndGet, [(str(tmp_path), i) for i in range(64)])
+
+    assert all(results)
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp-")]
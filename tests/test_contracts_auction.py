@@ -1,19 +1,53 @@
 from time import time
 
+import pytest
 from algosdk import encoding
+from algosdk.future import transaction
 from algosdk.logic import get_application_address
 
-from tests.helper_auction import createApp, setupApp
-from utils.account import Account
-from utils.helper import getAppGlobalState, getBalances, createDummyAsset
-from utils.setup import getAlgodClient, get_account_credentials
+from contracts.abi import encode_call
+from contracts.auction import (
+    BID_FIELDS,
+    BID_KEY,
+    CONTRACT,
+    DELETE_INNER_FEES,
+    PARAMS_FIELDS,
+    PARAMS_KEY,
+    PULL_CONTRACT,
+    decode_state,
+    encode_state,
+    setup_funding,
+    state_schemas,
+)
+from contracts.funding import MIN_TXN_FEE
+from tests.helper_auction import (
+    createApp,
+    getContracts,
+    setupApp,
+    placeBid,
+    closeAuction,
+    getRefund,
+    optInToAuction,
+    settleAuction,
+    withdrawRefunds,
+)
+from utils.helper import (
+    getAppGlobalState,
+    getBalances,
+    createDummyAsset,
+    getLastBlockTimestamp,
+    optInToAsset,
+    waitForTransaction,
+)
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.params import getSuggestedParams
 
 
 def test_create():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
-    creator_pk, creator_a, creator_m = get_account_credentials(1)
-    seller_pk, seller_a, seller_m = get_account_credentials(2)
+    creator = getTemporaryAccount(client)
+    seller = getTemporaryAccount(client)
 
     assetID = 1  # fake ID
     startTime = int(time()) + 10  # start time is 10 seconds in the future
@@ -23,8 +57,8 @@ def test_create():
 
     appID = createApp(
         client=client,
-        sender=Account(creator_pk),
-        seller=seller_a,
+        sender=creator,
+        seller=seller.getAddress(),
         assetID=assetID,
         startTime=startTime,
         endTime=endTime,
@@ -32,29 +66,79 @@ def test_create():
         minBidIncrement=increment,
     )
 
-    actual = getAppGlobalState(client, appID)
+    state = getAppGlobalState(client, appID)
+    # every field is packed into the two values
+    assert {key: len(value) for key, value in state.items()} == {PARAMS_KEY: 80, BID_KEY: 48}
+
+    actual = decode_state(state)
     expected = {
-        b"seller": encoding.decode_address(seller_a),
-        b"nft_id": assetID,
-        b"start": startTime,
-        b"end": endTime,
-        b"reserve_amount": reserve,
-        b"min_bid_inc": increment,
-        b"bid_account": bytes(32), # decoded zero address
-        b"fee_percent": 1,
+        "seller": encoding.decode_address(seller.getAddress()),
+        "nft_id": assetID,
+        "start": startTime,
+        "end": endTime,
+        "reserve_amount": reserve,
+        "min_bid_inc": increment,
+        "bid_account": bytes(32), # decoded zero address
+        "bid_amount": 0,
+        "num_bids": 0,
+        "fee_percent": 1,
     }
 
     assert actual == expected
 
 
+def test_create_checks_argument_count():
+    client = LocalAlgodClient()
+
+    creator = getTemporaryAccount(client)
+    approval, clear = getContracts(client)
+    (globalUints, globalByteSlices), _ = state_schemas()
+    startTime = int(time()) + 10
+    args = encode_call(CONTRACT, "create", creator.getAddress(), 1, startTime, startTime + 60, 1_000_000, 100_000, 1)
+
+    # an argument past the parameters is rejected rather than ignored
+    txn = transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=transaction.StateSchema(num_uints=globalUints, num_byte_slices=globalByteSlices),
+        local_schema=transaction.StateSchema(num_uints=0, num_byte_slices=0),
+        app_args=args + [b"extra"],
+        sp=getSuggestedParams(client),
+    )
+    with pytest.raises(Exception):
+        client.send_transaction(txn.sign(creator.getPrivateKey()))
+
+
+def test_encode_state():
+    params = {
+        "seller": bytes(range(32)),
+        "nft_id": 1,
+        "start": 2,
+        "end": 3,
+        "reserve_amount": 4,
+        "min_bid_inc": 5,
+        "fee_percent": 6,
+    }
+    bid = {"bid_account": bytes(32), "bid_amount": 7, "num_bids": 8}
+    state = {PARAMS_KEY: encode_state(PARAMS_FIELDS, params), BID_KEY: encode_state(BID_FIELDS, bid)}
+
+    assert state[PARAMS_KEY][32:40] == (1).to_bytes(8, "big")
+    assert decode_state(state) == {**params, **bid}
+
+    with pytest.raises(ValueError):
+        encode_state(BID_FIELDS, {**bid, "bid_account": bytes(31)})
+
+
 def test_setup():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
-    creator_pk, creator_a, creator_m = get_account_credentials(1)
-    seller_pk, seller_a, seller_m = get_account_credentials(2)
+    creator = getTemporaryAccount(client)
+    seller = getTemporaryAccount(client)
 
     nftAmount = 1
-    assetID = createDummyAsset(client, 1, Account(creator_pk))
+    assetID = createDummyAsset(client, 1, creator)
 
     startTime = int(time()) + 10  # start time is 10 seconds in the future
     endTime = startTime + 60  # end time is 1 minute after start
@@ -63,8 +147,8 @@ def test_setup():
 
     appID = createApp(
         client=client,
-        sender=Account(creator_pk),
-        seller=creator_a,
+        sender=creator,
+        seller=creator.getAddress(),
         assetID=assetID,
         startTime=startTime,
         endTime=endTime,
@@ -75,34 +159,36 @@ def test_setup():
     setupApp(
         client=client,
         appID=appID,
-        funder=Account(creator_pk),
-        nftHolder=Account(creator_pk),
+        funder=creator,
+        nftHolder=creator,
         nftID=assetID,
         nftAmount=nftAmount,
     )
 
-    actualState = getAppGlobalState(client, appID)
+    actualState = decode_state(getAppGlobalState(client, appID))
     expectedState = {
-        b"seller": encoding.decode_address(creator_a),
-        b"nft_id": assetID,
-        b"start": startTime,
-        b"end": endTime,
-        b"reserve_amount": reserve,
-        b"min_bid_inc": increment,
-        b"bid_account": bytes(32),  # decoded zero address
-        b"fee_percent": 1,
+        "seller": encoding.decode_address(creator.getAddress()),
+        "nft_id": assetID,
+        "start": startTime,
+        "end": endTime,
+        "reserve_amount": reserve,
+        "min_bid_inc": increment,
+        "bid_account": bytes(32),  # decoded zero address
+        "bid_amount": 0,
+        "num_bids": 0,
+        "fee_percent": 1,
     }
 
     assert actualState == expectedState
 
     actualBalances = getBalances(client, get_application_address(appID))
-    expectedBalances = {0: 2 * 100_000 + 3 * 1_000, assetID: nftAmount}
+    expectedBalances = {0: 2 * 100_000, assetID: nftAmount}
 
     assert actualBalances == expectedBalances
 
 
 def test_first_bid_before_start():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
     creator = getTemporaryAccount(client)
     seller = getTemporaryAccount(client)
@@ -115,18 +201,18 @@ def test_first_bid_before_start():
     reserve = 1_000_000  # 1 Algo
     increment = 100_000  # 0.1 Algo
 
-    appID = createAuctionApp(
+    appID = createApp(
         client=client,
         sender=creator,
         seller=seller.getAddress(),
-        nftID=nftID,
+        assetID=nftID,
         startTime=startTime,
         endTime=endTime,
         reserve=reserve,
         minBidIncrement=increment,
     )
 
-    setupAuctionApp(
+    setupApp(
         client=client,
         appID=appID,
         funder=creator,
@@ -136,6 +222,7 @@ def test_first_bid_before_start():
     )
 
     bidder = getTemporaryAccount(client)
+    optInToAsset(client, nftID, bidder)
 
     _, lastRoundTime = getLastBlockTimestamp(client)
     assert lastRoundTime < startTime
@@ -146,7 +233,7 @@ def test_first_bid_before_start():
 
 
 def test_first_bid():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
     creator = getTemporaryAccount(client)
     seller = getTemporaryAccount(client)
@@ -159,18 +246,18 @@ def test_first_bid():
     reserve = 1_000_000  # 1 Algo
     increment = 100_000  # 0.1 Algo
 
-    appID = createAuctionApp(
+    appID = createApp(
         client=client,
         sender=creator,
         seller=seller.getAddress(),
-        nftID=nftID,
+        assetID=nftID,
         startTime=startTime,
         endTime=endTime,
         reserve=reserve,
         minBidIncrement=increment,
     )
 
-    setupAuctionApp(
+    setupApp(
         client=client,
         appID=appID,
         funder=creator,
@@ -180,37 +267,37 @@ def test_first_bid():
     )
 
     bidder = getTemporaryAccount(client)
+    optInToAsset(client, nftID, bidder)
 
-    _, lastRoundTime = getLastBlockTimestamp(client)
-    if lastRoundTime < startTime + 5:
-        sleep(startTime + 5 - lastRoundTime)
+    client.advanceTo(startTime + 5)
 
     bidAmount = 500_000  # 0.5 Algos
     placeBid(client=client, appID=appID, bidder=bidder, bidAmount=bidAmount)
 
-    actualState = getAppGlobalState(client, appID)
+    actualState = decode_state(getAppGlobalState(client, appID))
     expectedState = {
-        b"seller": encoding.decode_address(seller.getAddress()),
-        b"nft_id": nftID,
-        b"start": startTime,
-        b"end": endTime,
-        b"reserve_amount": reserve,
-        b"min_bid_inc": increment,
-        b"num_bids": 1,
-        b"bid_amount": bidAmount,
-        b"bid_account": encoding.decode_address(bidder.getAddress()),
+        "seller": encoding.decode_address(seller.getAddress()),
+        "nft_id": nftID,
+        "start": startTime,
+        "end": endTime,
+        "reserve_amount": reserve,
+        "min_bid_inc": increment,
+        "fee_percent": 1,
+        "num_bids": 1,
+        "bid_amount": bidAmount,
+        "bid_account": encoding.decode_address(bidder.getAddress()),
     }
 
     assert actualState == expectedState
 
     actualBalances = getBalances(client, get_application_address(appID))
-    expectedBalances = {0: 2 * 100_000 + 2 * 1_000 + bidAmount, nftID: nftAmount}
+    expectedBalances = {0: 2 * 100_000 + bidAmount, nftID: nftAmount}
 
     assert actualBalances == expectedBalances
 
 
 def test_second_bid():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
     creator = getTemporaryAccount(client)
     seller = getTemporaryAccount(client)
@@ -223,18 +310,18 @@ def test_second_bid():
     reserve = 1_000_000  # 1 Algo
     increment = 100_000  # 0.1 Algo
 
-    appID = createAuctionApp(
+    appID = createApp(
         client=client,
         sender=creator,
         seller=seller.getAddress(),
-        nftID=nftID,
+        assetID=nftID,
         startTime=startTime,
         endTime=endTime,
         reserve=reserve,
         minBidIncrement=increment,
     )
 
-    setupAuctionApp(
+    setupApp(
         client=client,
         appID=appID,
         funder=creator,
@@ -245,10 +332,10 @@ def test_second_bid():
 
     bidder1 = getTemporaryAccount(client)
     bidder2 = getTemporaryAccount(client)
+    optInToAsset(client, nftID, bidder1)
+    optInToAsset(client, nftID, bidder2)
 
-    _, lastRoundTime = getLastBlockTimestamp(client)
-    if lastRoundTime < startTime + 5:
-        sleep(startTime + 5 - lastRoundTime)
+    client.advanceTo(startTime + 5)
 
     bid1Amount = 500_000  # 0.5 Algos
     placeBid(client=client, appID=appID, bidder=bidder1, bidAmount=bid1Amount)
@@ -267,34 +354,35 @@ def test_second_bid():
     bid2Amount = bid1Amount + increment
     placeBid(client=client, appID=appID, bidder=bidder2, bidAmount=bid2Amount)
 
-    actualState = getAppGlobalState(client, appID)
+    actualState = decode_state(getAppGlobalState(client, appID))
     expectedState = {
-        b"seller": encoding.decode_address(seller.getAddress()),
-        b"nft_id": nftID,
-        b"start": startTime,
-        b"end": endTime,
-        b"reserve_amount": reserve,
-        b"min_bid_inc": increment,
-        b"num_bids": 2,
-        b"bid_amount": bid2Amount,
-        b"bid_account": encoding.decode_address(bidder2.getAddress()),
+        "seller": encoding.decode_address(seller.getAddress()),
+        "nft_id": nftID,
+        "start": startTime,
+        "end": endTime,
+        "reserve_amount": reserve,
+        "min_bid_inc": increment,
+        "fee_percent": 1,
+        "num_bids": 2,
+        "bid_amount": bid2Amount,
+        "bid_account": encoding.decode_address(bidder2.getAddress()),
     }
 
     assert actualState == expectedState
 
     actualAppBalances = getBalances(client, get_application_address(appID))
-    expectedAppBalances = {0: 2 * 100_000 + 2 * 1_000 + bid2Amount, nftID: nftAmount}
+    expectedAppBalances = {0: 2 * 100_000 + bid2Amount, nftID: nftAmount}
 
     assert actualAppBalances == expectedAppBalances
 
     bidder1AlgosAfter = getBalances(client, bidder1.getAddress())[0]
 
-    # bidder1 should receive a refund of their bid, minus the txn fee
-    assert bidder1AlgosAfter - bidder1AlgosBefore >= bid1Amount - 1_000
+    # bidder1 should receive a full refund of their bid, the new bidder pays its fee
+    assert bidder1AlgosAfter - bidder1AlgosBefore == bid1Amount
 
 
 def test_close_before_start():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
     creator = getTemporaryAccount(client)
     seller = getTemporaryAccount(client)
@@ -307,18 +395,18 @@ def test_close_before_start():
     reserve = 1_000_000  # 1 Algo
     increment = 100_000  # 0.1 Algo
 
-    appID = createAuctionApp(
+    appID = createApp(
         client=client,
         sender=creator,
         seller=seller.getAddress(),
-        nftID=nftID,
+        assetID=nftID,
         startTime=startTime,
         endTime=endTime,
         reserve=reserve,
         minBidIncrement=increment,
     )
 
-    setupAuctionApp(
+    setupApp(
         client=client,
         appID=appID,
         funder=creator,
@@ -342,7 +430,7 @@ def test_close_before_start():
 
 
 def test_close_no_bids():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
     creator = getTemporaryAccount(client)
     seller = getTemporaryAccount(client)
@@ -355,18 +443,18 @@ def test_close_no_bids():
     reserve = 1_000_000  # 1 Algo
     increment = 100_000  # 0.1 Algo
 
-    appID = createAuctionApp(
+    appID = createApp(
         client=client,
         sender=creator,
         seller=seller.getAddress(),
-        nftID=nftID,
+        assetID=nftID,
         startTime=startTime,
         endTime=endTime,
         reserve=reserve,
         minBidIncrement=increment,
     )
 
-    setupAuctionApp(
+    setupApp(
         client=client,
         appID=appID,
         funder=creator,
@@ -375,9 +463,7 @@ def test_close_no_bids():
         nftAmount=nftAmount,
     )
 
-    _, lastRoundTime = getLastBlockTimestamp(client)
-    if lastRoundTime < endTime + 5:
-        sleep(endTime + 5 - lastRoundTime)
+    client.advanceTo(endTime + 5)
 
     closeAuction(client, appID, seller)
 
@@ -391,7 +477,7 @@ def test_close_no_bids():
 
 
 def test_close_reserve_not_met():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
     creator = getTemporaryAccount(client)
     seller = getTemporaryAccount(client)
@@ -404,18 +490,18 @@ def test_close_reserve_not_met():
     reserve = 1_000_000  # 1 Algo
     increment = 100_000  # 0.1 Algo
 
-    appID = createAuctionApp(
+    appID = createApp(
         client=client,
         sender=creator,
         seller=seller.getAddress(),
-        nftID=nftID,
+        assetID=nftID,
         startTime=startTime,
         endTime=endTime,
         reserve=reserve,
         minBidIncrement=increment,
     )
 
-    setupAuctionApp(
+    setupApp(
         client=client,
         appID=appID,
         funder=creator,
@@ -425,19 +511,16 @@ def test_close_reserve_not_met():
     )
 
     bidder = getTemporaryAccount(client)
+    optInToAsset(client, nftID, bidder)
 
-    _, lastRoundTime = getLastBlockTimestamp(client)
-    if lastRoundTime < startTime + 5:
-        sleep(startTime + 5 - lastRoundTime)
+    client.advanceTo(startTime + 5)
 
     bidAmount = 500_000  # 0.5 Algos
     placeBid(client=client, appID=appID, bidder=bidder, bidAmount=bidAmount)
 
     bidderAlgosBefore = getBalances(client, bidder.getAddress())[0]
 
-    _, lastRoundTime = getLastBlockTimestamp(client)
-    if lastRoundTime < endTime + 5:
-        sleep(endTime + 5 - lastRoundTime)
+    client.advanceTo(endTime + 5)
 
     closeAuction(client, appID, seller)
 
@@ -448,15 +531,15 @@ def test_close_reserve_not_met():
 
     bidderAlgosAfter = getBalances(client, bidder.getAddress())[0]
 
-    # bidder should receive a refund of their bid, minus the txn fee
-    assert bidderAlgosAfter - bidderAlgosBefore >= bidAmount - 1_000
+    # bidder should receive a full refund of their bid, the closer pays its fee
+    assert bidderAlgosAfter - bidderAlgosBefore == bidAmount
 
     sellerNftBalance = getBalances(client, seller.getAddress())[nftID]
     assert sellerNftBalance == nftAmount
 
 
 def test_close_reserve_met():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
     creator = getTemporaryAccount(client)
     seller = getTemporaryAccount(client)
@@ -469,18 +552,18 @@ def test_close_reserve_met():
     reserve = 1_000_000  # 1 Algo
     increment = 100_000  # 0.1 Algo
 
-    appID = createAuctionApp(
+    appID = createApp(
         client=client,
         sender=creator,
         seller=seller.getAddress(),
-        nftID=nftID,
+        assetID=nftID,
         startTime=startTime,
         endTime=endTime,
         reserve=reserve,
         minBidIncrement=increment,
     )
 
-    setupAuctionApp(
+    setupApp(
         client=client,
         appID=appID,
         funder=creator,
@@ -492,19 +575,14 @@ def test_close_reserve_met():
     sellerAlgosBefore = getBalances(client, seller.getAddress())[0]
 
     bidder = getTemporaryAccount(client)
+    optInToAsset(client, nftID, bidder)
 
-    _, lastRoundTime = getLastBlockTimestamp(client)
-    if lastRoundTime < startTime + 5:
-        sleep(startTime + 5 - lastRoundTime)
+    client.advanceTo(startTime + 5)
 
     bidAmount = reserve
     placeBid(client=client, appID=appID, bidder=bidder, bidAmount=bidAmount)
 
-    optInToAsset(client, nftID, bidder)
-
-    _, lastRoundTime = getLastBlockTimestamp(client)
-    if lastRoundTime < endTime + 5:
-        sleep(endTime + 5 - lastRoundTime)
+    client.advanceTo(endTime + 5)
 
     closeAuction(client, appID, seller)
 
@@ -520,6 +598,154 @@ def test_close_reserve_met():
     actualSellerBalances = getBalances(client, seller.getAddress())
 
     assert len(actualSellerBalances) == 2
-    # seller should receive the bid amount, minus the txn fee
-    assert actualSellerBalances[0] >= sellerAlgosBefore + bidAmount - 1_000
+    # seller should receive the bid amount, minus the marketplace fee and the
+    # fee of the close call, which pays for its inner transactions
+    closeFee = MIN_TXN_FEE + DELETE_INNER_FEES
+    assert actualSellerBalances[0] == sellerAlgosBefore + bidAmount - bidAmount // 100 - closeFee
     assert actualSellerBalances[nftID] == 0
+
+
+def createPullAuction(client, seller, bidders):
+    nftID = createDummyAsset(client, 1, seller)
+    startTime = int(time()) + 10
+    endTime = startTime + 60
+
+    appID = createApp(
+        client=client,
+        sender=seller,
+        seller=seller.getAddress(),
+        assetID=nftID,
+        startTime=startTime,
+        endTime=endTime,
+        reserve=1_000_000,
+        minBidIncrement=100_000,
+        pullRefunds=True,
+    )
+    setupApp(client=client, appID=appID, funder=seller, nftHolder=seller, nftID=nftID, nftAmount=1)
+    for bidder in bidders:
+        optInToAsset(client, nftID, bidder)
+
+    client.advanceTo(startTime + 5)
+    return appID, nftID, endTime
+
+
+def test_pull_refunds():
+    client = LocalAlgodClient()
+
+    seller = getTemporaryAccount(client)
+    bidders = [getTemporaryAccount(client) for _ in range(3)]
+    appID, nftID, endTime = createPullAuction(client, seller, bidders)
+    for bidder in bidders:
+        optInToAuction(client, appID, bidder)
+    addresses = [bidder.getAddress() for bidder in bidders]
+
+    amounts = [500_000, 600_000, 1_000_000]
+    for bidder, amount in zip(bidders, amounts):
+        before = getBalances(client, bidder.getAddress())[0]
+        placeBid(client=client, appID=appID, bidder=bidder, bidAmount=amount)
+        # no inner transaction to pay for
+        assert getBalances(client, bidder.getAddress())[0] == before - amount - 2 * MIN_TXN_FEE
+
+    assert [getRefund(client, appID, address) for address in addresses] == [500_000, 600_000, 0]
+    assert decode_state(getAppGlobalState(client, appID))["refunds_owed"] == 1_100_000
+
+    client.advanceTo(endTime + 5)
+    # the refunds owed stay in the auction account until withdrawn
+    with pytest.raises(Exception):
+        closeAuction(client, appID, seller)
+
+    before = [getBalances(client, address)[0] for address in addresses]
+    assert withdrawRefunds(client, appID, seller, addresses) == 1_100_000
+
+    assert [getBalances(client, address)[0] for address in addresses] == [
+        before[0] + 500_000,
+        before[1] + 600_000,
+        before[2],
+    ]
+    assert [getRefund(client, appID, address) for address in addresses] == [0, 0, 0]
+    assert decode_state(getAppGlobalState(client, appID))["refunds_owed"] == 0
+
+    closeAuction(client, appID, seller)
+    assert getBalances(client, bidders[2].getAddress())[nftID] == 1
+
+
+def test_settle_before_refunds_are_withdrawn():
+    client = LocalAlgodClient()
+
+    seller = getTemporaryAccount(client)
+    bidders = [getTemporaryAccount(client) for _ in range(2)]
+    appID, nftID, endTime = createPullAuction(client, seller, bidders)
+    for bidder in bidders:
+        optInToAuction(client, appID, bidder)
+
+    placeBid(client=client, appID=appID, bidder=bidders[0], bidAmount=500_000)
+    placeBid(client=client, appID=appID, bidder=bidders[1], bidAmount=1_000_000)
+
+    # only once the auction has ended
+    with pytest.raises(Exception):
+        settleAuction(client, appID, seller)
+
+    client.advanceTo(endTime + 5)
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    settleAuction(client, appID, bidders[1])
+
+    # the refund still owed does not hold up the winner nor the seller
+    assert getBalances(client, bidders[1].getAddress())[nftID] == 1
+    assert getBalances(client, seller.getAddress())[0] == sellerBefore + 1_000_000 - 1_000_000 // 100
+    appGlobalState = decode_state(getAppGlobalState(client, appID))
+    assert appGlobalState["settled"] == 1
+    assert appGlobalState["refunds_owed"] == 500_000
+
+    # an auction is settled once
+    with pytest.raises(Exception):
+        settleAuction(client, appID, seller)
+    # and closed once nothing is owed, without paying out again
+    with pytest.raises(Exception):
+        closeAuction(client, appID, seller)
+    withdrawRefunds(client, appID, seller, [bidders[0].getAddress()])
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    remaining = getBalances(client, get_application_address(appID))[0]
+    # the seller created the auction, so is also sent what remains
+    closeAuction(client, appID, seller)
+    assert getBalances(client, seller.getAddress())[0] == sellerBefore - MIN_TXN_FEE - DELETE_INNER_FEES + remaining
+
+
+def test_pull_refunds_without_local_state():
+    client = LocalAlgodClient()
+
+    seller = getTemporaryAccount(client)
+    bidders = [getTemporaryAccount(client) for _ in range(3)]
+    appID, nftID, endTime = createPullAuction(client, seller, bidders)
+    optInToAuction(client, appID, bidders[1])
+
+    # a bidder never opted in is paid back by the next bid
+    placeBid(client=client, appID=appID, bidder=bidders[0], bidAmount=500_000)
+    before = getBalances(client, bidders[0].getAddress())[0]
+    placeBid(client=client, appID=appID, bidder=bidders[1], bidAmount=600_000)
+    assert getBalances(client, bidders[0].getAddress())[0] == before + 500_000
+
+    placeBid(client=client, appID=appID, bidder=bidders[2], bidAmount=1_000_000)
+    assert getRefund(client, appID, bidders[1].getAddress()) == 600_000
+
+    # clearing the local state forfeits the refund
+    clearTxn = transaction.ApplicationClearStateTxn(bidders[1].getAddress(), client.suggested_params(), appID)
+    signedClearTxn = clearTxn.sign(bidders[1].getPrivateKey())
+    client.send_transaction(signedClearTxn)
+    waitForTransaction(client, signedClearTxn.get_txid())
+    assert decode_state(getAppGlobalState(client, appID))["refunds_owed"] == 0
+
+    client.advanceTo(endTime + 5)
+    closeAuction(client, appID, seller)
+    assert getBalances(client, bidders[2].getAddress())[nftID] == 1
+
+
+def test_pull_methods_only_with_pull_refunds():
+    # an auction refunding outbid bidders itself has nothing to withdraw or
+    # settle, so its ABI leaves the methods out
+    assert [method.name for method in CONTRACT.methods] == ["bid", "setup", "create"]
+    assert [method.name for method in PULL_CONTRACT.methods] == ["bid", "withdraw", "setup", "settle", "create"]
+
+
+def test_setup_funding():
+    assert setup_funding() == 2 * 100_000
+    assert setup_funding(pool_fees=False) == 2 * 100_000 + 4 * 1_000
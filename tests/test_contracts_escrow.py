@@ -1,13 +1,27 @@
 import base64
 
+import pytest
 from algosdk import encoding
+from algosdk.future import transaction
 from algosdk.logic import get_application_address
 
 from contracts import __version__
-from tests.helper_escrow import getContracts, createApp, setupApp, placeOrder
+from contracts.abi import encode_call
+from contracts.escrow import CONTRACT, setup_funding
+from tests.helper_escrow import (
+    FEE_RECEIVER,
+    getContracts,
+    createApp,
+    setupApp,
+    placeOrder,
+    bulkList,
+    bulkDelist,
+    buildCartGroups,
+    checkoutCart,
+)
 from utils.account import Account
-from utils.helper import getAppGlobalState, createDummyAsset, getBalances
-from utils.setup import getAlgodClient, get_account_credentials
+from utils.helper import getAppGlobalState, createDummyAsset, getBalances, optInToAsset
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
 
 
 def test_contract_compile():
@@ -15,7 +29,7 @@ def test_contract_compile():
     Compile, setup and test teal contracts
     :return: teal contract bytes
     """
-    client = getAlgodClient()
+    client = LocalAlgodClient()
     approval, clear = getContracts(client)
 
     print('--- Approval ---')
@@ -88,28 +102,30 @@ def test_contract_compile():
 #     assert actualBalances == expectedBalances
 
 def test_buy():
-    client = getAlgodClient()
+    client = LocalAlgodClient()
 
-    creator_pk, creator_a, creator_m = get_account_credentials(1)
-    buyer_pk, buyer_a, buyer_m = get_account_credentials(2)
+    creator = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
 
     # 10 Algo
-    assetID = createDummyAsset(client, 1, Account(creator_pk))
+    assetID = createDummyAsset(client, 1, creator)
     assetPrice = 1_000_000 * 1
 
     feeReceiver = 'DPANDA7MC3CHRPXCORO4YBB56NKKCEEMREWO6VW2WT2NYXSADUTBRZCXWU'
     feePercent = 5
+    # the fee receiver is an existing account on the network
+    client.fund(feeReceiver, 1_000_000)
 
     appID = createApp(
         client=client,
-        creator=Account(creator_pk),
+        creator=creator,
         assetID=assetID,
     )
 
     setupApp(
         client=client,
         appID=appID,
-        funder=Account(creator_pk),
+        funder=creator,
         assetID=assetID,
         assetPrice=assetPrice,
     )
@@ -125,10 +141,13 @@ def test_buy():
 
     assert actualState == expectedState
 
+    creatorBalance = getBalances(client, creator.getAddress())[0]
+    feeReceiverBalance = getBalances(client, feeReceiver)[0]
+
     placeOrder(
         client=client,
         appID=appID,
-        buyer=Account(buyer_pk),
+        buyer=buyer,
         assetID=assetID,
         assetPrice=assetPrice
     )
@@ -138,6 +157,169 @@ def test_buy():
 
     assert actualBalances == expectedBalances
 
+    # the sale settles the fee and the seller's proceeds, and closing the
+    # escrow returns its minimum balance, all inner fees paid by the buyer
+    fee = assetPrice * feePercent // 100
+    assert getBalances(client, feeReceiver)[0] == feeReceiverBalance + fee
+    assert getBalances(client, creator.getAddress())[0] == creatorBalance + assetPrice - fee + 200_000
+
+
+def test_bulk_list_and_delist():
+    client = LocalAlgodClient()
+
+    seller = getTemporaryAccount(client)
+    other = getTemporaryAccount(client)
+
+    assetIDs = [createDummyAsset(client, 1, seller) for _ in range(20)]
+    # the seller does not hold this one, so its setup fails
+    foreignAssetID = createDummyAsset(client, 1, other)
+    items = [(assetID, 1_000_000 + i) for i, assetID in enumerate(assetIDs)] + [(foreignAssetID, 1_000_000)]
+
+    results = bulkList(client, seller, items)
+
+    assert [r.listed for r in results] == [True] * 20 + [False]
+    assert results[-1].error is not None and results[-1].appID is not None
+    for result in results[:-1]:
+        assert result.error is None
+        assert getAppGlobalState(client, result.appID)[b"ap"] == result.assetPrice
+        assert getBalances(client, get_application_address(result.appID))[result.assetID] == 1
+
+    errors = bulkDelist(client, seller, [(r.appID, r.assetID) for r in results])
+
+    assert errors == [None] * len(results)
+    balances = getBalances(client, seller.getAddress())
+    assert all(balances[assetID] == 1 for assetID in assetIDs)
+    assert client.account_info(seller.getAddress())["total-created-apps"] == 0
+
+
+def test_cart_checkout():
+    client = LocalAlgodClient()
+
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    client.fund(FEE_RECEIVER, 1_000_000)
+
+    items = [(createDummyAsset(client, 1, seller), 1_000_000 + i) for i in range(10)]
+    appIDs = [result.appID for result in bulkList(client, seller, items)]
+
+    # 4 purchases fit in a group with their opt-ins, 5 without
+    groups = buildCartGroups(client, buyer, appIDs, client.suggested_params())
+    assert [len(group) for group in groups] == [16, 16, 8]
+    for assetID, _ in items[:5]:
+        optInToAsset(client, assetID, buyer)
+    groups = buildCartGroups(client, buyer, appIDs[:5], client.suggested_params())
+    assert [len(group) for group in groups] == [15]
+
+    # a cart of one group settles in a single confirmed round
+    results = checkoutCart(client, buyer, appIDs[:4])
+    assert [result.appIDs for result in results] == [appIDs[:4]]
+    assert results[0].bought and results[0].error is None
+    rounds = {client.pending_transaction_info(txID)["confirmed-round"] for txID in results[0].buyTxIDs}
+    assert len(results[0].buyTxIDs) == 4 and len(rounds) == 1
+
+    # a larger cart is packed into several groups: the asset the buyer is
+    # opted in to and 3 new ones, then the last 2
+    results = checkoutCart(client, buyer, appIDs[4:])
+    assert [result.appIDs for result in results] == [appIDs[4:8], appIDs[8:]]
+    assert all(result.bought for result in results)
+    assert sum(len(result.buyTxIDs) for result in results) == len(appIDs) - 4
+
+    balances = getBalances(client, buyer.getAddress())
+    assert all(balances[assetID] == 1 for assetID, _ in items)
+    assert client.account_info(seller.getAddress())["total-created-apps"] == 0
+
+
+def test_cart_group_is_atomic():
+    client = LocalAlgodClient()
+
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    client.fund(FEE_RECEIVER, 1_000_000)
+
+    items = [(createDummyAsset(client, 1, seller), 1_000_000) for _ in range(3)]
+    appIDs = [result.appID for result in bulkList(client, seller, items)]
+    # the last escrow is sold before the cart is checked out
+    groups = buildCartGroups(client, buyer, appIDs, client.suggested_params())
+    placeOrder(client, appIDs[-1], getTemporaryAccount(client), items[-1][0], items[-1][1])
+
+    with pytest.raises(Exception):
+        client.send_transactions([txn.sign(buyer.getPrivateKey()) for txn in groups[0]])
+
+    balances = getBalances(client, buyer.getAddress())
+    assert all(assetID not in balances for assetID, _ in items)
+
+    with pytest.raises(ValueError):
+        buildCartGroups(client, buyer, appIDs[:1] * 2, client.suggested_params())
+
+
+class RacingClient(LocalAlgodClient):
+    """Runs `beforeSend` once, right before the next group is sent."""
+
+    beforeSend = None
+
+    def send_transactions(self, txns, **kwargs):
+        beforeSend, self.beforeSend = self.beforeSend, None
+        if beforeSend is not None:
+            beforeSend()
+        return super().send_transactions(txns, **kwargs)
+
+
+def test_cart_partial_fill():
+    client = RacingClient()
+
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    client.fund(FEE_RECEIVER, 1_000_000)
+
+    items = [(createDummyAsset(client, 1, seller), 1_000_000) for _ in range(6)]
+    appIDs = [result.appID for result in bulkList(client, seller, items)]
+    # an escrow of the second group is sold while the cart is checked out
+    client.beforeSend = lambda: placeOrder(client, appIDs[-1], getTemporaryAccount(client), *items[-1])
+
+    results = checkoutCart(client, buyer, appIDs)
+
+    # the first group goes through, the second is rejected whole
+    assert [result.appIDs for result in results] == [appIDs[:4], appIDs[4:]]
+    assert results[0].bought and results[0].error is None
+    assert not results[1].bought and results[1].error is not None
+    balances = getBalances(client, buyer.getAddress())
+    assert all(balances[assetID] == 1 for assetID, _ in items[:4])
+    assert items[4][0] not in balances
+    assert getAppGlobalState(client, appIDs[4])[b"aid"] == items[4][0]
+
+
+def test_method_dispatch():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    assetID = createDummyAsset(client, 1, creator)
+    appID = createApp(client, creator, assetID)
+
+    def call(appArgs):
+        txn = transaction.ApplicationCallTxn(
+            sender=creator.getAddress(),
+            index=appID,
+            on_complete=transaction.OnComplete.NoOpOC,
+            app_args=appArgs,
+            sp=client.suggested_params(),
+        )
+        client.send_transaction(txn.sign(creator.getPrivateKey()))
+
+    # the create method only runs on creation
+    with pytest.raises(Exception):
+        call(encode_call(CONTRACT, "create", assetID, creator.getAddress(), 0))
+    # names are no longer methods
+    with pytest.raises(Exception):
+        call([b"on_buy", (1).to_bytes(8, "big")])
+
+    assert getAppGlobalState(client, appID)[b"fp"] == 5
+
+
+def test_setup_funding():
+    # with fee pooling only the minimum balance of the escrow holding the asset
+    assert setup_funding() == 2 * 100_000
+    # otherwise also the opt-in, the settlement group and the two closing fees
+    assert setup_funding(pool_fees=False) == 2 * 100_000 + 6 * 1_000
+
 
 def test_version():
     assert __version__ == '0.1.0'
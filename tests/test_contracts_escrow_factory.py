@@ -0,0 +1,129 @@
+import pytest
+from algosdk.encoding import encode_address
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+
+from contracts.abi import encode_call
+from contracts.escrow import FACTORY_DELETE_INNER_FEES, setup_funding
+from contracts.escrow_factory import CONTRACT, RELEASE_INNER_FEES, listing_deposit
+from contracts.funding import MIN_TXN_FEE
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER, bulkDelist
+from tests.helper_escrow_factory import createFactory, createListing, placeOrder
+from utils.helper import createDummyAsset, getAppGlobalState, getBalances
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.params import getSuggestedParams, withFlatFee
+
+
+def test_list_in_one_group():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    seller = getTemporaryAccount(client)
+    assetPrice = 10_000_000
+
+    factoryID = createFactory(client, creator)
+    assetID = createDummyAsset(client, 1, seller)
+    appID = createListing(client, factoryID, seller, assetID, assetPrice)
+
+    state = getAppGlobalState(client, appID)
+    assert encode_address(state[b"sl"]) == seller.getAddress()
+    assert state[b"aid"] == assetID
+    assert state[b"ap"] == assetPrice
+
+    # the escrow holds the asset and its funding, the factory keeps neither
+    assert getBalances(client, get_application_address(appID)) == {0: setup_funding(), assetID: 1}
+    assert assetID not in getBalances(client, get_application_address(factoryID))
+    assert getBalances(client, seller.getAddress())[assetID] == 0
+    assert getAppGlobalState(client, factoryID)[b"n"] == 1
+
+
+def test_buy_pays_seller():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetPrice = 10_000_000
+
+    factoryID = createFactory(client, creator)
+    assetID = createDummyAsset(client, 1, seller)
+    appID = createListing(client, factoryID, seller, assetID, assetPrice)
+
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    feeReceiverBefore = getBalances(client, FEE_RECEIVER).get(0, 0)
+    factoryBefore = getBalances(client, get_application_address(factoryID))[0]
+
+    placeOrder(client, factoryID, appID, buyer, assetID, assetPrice)
+
+    fee = assetPrice * FEE_PERCENT // 100
+    assert getBalances(client, buyer.getAddress())[assetID] == 1
+    assert getBalances(client, FEE_RECEIVER)[0] == feeReceiverBefore + fee
+    # the seller, not the factory, gets the proceeds, the escrow's funds and
+    # the deposit back as the escrow is deleted
+    assert getBalances(client, seller.getAddress())[0] == (
+        sellerBefore + assetPrice - fee + setup_funding() + listing_deposit()
+    )
+    assert getBalances(client, get_application_address(factoryID))[0] == factoryBefore - listing_deposit()
+
+
+def test_only_seller_delists():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    seller = getTemporaryAccount(client)
+    assetPrice = 10_000_000
+
+    factoryID = createFactory(client, creator)
+    assetID = createDummyAsset(client, 1, seller)
+    appID = createListing(client, factoryID, seller, assetID, assetPrice)
+
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    assert bulkDelist(client, creator, [(appID, assetID)], factoryID) != [None]
+    assert bulkDelist(client, seller, [(appID, assetID)], factoryID) == [None]
+    assert getBalances(client, seller.getAddress())[assetID] == 1
+
+    # a delisted escrow returns its funds and deposit too
+    deleteFee = MIN_TXN_FEE + FACTORY_DELETE_INNER_FEES
+    assert getBalances(client, seller.getAddress())[0] == (
+        sellerBefore - deleteFee + setup_funding() + listing_deposit()
+    )
+
+
+def test_delete_names_its_factory():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    seller = getTemporaryAccount(client)
+
+    factoryID = createFactory(client, creator)
+    otherID = createFactory(client, creator)
+    assetID = createDummyAsset(client, 1, seller)
+    appID = createListing(client, factoryID, seller, assetID, 10_000_000)
+
+    # nor can the factory be called to pay it, other than by its escrows
+    releaseTxn = transaction.ApplicationCallTxn(
+        sender=seller.getAddress(),
+        index=factoryID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "release"),
+        accounts=[seller.getAddress()],
+        foreign_apps=[appID],
+        sp=withFlatFee(getSuggestedParams(client), MIN_TXN_FEE + RELEASE_INNER_FEES),
+    )
+    with pytest.raises(AlgodHTTPError):
+        client.send_transaction(releaseTxn.sign(seller.getPrivateKey()))
+
+    # and another factory cannot be made to pay it either
+    assert bulkDelist(client, seller, [(appID, assetID)], otherID) != [None]
+    assert bulkDelist(client, seller, [(appID, assetID)], factoryID) == [None]
+
+
+def test_list_requires_the_asset():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    seller = getTemporaryAccount(client)
+
+    factoryID = createFactory(client, creator)
+    # an asset held by someone else cannot be listed
+    assetID = createDummyAsset(client, 1, creator)
+
+    with pytest.raises(Exception):
+        createListing(client, factoryID, seller, assetID, 10_000_000)
+    assert getAppGlobalState(client, factoryID)[b"n"] == 0
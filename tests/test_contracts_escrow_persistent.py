@@ -0,0 +1,97 @@
+import pytest
+from algosdk.error import AlgodHTTPError
+
+from contracts.escrow import approval_program
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER
+from tests.helper_escrow_persistent import buyUnits, closeListing, createListing, setPrice, withdrawUnits
+from utils.helper import createDummyAsset, getAppGlobalState, getBalances
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+
+STATUS_ACTIVE = 1
+STATUS_IN_PROGRESS = 2
+
+
+def test_edition_sells_out_from_one_deployment():
+    client = LocalAlgodClient()
+    client.fund(FEE_RECEIVER, 1_000_000)
+    seller = getTemporaryAccount(client)
+    editions, perPurchase, assetPrice = 1_000, 25, 100_000
+
+    assetID = createDummyAsset(client, editions, seller)
+    appID = createListing(client, seller, assetID, editions, assetPrice)
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    feeReceiverBefore = getBalances(client, FEE_RECEIVER)[0]
+
+    buyers = [getTemporaryAccount(client) for _ in range(editions // perPurchase)]
+    for buyer in buyers:
+        assert getAppGlobalState(client, appID)[b"as"] == STATUS_IN_PROGRESS
+        buyUnits(client, appID, buyer, assetID, perPurchase, assetPrice)
+
+    assert all(getBalances(client, buyer.getAddress())[assetID] == perPurchase for buyer in buyers)
+    assert getAppGlobalState(client, appID)[b"as"] == STATUS_ACTIVE
+    assert client.account_info(seller.getAddress())["total-created-apps"] == 1
+    total = editions * assetPrice
+    assert getBalances(client, seller.getAddress())[0] == sellerBefore + total - total * FEE_PERCENT // 100
+    assert getBalances(client, FEE_RECEIVER)[0] == feeReceiverBefore + total * FEE_PERCENT // 100
+
+    # sold out, so no more purchases, and anyone may close the escrow
+    with pytest.raises(AlgodHTTPError):
+        buyUnits(client, appID, buyers[0], assetID, 1, assetPrice)
+    closeListing(client, appID, buyers[0], assetID)
+    assert client.account_info(seller.getAddress())["total-created-apps"] == 0
+
+
+def test_seller_reprices_and_withdraws():
+    client = LocalAlgodClient()
+    client.fund(FEE_RECEIVER, 1_000_000)
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetPrice = 1_000_000
+
+    assetID = createDummyAsset(client, 10, seller)
+    appID = createListing(client, seller, assetID, 10, assetPrice)
+    buyUnits(client, appID, buyer, assetID, 2, assetPrice)
+
+    # only the seller sets the price, and purchases at the old one fail
+    with pytest.raises(AlgodHTTPError):
+        setPrice(client, appID, buyer, assetPrice // 2)
+    setPrice(client, appID, seller, assetPrice * 2)
+    with pytest.raises(AlgodHTTPError):
+        buyUnits(client, appID, buyer, assetID, 3, assetPrice)
+    buyUnits(client, appID, buyer, assetID, 3, assetPrice * 2)
+    assert getBalances(client, buyer.getAddress())[assetID] == 5
+
+    # withdrawing the units left ends the sale
+    with pytest.raises(AlgodHTTPError):
+        withdrawUnits(client, appID, buyer, assetID, 1)
+    with pytest.raises(AlgodHTTPError):
+        withdrawUnits(client, appID, seller, assetID, 6)
+    withdrawUnits(client, appID, seller, assetID, 2)
+    assert getAppGlobalState(client, appID)[b"as"] == STATUS_IN_PROGRESS
+    withdrawUnits(client, appID, seller, assetID, 3)
+    assert getAppGlobalState(client, appID)[b"as"] == STATUS_ACTIVE
+    assert getBalances(client, seller.getAddress())[assetID] == 5
+
+    closeListing(client, appID, seller, assetID)
+    assert client.account_info(seller.getAddress())["total-created-apps"] == 0
+
+
+def test_only_seller_closes_on_sale():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    other = getTemporaryAccount(client)
+
+    assetID = createDummyAsset(client, 5, seller)
+    appID = createListing(client, seller, assetID, 5, 1_000_000)
+
+    with pytest.raises(AlgodHTTPError):
+        closeListing(client, appID, other, assetID)
+    closeListing(client, appID, seller, assetID)
+    assert getBalances(client, seller.getAddress())[assetID] == 5
+
+
+def test_persistent_needs_pooled_fees():
+    with pytest.raises(ValueError):
+        approval_program(persistent=True, pool_fees=False)
+    with pytest.raises(ValueError):
+        approval_program(persistent=True, factory=True)
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from contracts.escrow_royalty import BASIS_POINTS, MAX_ROYALTY_RECIPIENTS, decode_royalties
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER
+from tests.helper_escrow_royalty import createApp, setupApp, placeOrder
+from utils.analyzer import DEFAULT_THRESHOLDS_PATH
+from utils.helper import createDummyAsset, getAppGlobalState, getBalances
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+
+
+def listWithRoyalties(client, seller, shares, assetPrice):
+    recipients = [getTemporaryAccount(client).getAddress() for _ in shares]
+    royalties = list(zip(recipients, shares))
+    assetID = createDummyAsset(client, 1, seller)
+    appID = createApp(client, seller, assetID, royalties)
+    setupApp(client, appID, seller, assetID, assetPrice)
+    return appID, assetID, royalties
+
+
+def test_buy_pays_royalties():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetPrice = 10_000_000
+
+    appID, assetID, royalties = listWithRoyalties(client, seller, [250, 500], assetPrice)
+    assert decode_royalties(getAppGlobalState(client, appID)) == royalties
+
+    recipientsBefore = [getBalances(client, address)[0] for address, _ in royalties]
+    feeReceiverBefore = getBalances(client, FEE_RECEIVER).get(0, 0)
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+
+    placeOrder(client, appID, buyer, assetID, assetPrice)
+
+    paid = [assetPrice * share // BASIS_POINTS for _, share in royalties]
+    fee = assetPrice * FEE_PERCENT // 100
+    assert [getBalances(client, address)[0] for address, _ in royalties] == [
+        before + amount for before, amount in zip(recipientsBefore, paid)
+    ]
+    assert getBalances(client, FEE_RECEIVER)[0] == feeReceiverBefore + fee
+    assert getBalances(client, buyer.getAddress())[assetID] == 1
+    # the seller also gets back the escrow's funding on delete
+    assert getBalances(client, seller.getAddress())[0] > sellerBefore + assetPrice - fee - sum(paid)
+
+
+@pytest.mark.parametrize(
+    "shares",
+    [
+        [100] * (MAX_ROYALTY_RECIPIENTS + 1),
+        [100, 0][:MAX_ROYALTY_RECIPIENTS],
+        [BASIS_POINTS - FEE_PERCENT * 100 + 1],
+    ],
+    ids=["too-many", "zero-share", "over-price"],
+)
+def test_create_rejects_invalid_royalties(shares):
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    assetID = createDummyAsset(client, 1, seller)
+    royalties = [(getTemporaryAccount(client).getAddress(), share) for share in shares]
+
+    with pytest.raises(Exception):
+        createApp(client, seller, assetID, royalties)
+
+
+def test_royalty_cost_per_recipient():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    assetPrice = 10_000_000
+
+    costs = []
+    for recipients in range(MAX_ROYALTY_RECIPIENTS + 1):
+        appID, assetID, _ = listWithRoyalties(client, seller, [100] * recipients, assetPrice)
+        txID = placeOrder(client, appID, getTemporaryAccount(client), assetID, assetPrice)
+        costs.append(client.getOpcodeCost(txID))
+
+    # every recipient adds the same cost, its payment within the inner group
+    increments = [after - before for before, after in zip(costs, costs[1:])]
+    assert len(set(increments)) == 1 and increments[0] > 0
+    # and a buy paying the most recipients stays within the cost recorded
+    # for it by the analyzer
+    with open(DEFAULT_THRESHOLDS_PATH) as f:
+        thresholds = json.load(f)
+    assert costs[-1] <= thresholds["escrow_royalty_approval"]["NoOp/on_buy"]["cost"]
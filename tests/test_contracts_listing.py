@@ -0,0 +1,65 @@
+import pytest
+from algosdk.future import transaction
+
+from contracts.funding import MIN_TXN_FEE
+from contracts.listing import listing_fee
+from tests.helper_escrow import FEE_PERCENT, FEE_RECEIVER
+from tests.helper_listing import buildBuyTxns, buyListing, createListing, loadListings, saveListings
+from utils.helper import createDummyAsset, getBalances, optInToAsset
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+
+
+def test_buy(tmp_path):
+    client = LocalAlgodClient()
+    client.fund(FEE_RECEIVER, 1_000_000)
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetID = createDummyAsset(client, 1, seller)
+    optInToAsset(client, assetID, buyer)
+    price = 2_000_000
+
+    # listing takes no transaction
+    lastRound = client.status()["last-round"]
+    path = str(tmp_path / "listings.json")
+    saveListings(path, [createListing(client, seller, assetID, price)])
+    [listing] = loadListings(path)
+    assert client.status()["last-round"] == lastRound
+    assert listing.fee == listing_fee(price, FEE_PERCENT)
+
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    buyerBefore = getBalances(client, buyer.getAddress())[0]
+    buyListing(client, listing, buyer)
+
+    assert getBalances(client, buyer.getAddress()) == {0: buyerBefore - price - listing.fee - 3 * MIN_TXN_FEE, assetID: 1}
+    assert getBalances(client, seller.getAddress()) == {0: sellerBefore + price, assetID: 0}
+    assert getBalances(client, FEE_RECEIVER)[0] == 1_000_000 + listing.fee
+
+    # the seller no longer holds the asset
+    with pytest.raises(Exception):
+        buyListing(client, listing, buyer)
+
+
+def test_buy_below_price():
+    client = LocalAlgodClient()
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetID = createDummyAsset(client, 1, seller)
+    optInToAsset(client, assetID, buyer)
+    listing = createListing(client, seller, assetID, 2_000_000)
+
+    payTxn, feeTxn, transferTxn = buildBuyTxns(listing, buyer, client.suggested_params())
+    payTxn.amt -= 1
+    for txn in (payTxn, feeTxn, transferTxn):
+        txn.group = None
+    transaction.assign_group_id([payTxn, feeTxn, transferTxn])
+
+    with pytest.raises(Exception, match="rejected by logic"):
+        client.send_transactions(
+            [
+                payTxn.sign(buyer.getPrivateKey()),
+                feeTxn.sign(buyer.getPrivateKey()),
+                transaction.LogicSigTransaction(transferTxn, listing.lsig),
+            ]
+        )
+
+    assert getBalances(client, seller.getAddress())[assetID] == 1
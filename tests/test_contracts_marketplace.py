@@ -0,0 +1,92 @@
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+
+from contracts.marketplace import DELIST_INNER_FEES, LISTING_DEPOSIT
+from tests.helper_marketplace import (
+    APP_MIN_BALANCE,
+    buyListing,
+    createMarketplace,
+    delistAsset,
+    getListings,
+    listAsset,
+)
+from utils.helper import createDummyAsset, getBalances, optInToAsset
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+
+FEE_PERCENT = 5
+
+
+def setup():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    feeReceiver = getTemporaryAccount(client, 1_000_000)
+    appID = createMarketplace(client, creator, feeReceiver.getAddress(), FEE_PERCENT)
+    return client, appID, feeReceiver
+
+
+def test_buy():
+    client, appID, feeReceiver = setup()
+    seller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetID = createDummyAsset(client, 1, seller)
+    optInToAsset(client, assetID, buyer)
+    price = 2_000_000
+
+    listAsset(client, appID, seller, assetID, price)
+    assert getListings(client, appID) == {(assetID, seller.getAddress()): (price, 1)}
+
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    buyListing(client, appID, buyer, seller.getAddress(), assetID)
+
+    fee = price * FEE_PERCENT // 100
+    assert getListings(client, appID) == {}
+    assert getBalances(client, buyer.getAddress())[assetID] == 1
+    assert getBalances(client, feeReceiver.getAddress())[0] == 1_000_000 + fee
+    # proceeds plus the deposit less the opt-in fee
+    assert getBalances(client, seller.getAddress())[0] == sellerBefore + price - fee + LISTING_DEPOSIT - 1_000
+    # the app gave up its asset holding and kept nothing
+    assert getBalances(client, get_application_address(appID)) == {0: APP_MIN_BALANCE}
+
+
+def test_partial_buys_and_shared_asset():
+    client, appID, _ = setup()
+    firstSeller = getTemporaryAccount(client)
+    secondSeller = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    assetID = createDummyAsset(client, 5, firstSeller)
+    optInToAsset(client, assetID, secondSeller)
+    optInToAsset(client, assetID, buyer)
+    transferTxn = transaction.AssetTransferTxn(firstSeller.getAddress(), client.suggested_params(), secondSeller.getAddress(), 2, assetID)
+    client.send_transaction(transferTxn.sign(firstSeller.getPrivateKey()))
+
+    listAsset(client, appID, firstSeller, assetID, 1_000_000, quantity=3)
+    listAsset(client, appID, secondSeller, assetID, 900_000, quantity=2)
+
+    buyListing(client, appID, buyer, firstSeller.getAddress(), assetID, quantity=2)
+    assert getListings(client, appID)[(assetID, firstSeller.getAddress())] == (1_000_000, 1)
+
+    buyListing(client, appID, buyer, secondSeller.getAddress(), assetID, quantity=2)
+    buyListing(client, appID, buyer, firstSeller.getAddress(), assetID, quantity=1)
+
+    assert getListings(client, appID) == {}
+    assert getBalances(client, buyer.getAddress())[assetID] == 5
+    # only the unneeded second opt-in fee is left over
+    assert getBalances(client, get_application_address(appID)) == {0: APP_MIN_BALANCE + 1_000}
+
+
+def test_delist():
+    client, appID, _ = setup()
+    seller = getTemporaryAccount(client)
+    assetIDs = [createDummyAsset(client, 1, seller) for _ in range(10)]
+
+    for i, assetID in enumerate(assetIDs):
+        listAsset(client, appID, seller, assetID, 1_000_000 + i)
+    assert len(getListings(client, appID)) == 10
+
+    sellerBefore = getBalances(client, seller.getAddress())[0]
+    delistAsset(client, appID, seller, assetIDs[0])
+
+    assert len(getListings(client, appID)) == 9
+    assert getBalances(client, seller.getAddress())[assetIDs[0]] == 1
+    # the deposit less the opt-in and delist fees, and the app call's own fee
+    assert getBalances(client, seller.getAddress())[0] == sellerBefore + LISTING_DEPOSIT - 1_000 - DELIST_INNER_FEES - 1_000
@@ -1,4 +1,238 @@
+import json
+
+import pytest
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+
 from contracts import __version__
+from contracts.abi import encode_call
+from contracts.funding import MIN_TXN_FEE
+from contracts.shuffle import CLAIM_ROUNDS, CONTRACT, EXPIRE_INNER_FEES, MAX_PENDING, PAGE_ITEMS
+from tests.helper_shuffle import (
+    PAGES_PER_GROUP,
+    HashChainBeacon,
+    addPages,
+    buyDraw,
+    claimItem,
+    closeShuffle,
+    createApp,
+    drawItem,
+    expirePurchase,
+    loadPool,
+    mintDrop,
+)
+from utils.analyzer import DEFAULT_THRESHOLDS_PATH
+from utils.helper import getAppGlobalState, getBalances
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.opcodes import MAX_TXN_GROUP_SIZE
+from utils.params import getSuggestedParams, getSuggestedParamsProvider
+
+PRICE = 1_000_000
+
+
+def createDrop(client, creator, count, draws):
+    beacon = HashChainBeacon(b"drop", draws)
+    appID = createApp(client, creator, PRICE, beacon)
+    assetIDs = mintDrop(client, creator, appID, count)
+    pages = addPages(client, creator, appID, (count + PAGE_ITEMS - 1) // PAGE_ITEMS)
+    loadPool(client, creator, appID, pages, assetIDs)
+    return appID, beacon, pages, assetIDs
+
+
+def groupCount(txns, perGroup):
+    return (txns + perGroup - 1) // perGroup
+
+
+def test_draws_every_item_once():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+    count = PAGE_ITEMS + 25
+    # the price and the minimum balance of every NFT
+    client.fund(buyer.getAddress(), count * (PRICE + 100_000))
+
+    appID, beacon, pages, assetIDs = createDrop(client, creator, count, count)
+    assert getAppGlobalState(client, appID)[b"n"] == count
+
+    claimed = []
+    for _ in range(count):
+        purchase = buyDraw(client, appID, buyer, PRICE)
+        drawn, assetID, _ = drawItem(client, appID, creator, beacon, pages)
+        assert drawn == purchase
+        assert claimItem(client, appID, buyer, purchase) == assetID
+        claimed.append(assetID)
+
+    assert sorted(claimed) == sorted(assetIDs)
+    # shuffled rather than drawn in the order they were loaded
+    assert claimed != assetIDs
+    assert all(getBalances(client, buyer.getAddress())[assetID] == 1 for assetID in assetIDs)
+
+    # nothing left to draw
+    with pytest.raises(AlgodHTTPError):
+        buyDraw(client, appID, buyer, PRICE)
+
+    creatorBefore = getBalances(client, creator.getAddress())[0]
+    closeShuffle(client, appID, creator)
+    assert getBalances(client, creator.getAddress())[0] > creatorBefore + (count - 1) * PRICE
+
+
+def test_draw_and_claim_checks():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    buyers = [getTemporaryAccount(client) for _ in range(2)]
+
+    appID, beacon, pages, _ = createDrop(client, creator, 30, 4)
+
+    # no purchase to draw for
+    with pytest.raises(AlgodHTTPError):
+        drawItem(client, appID, creator, beacon, pages)
+
+    purchase = buyDraw(client, appID, buyers[0], PRICE)
+    # the beacon's values must be revealed in order
+    other = HashChainBeacon(b"other", 4)
+    other.reveal = lambda last: other.values[0]
+    with pytest.raises(AlgodHTTPError):
+        drawItem(client, appID, creator, other, pages)
+    skipping = HashChainBeacon(b"drop", 4)
+    skipping.reveal = lambda last: beacon.values[1]
+    with pytest.raises(AlgodHTTPError):
+        drawItem(client, appID, creator, skipping, pages)
+
+    # an unclaimed purchase cannot be closed over
+    _, assetID, _ = drawItem(client, appID, creator, beacon, pages)
+    with pytest.raises(AlgodHTTPError):
+        closeShuffle(client, appID, creator)
+    # the NFT only goes to the buyer
+    with pytest.raises(AlgodHTTPError):
+        claimItem(client, appID, buyers[1], purchase)
+    # but anyone can claim it for the buyer
+    claimItem(client, appID, buyers[0], purchase, claimer=buyers[1])
+    assert getBalances(client, buyers[0].getAddress())[assetID] == 1
+    with pytest.raises(ValueError):
+        claimItem(client, appID, buyers[0], purchase)
+
+    # the pool is sealed by the first purchase
+    txn = transaction.ApplicationCallTxn(
+        sender=creator.getAddress(),
+        index=appID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        app_args=encode_call(CONTRACT, "load", (1).to_bytes(8, "big")),
+        accounts=[pages[0].getAddress()],
+        sp=getSuggestedParams(client),
+    )
+    with pytest.raises(AlgodHTTPError):
+        client.send_transaction(txn.sign(creator.getPrivateKey()))
+
+
+def test_pending_purchases_are_bounded():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+
+    appID, _, _, _ = createDrop(client, creator, MAX_PENDING + 1, 0)
+
+    for _ in range(MAX_PENDING):
+        buyDraw(client, appID, buyer, PRICE)
+    with pytest.raises(AlgodHTTPError):
+        buyDraw(client, appID, buyer, PRICE)
+
+
+def test_unclaimed_purchases_expire():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+
+    appID, beacon, pages, _ = createDrop(client, creator, 30, 2)
+    purchases = [buyDraw(client, appID, buyer, PRICE) for _ in range(2)]
+    for _ in purchases:
+        drawItem(client, appID, creator, beacon, pages)
+    claimItem(client, appID, buyer, purchases[0])
+
+    # the buyer has CLAIM_ROUNDS to claim
+    with pytest.raises(AlgodHTTPError):
+        expirePurchase(client, appID, creator, purchases[1])
+    client.advanceRounds(CLAIM_ROUNDS)
+    # the empty blocks leave the cached params outside their validity window
+    getSuggestedParamsProvider(client).observeRound(client.status()["last-round"])
+    # a claimed purchase is gone
+    with pytest.raises(ValueError):
+        expirePurchase(client, appID, creator, purchases[0])
+
+    before = getBalances(client, buyer.getAddress())[0]
+    expirePurchase(client, appID, creator, purchases[1])
+    assert getBalances(client, buyer.getAddress())[0] == before + PRICE
+    with pytest.raises(ValueError):
+        claimItem(client, appID, buyer, purchases[1])
+
+    # nothing is left pending to hold up the close
+    closeShuffle(client, appID, creator)
+
+
+def test_undrawn_purchases_expire():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    buyer = getTemporaryAccount(client)
+
+    appID, beacon, pages, _ = createDrop(client, creator, 30, 2)
+    purchases = [buyDraw(client, appID, buyer, PRICE) for _ in range(2)]
+
+    # the creator stops drawing, the buyer waits CLAIM_ROUNDS from the purchase
+    with pytest.raises(AlgodHTTPError):
+        expirePurchase(client, appID, buyer, purchases[0])
+    client.advanceRounds(CLAIM_ROUNDS)
+    getSuggestedParamsProvider(client).observeRound(client.status()["last-round"])
+    # and purchases are refunded in the order they would be drawn
+    with pytest.raises(AlgodHTTPError):
+        expirePurchase(client, appID, buyer, purchases[1])
+
+    before = getBalances(client, buyer.getAddress())[0]
+    expirePurchase(client, appID, buyer, purchases[0])
+    assert getBalances(client, buyer.getAddress())[0] == before + PRICE - MIN_TXN_FEE - EXPIRE_INNER_FEES
+    assert getAppGlobalState(client, appID)[b"d"] == 1
+
+    # the next draw moves on to the purchase after it
+    drawn, _, _ = drawItem(client, appID, creator, beacon, pages)
+    assert drawn == purchases[1]
+    claimItem(client, appID, buyer, purchases[1])
+    closeShuffle(client, appID, creator)
+
+
+def test_ten_thousand_item_drop():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    client.fund(creator.getAddress(), 1_100_000_000)
+    buyer = getTemporaryAccount(client)
+    count = 10_000
+    draws = 10
+
+    roundBefore = client.status()["last-round"]
+    appID, beacon, pages, assetIDs = createDrop(client, creator, count, draws)
+    assert getAppGlobalState(client, appID)[b"n"] == count
+    assert len(pages) == 45
+    # a round for the creation, then one per group of the mints, the page
+    # opt-ins and the loads
+    assert client.status()["last-round"] - roundBefore == (
+        1
+        + groupCount(count, MAX_TXN_GROUP_SIZE)
+        + groupCount(len(pages), PAGES_PER_GROUP)
+        + groupCount(len(pages), MAX_TXN_GROUP_SIZE)
+    )
+
+    costs = []
+    for _ in range(draws):
+        purchase = buyDraw(client, appID, buyer, PRICE)
+        _, assetID, txID = drawItem(client, appID, creator, beacon, pages)
+        costs.append(client.getOpcodeCost(txID))
+        claimItem(client, appID, buyer, purchase)
+        assert assetID in assetIDs
+
+    assert getAppGlobalState(client, appID)[b"n"] == count - draws
+    # every draw costs the same, whichever index it draws, within the cost
+    # recorded for it by the analyzer
+    assert len(set(costs)) == 1
+    with open(DEFAULT_THRESHOLDS_PATH) as f:
+        thresholds = json.load(f)
+    assert costs[0] <= thresholds["shuffle_approval"]["NoOp/draw"]["cost"]
 
 
 def test_version():
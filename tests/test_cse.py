@@ -0,0 +1,82 @@
+from pyteal import App, Assert, Bytes, If, Int, Mode, Seq, Txn, compileTeal
+
+from utils.analyzer import contractReports
+from utils.cse import cacheRepeatedReads
+
+
+def compile(expr):
+    return compileTeal(expr, mode=Mode.Application, version=5)
+
+
+def test_cacheRepeatedReads():
+    price = App.globalGet(Bytes("price"))
+    branch = Seq(
+        Assert(price > Int(1)),
+        Assert(price < Int(10)),
+        If(Txn.fee() > Int(0)).Then(Assert(price != Int(5))),
+        Assert(price * Int(2) + price > Int(0)),
+        Int(1),
+    )
+
+    teal = compile(cacheRepeatedReads(branch))
+
+    assert teal.count("app_global_get") == 1
+    # stored where first read, then loaded for every read
+    assert teal.count("store 0") == 1
+    assert teal.count("load 0") == 5
+    # the original expression is left unchanged
+    assert compile(branch).count("app_global_get") == 5
+
+
+def test_cacheRepeatedReads_writtenKeys():
+    price = App.globalGet(Bytes("price"))
+    branch = Seq(
+        Assert(price > Int(1)),
+        App.globalPut(Bytes("price"), price + Int(1)),
+        Assert(price < Int(10)),
+        Assert(price != Int(5)),
+        Int(1),
+    )
+
+    # the key changes during the branch, so every read stays
+    assert compile(cacheRepeatedReads(branch)).count("app_global_get") == 4
+
+
+def test_cacheRepeatedReads_conditional():
+    price = App.globalGet(Bytes("price"))
+    branch = If(
+        Txn.fee() > Int(0),
+        Seq(Assert(price > Int(1)), Assert(price < Int(10)), Assert(price != Int(5)), Int(1)),
+        Seq(Assert(price > Int(1)), Assert(price < Int(10)), Assert(price != Int(5)), Int(0)),
+    )
+
+    # no read happens on every path, so none can be cached for the others
+    assert compile(cacheRepeatedReads(branch)).count("app_global_get") == 6
+
+
+def test_cacheRepeatedReads_region():
+    price = App.globalGet(Bytes("price"))
+    branch = Seq(
+        If(Txn.fee() > Int(0)).Then(
+            Seq(Assert(price > Int(1)), Assert(price < Int(10)), Assert(price != Int(5)), Assert(price != Int(6)))
+        ),
+        Assert(price > Int(0)),
+        Int(1),
+    )
+
+    teal = compile(cacheRepeatedReads(branch))
+
+    # cached within the If body, but read again after it
+    assert teal.count("app_global_get") == 2
+    assert teal.count("load 0") == 4
+
+
+def test_contract_savings():
+    before = {report.name: report for report in contractReports(optimize=False)}
+    after = {report.name: report for report in contractReports()}
+
+    assert after["escrow_approval"].branch("NoOp/on_buy").cost < before["escrow_approval"].branch("NoOp/on_buy").cost
+    assert after["auction_approval"].branch("NoOp/bid").cost < before["auction_approval"].branch("NoOp/bid").cost
+    for name, report in after.items():
+        for branch in report.branches:
+            assert branch.cost <= before[name].branch(branch.name).cost
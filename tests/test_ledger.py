@@ -0,0 +1,195 @@
+from base64 import b64decode
+
+import pytest
+from algosdk import account
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+
+from utils.helper import getBalances, getLastBlockTimestamp, waitForTransaction
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.params import withFlatFee
+
+
+def test_advance_clock():
+    client = LocalAlgodClient(timestamp=1_000)
+
+    client.advanceTo(5_000)
+    _, timestamp = getLastBlockTimestamp(client)
+    assert timestamp == 5_000
+
+    client.advanceTime(60)
+    _, timestamp = getLastBlockTimestamp(client)
+    assert timestamp == 5_060
+
+    with pytest.raises(ValueError):
+        client.advanceTo(1_000)
+
+
+def test_failed_group_is_not_applied():
+    client = LocalAlgodClient()
+
+    sender = getTemporaryAccount(client, 1_000_000)
+    receiver = getTemporaryAccount(client, 1_000_000)
+
+    suggestedParams = client.suggested_params()
+    payTxn = transaction.PaymentTxn(
+        sender=sender.getAddress(),
+        receiver=receiver.getAddress(),
+        amt=100_000,
+        sp=suggestedParams,
+    )
+    # leaves the sender below the minimum balance
+    overspendTxn = transaction.PaymentTxn(
+        sender=sender.getAddress(),
+        receiver=receiver.getAddress(),
+        amt=850_000,
+        sp=suggestedParams,
+    )
+    transaction.assign_group_id([payTxn, overspendTxn])
+
+    with pytest.raises(AlgodHTTPError):
+        client.send_transactions([
+            payTxn.sign(sender.getPrivateKey()),
+            overspendTxn.sign(sender.getPrivateKey()),
+        ])
+
+    assert getBalances(client, sender.getAddress()) == {0: 1_000_000}
+    assert getBalances(client, receiver.getAddress()) == {0: 1_000_000}
+
+
+def test_failed_txn_does_not_create_account():
+    client = LocalAlgodClient()
+
+    sender = getTemporaryAccount(client, 1_000_000)
+    newAddress = account.generate_account()[1]
+
+    # below the minimum balance of the new account
+    txn = transaction.PaymentTxn(sender.getAddress(), client.suggested_params(), newAddress, 1_000)
+    with pytest.raises(AlgodHTTPError):
+        client.send_transaction(txn.sign(sender.getPrivateKey()))
+
+    assert getBalances(client, newAddress) == {0: 0}
+
+
+def test_close_account():
+    client = LocalAlgodClient()
+
+    sender = getTemporaryAccount(client, 1_000_000)
+    receiver = getTemporaryAccount(client, 1_000_000)
+
+    txn = transaction.PaymentTxn(
+        sender=sender.getAddress(),
+        receiver=receiver.getAddress(),
+        amt=0,
+        close_remainder_to=receiver.getAddress(),
+        sp=client.suggested_params(),
+    )
+    signedTxn = txn.sign(sender.getPrivateKey())
+    client.send_transaction(signedTxn)
+
+    response = waitForTransaction(client, signedTxn.get_txid())
+    assert response.closingAmount == 999_000
+    assert getBalances(client, sender.getAddress()) == {0: 0}
+    assert getBalances(client, receiver.getAddress()) == {0: 1_999_000}
+
+
+def createApp(client, sender, source):
+    """Create an app running `source` for both of its programs."""
+    program = b64decode(client.compile(source)["result"])
+    txn = transaction.ApplicationCreateTxn(
+        sender=sender.getAddress(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=program,
+        clear_program=program,
+        global_schema=transaction.StateSchema(0, 0),
+        local_schema=transaction.StateSchema(0, 0),
+        sp=client.suggested_params(),
+    )
+    signedTxn = txn.sign(sender.getPrivateKey())
+    client.send_transaction(signedTxn)
+    return waitForTransaction(client, signedTxn.get_txid()).applicationIndex
+
+
+PAY_FOREIGN_APP = """#pragma version {version}
+txn ApplicationID
+bz done
+itxn_begin
+int pay
+itxn_field TypeEnum
+txna Applications 1
+app_params_get AppAddress
+assert
+itxn_field Receiver
+int 100000
+itxn_field Amount
+int 0
+itxn_field Fee
+itxn_submit
+done:
+int 1
+"""
+
+
+@pytest.mark.parametrize("version, available", [(6, False), (7, True)])
+def test_foreign_app_address_available_from_v7(version, available):
+    client = LocalAlgodClient()
+    sender = getTemporaryAccount(client)
+
+    targetID = createApp(client, sender, PAY_FOREIGN_APP.format(version=version))
+    payerID = createApp(client, sender, PAY_FOREIGN_APP.format(version=version))
+    client.fund(get_application_address(payerID), 1_000_000)
+
+    txn = transaction.ApplicationCallTxn(
+        sender=sender.getAddress(),
+        index=payerID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        foreign_apps=[targetID],
+        sp=withFlatFee(client.suggested_params(), 2_000),
+    )
+    if available:
+        client.send_transaction(txn.sign(sender.getPrivateKey()))
+        assert getBalances(client, get_application_address(targetID))[0] == 100_000
+    else:
+        with pytest.raises(AlgodHTTPError):
+            client.send_transaction(txn.sign(sender.getPrivateKey()))
+
+
+READ_FOREIGN_APP = """#pragma version {version}
+txn ApplicationID
+bz done
+int {reference}
+byte "k"
+app_global_get_ex
+pop
+pop
+done:
+int 1
+"""
+
+
+@pytest.mark.parametrize(
+    "version, byID, available",
+    [(3, False, True), (3, True, False), (4, False, True), (4, True, True)],
+)
+def test_foreign_app_reference(version, byID, available):
+    client = LocalAlgodClient()
+    sender = getTemporaryAccount(client)
+
+    # before v4 a foreign app is only referenced by its slot index
+    targetID = createApp(client, sender, READ_FOREIGN_APP.format(version=version, reference=0))
+    reference = targetID if byID else 1
+    readerID = createApp(client, sender, READ_FOREIGN_APP.format(version=version, reference=reference))
+
+    txn = transaction.ApplicationCallTxn(
+        sender=sender.getAddress(),
+        index=readerID,
+        on_complete=transaction.OnComplete.NoOpOC,
+        foreign_apps=[targetID],
+        sp=client.suggested_params(),
+    )
+    if available:
+        client.send_transaction(txn.sign(sender.getPrivateKey()))
+    else:
+        with pytest.raises(AlgodHTTPError):
+            client.send_transaction(txn.sign(sender.getPrivateKey()))
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+from algosdk.future import transaction
+
+from tests.helper_escrow import buildOrderTxns
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.helper import waitForTransaction
+from utils.params import (
+    AsyncSuggestedParamsProvider,
+    SuggestedParamsProvider,
+    getSuggestedParams,
+    getSuggestedParamsProvider,
+)
+
+
+class SlowClient(LocalAlgodClient):
+    def __init__(self) -> None:
+        super().__init__()
+        self.fetches = 0
+
+    def suggested_params(self, **kwargs):
+        self.fetches += 1
+        time.sleep(0.05)
+        return super().suggested_params(**kwargs)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_burst_shares_params():
+    client = SlowClient()
+    buyer = getTemporaryAccount(client)
+    creator = getTemporaryAccount(client)
+    client.fetches = 0
+
+    groups = [buildOrderTxns(1, buyer, 2, 1_000 + i, creator.getAddress(), getSuggestedParams(client)) for i in range(1_000)]
+
+    assert client.fetches == 1
+    assert len({group[0].group for group in groups}) == 1_000
+
+
+def test_refresh_policy():
+    client = LocalAlgodClient()
+    clock = FakeClock()
+    provider = SuggestedParamsProvider(client, maxAge=4.0, refreshMargin=10, clock=clock)
+
+    params = provider.get()
+    # callers get their own copy
+    params.fee = 1_000_000
+    assert provider.get().fee != params.fee
+    assert provider.fetches == 1
+
+    provider.observeRound(params.first + 1)
+    provider.get()
+    assert provider.fetches == 2
+
+    clock.now += 5
+    provider.get()
+    assert provider.fetches == 3
+
+    # the validity window is about to close
+    provider.observeRound(provider.get().last - 10)
+    client.advanceRounds(5)
+    provider.get()
+    assert provider.fetches == 5
+
+
+def test_wait_refreshes_params_on_new_block():
+    client = LocalAlgodClient()
+    sender = getTemporaryAccount(client)
+    provider = getSuggestedParamsProvider(client)
+
+    txn = transaction.PaymentTxn(sender.getAddress(), getSuggestedParams(client), sender.getAddress(), 0)
+    fetches = provider.fetches
+    waitForTransaction(client, client.send_transaction(txn.sign(sender.getPrivateKey())))
+
+    # the transaction's block makes the cached params stale
+    assert getSuggestedParams(client).first > txn.first_valid_round
+    assert provider.fetches == fetches + 1
+
+
+def test_concurrent_threads_share_fetch():
+    client = SlowClient()
+    provider = SuggestedParamsProvider(client)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(provider.get())) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 20
+    assert client.fetches == 1
+
+
+def test_concurrent_coroutines_share_fetch():
+    client = LocalAlgodClient()
+    fetches = []
+
+    class AsyncClient:
+        async def suggested_params(self) -> transaction.SuggestedParams:
+            fetches.append(1)
+            await asyncio.sleep(0.01)
+            return client.suggested_params()
+
+    async def run():
+        provider = AsyncSuggestedParamsProvider(AsyncClient())
+        return await asyncio.gather(*(provider.get() for _ in range(50)))
+
+    results = asyncio.run(run())
+
+    assert len(results) == 50
+    assert len(set(map(id, results))) == 50
+    assert len(fetches) == 1
@@ -0,0 +1,96 @@
+import pytest
+
+from utils.analyzer import contractReports
+from utils.avm import AVMError, EvalContext, evaluate, parseProgram
+from utils.peephole import RULES, optimizeTeal
+
+# (rule, snippet, input stacks, values left on the stack). Every snippet is
+# run on each input stack, before and after the rewrite, and must leave the
+# same values and scratch space or fail on both.
+CASES = [
+    ("and-true", "==\nint 1\n&&", [(1, 1), (1, 2), (b"a", b"a"), (b"a", 1)], 1),
+    ("or-false", "<\nint 0\n||", [(1, 2), (2, 1), (b"a", 1)], 1),
+    ("double-not", "!=\n!\n!", [(0, 0), (0, 3), (b"a", b"b")], 1),
+    ("equals-zero", "int 0\n==", [(0,), (5,), (b"",)], 1),
+    ("test-not-zero", "int 0\n!=\nassert", [(7, 0), (7, 1), (7, b"x")], 1),
+    ("negated-branch", "!\nbnz skip\nint 7\nstore 3\nskip:", [(0,), (3,), (b"",)], 0),
+    ("negated-branch", "!\nbz skip\nint 7\nstore 3\nskip:", [(0,), (3,)], 0),
+    ("branch-over-jump", "bnz next\nb done\nnext:\nint 7\nstore 3\ndone:", [(0,), (2,), (b"",)], 0),
+    ("jump-to-next", "b next\nnext:\nint 1", [()], 1),
+    ("unused-value", "txn Fee\npop", [()], 0),
+    ("unused-value", "dup\npop", [(1,), (b"a",)], 1),
+    ("swap-swap", "swap\nswap", [(1, b"a")], 2),
+    ("store-load", "store 3\nload 3", [(4,), (b"a",)], 1),
+    ("repeated-expression", 'byte "k"\napp_global_get\nbyte "k"\napp_global_get', [()], 2),
+    ("repeated-expression", "load 3\nint 1\n+\nload 3\nint 1\n+", [()], 2),
+    ("repeated-expression", "txna ApplicationArgs 0\nbtoi\ntxna ApplicationArgs 0\nbtoi", [()], 2),
+    ("repeated-expression", "txna ApplicationArgs 1\nbtoi\ntxna ApplicationArgs 1\nbtoi", [()], 2),
+]
+
+
+class SnippetContext(EvalContext):
+    """Just enough of a ledger for the snippets."""
+
+    def __init__(self) -> None:
+        self.group = [{"Fee": 1000, "ApplicationArgs": [(5).to_bytes(8, "big"), bytes(9)]}]
+        self.groupIndex = 0
+
+    def globalField(self, field):
+        return 1 if field == "CurrentApplicationID" else 0
+
+    def consumeBudget(self, cost):
+        pass
+
+    def getGlobal(self, appID, key):
+        return {b"k": 42}.get(key)
+
+
+def runSnippet(snippet, inputs, outputs):
+    """The scratch space after running `snippet` on `inputs`, with the
+    values it leaves stored from slot 100 on, or None if it fails."""
+    lines = ["#pragma version 6"]
+    for value in inputs:
+        lines.append("int {}".format(value) if isinstance(value, int) else "byte 0x" + value.hex())
+    lines.append(snippet)
+    lines += ["store {}".format(100 + i) for i in range(outputs)]
+    lines.append("int 1")
+    try:
+        return evaluate(parseProgram("\n".join(lines)), SnippetContext()).scratch
+    except AVMError:
+        return None
+
+
+@pytest.mark.parametrize("rule, snippet, stacks, outputs", CASES, ids=[case[0] for case in CASES])
+def test_rule_preserves_semantics(rule, snippet, stacks, outputs):
+    applied = {}
+    optimized = optimizeTeal(snippet, applied=applied)
+
+    assert applied.get(rule, 0) >= 1
+    assert len(optimized.splitlines()) < len(snippet.splitlines()) or len(optimized) < len(snippet)
+    for inputs in stacks:
+        assert runSnippet(optimized, inputs, outputs) == runSnippet(snippet, inputs, outputs)
+
+
+def test_every_rule_is_checked():
+    assert {name for name, _ in RULES} == {case[0] for case in CASES}
+
+
+def test_rules_stay_within_blocks():
+    # a jump to the label sees a different stack than the fall through
+    assert optimizeTeal("int 0\nlabel:\n==") == "int 0\nlabel:\n=="
+    assert optimizeTeal("txn Fee\nlabel:\ntxn Fee") == "txn Fee\nlabel:\ntxn Fee"
+    # nor do values of unknown type lose their checks
+    assert optimizeTeal("load 1\nint 1\n&&") == "load 1\nint 1\n&&"
+
+
+def test_contract_savings():
+    before = {report.name: report for report in contractReports(peephole=False)}
+    after = {report.name: report for report in contractReports()}
+
+    for name, report in after.items():
+        assert [branch.name for branch in report.branches] == [branch.name for branch in before[name].branches]
+        for branch in report.branches:
+            assert branch.cost <= before[name].branch(branch.name).cost
+            assert branch.size <= before[name].branch(branch.name).size
+    assert after["escrow_approval"].branch("DeleteApplication").cost < before["escrow_approval"].branch("DeleteApplication").cost
+    assert after["marketplace_approval"].size < before["marketplace_approval"].size
@@ -0,0 +1,73 @@
+import pytest
+from algosdk.future import transaction
+
+from utils.assembler import disassemble
+from utils.avm import AVMError
+from utils.cache import programHash
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.template import ProgramTemplate
+
+# approves payments of at most TMPL_LIMIT to TMPL_RECEIVER, with the
+# variables on both sides of a branch
+TEMPLATE = """#pragma version 5
+txn Amount
+int TMPL_LIMIT
+<=
+bnz check_receiver
+err
+check_receiver:
+txn Receiver
+addr TMPL_RECEIVER
+==
+txn Amount
+int TMPL_LIMIT
+int 1
+-
+int 1
++
+<=
+&&
+"""
+
+
+def pay(client, program, receiver, amount):
+    lsig = transaction.LogicSigAccount(program)
+    txn = transaction.PaymentTxn(lsig.address(), client.suggested_params(), receiver, amount)
+    client.send_transaction(transaction.LogicSigTransaction(txn, lsig))
+
+
+def test_fill():
+    client = LocalAlgodClient()
+    receiver = getTemporaryAccount(client)
+    template = ProgramTemplate(TEMPLATE)
+
+    assert template.variables == {"TMPL_LIMIT": "int", "TMPL_RECEIVER": "bytes"}
+    # values of different encoded lengths shift the code behind the blocks
+    for limit in (1, 10 ** 12):
+        program, address = template.fillWithHash({"TMPL_LIMIT": limit, "TMPL_RECEIVER": receiver.getAddress()})
+        assert address == programHash(program)
+        assert disassemble(program).instructions[0].args[0] == limit
+
+        client.fund(address, 1_000_000 + limit)
+        pay(client, program, receiver.getAddress(), limit)
+        with pytest.raises(Exception, match="err opcode"):
+            pay(client, program, receiver.getAddress(), limit + 1)
+        # past the branch
+        with pytest.raises(Exception, match="rejected by logic"):
+            pay(client, program, address, limit)
+
+
+def test_fill_missing_value():
+    template = ProgramTemplate(TEMPLATE)
+
+    with pytest.raises(ValueError):
+        template.fill({"TMPL_LIMIT": 1})
+    with pytest.raises(ValueError):
+        template.fill({"TMPL_LIMIT": -1, "TMPL_RECEIVER": bytes(32)})
+
+
+def test_variables_are_constants():
+    with pytest.raises(AVMError):
+        ProgramTemplate("#pragma version 5\nbyte TMPL_KEY\napp_global_get\nint TMPL_KEY\n==")
+    with pytest.raises(AVMError):
+        ProgramTemplate("#pragma version 5\nbnz TMPL_LABEL\nint 1")
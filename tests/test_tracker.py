@@ -0,0 +1,146 @@
+import pytest
+from algosdk.future import transaction
+
+from contracts.abi import encode_call
+from contracts.escrow import CONTRACT, TEAL_VERSION, approval_program, clear_state_program, global_schema
+from utils.helper import createDummyAsset, fullyCompileContract
+from utils.ledger import LocalAlgodClient, getTemporaryAccount
+from utils.tracker import ConfirmationTracker, waitForTransactions
+
+
+class CountingClient(LocalAlgodClient):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = {}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def status(self, **kwargs):
+        self._count("status")
+        return super().status(**kwargs)
+
+    def status_after_block(self, *args, **kwargs):
+        self._count("status_after_block")
+        return super().status_after_block(*args, **kwargs)
+
+    def block_info(self, *args, **kwargs):
+        self._count("block_info")
+        return super().block_info(*args, **kwargs)
+
+    def pending_transaction_info(self, *args, **kwargs):
+        self._count("pending_transaction_info")
+        return super().pending_transaction_info(*args, **kwargs)
+
+
+def sendPayments(client, sender, receiver, count):
+    txIDs = []
+    for i in range(count):
+        txn = transaction.PaymentTxn(sender.getAddress(), client.suggested_params(), receiver.getAddress(), 1_000 + i)
+        txIDs.append(client.send_transaction(txn.sign(sender.getPrivateKey())))
+    return txIDs
+
+
+def test_matches_pending_transaction_info():
+    client = LocalAlgodClient()
+    creator = getTemporaryAccount(client)
+    closer = getTemporaryAccount(client, 1_000_000)
+
+    assetID = createDummyAsset(client, 1, creator)
+
+    globalUints, globalByteSlices = global_schema()
+    tracker = ConfirmationTracker(client)
+    createTxn = transaction.ApplicationCreateTxn(
+        sender=creator.getAddress(),
+        sp=client.suggested_params(),
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=fullyCompileContract(client, approval_program(), version=TEAL_VERSION),
+        clear_program=fullyCompileContract(client, clear_state_program(), version=TEAL_VERSION),
+        global_schema=transaction.StateSchema(num_uints=globalUints, num_byte_slices=globalByteSlices),
+        local_schema=transaction.StateSchema(num_uints=0, num_byte_slices=0),
+        app_args=encode_call(CONTRACT, "create", assetID, creator.getAddress(), 5),
+    )
+    closeTxn = transaction.PaymentTxn(
+        closer.getAddress(), client.suggested_params(), creator.getAddress(), 0, close_remainder_to=creator.getAddress()
+    )
+    txIDs = [
+        client.send_transaction(createTxn.sign(creator.getPrivateKey())),
+        client.send_transaction(closeTxn.sign(closer.getPrivateKey())),
+    ]
+    futures = [tracker.track(txID) for txID in txIDs]
+    tracker.wait()
+
+    for txID, future in zip(txIDs, futures):
+        expected = client.pending_transaction_info(txID)
+        response = future.result()
+        assert response.confirmedRound == expected["confirmed-round"]
+        assert response.applicationIndex == expected.get("application-index")
+        assert response.txn == expected["txn"]
+        assert response.globalStateDelta == expected.get("global-state-delta")
+    assert futures[1].result().closingAmount > 0
+
+
+def test_api_calls_do_not_grow_with_txids():
+    client = CountingClient()
+    sender = getTemporaryAccount(client)
+    receiver = getTemporaryAccount(client)
+
+    tracker = ConfirmationTracker(client)
+    startRound = tracker.lastRound
+    txIDs = sendPayments(client, sender, receiver, 50)
+    resolved = []
+    for txID in txIDs:
+        tracker.track(txID, callback=resolved.append)
+    client.calls.clear()
+    tracker.wait()
+
+    assert len(resolved) == 50
+    assert all(future.result().confirmedRound > 0 for future in resolved)
+    # one block fetched per round, no per-txid lookups
+    assert client.calls["block_info"] == client.status()["last-round"] - startRound
+    assert "pending_transaction_info" not in client.calls
+
+
+def test_timeout():
+    client = LocalAlgodClient()
+
+    tracker = ConfirmationTracker(client, timeout=3)
+    missing = tracker.track("A" * 52)
+    tracker.wait()
+
+    with pytest.raises(Exception, match="not confirmed after 3 rounds"):
+        missing.result()
+
+
+def test_wait_for_transactions_after_submission():
+    client = LocalAlgodClient()
+    sender = getTemporaryAccount(client)
+    receiver = getTemporaryAccount(client)
+
+    txIDs = sendPayments(client, sender, receiver, 3)
+    responses = waitForTransactions(client, txIDs)
+
+    assert [r.confirmedRound for r in responses] == [client.pending_transaction_info(txID)["confirmed-round"] for txID in txIDs]
+
+
+class DroppingClient(LocalAlgodClient):
+    dropped = "B" * 52
+
+    def pending_transaction_info(self, transaction_id, *args, **kwargs):
+        if transaction_id == self.dropped:
+            return {"pool-error": "overspend", "txn": {}}
+        return super().pending_transaction_info(transaction_id, *args, **kwargs)
+
+
+def test_dropped_fails_at_next_round():
+    client = DroppingClient()
+
+    tracker = ConfirmationTracker(client, timeout=10)
+    startRound = tracker.lastRound
+    dropped = tracker.track(client.dropped)
+    tracker.waitForBlock()
+
+    # reported like waitForTransaction does, without waiting for the timeout
+    assert tracker.lastRound == startRound + 1
+    with pytest.raises(Exception, match="Pool error: overspend"):
+        dropped.result()
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import ssl
+from base64 import b64decode, b64encode
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urlsplit
+
+from algosdk import constants, encoding
+from algosdk.error import AlgodHTTPError, AlgodResponseError
+from algosdk.future import transaction
+from pyteal import Expr, Mode, compileTeal
+
+from utils.cache import CompileCache, compilerIdentity, formatBuild, getDefaultCompileCache
+from utils.helper import PendingTxnResponse, assembleCached, decodeState, lookupCompiled, storeCompiled
+from utils.params import getSuggestedParamsProvider
+from utils.peephole import optimizeTeal
+
+API_VERSION_PREFIX = "/v2"
+ALGOD_AUTH_HEADER = "X-Algo-API-Token"
+DEFAULT_MAX_CONNECTIONS = 16
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class AsyncAlgodClient:
+    """An asyncio counterpart of algosdk's AlgodClient.
+
+    Requests are sent over a pool of keep-alive HTTP/1.1 connections. At most
+    `maxConnections` requests are in flight at once; further requests wait for
+    a connection to free up, so any number of coroutines can share a client.
+    Methods take the same arguments and return the same values as their
+    AlgodClient equivalents.
+    """
+
+    def __init__(
+        self,
+        algod_token: str,
+        algod_address: str,
+        headers: Optional[Dict[str, str]] = None,
+        maxConnections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: Optional[float] = None,
+    ) -> None:
+        if maxConnections < 1:
+            raise ValueError("maxConnections must be at least 1")
+        self.algod_token = algod_token
+        self.algod_address = algod_address
+        self.headers = headers
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+
+        url = urlsplit(algod_address)
+        self._secure = url.scheme == "https"
+        self._host = url.hostname or "localhost"
+        self._port = url.port or (443 if self._secure else 80)
+        self._basePath = url.path.rstrip("/")
+
+        self._idle: List[_Connection] = []
+        # created on first use so the client can be built outside the event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+        # the node's build, asked once by nodeBuild
+        self._build: Optional[str] = None
+
+    async def __aenter__(self) -> "AsyncAlgodClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close all idle connections."""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    # -- transport ------------------------------------------------------------
+
+    async def _open(self) -> _Connection:
+        context = ssl.create_default_context() if self._secure else None
+        reader, writer = await asyncio.open_connection(self._host, self._port, ssl=context)
+        return _Connection(reader, writer)
+
+    async def algod_request(
+        self,
+        method: str,
+        requrl: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        response_format: str = "json",
+    ) -> Any:
+        header = {"User-Agent": "py-algorand-sdk", ALGOD_AUTH_HEADER: self.algod_token}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+
+        path = self._basePath + (requrl if requrl in constants.unversioned_paths else API_VERSION_PREFIX + requrl)
+        if params:
+            path += "?" + urlencode(params)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.maxConnections)
+        async with self._slots:
+            request = self._send(method, path, header, data)
+            if self.timeout is not None:
+                request = asyncio.wait_for(request, self.timeout)
+            code, body = await request
+
+        if code >= 400:
+            message = body.decode("utf-8", "replace")
+            try:
+                message = json.loads(message)["message"]
+            except (ValueError, KeyError, TypeError):
+                pass
+            raise AlgodHTTPError(message, code)
+        if response_format != "json":
+            return body
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise AlgodResponseError("Failed to parse JSON response from algod") from e
+
+    async def _send(self, method: str, path: str, header: Dict[str, str], data: Optional[bytes]) -> Tuple[int, bytes]:
+        lines = ["{} {} HTTP/1.1".format(method, path), "Host: {}".format(self._host)]
+        lines += ["{}: {}".format(name, value) for name, value in header.items()]
+        lines.append("Content-Length: {}".format(len(data or b"")))
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (data or b"")
+
+        while True:
+            reused = bool(self._idle)
+            connection = self._idle.pop() if reused else await self._open()
+            try:
+                connection.writer.write(request)
+                await connection.writer.drain()
+                code, body, keepAlive = await self._readResponse(connection.reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection.close()
+                if reused:
+                    # the server closed the idle connection, retry on a new one
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if keepAlive:
+                self._idle.append(connection)
+            else:
+                connection.close()
+            return code, body
+
+    @staticmethod
+    async def _readResponse(reader: asyncio.StreamReader) -> Tuple[int, bytes, bool]:
+        statusLine = await reader.readline()
+        if not statusLine:
+            raise ConnectionResetError("connection closed by algod")
+        version, code = statusLine.decode("latin-1").split(" ", 2)[:2]
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n"):
+                break
+            if not line:
+                raise asyncio.IncompleteReadError(b"", None)
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keepAlive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # skip trailers
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keepAlive = False
+        return int(code), body, keepAlive
+
+    # -- algod API --------------------------------------------------------------
+
+    async def status(self, **kwargs: Any) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/status", **kwargs)
+
+    async def status_after_block(self, block_num: Optional[int] = None, round_num: Optional[int] = None, **kwargs: Any) -> Dict[str, Any]:
+        number = block_num if block_num is not None else round_num
+        if number is None:
+            raise ValueError("block_num or round_num is required")
+        return await self.algod_request("GET", "/status/wait-for-block-after/{}".format(number), **kwargs)
+
+    async def suggested_params(self, **kwargs: Any) -> transaction.SuggestedParams:
+        res = await self.algod_request("GET", "/transactions/params", **kwargs)
+        return transaction.SuggestedParams(
+            res["fee"],
+            res["last-round"],
+            res["last-round"] + 1000,
+            res["genesis-hash"],
+            res["genesis-id"],
+            False,
+            res["consensus-version"],
+            res["min-fee"],
+        )
+
+    async def versions(self, **kwargs: Any) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/versions", **kwargs)
+
+    async def compile(self, source: str, **kwargs: Any) -> Dict[str, str]:
+        headers = dict(kwargs.pop("headers", None) or {}, **{"Content-Type": "application/x-binary"})
+        return await self.algod_request("POST", "/teal/compile", data=source.encode("utf-8"), headers=headers, **kwargs)
+
+    async def send_transaction(self, txn: Any, **kwargs: Any) -> str:
+        return await self.send_raw_transaction(encoding.msgpack_encode(txn), **kwargs)
+
+    async def send_transactions(self, txns: List[Any], **kwargs: Any) -> str:
+        serialized = b"".join(b64decode(encoding.msgpack_encode(txn)) for txn in txns)
+        return await self.send_raw_transaction(b64encode(serialized), **kwargs)
+
+    async def send_raw_transaction(self, txn: Union[str, bytes], **kwargs: Any) -> str:
+        headers = dict(kwargs.pop("headers", None) or {}, **{"Content-Type": "application/x-binary"})
+        response = await self.algod_request("POST", "/transactions", data=b64decode(txn), headers=headers, **kwargs)
+        return response["txId"]
+
+    async def pending_transaction_info(self, transaction_id: str, response_format: str = "json", **kwargs: Any) -> Any:
+        return await self.algod_request(
+            "GET",
+            "/transactions/pending/" + transaction_id,
+            params={"format": response_format},
+            response_format=response_format,
+            **kwargs
+        )
+
+    async def account_info(self, address: str, **kwargs: Any) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/accounts/" + address, **kwargs)
+
+    async def application_info(self, application_id: int, **kwargs: Any) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/applications/{}".format(application_id), **kwargs)
+
+    async def asset_info(self, asset_id: int, **kwargs: Any) -> Dict[str, Any]:
+        return await self.algod_request("GET", "/assets/{}".format(asset_id), **kwargs)
+
+    async def block_info(self, block: Optional[int] = None, response_format: str = "json", round_num: Optional[int] = None, **kwargs: Any) -> Any:
+        number = block if block is not None else round_num
+        if number is None:
+            raise ValueError("block or round_num is required")
+        return await self.algod_request(
+            "GET",
+            "/blocks/{}".format(number),
+            params={"format": response_format},
+            response_format=response_format,
+            **kwargs
+        )
+
+
+async def gatherLimited(aws: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    """Like asyncio.gather, but with at most `limit` of `aws` running at once."""
+    slots = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable[Any]) -> Any:
+        async with slots:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws))
+
+
+async def waitForTransaction(client: AsyncAlgodClient, txID: str, timeout: int = 10) -> PendingTxnResponse:
+    lastStatus = await client.status()
+    lastRound = lastStatus["last-round"]
+    startRound = lastRound
+    # every new block is a chance to refresh the cached suggested params
+    provider = getSuggestedParamsProvider(client)
+    provider.observeRound(lastRound)
+
+    while lastRound < startRound + timeout:
+        pending_txn = await client.pending_transaction_info(txID)
+
+        if pending_txn.get("confirmed-round", 0) > 0:
+            return PendingTxnResponse(pending_txn)
+
+        if pending_txn["pool-error"]:
+            raise Exception("Pool error: {}".format(pending_txn["pool-error"]))
+
+        lastStatus = await client.status_after_block(lastRound + 1)
+        provider.observeRound(lastStatus["last-round"])
+
+        lastRound += 1
+
+    raise Exception(
+        "Transaction {} not confirmed after {} rounds".format(txID, timeout)
+    )
+
+
+async def nodeBuild(client: AsyncAlgodClient) -> str:
+    """The build of the algod node behind `client`, asked once per client."""
+    if client._build is None:
+        client._build = formatBuild(await client.versions())
+    return client._build
+
+
+async def fullyCompileContract(
+    client: AsyncAlgodClient,
+    contract: Expr,
+    cache: Optional[CompileCache] = None,
+    version: int = 5,
+    optimize: bool = True,
+) -> bytes:
+    teal = compileTeal(contract, mode=Mode.Application, version=version)
+    if optimize:
+        teal = optimizeTeal(teal)
+
+    if cache is None:
+        cache = getDefaultCompileCache()
+    program = assembleCached(teal, version, cache)
+    if program is not None:
+        return program
+
+    # the local assembler lags behind algod, let the node assemble it
+    key, program = lookupCompiled(teal, version, cache, compilerIdentity(client, await nodeBuild(client)))
+    if program is None:
+        program = storeCompiled(cache, key, await client.compile(teal))
+    return program
+
+
+async def getAppGlobalState(client: AsyncAlgodClient, appID: int) -> Dict[bytes, Union[int, bytes]]:
+    appInfo = await client.application_info(appID)
+    return decodeState(appInfo["params"]["global-state"])
+
+
+async def getAppCreator(client: AsyncAlgodClient, appID: int) -> str:
+    appInfo = await client.application_info(appID)
+    return appInfo["params"]["creator"]
+
+
+async def getBalances(client: AsyncAlgodClient, account: str) -> Dict[int, int]:
+    balances: Dict[int, int] = dict()
+
+    accountInfo = await client.account_info(account)
+
+    # set key 0 to Algo balance
+    balances[0] = accountInfo["amount"]
+
+    assets: List[Dict[str, Any]] = accountInfo.get("assets", [])
+    for assetHolding in assets:
+        balances[assetHolding["asset-id"]] = assetHolding["amount"]
+
+    return balances
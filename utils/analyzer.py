@@ -0,0 +1,477 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from utils.assembler import assembleProgram, disassemble, instructionSizes
+from utils.avm import Instruction, Program, parseProgram
+from utils.opcodes import MAX_APP_PROGRAM_COST, OPS_BY_NAME
+from utils.peephole import optimizeTeal
+from utils.setup import get_project_root_path
+
+DEFAULT_THRESHOLDS_PATH = os.path.join(get_project_root_path(), "tests", "fixtures", "cost_thresholds.json")
+
+# thresholds applied to every branch unless overridden
+DEFAULT_THRESHOLDS = {"cost": MAX_APP_PROGRAM_COST}
+
+# worst-case value of a path through a loop or recursive subroutine
+UNBOUNDED = float("inf")
+# value of a path that can only end in err, which never costs a successful call
+_FAILS = float("-inf")
+
+_INNER_SUBMITS = ("itxn_submit", "itxn_next")
+
+
+class BasicBlock:
+    def __init__(self, start: int, end: int) -> None:
+        self.start = start
+        self.end = end
+        # indexes of the blocks execution may continue in
+        self.successors: List[int] = []
+        # subroutine entry called at the end of this block, if any
+        self.call: Optional[int] = None
+
+
+class ControlFlowGraph:
+    """Basic blocks of a TEAL program and the edges between them.
+
+    Blocks are indexed by their first instruction. A block ending in callsub
+    has the called subroutine in `call` and the instruction after the call as
+    its only successor; retsub ends a block without successors.
+    """
+
+    def __init__(self, program: Program) -> None:
+        self.program = program
+        instructions = program.instructions
+
+        leaders = {0} | set(program.labels.values())
+        for index, instr in enumerate(instructions):
+            if instr.op in ("b", "bz", "bnz", "callsub", "return", "err", "retsub"):
+                leaders.add(index + 1)
+        starts = sorted(leader for leader in leaders if leader < len(instructions))
+
+        self.blocks: Dict[int, BasicBlock] = {}
+        for start, end in zip(starts, starts[1:] + [len(instructions)]):
+            block = BasicBlock(start, end)
+            last = instructions[end - 1]
+            if last.op in ("b", "bz", "bnz"):
+                block.successors.append(program.labels[last.args[0]])
+            if last.op == "callsub":
+                block.call = program.labels[last.args[0]]
+            if last.op not in ("b", "return", "err", "retsub") and end < len(instructions):
+                block.successors.append(end)
+            self.blocks[start] = block
+
+        self.subroutines: Dict[int, str] = {}
+        for instr in instructions:
+            if instr.op == "callsub":
+                self.subroutines[program.labels[instr.args[0]]] = instr.args[0]
+
+    def reachable(self, entry: int) -> List[int]:
+        """Blocks reachable from `entry` without entering called subroutines."""
+        seen: Set[int] = set()
+        stack = [entry]
+        while stack:
+            start = stack.pop()
+            if start in seen or start not in self.blocks:
+                continue
+            seen.add(start)
+            stack.extend(self.blocks[start].successors)
+        return sorted(seen)
+
+    def calls(self, entry: int) -> List[int]:
+        """Subroutines called, directly or not, from the blocks reachable from `entry`."""
+        found: List[int] = []
+        stack = [entry]
+        visited: Set[int] = set()
+        while stack:
+            start = stack.pop()
+            if start in visited:
+                continue
+            visited.add(start)
+            for block in self.reachable(start):
+                call = self.blocks[block].call
+                if call is not None:
+                    if call not in found:
+                        found.append(call)
+                    stack.append(call)
+        return found
+
+    def worstCase(self, entry: int, weight: Callable[[Instruction], int]) -> float:
+        """The largest total weight of any successful path from `entry` to
+        return (or retsub, inside a subroutine), counting called subroutines.
+
+        Paths that can only end in err are ignored; UNBOUNDED is returned when
+        a loop or recursion is reachable.
+        """
+        memo: Dict[int, float] = {}
+        active: Set[int] = set()
+
+        def visit(start: int) -> float:
+            if start in memo:
+                return memo[start]
+            if start in active:
+                return UNBOUNDED
+            active.add(start)
+            block = self.blocks[start]
+            instructions = self.program.instructions[block.start:block.end]
+            total: float = sum(weight(instr) for instr in instructions)
+            if block.call is not None:
+                total += visit(block.call)
+            last = instructions[-1].op
+            if last == "err":
+                result = _FAILS
+            elif last in ("return", "retsub"):
+                result = total
+            elif block.successors:
+                result = total + max(visit(successor) for successor in block.successors)
+            else:
+                # falling off the end of the program returns
+                result = total
+            active.discard(start)
+            memo[start] = result
+            return result
+
+        return visit(entry)
+
+
+def opcodeCost(instr: Instruction) -> int:
+    spec = OPS_BY_NAME.get(instr.op)
+    # int and byte pseudo-ops assemble to single constant loads
+    return spec.cost if spec is not None else 1
+
+
+def innerTxnCount(instr: Instruction) -> int:
+    return 1 if instr.op in _INNER_SUBMITS else 0
+
+
+def _conditionName(program: Program, block: BasicBlock, constantNames: Dict[str, str]) -> Optional[str]:
+    """Name a Cond branch after the constant its condition compares with,
+    or the name `constantNames` gives that constant."""
+    lines = program.source.splitlines()
+    instructions = program.instructions[block.start:block.end]
+    # "ApplicationID == 0" as the peephole pass leaves it
+    if len(instructions) >= 2 and instructions[-1].op == "bz":
+        previous = instructions[-2]
+        if previous.op == "txn" and previous.args[0] == "ApplicationID":
+            return "create"
+    for index in range(len(instructions) - 1, -1, -1):
+        instr = instructions[index]
+        if instr.op not in ("int", "byte"):
+            continue
+        text = lines[instr.line - 1].strip().split(None, 1)[1]
+        previous = instructions[index - 1] if index else None
+        if previous is not None and previous.op == "txn" and previous.args[0] == "ApplicationID" and instr.args[0] == 0:
+            return "create"
+        return constantNames.get(text, text.strip('"'))
+    return None
+
+
+class BranchReport:
+    def __init__(self, name: str, label: str, cost: float, size: int, innerTxns: float, calls: List[str]) -> None:
+        self.name = name
+        self.label = label
+        self.cost = cost
+        self.size = size
+        self.innerTxns = innerTxns
+        self.calls = calls
+
+    def toJson(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "label": self.label,
+            "cost": _jsonNumber(self.cost),
+            "size": self.size,
+            "innerTxns": _jsonNumber(self.innerTxns),
+            "calls": self.calls,
+        }
+
+
+class ProgramReport:
+    def __init__(self, name: str, version: int, size: int, cost: float) -> None:
+        self.name = name
+        self.version = version
+        self.size = size
+        self.cost = cost
+        self.branches: List[BranchReport] = []
+        self.subroutines: List[BranchReport] = []
+
+    def branch(self, name: str) -> BranchReport:
+        for branch in self.branches:
+            if branch.name == name:
+                return branch
+        raise KeyError(name)
+
+    def toJson(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "size": self.size,
+            "cost": _jsonNumber(self.cost),
+            "branches": [branch.toJson() for branch in self.branches],
+            "subroutines": [subroutine.toJson() for subroutine in self.subroutines],
+        }
+
+
+def _jsonNumber(value: float) -> Any:
+    if value == UNBOUNDED:
+        return "unbounded"
+    if value == _FAILS:
+        return None
+    return int(value)
+
+
+def analyzeProgram(teal: str, name: str = "program", constantNames: Optional[Dict[str, str]] = None) -> ProgramReport:
+    """Report the worst-case opcode cost, byte size and inner transaction
+    count of every branch of the top-level Cond of a compiled program.
+
+    Branches are found by following the chain of bnz (or bz) tests from the
+    program entry up to its final err, as PyTeal compiles Cond. A branch
+    that is a Cond itself (such as a NoOp branch dispatching on the first
+    application argument) is reported along with each of its branches, named
+    "<outer>/<inner>". Branches testing a constant `constantNames` maps,
+    such as a method selector, are named after it. Costs include the
+    dispatch leading to the branch and every subroutine it calls; sizes
+    cover only the branch's own code, with subroutines reported separately.
+    """
+    program = parseProgram(teal)
+    cfg = ControlFlowGraph(program)
+    headerSize, sizes = instructionSizes(program)
+
+    def blockSize(start: int) -> int:
+        block = cfg.blocks[start]
+        return sum(sizes[block.start:block.end])
+
+    # the constant blocks the assembler prepends run before everything else
+    prologueCost = _leadingConstantBlocks(disassemble(assembleProgram(program))) - _leadingConstantBlocks(program)
+
+    report = ProgramReport(name, program.version, headerSize + sum(sizes), prologueCost + cfg.worstCase(0, opcodeCost))
+
+    def dispatch(start: int, prefixCost: float, prefixInner: float, prefix: str) -> bool:
+        chain: List[Tuple[int, str, float, float]] = []
+        current = start
+        cost, inner = prefixCost, prefixInner
+        while True:
+            block = cfg.blocks[current]
+            instructions = program.instructions[block.start:block.end]
+            cost += sum(opcodeCost(instr) for instr in instructions)
+            inner += sum(innerTxnCount(instr) for instr in instructions)
+            last = instructions[-1]
+            if last.op == "err" and chain:
+                break
+            if last.op not in ("bnz", "bz") or block.call is not None or len(block.successors) != 2:
+                return False
+            name = _conditionName(program, block, constantNames or {}) or last.args[0]
+            chain.append((program.labels[last.args[0]], name, cost, inner))
+            current = block.successors[1]
+
+        for target, name, branchCost, branchInner in chain:
+            fullName = prefix + name
+            blocks = cfg.reachable(target)
+            report.branches.append(
+                BranchReport(
+                    fullName,
+                    _labelOf(program, target),
+                    branchCost + cfg.worstCase(target, opcodeCost),
+                    sum(blockSize(b) for b in blocks),
+                    branchInner + cfg.worstCase(target, innerTxnCount),
+                    [cfg.subroutines[call] for call in cfg.calls(target)],
+                )
+            )
+            dispatch(target, branchCost, branchInner, fullName + "/")
+        return True
+
+    dispatch(0, prologueCost, 0, "")
+
+    for entry, label in sorted(cfg.subroutines.items()):
+        blocks = cfg.reachable(entry)
+        report.subroutines.append(
+            BranchReport(
+                label,
+                label,
+                cfg.worstCase(entry, opcodeCost),
+                sum(blockSize(b) for b in blocks),
+                cfg.worstCase(entry, innerTxnCount),
+                [cfg.subroutines[call] for call in cfg.calls(entry)],
+            )
+        )
+    return report
+
+
+def _leadingConstantBlocks(program: Program) -> int:
+    count = 0
+    for instr in program.instructions[:2]:
+        if instr.op not in ("intcblock", "bytecblock"):
+            break
+        count += 1
+    return count
+
+
+def _labelOf(program: Program, index: int) -> str:
+    for label, target in program.labels.items():
+        if target == index:
+            return label
+    return str(index)
+
+
+def checkThresholds(report: ProgramReport, thresholds: Dict[str, Any]) -> List[str]:
+    """Return a message for every branch of `report` over its thresholds.
+
+    `thresholds` maps program names to branch names to limits on "cost",
+    "size" and "innerTxns"; limits under the "*" key apply to every branch
+    (and "*" at the top level to every program). DEFAULT_THRESHOLDS applies
+    when nothing else does.
+    """
+    defaults = dict(DEFAULT_THRESHOLDS)
+    defaults.update(thresholds.get("*", {}).get("*", {}))
+    programThresholds = thresholds.get(report.name, {})
+    defaults.update(programThresholds.get("*", {}))
+
+    violations = []
+    for branch in report.branches:
+        limits = dict(defaults)
+        limits.update(programThresholds.get(branch.name, {}))
+        for metric, limit in limits.items():
+            value = getattr(branch, metric)
+            if limit is not None and value > limit:
+                violations.append(
+                    "{}: branch {} {} {} exceeds {}".format(report.name, branch.name, metric, _jsonNumber(value), limit)
+                )
+    return violations
+
+
+def contractReports(optimize: bool = True, peephole: bool = True) -> List[ProgramReport]:
+    """Analyze the approval programs of the contracts in this repository,
+    as fullyCompileContract deploys them.
+
+    With `optimize` False, contracts built through utils.cse are analyzed
+    as they are without it; with `peephole` False, the compiled TEAL is
+    analyzed without the rewrites of utils.peephole.
+    """
+    from pyteal import Mode, compileTeal
+
+    from contracts import auction, escrow, escrow_factory, escrow_royalty, marketplace, shuffle
+
+    contracts: Dict[str, Tuple[Callable[[], Any], int, Any]] = {
+        "escrow_approval": (lambda: escrow.approval_program(optimize=optimize), escrow.TEAL_VERSION, escrow.CONTRACT),
+        "escrow_royalty_approval": (
+            lambda: escrow_royalty.approval_program(optimize=optimize),
+            escrow_royalty.TEAL_VERSION,
+            escrow_royalty.CONTRACT,
+        ),
+        "escrow_persistent_approval": (
+            lambda: escrow.approval_program(optimize=optimize, persistent=True),
+            escrow.TEAL_VERSION,
+            escrow.PERSISTENT_CONTRACT,
+        ),
+        "escrow_factory_approval": (escrow_factory.approval_program, escrow_factory.TEAL_VERSION, escrow_factory.CONTRACT),
+        # the escrows the factory creates
+        "escrow_factory_child_approval": (
+            lambda: escrow.approval_program(optimize=optimize, factory=True),
+            escrow.TEAL_VERSION,
+            escrow.FACTORY_CONTRACT,
+        ),
+        "auction_approval": (
+            lambda: auction.approval_program(optimize=optimize),
+            auction.TEAL_VERSION,
+            auction.CONTRACT,
+        ),
+        "auction_pull_approval": (
+            lambda: auction.approval_program(optimize=optimize, pull_refunds=True),
+            auction.TEAL_VERSION,
+            auction.PULL_CONTRACT,
+        ),
+        "marketplace_approval": (marketplace.approval_program, marketplace.TEAL_VERSION, None),
+        "shuffle_approval": (lambda: shuffle.approval_program(optimize=optimize), shuffle.TEAL_VERSION, shuffle.CONTRACT),
+    }
+    reports = []
+    for name, (contract, version, description) in contracts.items():
+        # some contracts print while building, keep stdout machine-readable
+        with redirect_stdout(sys.stderr):
+            teal = compileTeal(contract(), mode=Mode.Application, version=version)
+        if peephole:
+            teal = optimizeTeal(teal)
+        # name the branches of ABI methods after the method, not its selector
+        methods = description.methods if description is not None else []
+        selectors = {"0x" + method.get_selector().hex(): method.name for method in methods}
+        reports.append(analyzeProgram(teal, name, selectors))
+    return reports
+
+
+def compareReports(before: List[ProgramReport], after: List[ProgramReport]) -> List[str]:
+    """Describe the change in cost and size of every branch from `before` to
+    `after`, one line per branch."""
+    lines = []
+    for old, new in zip(before, after):
+        for branch in new.branches:
+            previous = old.branch(branch.name)
+            lines.append(
+                "{} {}: cost {} -> {} ({:+}), size {} -> {} ({:+})".format(
+                    new.name,
+                    branch.name,
+                    _jsonNumber(previous.cost),
+                    _jsonNumber(branch.cost),
+                    _jsonNumber(branch.cost - previous.cost),
+                    previous.size,
+                    branch.size,
+                    branch.size - previous.size,
+                )
+            )
+    return lines
+
+
+def recordThresholds(reports: List[ProgramReport], thresholds: Dict[str, Any]) -> Dict[str, Any]:
+    """Return `thresholds` with every branch limited to its current cost,
+    size and inner transaction count."""
+    recorded = {key: value for key, value in thresholds.items() if key == "*"}
+    for report in reports:
+        programThresholds = {key: value for key, value in thresholds.get(report.name, {}).items() if key == "*"}
+        for branch in report.branches:
+            programThresholds[branch.name] = {
+                "cost": _jsonNumber(branch.cost),
+                "size": branch.size,
+                "innerTxns": _jsonNumber(branch.innerTxns),
+            }
+        recorded[report.name] = programThresholds
+    return recorded
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report worst-case cost and size of each contract branch")
+    parser.add_argument("--check", action="store_true", help="fail if a branch exceeds its threshold")
+    parser.add_argument("--record", action="store_true", help="set the thresholds to the current values")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS_PATH, help="JSON file of thresholds")
+    parser.add_argument("--compare", action="store_true", help="show the savings of the common-subexpression pass")
+    parser.add_argument("--compare-peephole", action="store_true", help="show the savings of the peephole pass")
+    args = parser.parse_args(argv)
+
+    reports = contractReports()
+    if args.compare or args.compare_peephole:
+        before = contractReports(optimize=False) if args.compare else contractReports(peephole=False)
+        for line in compareReports(before, reports):
+            print(line)
+        return 0
+    json.dump([report.toJson() for report in reports], sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+    thresholds: Dict[str, Any] = {}
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    if args.record:
+        with open(args.thresholds, "w") as f:
+            json.dump(recordThresholds(reports, thresholds), f, indent=2)
+            f.write("\n")
+        return 0
+    if not args.check:
+        return 0
+    violations = [v for report in reports for v in checkThresholds(report, thresholds)]
+    for violation in violations:
+        print(violation, file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
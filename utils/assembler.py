@@ -0,0 +1,319 @@
+import hashlib
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import avm, opcodes
+from utils.avm import AVMError, Instruction, Program, parseProgram
+from utils.opcodes import (
+    BRANCHES,
+    FIELD_INDEXES,
+    FIELD_TABLES,
+    IMM_BYTES,
+    IMM_BYTES_BLOCK,
+    IMM_INT16_LABEL,
+    IMM_UINT8,
+    IMM_VARINT,
+    IMM_VARINT_BLOCK,
+    OPS_BY_CODE,
+    OPS_BY_NAME,
+)
+
+# algod replaces int/byte pseudo-ops with an optimized constant block from v4
+OPTIMIZE_CONSTANTS_VERSION = 4
+# pushint/pushbytes exist from v3
+PUSH_CONSTANTS_VERSION = 3
+# branches may only jump backwards from v4
+BACKWARD_BRANCH_VERSION = 4
+
+# see assemblerIdentity
+_IDENTITY: Optional[str] = None
+
+_INTC_SHORTCUTS = (0x22, 0x23, 0x24, 0x25)
+_BYTEC_SHORTCUTS = (0x28, 0x29, 0x2A, 0x2B)
+
+
+def assemblerIdentity() -> str:
+    """Identify this build of the assembler by the hash of its source, and
+    of the parser and opcode table it relies on, so that the programs it
+    assembled are cached apart from those of any other build."""
+    global _IDENTITY
+    if _IDENTITY is None:
+        digest = hashlib.sha256()
+        for module in (sys.modules[__name__], avm, opcodes):
+            with open(module.__file__, "rb") as f:
+                digest.update(f.read())
+        _IDENTITY = "utils.assembler:" + digest.hexdigest()
+    return _IDENTITY
+
+
+def encodeUvarint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decodeUvarint(data: bytes, offset: int) -> Tuple[int, int]:
+    """Return the varint at `offset` and the offset just past it."""
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise AVMError("program ends in the middle of a varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise AVMError("varint overflows uint64")
+
+
+def _encodeBytes(value: bytes) -> bytes:
+    return encodeUvarint(len(value)) + value
+
+
+def constantBlock(values: List[Any], version: int) -> List[Any]:
+    """Pick the constants that go in the prepended intcblock/bytecblock.
+
+    Before v4 every distinct constant is placed in the block in order of first
+    use. From v4 algod orders constants by how often they are referenced
+    (ties keep first-use order) and leaves out constants used only once,
+    which are pushed inline instead.
+    """
+    distinct: List[Any] = []
+    counts: Dict[Any, int] = {}
+    for value in values:
+        if value not in counts:
+            distinct.append(value)
+            counts[value] = 0
+        counts[value] += 1
+    if version < OPTIMIZE_CONSTANTS_VERSION:
+        return distinct
+    ordered = sorted(distinct, key=lambda value: -counts[value])
+    return [value for value in ordered if counts[value] > 1]
+
+
+def _constantReference(
+    value: Any,
+    block: List[Any],
+    explicit: Optional[List[Any]],
+    isInt: bool,
+    version: int,
+) -> bytes:
+    source = explicit if explicit is not None else block
+    if value in source:
+        index = source.index(value)
+        shortcuts = _INTC_SHORTCUTS if isInt else _BYTEC_SHORTCUTS
+        if index < len(shortcuts):
+            return bytes([shortcuts[index]])
+        if index > 255:
+            raise AVMError("constant block exceeds 256 entries")
+        return bytes([0x21 if isInt else 0x27, index])
+    if version < PUSH_CONSTANTS_VERSION:
+        raise AVMError("{} is not in the constant block".format(value))
+    if isInt:
+        return bytes([0x81]) + encodeUvarint(value)
+    return bytes([0x80]) + _encodeBytes(value)
+
+
+def _encodeInstruction(instr: Instruction, version: int) -> bytes:
+    spec = OPS_BY_NAME[instr.op]
+    if spec.version > version:
+        raise AVMError("{} opcode was introduced in TEAL v{}".format(instr.op, spec.version), instr.line)
+
+    out = bytearray([spec.code])
+    if spec.immediates == (IMM_VARINT_BLOCK,):
+        out += encodeUvarint(len(instr.args))
+        for value in instr.args:
+            out += encodeUvarint(value)
+        return bytes(out)
+    if spec.immediates == (IMM_BYTES_BLOCK,):
+        out += encodeUvarint(len(instr.args))
+        for value in instr.args:
+            out += _encodeBytes(value)
+        return bytes(out)
+
+    for kind, arg in zip(spec.immediates, instr.args):
+        if kind == IMM_UINT8:
+            out.append(arg)
+        elif kind == IMM_VARINT:
+            out += encodeUvarint(arg)
+        elif kind == IMM_BYTES:
+            out += _encodeBytes(arg)
+        else:
+            index = FIELD_INDEXES[kind][arg]
+            minVersion = FIELD_TABLES[kind][index][1]
+            if minVersion > version:
+                raise AVMError("{} field {} was introduced in TEAL v{}".format(instr.op, arg, minVersion), instr.line)
+            out.append(index)
+    return bytes(out)
+
+
+def _encodeProgram(program: Program) -> Tuple[bytes, List[bytes]]:
+    """Return the header (version and constant blocks) and the encoding of
+    each instruction."""
+    version = program.version
+    instructions = program.instructions
+
+    explicitInts: Optional[List[Any]] = None
+    explicitBytes: Optional[List[Any]] = None
+    for instr in instructions:
+        if instr.op == "intcblock" and explicitInts is None:
+            explicitInts = list(instr.args)
+        elif instr.op == "bytecblock" and explicitBytes is None:
+            explicitBytes = list(instr.args)
+
+    intBlock: List[Any] = []
+    if explicitInts is None:
+        intBlock = constantBlock([i.args[0] for i in instructions if i.op == "int"], version)
+    byteBlock: List[Any] = []
+    if explicitBytes is None:
+        byteBlock = constantBlock([i.args[0] for i in instructions if i.op == "byte"], version)
+
+    # one encoded chunk per instruction; branch offsets are patched below
+    chunks: List[bytes] = []
+    for instr in instructions:
+        try:
+            if instr.op == "int":
+                chunks.append(_constantReference(instr.args[0], intBlock, explicitInts, True, version))
+            elif instr.op == "byte":
+                chunks.append(_constantReference(instr.args[0], byteBlock, explicitBytes, False, version))
+            elif instr.op in BRANCHES:
+                spec = OPS_BY_NAME[instr.op]
+                if spec.version > version:
+                    raise AVMError("{} opcode was introduced in TEAL v{}".format(instr.op, spec.version))
+                chunks.append(bytes([spec.code, 0, 0]))
+            else:
+                chunks.append(_encodeInstruction(instr, version))
+        except AVMError as e:
+            if e.line:
+                raise
+            raise AVMError(str(e), instr.line)
+
+    positions = [0]
+    for chunk in chunks:
+        positions.append(positions[-1] + len(chunk))
+
+    for index, instr in enumerate(instructions):
+        if instr.op not in BRANCHES:
+            continue
+        target = positions[program.labels[instr.args[0]]]
+        offset = target - positions[index + 1]
+        if offset < 0 and version < BACKWARD_BRANCH_VERSION:
+            raise AVMError("label {} is a back reference, which requires v4".format(instr.args[0]), instr.line)
+        if not -0x8000 <= offset <= 0x7FFF:
+            raise AVMError("label {} is too far away".format(instr.args[0]), instr.line)
+        chunks[index] = chunks[index][:1] + (offset & 0xFFFF).to_bytes(2, "big")
+
+    header = bytearray(encodeUvarint(version))
+    if intBlock:
+        header.append(0x20)
+        header += encodeUvarint(len(intBlock))
+        for value in intBlock:
+            header += encodeUvarint(value)
+    if byteBlock:
+        header.append(0x26)
+        header += encodeUvarint(len(byteBlock))
+        for value in byteBlock:
+            header += _encodeBytes(value)
+    return bytes(header), chunks
+
+
+def assembleProgram(program: Program) -> bytes:
+    """Encode a parsed program the same way algod's assembler does."""
+    header, chunks = _encodeProgram(program)
+    return header + b"".join(chunks)
+
+
+def instructionSizes(program: Program) -> Tuple[int, List[int]]:
+    """Return the size in bytes of the program header and of each instruction
+    once assembled."""
+    header, chunks = _encodeProgram(program)
+    return len(header), [len(chunk) for chunk in chunks]
+
+
+def assemble(source: str) -> bytes:
+    """Assemble TEAL source into bytecode without contacting algod.
+
+    Raises UnknownOpcodeError for opcodes this assembler does not support and
+    AVMError for any other assembly error.
+    """
+    return assembleProgram(parseProgram(source))
+
+
+def disassemble(program: bytes) -> Program:
+    """Decode bytecode into a Program the evaluator can run.
+
+    Branch targets become labels named after their byte offset.
+    """
+    try:
+        version, pc = decodeUvarint(program, 0)
+        instructions: List[Instruction] = []
+        starts: Dict[int, int] = {}
+        targets: Dict[int, int] = {}
+
+        while pc < len(program):
+            start = pc
+            spec = OPS_BY_CODE.get(program[pc])
+            if spec is None:
+                raise AVMError("invalid opcode 0x{:02x} at pc {}".format(program[pc], pc))
+            if spec.version > version:
+                raise AVMError("{} opcode was introduced in TEAL v{}".format(spec.name, spec.version))
+            pc += 1
+
+            args: List[Any] = []
+            for kind in spec.immediates:
+                if kind == IMM_UINT8:
+                    args.append(program[pc])
+                    pc += 1
+                elif kind == IMM_VARINT:
+                    value, pc = decodeUvarint(program, pc)
+                    args.append(value)
+                elif kind == IMM_BYTES:
+                    length, pc = decodeUvarint(program, pc)
+                    args.append(program[pc:pc + length])
+                    pc += length
+                elif kind == IMM_VARINT_BLOCK:
+                    count, pc = decodeUvarint(program, pc)
+                    for _ in range(count):
+                        value, pc = decodeUvarint(program, pc)
+                        args.append(value)
+                elif kind == IMM_BYTES_BLOCK:
+                    count, pc = decodeUvarint(program, pc)
+                    for _ in range(count):
+                        length, pc = decodeUvarint(program, pc)
+                        args.append(program[pc:pc + length])
+                        pc += length
+                elif kind == IMM_INT16_LABEL:
+                    offset = int.from_bytes(program[pc:pc + 2], "big", signed=True)
+                    pc += 2
+                    targets[len(instructions)] = pc + offset
+                    args.append(None)
+                else:
+                    table = FIELD_TABLES[kind]
+                    if program[pc] >= len(table):
+                        raise AVMError("invalid {} index {} at pc {}".format(kind, program[pc], pc))
+                    args.append(table[program[pc]][0])
+                    pc += 1
+            if pc > len(program):
+                raise AVMError("program ends in the middle of {}".format(spec.name))
+
+            starts[start] = len(instructions)
+            instructions.append(Instruction(spec.name, tuple(args), 0))
+        starts[len(program)] = len(instructions)
+    except IndexError:
+        raise AVMError("program ends in the middle of an instruction")
+
+    labels: Dict[str, int] = {}
+    for index, target in targets.items():
+        if target not in starts:
+            raise AVMError("branch target {} is not an instruction boundary".format(target))
+        label = "label{}".format(target)
+        labels[label] = starts[target]
+        instr = instructions[index]
+        instructions[index] = Instruction(instr.op, (label,), instr.line)
+    return Program(version, instructions, labels)
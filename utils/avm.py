@@ -0,0 +1,1592 @@
+from base64 import b32decode, b64decode
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from algosdk import encoding
+
+from utils.opcodes import (
+    FIELD_INDEXES,
+    IMM_BYTES,
+    IMM_BYTES_BLOCK,
+    IMM_INT16_LABEL,
+    IMM_UINT8,
+    IMM_VARINT,
+    IMM_VARINT_BLOCK,
+    MAX_INNER_TXNS,
+    MAX_LOG_CALLS,
+    MAX_LOG_SIZE,
+    MAX_STACK_DEPTH,
+    MAX_STRING_SIZE,
+    NAMED_INTS,
+    OPS_BY_NAME,
+    TXN_ARRAY_FIELDS,
+    TXN_TYPE_ENUMS,
+)
+
+StackValue = Union[int, bytes]
+TxnFields = Dict[str, Any]
+
+MAX_UINT64 = 2 ** 64 - 1
+MAX_BYTE_MATH_SIZE = 64
+ZERO_ADDRESS = bytes(32)
+
+# Transaction fields holding 32 byte addresses, defaulting to the zero address
+ADDRESS_FIELDS = (
+    "Sender",
+    "Receiver",
+    "CloseRemainderTo",
+    "AssetSender",
+    "AssetReceiver",
+    "AssetCloseTo",
+    "RekeyTo",
+    "ConfigAssetManager",
+    "ConfigAssetReserve",
+    "ConfigAssetFreeze",
+    "ConfigAssetClawback",
+    "FreezeAssetAccount",
+)
+
+# Transaction fields holding byte strings, every other scalar field is a uint64
+BYTES_FIELDS = ADDRESS_FIELDS + (
+    "Note",
+    "Lease",
+    "VotePK",
+    "SelectionPK",
+    "Type",
+    "TxID",
+    "ApprovalProgram",
+    "ClearStateProgram",
+    "ConfigAssetUnitName",
+    "ConfigAssetName",
+    "ConfigAssetURL",
+    "ConfigAssetMetadataHash",
+    "LastLog",
+    "StateProofPK",
+)
+
+# Fields an application may set on an inner transaction
+INNER_TXN_SETTABLE_FIELDS = (
+    "Sender",
+    "Fee",
+    "Note",
+    "Receiver",
+    "Amount",
+    "CloseRemainderTo",
+    "Type",
+    "TypeEnum",
+    "XferAsset",
+    "AssetAmount",
+    "AssetSender",
+    "AssetReceiver",
+    "AssetCloseTo",
+    "ApplicationID",
+    "OnCompletion",
+    "ApplicationArgs",
+    "Accounts",
+    "ApprovalProgram",
+    "ClearStateProgram",
+    "RekeyTo",
+    "ConfigAsset",
+    "ConfigAssetTotal",
+    "ConfigAssetDecimals",
+    "ConfigAssetDefaultFrozen",
+    "ConfigAssetUnitName",
+    "ConfigAssetName",
+    "ConfigAssetURL",
+    "ConfigAssetMetadataHash",
+    "ConfigAssetManager",
+    "ConfigAssetReserve",
+    "ConfigAssetFreeze",
+    "ConfigAssetClawback",
+    "FreezeAsset",
+    "FreezeAssetAccount",
+    "FreezeAssetFrozen",
+    "Assets",
+    "Applications",
+    "GlobalNumUint",
+    "GlobalNumByteSlice",
+    "LocalNumUint",
+    "LocalNumByteSlice",
+    "ExtraProgramPages",
+    "Nonparticipation",
+)
+
+
+class AVMError(Exception):
+    """Raised when a program fails to parse or is rejected during evaluation"""
+
+    def __init__(self, message: str, line: int = 0) -> None:
+        if line:
+            message = "line {}: {}".format(line, message)
+        super().__init__(message)
+        self.line = line
+
+
+class UnknownOpcodeError(AVMError):
+    """Raised when a program uses an opcode this module does not know"""
+
+
+class Instruction(NamedTuple):
+    """A single parsed opcode with its immediate arguments"""
+
+    op: str
+    args: Tuple[Any, ...]
+    line: int
+
+
+class Program:
+    """A TEAL program ready for evaluation.
+
+    Branch instructions reference labels by name; `labels` maps every label to
+    the index of the instruction that follows it.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        instructions: List[Instruction],
+        labels: Dict[str, int],
+        source: str = "",
+    ) -> None:
+        self.version = version
+        self.instructions = instructions
+        self.labels = labels
+        self.source = source
+
+
+def getTxnField(txn: TxnFields, field: str) -> Any:
+    """Read a scalar transaction field, applying the protocol default."""
+    if field in txn:
+        return txn[field]
+    if field in TXN_ARRAY_FIELDS:
+        return []
+    if field == "NumAppArgs":
+        return len(txn.get("ApplicationArgs", []))
+    if field == "NumAccounts":
+        return len(txn.get("Accounts", []))
+    if field == "NumAssets":
+        return len(txn.get("Assets", []))
+    if field == "NumApplications":
+        return len(txn.get("Applications", []))
+    if field == "NumLogs":
+        return len(txn.get("Logs", []))
+    if field == "LastLog":
+        logs = txn.get("Logs", [])
+        return logs[-1] if logs else b""
+    if field in ADDRESS_FIELDS or field in ("Lease", "VotePK", "SelectionPK"):
+        return ZERO_ADDRESS
+    if field in BYTES_FIELDS:
+        return b""
+    return 0
+
+
+def getTxnArrayField(txn: TxnFields, field: str, index: int) -> StackValue:
+    """Read element `index` of an array transaction field.
+
+    As in the AVM, Accounts[0] is the sender and Applications[0] is the
+    called application.
+    """
+    if field not in TXN_ARRAY_FIELDS:
+        raise AVMError("{} is not an array field".format(field))
+
+    values = list(txn.get(field, []))
+    if field == "Accounts":
+        values = [getTxnField(txn, "Sender")] + values
+    elif field == "Applications":
+        values = [getTxnField(txn, "ApplicationID")] + values
+
+    if index >= len(values):
+        raise AVMError("invalid {} index {}".format(field, index))
+    return values[index]
+
+
+class EvalContext:
+    """Everything a program can observe or change while it runs.
+
+    The local ledger provides a concrete implementation; this base class
+    documents the interface the evaluator relies on.
+    """
+
+    mode: str = "application"
+    group: List[TxnFields] = []
+    groupIndex: int = 0
+    args: List[bytes] = []
+
+    @property
+    def txn(self) -> TxnFields:
+        return self.group[self.groupIndex]
+
+    def globalField(self, field: str) -> StackValue:
+        raise NotImplementedError
+
+    def consumeBudget(self, cost: int) -> None:
+        raise NotImplementedError
+
+    def remainingBudget(self) -> int:
+        raise NotImplementedError
+
+    def programHash(self) -> bytes:
+        raise NotImplementedError
+
+    def groupScratch(self, groupIndex: int) -> List[StackValue]:
+        raise NotImplementedError
+
+    def createdID(self, groupIndex: int) -> int:
+        raise NotImplementedError
+
+    def resolveAccount(self, value: StackValue) -> bytes:
+        raise NotImplementedError
+
+    def resolveAsset(self, value: int, foreign: bool = True) -> int:
+        """The asset `value` refers to. Before v4, opcodes whose operand is
+        not `foreign` take the ID itself, the others a Txn.ForeignAssets
+        slot index."""
+        raise NotImplementedError
+
+    def resolveApp(self, value: int, foreign: bool = True) -> int:
+        """The app `value` refers to, as resolveAsset, with 0 the current
+        app and the slots of Txn.ForeignApps counted from 1."""
+        raise NotImplementedError
+
+    def balance(self, account: bytes) -> int:
+        raise NotImplementedError
+
+    def minBalance(self, account: bytes) -> int:
+        raise NotImplementedError
+
+    def authAddr(self, account: bytes) -> bytes:
+        raise NotImplementedError
+
+    def optedIn(self, account: bytes, appID: int) -> bool:
+        raise NotImplementedError
+
+    def getGlobal(self, appID: int, key: bytes) -> Optional[StackValue]:
+        raise NotImplementedError
+
+    def putGlobal(self, key: bytes, value: StackValue) -> None:
+        raise NotImplementedError
+
+    def delGlobal(self, key: bytes) -> None:
+        raise NotImplementedError
+
+    def getLocal(self, account: bytes, appID: int, key: bytes) -> Optional[StackValue]:
+        raise NotImplementedError
+
+    def putLocal(self, account: bytes, key: bytes, value: StackValue) -> None:
+        raise NotImplementedError
+
+    def delLocal(self, account: bytes, key: bytes) -> None:
+        raise NotImplementedError
+
+    def assetHolding(self, account: bytes, assetID: int) -> Optional[Dict[str, StackValue]]:
+        raise NotImplementedError
+
+    def assetParams(self, assetID: int) -> Optional[Dict[str, StackValue]]:
+        raise NotImplementedError
+
+    def appParams(self, appID: int) -> Optional[Dict[str, StackValue]]:
+        raise NotImplementedError
+
+    def log(self, message: bytes) -> None:
+        raise NotImplementedError
+
+    def newInnerTxn(self) -> TxnFields:
+        raise NotImplementedError
+
+    def submitInner(self, group: List[TxnFields]) -> List[TxnFields]:
+        raise NotImplementedError
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+
+
+def _tokenize(line: str) -> List[str]:
+    """Split a source line into tokens, keeping quoted strings intact and
+    dropping comments."""
+    tokens: List[str] = []
+    i = 0
+    n = len(line)
+    while i < n:
+        c = line[i]
+        if c in " \t":
+            i += 1
+            continue
+        if line.startswith("//", i):
+            break
+        start = i
+        if c == '"':
+            i += 1
+            while i < n and line[i] != '"':
+                if line[i] == "\\":
+                    i += 1
+                i += 1
+            i += 1
+        else:
+            while i < n and line[i] not in " \t":
+                if line[i] == '"':
+                    i += 1
+                    while i < n and line[i] != '"':
+                        if line[i] == "\\":
+                            i += 1
+                        i += 1
+                i += 1
+        tokens.append(line[start:i])
+    return tokens
+
+
+def parseStringLiteral(token: str) -> bytes:
+    if len(token) < 2 or token[0] != '"' or token[-1] != '"':
+        raise AVMError("malformed string literal {}".format(token))
+    body = token[1:-1]
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c != "\\":
+            out += c.encode("utf-8")
+            i += 1
+            continue
+        i += 1
+        if i >= len(body):
+            raise AVMError("non-terminated escape sequence")
+        e = body[i]
+        if e == "n":
+            out.append(0x0A)
+        elif e == "r":
+            out.append(0x0D)
+        elif e == "t":
+            out.append(0x09)
+        elif e == "\\":
+            out.append(0x5C)
+        elif e == '"':
+            out.append(0x22)
+        elif e == "x":
+            out.append(int(body[i + 1 : i + 3], 16))
+            i += 2
+        else:
+            raise AVMError("invalid escape sequence \\{}".format(e))
+        i += 1
+    return bytes(out)
+
+
+def _decodeB32(value: str) -> bytes:
+    return b32decode(value + "=" * (-len(value) % 8))
+
+
+def _decodeB64(value: str) -> bytes:
+    return b64decode(value + "=" * (-len(value) % 4))
+
+
+def parseByteArgs(tokens: List[str]) -> Tuple[bytes, int]:
+    """Parse a byte constant from the start of `tokens`.
+
+    Returns the value and the number of tokens consumed.
+    """
+    if not tokens:
+        raise AVMError("byte constant expected")
+    first = tokens[0]
+    for prefix, decode in (("base64", _decodeB64), ("b64", _decodeB64), ("base32", _decodeB32), ("b32", _decodeB32)):
+        if first == prefix:
+            if len(tokens) < 2:
+                raise AVMError("{} needs an argument".format(prefix))
+            return decode(tokens[1]), 2
+        if first.startswith(prefix + "(") and first.endswith(")"):
+            return decode(first[len(prefix) + 1 : -1]), 1
+    if first.startswith("0x"):
+        return bytes.fromhex(first[2:]), 1
+    if first.startswith('"'):
+        return parseStringLiteral(first), 1
+    raise AVMError("byte constant did not parse: {}".format(first))
+
+
+def parseUint(token: str) -> int:
+    if token in NAMED_INTS:
+        return NAMED_INTS[token]
+    try:
+        if len(token) > 1 and token[0] == "0" and token[1].isdigit():
+            value = int(token, 8)
+        else:
+            value = int(token, 0)
+    except ValueError:
+        raise AVMError("unable to parse {!r} as integer".format(token))
+    if value < 0 or value > MAX_UINT64:
+        raise AVMError("integer {} out of range".format(token))
+    return value
+
+
+def methodSelector(signature: bytes) -> bytes:
+    """The ARC-4 selector: first 4 bytes of sha512/256 of the signature"""
+    return encoding.checksum(signature)[:4]
+
+
+def _parseField(kind: str, token: str, line: int) -> str:
+    if token not in FIELD_INDEXES[kind]:
+        raise AVMError("unknown field {}".format(token), line)
+    return token
+
+
+def parseProgram(source: str) -> Program:
+    """Parse TEAL assembly into a Program."""
+    version = 1
+    instructions: List[Instruction] = []
+    labels: Dict[str, int] = {}
+
+    for lineNumber, rawLine in enumerate(source.splitlines(), start=1):
+        stripped = rawLine.strip()
+        if stripped.startswith("#pragma"):
+            parts = stripped.split()
+            if len(parts) == 3 and parts[1] == "version":
+                version = parseUint(parts[2])
+                continue
+            raise AVMError("unknown pragma", lineNumber)
+
+        tokens = _tokenize(rawLine)
+        if not tokens:
+            continue
+        if len(tokens) == 1 and tokens[0].endswith(":"):
+            label = tokens[0][:-1]
+            if label in labels:
+                raise AVMError("duplicate label {}".format(label), lineNumber)
+            labels[label] = len(instructions)
+            continue
+
+        name, immediates = tokens[0], tokens[1:]
+        instructions.append(_parseInstruction(name, immediates, lineNumber))
+
+    for instr in instructions:
+        if instr.op in ("bnz", "bz", "b", "callsub") and instr.args[0] not in labels:
+            raise AVMError("reference to undefined label {}".format(instr.args[0]), instr.line)
+
+    return Program(version, instructions, labels, source)
+
+
+def _parseInstruction(name: str, immediates: List[str], line: int) -> Instruction:
+    try:
+        if name == "int":
+            _expectCount(immediates, 1, line)
+            return Instruction("int", (parseUint(immediates[0]),), line)
+        if name == "byte":
+            value, used = parseByteArgs(immediates)
+            _expectCount(immediates, used, line)
+            return Instruction("byte", (value,), line)
+        if name == "addr":
+            _expectCount(immediates, 1, line)
+            return Instruction("byte", (encoding.decode_address(immediates[0]),), line)
+        if name == "method":
+            _expectCount(immediates, 1, line)
+            return Instruction("byte", (methodSelector(parseStringLiteral(immediates[0])),), line)
+        if name == "txn" and len(immediates) == 2:
+            name = "txna"
+        if name == "gtxn" and len(immediates) == 3:
+            name = "gtxna"
+        if name == "gtxns" and len(immediates) == 2:
+            name = "gtxnsa"
+        if name == "itxn" and len(immediates) == 2:
+            name = "itxna"
+        if name == "gitxn" and len(immediates) == 3:
+            name = "gitxna"
+
+        spec = OPS_BY_NAME.get(name)
+        if spec is None:
+            raise UnknownOpcodeError("unknown opcode: {}".format(name), line)
+
+        if spec.immediates == (IMM_VARINT_BLOCK,):
+            return Instruction(name, tuple(parseUint(t) for t in immediates), line)
+        if spec.immediates == (IMM_BYTES_BLOCK,):
+            values = []
+            rest = list(immediates)
+            while rest:
+                value, used = parseByteArgs(rest)
+                values.append(value)
+                rest = rest[used:]
+            return Instruction(name, tuple(values), line)
+        if spec.immediates == (IMM_BYTES,):
+            value, used = parseByteArgs(immediates)
+            _expectCount(immediates, used, line)
+            return Instruction(name, (value,), line)
+
+        _expectCount(immediates, len(spec.immediates), line)
+        args: List[Any] = []
+        for kind, token in zip(spec.immediates, immediates):
+            if kind == IMM_UINT8:
+                value = parseUint(token)
+                if value > 255:
+                    raise AVMError("{} immediate {} exceeds 255".format(name, token), line)
+                args.append(value)
+            elif kind == IMM_VARINT:
+                args.append(parseUint(token))
+            elif kind == IMM_INT16_LABEL:
+                args.append(token)
+            else:
+                args.append(_parseField(kind, token, line))
+        return Instruction(name, tuple(args), line)
+    except AVMError as e:
+        if e.line:
+            raise
+        raise AVMError(str(e), line)
+
+
+def _expectCount(immediates: List[str], count: int, line: int) -> None:
+    if len(immediates) != count:
+        raise AVMError("expected {} immediate arguments, got {}".format(count, len(immediates)), line)
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+
+
+def _isqrt(value: int) -> int:
+    # math.isqrt is not available before Python 3.8
+    if value < 2:
+        return value
+    x = 1 << ((value.bit_length() + 1) // 2)
+    while True:
+        y = (x + value // x) // 2
+        if y >= x:
+            return x
+        x = y
+
+
+def _isInt(value: StackValue) -> bool:
+    return isinstance(value, int)
+
+
+class _Evaluator:
+    def __init__(self, program: Program, ctx: EvalContext) -> None:
+        self.program = program
+        self.ctx = ctx
+        self.version = program.version
+        self.stack: List[StackValue] = []
+        self.scratch: List[StackValue] = [0] * 256
+        self.callstack: List[int] = []
+        self.intc: List[int] = []
+        self.bytec: List[bytes] = []
+        self.pc = 0
+        self.cost = 0
+        self.innerGroup: Optional[List[TxnFields]] = None
+        self.lastInnerGroup: List[TxnFields] = []
+        self.innerCount = 0
+        self.logCount = 0
+        self.logSize = 0
+        self.handlers: Dict[str, Callable[[Instruction], None]] = {}
+        for name, spec in OPS_BY_NAME.items():
+            handler = getattr(self, "op_" + _handlerName(name), None)
+            if handler is not None:
+                self.handlers[name] = handler
+        self.handlers["int"] = self.op_int
+        self.handlers["byte"] = self.op_byte
+
+    # -- stack helpers --------------------------------------------------
+
+    def fail(self, message: str) -> AVMError:
+        instr = self.program.instructions[min(self.pc, len(self.program.instructions) - 1)]
+        return AVMError(message, instr.line)
+
+    def push(self, value: StackValue) -> None:
+        if isinstance(value, bytes) and len(value) > MAX_STRING_SIZE:
+            raise self.fail("byte string exceeds {} bytes".format(MAX_STRING_SIZE))
+        self.stack.append(value)
+
+    def pop(self) -> StackValue:
+        if not self.stack:
+            raise self.fail("stack underflow")
+        return self.stack.pop()
+
+    def popInt(self) -> int:
+        value = self.pop()
+        if not isinstance(value, int):
+            raise self.fail("expected uint64 but got []byte")
+        return value
+
+    def popBytes(self) -> bytes:
+        value = self.pop()
+        if not isinstance(value, bytes):
+            raise self.fail("expected []byte but got uint64")
+        return value
+
+    def pushInt(self, value: int) -> None:
+        if value < 0:
+            raise self.fail("- would result negative")
+        if value > MAX_UINT64:
+            raise self.fail("overflow")
+        self.stack.append(value)
+
+    def pushBool(self, value: bool) -> None:
+        self.stack.append(1 if value else 0)
+
+    # -- main loop ------------------------------------------------------
+
+    def run(self) -> bool:
+        instructions = self.program.instructions
+        ctx = self.ctx
+        while self.pc < len(instructions):
+            instr = instructions[self.pc]
+            if instr.op in ("int", "byte"):
+                cost = 1
+            else:
+                spec = OPS_BY_NAME[instr.op]
+                if spec.version > self.version:
+                    raise self.fail("{} opcode was introduced in TEAL v{}".format(instr.op, spec.version))
+                if spec.appOnly and ctx.mode != "application":
+                    raise self.fail("{} not allowed in current mode".format(instr.op))
+                cost = spec.cost
+            self.cost += cost
+            ctx.consumeBudget(cost)
+
+            nextPC = self.pc + 1
+            self.nextPC = nextPC
+            self.handlers[instr.op](instr)
+            if len(self.stack) > MAX_STACK_DEPTH:
+                raise self.fail("stack overflow")
+            self.pc = self.nextPC
+
+        if self.innerGroup is not None:
+            raise self.fail("itxn_begin without itxn_submit")
+        if len(self.stack) != 1:
+            raise AVMError("stack finished with {} values".format(len(self.stack)))
+        result = self.stack[0]
+        if not isinstance(result, int):
+            raise AVMError("stack finished with bytes not int")
+        return result != 0
+
+    def jump(self, label: str) -> None:
+        self.nextPC = self.program.labels[label]
+
+    # -- constants ------------------------------------------------------
+
+    def op_int(self, instr: Instruction) -> None:
+        self.stack.append(instr.args[0])
+
+    def op_byte(self, instr: Instruction) -> None:
+        self.push(instr.args[0])
+
+    def op_intcblock(self, instr: Instruction) -> None:
+        self.intc = list(instr.args)
+
+    def op_bytecblock(self, instr: Instruction) -> None:
+        self.bytec = list(instr.args)
+
+    def _intc(self, index: int) -> None:
+        if index >= len(self.intc):
+            raise self.fail("intc {} beyond {} constants".format(index, len(self.intc)))
+        self.stack.append(self.intc[index])
+
+    def _bytec(self, index: int) -> None:
+        if index >= len(self.bytec):
+            raise self.fail("bytec {} beyond {} constants".format(index, len(self.bytec)))
+        self.stack.append(self.bytec[index])
+
+    def op_intc(self, instr: Instruction) -> None:
+        self._intc(instr.args[0])
+
+    def op_intc_0(self, instr: Instruction) -> None:
+        self._intc(0)
+
+    def op_intc_1(self, instr: Instruction) -> None:
+        self._intc(1)
+
+    def op_intc_2(self, instr: Instruction) -> None:
+        self._intc(2)
+
+    def op_intc_3(self, instr: Instruction) -> None:
+        self._intc(3)
+
+    def op_bytec(self, instr: Instruction) -> None:
+        self._bytec(instr.args[0])
+
+    def op_bytec_0(self, instr: Instruction) -> None:
+        self._bytec(0)
+
+    def op_bytec_1(self, instr: Instruction) -> None:
+        self._bytec(1)
+
+    def op_bytec_2(self, instr: Instruction) -> None:
+        self._bytec(2)
+
+    def op_bytec_3(self, instr: Instruction) -> None:
+        self._bytec(3)
+
+    def op_pushint(self, instr: Instruction) -> None:
+        self.stack.append(instr.args[0])
+
+    def op_pushbytes(self, instr: Instruction) -> None:
+        self.push(instr.args[0])
+
+    def _arg(self, index: int) -> None:
+        if index >= len(self.ctx.args):
+            raise self.fail("cannot load arg[{}] of {}".format(index, len(self.ctx.args)))
+        self.push(self.ctx.args[index])
+
+    def op_arg(self, instr: Instruction) -> None:
+        self._arg(instr.args[0])
+
+    def op_arg_0(self, instr: Instruction) -> None:
+        self._arg(0)
+
+    def op_arg_1(self, instr: Instruction) -> None:
+        self._arg(1)
+
+    def op_arg_2(self, instr: Instruction) -> None:
+        self._arg(2)
+
+    def op_arg_3(self, instr: Instruction) -> None:
+        self._arg(3)
+
+    def op_args(self, instr: Instruction) -> None:
+        self._arg(self.popInt())
+
+    # -- flow control ---------------------------------------------------
+
+    def op_err(self, instr: Instruction) -> None:
+        raise self.fail("err opcode executed")
+
+    def op_bnz(self, instr: Instruction) -> None:
+        if self.popInt() != 0:
+            self.jump(instr.args[0])
+
+    def op_bz(self, instr: Instruction) -> None:
+        if self.popInt() == 0:
+            self.jump(instr.args[0])
+
+    def op_b(self, instr: Instruction) -> None:
+        self.jump(instr.args[0])
+
+    def op_return(self, instr: Instruction) -> None:
+        value = self.popInt()
+        self.stack = [value]
+        self.nextPC = len(self.program.instructions)
+
+    def op_assert(self, instr: Instruction) -> None:
+        if self.popInt() == 0:
+            raise self.fail("assert failed")
+
+    def op_callsub(self, instr: Instruction) -> None:
+        self.callstack.append(self.pc + 1)
+        self.jump(instr.args[0])
+
+    def op_retsub(self, instr: Instruction) -> None:
+        if not self.callstack:
+            raise self.fail("retsub with empty callstack")
+        self.nextPC = self.callstack.pop()
+
+    # -- stack manipulation ---------------------------------------------
+
+    def op_pop(self, instr: Instruction) -> None:
+        self.pop()
+
+    def op_dup(self, instr: Instruction) -> None:
+        value = self.pop()
+        self.stack += [value, value]
+
+    def op_dup2(self, instr: Instruction) -> None:
+        b = self.pop()
+        a = self.pop()
+        self.stack += [a, b, a, b]
+
+    def op_dig(self, instr: Instruction) -> None:
+        depth = instr.args[0]
+        if depth >= len(self.stack):
+            raise self.fail("dig {} with stack size {}".format(depth, len(self.stack)))
+        self.stack.append(self.stack[-1 - depth])
+
+    def op_swap(self, instr: Instruction) -> None:
+        b = self.pop()
+        a = self.pop()
+        self.stack += [b, a]
+
+    def op_select(self, instr: Instruction) -> None:
+        c = self.popInt()
+        b = self.pop()
+        a = self.pop()
+        self.stack.append(b if c != 0 else a)
+
+    def op_cover(self, instr: Instruction) -> None:
+        depth = instr.args[0]
+        if depth >= len(self.stack):
+            raise self.fail("cover {} with stack size {}".format(depth, len(self.stack)))
+        value = self.stack.pop()
+        self.stack.insert(len(self.stack) - depth, value)
+
+    def op_uncover(self, instr: Instruction) -> None:
+        depth = instr.args[0]
+        if depth >= len(self.stack):
+            raise self.fail("uncover {} with stack size {}".format(depth, len(self.stack)))
+        value = self.stack.pop(len(self.stack) - 1 - depth)
+        self.stack.append(value)
+
+    # -- scratch space --------------------------------------------------
+
+    def op_load(self, instr: Instruction) -> None:
+        self.stack.append(self.scratch[instr.args[0]])
+
+    def op_store(self, instr: Instruction) -> None:
+        self.scratch[instr.args[0]] = self.pop()
+
+    def op_loads(self, instr: Instruction) -> None:
+        index = self.popInt()
+        if index > 255:
+            raise self.fail("invalid scratch slot {}".format(index))
+        self.stack.append(self.scratch[index])
+
+    def op_stores(self, instr: Instruction) -> None:
+        value = self.pop()
+        index = self.popInt()
+        if index > 255:
+            raise self.fail("invalid scratch slot {}".format(index))
+        self.scratch[index] = value
+
+    def _gload(self, groupIndex: int, slot: int) -> None:
+        if groupIndex >= self.ctx.groupIndex:
+            raise self.fail("gload can't get future scratch space from txn with index {}".format(groupIndex))
+        if slot > 255:
+            raise self.fail("invalid scratch slot {}".format(slot))
+        self.stack.append(self.ctx.groupScratch(groupIndex)[slot])
+
+    def op_gload(self, instr: Instruction) -> None:
+        self._gload(instr.args[0], instr.args[1])
+
+    def op_gloads(self, instr: Instruction) -> None:
+        self._gload(self.popInt(), instr.args[0])
+
+    def op_gloadss(self, instr: Instruction) -> None:
+        slot = self.popInt()
+        self._gload(self.popInt(), slot)
+
+    def _gaid(self, groupIndex: int) -> None:
+        if groupIndex >= self.ctx.groupIndex:
+            raise self.fail("gaid can't get creatable ID of txn ahead of the current one")
+        self.stack.append(self.ctx.createdID(groupIndex))
+
+    def op_gaid(self, instr: Instruction) -> None:
+        self._gaid(instr.args[0])
+
+    def op_gaids(self, instr: Instruction) -> None:
+        self._gaid(self.popInt())
+
+    # -- arithmetic -----------------------------------------------------
+
+    def op_plus(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushInt(a + b)
+
+    def op_minus(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushInt(a - b)
+
+    def op_div(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        if b == 0:
+            raise self.fail("/ 0")
+        self.pushInt(a // b)
+
+    def op_mul(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushInt(a * b)
+
+    def op_mod(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        if b == 0:
+            raise self.fail("% 0")
+        self.pushInt(a % b)
+
+    def op_lt(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushBool(a < b)
+
+    def op_gt(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushBool(a > b)
+
+    def op_le(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushBool(a <= b)
+
+    def op_ge(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushBool(a >= b)
+
+    def op_and(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushBool(a != 0 and b != 0)
+
+    def op_or(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.pushBool(a != 0 or b != 0)
+
+    def _compare(self) -> bool:
+        b = self.pop()
+        a = self.pop()
+        if type(a) != type(b):
+            raise self.fail("cannot compare ({} to {})".format(type(a).__name__, type(b).__name__))
+        return a == b
+
+    def op_eq(self, instr: Instruction) -> None:
+        self.pushBool(self._compare())
+
+    def op_neq(self, instr: Instruction) -> None:
+        self.pushBool(not self._compare())
+
+    def op_not(self, instr: Instruction) -> None:
+        self.pushBool(self.popInt() == 0)
+
+    def op_len(self, instr: Instruction) -> None:
+        self.stack.append(len(self.popBytes()))
+
+    def op_itob(self, instr: Instruction) -> None:
+        self.stack.append(self.popInt().to_bytes(8, "big"))
+
+    def op_btoi(self, instr: Instruction) -> None:
+        value = self.popBytes()
+        if len(value) > 8:
+            raise self.fail("btoi arg too long, got [{}]bytes".format(len(value)))
+        self.stack.append(int.from_bytes(value, "big"))
+
+    def op_bitor(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.stack.append(a | b)
+
+    def op_bitand(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.stack.append(a & b)
+
+    def op_bitxor(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        self.stack.append(a ^ b)
+
+    def op_bitnot(self, instr: Instruction) -> None:
+        self.stack.append(self.popInt() ^ MAX_UINT64)
+
+    def op_mulw(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        product = a * b
+        self.stack += [product >> 64, product & MAX_UINT64]
+
+    def op_addw(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        total = a + b
+        self.stack += [total >> 64, total & MAX_UINT64]
+
+    def op_divmodw(self, instr: Instruction) -> None:
+        dLow = self.popInt()
+        dHigh = self.popInt()
+        nLow = self.popInt()
+        nHigh = self.popInt()
+        divisor = (dHigh << 64) | dLow
+        if divisor == 0:
+            raise self.fail("/ 0")
+        quotient, remainder = divmod((nHigh << 64) | nLow, divisor)
+        self.stack += [
+            quotient >> 64,
+            quotient & MAX_UINT64,
+            remainder >> 64,
+            remainder & MAX_UINT64,
+        ]
+
+    def op_divw(self, instr: Instruction) -> None:
+        divisor = self.popInt()
+        low = self.popInt()
+        high = self.popInt()
+        if divisor == 0:
+            raise self.fail("/ 0")
+        self.pushInt(((high << 64) | low) // divisor)
+
+    def op_shl(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        if b > 63:
+            raise self.fail("shl arg too big, ({})".format(b))
+        self.stack.append((a << b) & MAX_UINT64)
+
+    def op_shr(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        if b > 63:
+            raise self.fail("shr arg too big, ({})".format(b))
+        self.stack.append(a >> b)
+
+    def op_sqrt(self, instr: Instruction) -> None:
+        self.stack.append(_isqrt(self.popInt()))
+
+    def op_bitlen(self, instr: Instruction) -> None:
+        value = self.pop()
+        if isinstance(value, bytes):
+            value = int.from_bytes(value, "big")
+        self.stack.append(value.bit_length())
+
+    def op_exp(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        if a == 0 and b == 0:
+            raise self.fail("0^0 is undefined")
+        if a > 1 and b > 64:
+            raise self.fail("overflow")
+        self.pushInt(a ** b)
+
+    def op_expw(self, instr: Instruction) -> None:
+        b = self.popInt()
+        a = self.popInt()
+        if a == 0 and b == 0:
+            raise self.fail("0^0 is undefined")
+        if a > 1 and b > 128:
+            raise self.fail("overflow")
+        result = a ** b
+        if result > (1 << 128) - 1:
+            raise self.fail("overflow")
+        self.stack += [result >> 64, result & MAX_UINT64]
+
+    # -- byte math ------------------------------------------------------
+
+    def _popBigInt(self) -> int:
+        value = self.popBytes()
+        if len(value) > MAX_BYTE_MATH_SIZE:
+            raise self.fail("math attempted on large byte-array")
+        return int.from_bytes(value, "big")
+
+    def _pushBigInt(self, value: int) -> None:
+        self.stack.append(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+    def op_bplus(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self._pushBigInt(self._popBigInt() + b)
+
+    def op_bminus(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        a = self._popBigInt()
+        if a < b:
+            raise self.fail("byte math would have negative result")
+        self._pushBigInt(a - b)
+
+    def op_bdiv(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        a = self._popBigInt()
+        if b == 0:
+            raise self.fail("division by zero")
+        self._pushBigInt(a // b)
+
+    def op_bmul(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self._pushBigInt(self._popBigInt() * b)
+
+    def op_bmod(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        a = self._popBigInt()
+        if b == 0:
+            raise self.fail("modulo by zero")
+        self._pushBigInt(a % b)
+
+    def op_blt(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self.pushBool(self._popBigInt() < b)
+
+    def op_bgt(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self.pushBool(self._popBigInt() > b)
+
+    def op_ble(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self.pushBool(self._popBigInt() <= b)
+
+    def op_bge(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self.pushBool(self._popBigInt() >= b)
+
+    def op_beq(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self.pushBool(self._popBigInt() == b)
+
+    def op_bneq(self, instr: Instruction) -> None:
+        b = self._popBigInt()
+        self.pushBool(self._popBigInt() != b)
+
+    def _bitwise(self, fn: Callable[[int, int], int]) -> None:
+        b = self.popBytes()
+        a = self.popBytes()
+        size = max(len(a), len(b))
+        a = a.rjust(size, b"\x00")
+        b = b.rjust(size, b"\x00")
+        self.stack.append(bytes(fn(x, y) for x, y in zip(a, b)))
+
+    def op_bbitor(self, instr: Instruction) -> None:
+        self._bitwise(lambda x, y: x | y)
+
+    def op_bbitand(self, instr: Instruction) -> None:
+        self._bitwise(lambda x, y: x & y)
+
+    def op_bbitxor(self, instr: Instruction) -> None:
+        self._bitwise(lambda x, y: x ^ y)
+
+    def op_bbitnot(self, instr: Instruction) -> None:
+        self.stack.append(bytes(x ^ 0xFF for x in self.popBytes()))
+
+    def op_bsqrt(self, instr: Instruction) -> None:
+        self._pushBigInt(_isqrt(self._popBigInt()))
+
+    def op_bzero(self, instr: Instruction) -> None:
+        size = self.popInt()
+        if size > MAX_STRING_SIZE:
+            raise self.fail("bzero attempted to create a too large string")
+        self.stack.append(bytes(size))
+
+    # -- byte strings ---------------------------------------------------
+
+    def op_concat(self, instr: Instruction) -> None:
+        b = self.popBytes()
+        a = self.popBytes()
+        self.push(a + b)
+
+    def _substring(self, value: bytes, start: int, end: int) -> bytes:
+        if end < start:
+            raise self.fail("substring end before start")
+        if end > len(value):
+            raise self.fail("substring range beyond length of string")
+        return value[start:end]
+
+    def op_substring(self, instr: Instruction) -> None:
+        value = self.popBytes()
+        self.stack.append(self._substring(value, instr.args[0], instr.args[1]))
+
+    def op_substring3(self, instr: Instruction) -> None:
+        end = self.popInt()
+        start = self.popInt()
+        value = self.popBytes()
+        self.stack.append(self._substring(value, start, end))
+
+    def _extract(self, value: bytes, start: int, length: int) -> bytes:
+        if start + length > len(value):
+            raise self.fail("extract range beyond length of string")
+        return value[start : start + length]
+
+    def op_extract(self, instr: Instruction) -> None:
+        value = self.popBytes()
+        start, length = instr.args
+        if length == 0:
+            if start > len(value):
+                raise self.fail("extract range beyond length of string")
+            length = len(value) - start
+        self.stack.append(self._extract(value, start, length))
+
+    def op_extract3(self, instr: Instruction) -> None:
+        length = self.popInt()
+        start = self.popInt()
+        value = self.popBytes()
+        self.stack.append(self._extract(value, start, length))
+
+    def _extractUint(self, size: int) -> None:
+        start = self.popInt()
+        value = self.popBytes()
+        self.stack.append(int.from_bytes(self._extract(value, start, size), "big"))
+
+    def op_extract_uint16(self, instr: Instruction) -> None:
+        self._extractUint(2)
+
+    def op_extract_uint32(self, instr: Instruction) -> None:
+        self._extractUint(4)
+
+    def op_extract_uint64(self, instr: Instruction) -> None:
+        self._extractUint(8)
+
+    def op_getbit(self, instr: Instruction) -> None:
+        index = self.popInt()
+        target = self.pop()
+        if isinstance(target, int):
+            if index > 63:
+                raise self.fail("getbit index > 63 with with Uint")
+            self.stack.append((target >> index) & 1)
+            return
+        if index >= len(target) * 8:
+            raise self.fail("getbit index beyond byteslice")
+        self.stack.append((target[index // 8] >> (7 - index % 8)) & 1)
+
+    def op_setbit(self, instr: Instruction) -> None:
+        bit = self.popInt()
+        index = self.popInt()
+        target = self.pop()
+        if bit > 1:
+            raise self.fail("setbit value > 1")
+        if isinstance(target, int):
+            if index > 63:
+                raise self.fail("setbit index > 63 with Uint")
+            mask = 1 << index
+            self.stack.append(target | mask if bit else target & ~mask)
+            return
+        if index >= len(target) * 8:
+            raise self.fail("setbit index beyond byteslice")
+        data = bytearray(target)
+        mask = 1 << (7 - index % 8)
+        if bit:
+            data[index // 8] |= mask
+        else:
+            data[index // 8] &= ~mask & 0xFF
+        self.stack.append(bytes(data))
+
+    def op_getbyte(self, instr: Instruction) -> None:
+        index = self.popInt()
+        target = self.popBytes()
+        if index >= len(target):
+            raise self.fail("getbyte index beyond array length")
+        self.stack.append(target[index])
+
+    def op_setbyte(self, instr: Instruction) -> None:
+        value = self.popInt()
+        index = self.popInt()
+        target = self.popBytes()
+        if index >= len(target):
+            raise self.fail("setbyte index beyond array length")
+        if value > 255:
+            raise self.fail("setbyte value > 255")
+        data = bytearray(target)
+        data[index] = value
+        self.stack.append(bytes(data))
+
+    # -- crypto ---------------------------------------------------------
+
+    def op_sha256(self, instr: Instruction) -> None:
+        import hashlib
+
+        self.stack.append(hashlib.sha256(self.popBytes()).digest())
+
+    def op_sha512_256(self, instr: Instruction) -> None:
+        self.stack.append(encoding.checksum(self.popBytes()))
+
+    def op_keccak256(self, instr: Instruction) -> None:
+        from Cryptodome.Hash import keccak
+
+        self.stack.append(keccak.new(data=self.popBytes(), digest_bits=256).digest())
+
+    def op_ed25519verify(self, instr: Instruction) -> None:
+        from nacl.exceptions import BadSignatureError
+        from nacl.signing import VerifyKey
+
+        publicKey = self.popBytes()
+        signature = self.popBytes()
+        data = self.popBytes()
+        message = b"ProgData" + self.ctx.programHash() + data
+        try:
+            VerifyKey(publicKey).verify(message, signature)
+            self.pushBool(True)
+        except (BadSignatureError, ValueError):
+            self.pushBool(False)
+
+    # -- transaction fields ---------------------------------------------
+
+    def _groupTxn(self, index: int) -> TxnFields:
+        if index >= len(self.ctx.group):
+            raise self.fail("gtxn lookup TxnGroup[{}] but it only has {}".format(index, len(self.ctx.group)))
+        return self.ctx.group[index]
+
+    def _field(self, txn: TxnFields, field: str) -> None:
+        if field in TXN_ARRAY_FIELDS:
+            raise self.fail("{} is an array field".format(field))
+        if field == "GroupIndex" and txn is self.ctx.txn:
+            self.stack.append(self.ctx.groupIndex)
+            return
+        self.stack.append(getTxnField(txn, field))
+
+    def _arrayField(self, txn: TxnFields, field: str, index: int) -> None:
+        try:
+            self.stack.append(getTxnArrayField(txn, field, index))
+        except AVMError as e:
+            raise self.fail(str(e))
+
+    def op_txn(self, instr: Instruction) -> None:
+        self._field(self.ctx.txn, instr.args[0])
+
+    def op_txna(self, instr: Instruction) -> None:
+        self._arrayField(self.ctx.txn, instr.args[0], instr.args[1])
+
+    def op_txnas(self, instr: Instruction) -> None:
+        self._arrayField(self.ctx.txn, instr.args[0], self.popInt())
+
+    def op_gtxn(self, instr: Instruction) -> None:
+        self._field(self._groupTxn(instr.args[0]), instr.args[1])
+
+    def op_gtxna(self, instr: Instruction) -> None:
+        self._arrayField(self._groupTxn(instr.args[0]), instr.args[1], instr.args[2])
+
+    def op_gtxnas(self, instr: Instruction) -> None:
+        self._arrayField(self._groupTxn(instr.args[0]), instr.args[1], self.popInt())
+
+    def op_gtxns(self, instr: Instruction) -> None:
+        self._field(self._groupTxn(self.popInt()), instr.args[0])
+
+    def op_gtxnsa(self, instr: Instruction) -> None:
+        self._arrayField(self._groupTxn(self.popInt()), instr.args[0], instr.args[1])
+
+    def op_gtxnsas(self, instr: Instruction) -> None:
+        index = self.popInt()
+        self._arrayField(self._groupTxn(self.popInt()), instr.args[0], index)
+
+    def op_global(self, instr: Instruction) -> None:
+        field = instr.args[0]
+        if field == "OpcodeBudget":
+            self.stack.append(self.ctx.remainingBudget())
+            return
+        self.stack.append(self.ctx.globalField(field))
+
+    # -- application state ----------------------------------------------
+
+    def op_balance(self, instr: Instruction) -> None:
+        self.stack.append(self.ctx.balance(self.ctx.resolveAccount(self.pop())))
+
+    def op_min_balance(self, instr: Instruction) -> None:
+        self.stack.append(self.ctx.minBalance(self.ctx.resolveAccount(self.pop())))
+
+    def op_app_opted_in(self, instr: Instruction) -> None:
+        appID = self.ctx.resolveApp(self.popInt(), foreign=False)
+        account = self.ctx.resolveAccount(self.pop())
+        self.pushBool(self.ctx.optedIn(account, appID))
+
+    def op_app_local_get(self, instr: Instruction) -> None:
+        key = self.popBytes()
+        account = self.ctx.resolveAccount(self.pop())
+        value = self.ctx.getLocal(account, self.ctx.globalField("CurrentApplicationID"), key)
+        self.stack.append(0 if value is None else value)
+
+    def op_app_local_get_ex(self, instr: Instruction) -> None:
+        key = self.popBytes()
+        appID = self.ctx.resolveApp(self.popInt(), foreign=False)
+        account = self.ctx.resolveAccount(self.pop())
+        value = self.ctx.getLocal(account, appID, key)
+        self.stack += [0, 0] if value is None else [value, 1]
+
+    def op_app_global_get(self, instr: Instruction) -> None:
+        key = self.popBytes()
+        value = self.ctx.getGlobal(self.ctx.globalField("CurrentApplicationID"), key)
+        self.stack.append(0 if value is None else value)
+
+    def op_app_global_get_ex(self, instr: Instruction) -> None:
+        key = self.popBytes()
+        appID = self.ctx.resolveApp(self.popInt())
+        value = self.ctx.getGlobal(appID, key)
+        self.stack += [0, 0] if value is None else [value, 1]
+
+    def op_app_local_put(self, instr: Instruction) -> None:
+        value = self.pop()
+        key = self.popBytes()
+        account = self.ctx.resolveAccount(self.pop())
+        self.ctx.putLocal(account, key, value)
+
+    def op_app_global_put(self, instr: Instruction) -> None:
+        value = self.pop()
+        key = self.popBytes()
+        self.ctx.putGlobal(key, value)
+
+    def op_app_local_del(self, instr: Instruction) -> None:
+        key = self.popBytes()
+        account = self.ctx.resolveAccount(self.pop())
+        self.ctx.delLocal(account, key)
+
+    def op_app_global_del(self, instr: Instruction) -> None:
+        self.ctx.delGlobal(self.popBytes())
+
+    def _pushMaybe(self, values: Optional[Dict[str, StackValue]], field: str) -> None:
+        if values is None:
+            self.stack += [0, 0]
+        else:
+            self.stack += [values[field], 1]
+
+    def op_asset_holding_get(self, instr: Instruction) -> None:
+        assetID = self.ctx.resolveAsset(self.popInt(), foreign=False)
+        account = self.ctx.resolveAccount(self.pop())
+        self._pushMaybe(self.ctx.assetHolding(account, assetID), instr.args[0])
+
+    def op_asset_params_get(self, instr: Instruction) -> None:
+        assetID = self.ctx.resolveAsset(self.popInt())
+        self._pushMaybe(self.ctx.assetParams(assetID), instr.args[0])
+
+    def op_app_params_get(self, instr: Instruction) -> None:
+        appID = self.ctx.resolveApp(self.popInt())
+        self._pushMaybe(self.ctx.appParams(appID), instr.args[0])
+
+    def op_acct_params_get(self, instr: Instruction) -> None:
+        account = self.ctx.resolveAccount(self.pop())
+        balance = self.ctx.balance(account)
+        if balance == 0:
+            self.stack += [0, 0]
+            return
+        field = instr.args[0]
+        if field == "AcctBalance":
+            value: StackValue = balance
+        elif field == "AcctMinBalance":
+            value = self.ctx.minBalance(account)
+        else:
+            value = self.ctx.authAddr(account)
+        self.stack += [value, 1]
+
+    def op_log(self, instr: Instruction) -> None:
+        message = self.popBytes()
+        self.logCount += 1
+        self.logSize += len(message)
+        if self.logCount > MAX_LOG_CALLS:
+            raise self.fail("too many log calls in program. up to {} is allowed.".format(MAX_LOG_CALLS))
+        if self.logSize > MAX_LOG_SIZE:
+            raise self.fail("program logs too large. {} bytes > {} bytes limit".format(self.logSize, MAX_LOG_SIZE))
+        self.ctx.log(message)
+
+    # -- inner transactions ---------------------------------------------
+
+    def op_itxn_begin(self, instr: Instruction) -> None:
+        if self.innerGroup is not None:
+            raise self.fail("itxn_begin without itxn_submit")
+        self.innerGroup = [self.ctx.newInnerTxn()]
+
+    def op_itxn_next(self, instr: Instruction) -> None:
+        if self.innerGroup is None:
+            raise self.fail("itxn_next without itxn_begin")
+        self.innerGroup.append(self.ctx.newInnerTxn())
+
+    def op_itxn_field(self, instr: Instruction) -> None:
+        if self.innerGroup is None:
+            raise self.fail("itxn_field without itxn_begin")
+        field = instr.args[0]
+        value = self.pop()
+        if field not in INNER_TXN_SETTABLE_FIELDS:
+            raise self.fail("itxn_field {} is not allowed".format(field))
+        txn = self.innerGroup[-1]
+        if field in TXN_ARRAY_FIELDS:
+            if field in ("Accounts",):
+                value = self.ctx.resolveAccount(value)
+            txn.setdefault(field, []).append(value)
+            return
+        if field in BYTES_FIELDS:
+            if not isinstance(value, bytes):
+                raise self.fail("{} must be []byte".format(field))
+            if field in ADDRESS_FIELDS:
+                if len(value) != 32:
+                    raise self.fail("{} must be a 32 byte address".format(field))
+                # v5 accepted any address; availability is enforced from v6
+                if self.version >= 6:
+                    value = self.ctx.resolveAccount(value)
+        elif not isinstance(value, int):
+            raise self.fail("{} must be uint64".format(field))
+
+        if field == "Type":
+            if value.decode() not in TXN_TYPE_ENUMS:
+                raise self.fail("{} is not a valid Type for itxn_field".format(value))
+            txn["TypeEnum"] = TXN_TYPE_ENUMS[value.decode()]
+        elif field == "TypeEnum":
+            types = {v: k for k, v in TXN_TYPE_ENUMS.items()}
+            if value not in types:
+                raise self.fail("{} is not a valid TypeEnum for itxn_field".format(value))
+            txn["Type"] = types[value].encode()
+        txn[field] = value
+
+    def op_itxn_submit(self, instr: Instruction) -> None:
+        if self.innerGroup is None:
+            raise self.fail("itxn_submit without itxn_begin")
+        group = self.innerGroup
+        self.innerGroup = None
+        self.innerCount += len(group)
+        if self.innerCount > MAX_INNER_TXNS * (1 if self.version < 6 else 16):
+            raise self.fail("too many inner transactions")
+        for txn in group:
+            if "TypeEnum" not in txn:
+                raise self.fail("inner transaction has no Type")
+            allowed = ("pay", "axfer", "acfg", "afrz") if self.version < 6 else tuple(TXN_TYPE_ENUMS)
+            if txn["Type"].decode() not in allowed:
+                raise self.fail("{} inner transactions are not allowed in v{}".format(txn["Type"].decode(), self.version))
+        try:
+            self.lastInnerGroup = self.ctx.submitInner(group)
+        except AVMError as e:
+            raise self.fail(str(e))
+
+    def _lastInner(self, index: int = -1) -> TxnFields:
+        if not self.lastInnerGroup:
+            raise self.fail("no inner transaction available")
+        if index >= len(self.lastInnerGroup):
+            raise self.fail("gitxn {} beyond last inner group of {}".format(index, len(self.lastInnerGroup)))
+        return self.lastInnerGroup[index]
+
+    def op_itxn(self, instr: Instruction) -> None:
+        self._field(self._lastInner(), instr.args[0])
+
+    def op_itxna(self, instr: Instruction) -> None:
+        self._arrayField(self._lastInner(), instr.args[0], instr.args[1])
+
+    def op_itxnas(self, instr: Instruction) -> None:
+        self._arrayField(self._lastInner(), instr.args[0], self.popInt())
+
+    def op_gitxn(self, instr: Instruction) -> None:
+        self._field(self._lastInner(instr.args[0]), instr.args[1])
+
+    def op_gitxna(self, instr: Instruction) -> None:
+        self._arrayField(self._lastInner(instr.args[0]), instr.args[1], instr.args[2])
+
+    def op_gitxnas(self, instr: Instruction) -> None:
+        self._arrayField(self._lastInner(instr.args[0]), instr.args[1], self.popInt())
+
+
+_SYMBOL_HANDLERS = {
+    "+": "plus",
+    "-": "minus",
+    "/": "div",
+    "*": "mul",
+    "%": "mod",
+    "<": "lt",
+    ">": "gt",
+    "<=": "le",
+    ">=": "ge",
+    "&&": "and",
+    "||": "or",
+    "==": "eq",
+    "!=": "neq",
+    "!": "not",
+    "|": "bitor",
+    "&": "bitand",
+    "^": "bitxor",
+    "~": "bitnot",
+    "b+": "bplus",
+    "b-": "bminus",
+    "b/": "bdiv",
+    "b*": "bmul",
+    "b%": "bmod",
+    "b<": "blt",
+    "b>": "bgt",
+    "b<=": "ble",
+    "b>=": "bge",
+    "b==": "beq",
+    "b!=": "bneq",
+    "b|": "bbitor",
+    "b&": "bbitand",
+    "b^": "bbitxor",
+    "b~": "bbitnot",
+}
+
+
+def _handlerName(op: str) -> str:
+    return _SYMBOL_HANDLERS.get(op, op)
+
+
+class EvalResult(NamedTuple):
+    """Outcome of running a program"""
+
+    approved: bool
+    cost: int
+    scratch: List[StackValue]
+
+
+def evaluate(program: Program, ctx: EvalContext) -> EvalResult:
+    """Run `program` against `ctx`.
+
+    Returns whether the program approved along with the opcode cost it
+    consumed. Raises AVMError if the program fails.
+    """
+    evaluator = _Evaluator(program, ctx)
+    approved = evaluator.run()
+    return EvalResult(approved, evaluator.cost, evaluator.scratch)
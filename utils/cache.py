@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import tempfile
+from base64 import b64decode, b64encode
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+from weakref import WeakKeyDictionary
+
+from algosdk import encoding
+
+from utils.setup import get_project_root_path
+
+CACHE_DIR_ENV = "DP_TEAL_CACHE_DIR"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+ENTRY_SUFFIX = ".json"
+
+
+def programHash(program: bytes) -> str:
+    """The address algod reports as the hash of a compiled program"""
+    return encoding.encode_address(encoding.checksum(b"Program" + program))
+
+
+def compilerIdentity(client: Any, build: str) -> str:
+    """Identify the compiler behind `client`, so entries compiled by
+    different algod endpoints, or by another build of the same node, are
+    kept apart. `build` is the node's build, see nodeBuild."""
+    address = getattr(client, "algod_address", "")
+    return "{}.{}:{}@{}".format(type(client).__module__, type(client).__name__, address, build)
+
+
+def formatBuild(versions: Dict[str, Any]) -> str:
+    """The build of a node, from its /versions response."""
+    build = versions.get("build", {})
+    return "{}.{}.{}-{}".format(
+        build.get("major", 0), build.get("minor", 0), build.get("build_number", 0), build.get("commit_hash", "")
+    )
+
+
+# the build of every client's node, asked once per client
+_BUILDS: "WeakKeyDictionary[Any, str]" = WeakKeyDictionary()
+
+
+def nodeBuild(client: Any) -> str:
+    """The build of the algod node behind `client`, asked once per client."""
+    if client not in _BUILDS:
+        _BUILDS[client] = formatBuild(client.versions())
+    return _BUILDS[client]
+
+
+class CompileCache:
+    """A content-addressed on-disk cache of compiled TEAL programs.
+
+    Each entry lives in its own file named after a hash of the TEAL source,
+    TEAL version and compiler identity. Entries are written to a temporary
+    file and renamed into place, so concurrent readers only ever see complete
+    entries and concurrent writers of the same key simply race to an
+    identical result. Once the directory grows past `maxBytes` the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, directory: Union[str, Path], maxBytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.maxBytes = maxBytes
+
+    @staticmethod
+    def key(teal: str, version: int, compiler: str) -> str:
+        digest = hashlib.sha256()
+        for part in (compiler, str(version), teal):
+            encoded = part.encode()
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / (key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Return the bytecode and program hash stored under `key`, if any."""
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            program = b64decode(entry["result"])
+            hash = entry["hash"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            # a damaged entry is treated as a miss and replaced on the next put
+            self._remove(path)
+            return None
+
+        if programHash(program) != hash:
+            self._remove(path)
+            return None
+
+        try:
+            # mark as recently used for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return program, hash
+
+    def put(self, key: str, program: bytes, hash: str) -> None:
+        """Atomically store `program` under `key`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = {"result": b64encode(program).decode(), "hash": hash}
+
+        fd, tmpPath = tempfile.mkstemp(dir=str(self.directory), prefix=".tmp-", suffix=ENTRY_SUFFIX)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpPath, str(self.path(key)))
+        except BaseException:
+            self._remove(Path(tmpPath))
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in maxBytes."""
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(str(self.directory))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(ENTRY_SUFFIX) or name.startswith(".tmp-"):
+                continue
+            path = self.directory / name
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+            total += stat.st_size
+
+        entries.sort()
+        for _, name, size in entries:
+            if total <= self.maxBytes:
+                break
+            self._remove(self.directory / name)
+            total -= size
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            os.remove(str(path))
+        except FileNotFoundError:
+            pass
+
+
+def getDefaultCompileCache() -> CompileCache:
+    """The cache used by fullyCompileContract, stored under the project root
+    unless DP_TEAL_CACHE_DIR points elsewhere."""
+    directory = os.environ.get(CACHE_DIR_ENV) or os.path.join(get_project_root_path(), ".teal_cache")
+    return CompileCache(directory)
@@ -0,0 +1,288 @@
+from copy import copy
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from pyteal import (
+    App,
+    AppField,
+    Assert,
+    BinaryExpr,
+    Bytes,
+    Cond,
+    EnumInt,
+    Expr,
+    Global,
+    GlobalField,
+    If,
+    Int,
+    MultiValue,
+    NaryExpr,
+    Op,
+    Return,
+    ScratchLoad,
+    ScratchStore,
+    ScratchVar,
+    Seq,
+    SubroutineCall,
+    SubroutineDefinition,
+    TxnaExpr,
+    TxnExpr,
+    UnaryExpr,
+)
+from pyteal.ast.gtxn import GtxnaExpr, GtxnExpr
+from pyteal.ast.itxn import InnerTxnFieldExpr
+from pyteal.ast.substring import ExtractExpr, SubstringExpr, SuffixExpr
+from pyteal.ast.ternaryexpr import TernaryExpr
+
+# operators whose result only depends on their arguments
+PURE_OPS = {
+    Op.add, Op.minus, Op.mul, Op.div, Op.mod, Op.exp, Op.sqrt, Op.shl, Op.shr, Op.bitlen,
+    Op.lt, Op.gt, Op.le, Op.ge, Op.eq, Op.neq, Op.logic_and, Op.logic_or, Op.logic_not,
+    Op.bitwise_and, Op.bitwise_or, Op.bitwise_xor, Op.bitwise_not,
+    Op.len, Op.itob, Op.btoi, Op.concat, Op.getbit, Op.getbyte, Op.bzero,
+    Op.extract_uint16, Op.extract_uint32, Op.extract_uint64,
+    Op.sha256, Op.keccak256, Op.sha512_256,
+    Op.b_add, Op.b_minus, Op.b_mul, Op.b_div, Op.b_mod, Op.b_lt, Op.b_gt, Op.b_le, Op.b_ge,
+    Op.b_eq, Op.b_neq, Op.b_and, Op.b_or, Op.b_xor, Op.b_not, Op.bsqrt,
+}
+
+# fields of the current group, which no opcode can change during a call
+TXN_OPS = {Op.txn, Op.txna, Op.txnas, Op.gtxn, Op.gtxna, Op.gtxnas, Op.gtxns, Op.gtxnsa, Op.gtxnsas}
+
+# expressions evaluating their children in the order of their attributes and
+# without branching, so every child runs whenever the parent does
+_STRAIGHT = (
+    Seq, Assert, Return, BinaryExpr, UnaryExpr, NaryExpr, TernaryExpr, App, MultiValue,
+    SubroutineCall, InnerTxnFieldExpr, ScratchStore, TxnaExpr, GtxnExpr,
+    SubstringExpr, ExtractExpr, SuffixExpr,
+)
+
+Path = Tuple[Any, ...]
+
+
+class _Occurrence:
+    def __init__(self, path: Path, node: Expr, region: Path) -> None:
+        self.path = path
+        self.node = node
+        # the path of the innermost expression that the occurrence runs
+        # whenever it runs, such as the branch itself or the body of an If
+        self.region = region
+
+    def within(self, region: Path) -> bool:
+        return self.path[:len(region)] == region
+
+
+class _Analysis:
+    """Signatures and costs of the pure expressions of one branch."""
+
+    def __init__(self, writtenKeys: Optional[Set[Hashable]], cacheSlots: Set[int]) -> None:
+        # None when the branch writes a key only known at run time
+        self.writtenKeys = writtenKeys
+        self.cacheSlots = cacheSlots
+        self._signatures: Dict[int, Optional[Hashable]] = {}
+        self._costs: Dict[int, int] = {}
+
+    def signature(self, node: Any) -> Optional[Hashable]:
+        """A value equal for structurally equal pure expressions, or None if
+        `node` may evaluate differently at different points of the branch."""
+        if not isinstance(node, Expr):
+            # immediate arguments such as field names and static indexes
+            return node
+        if id(node) not in self._signatures:
+            self._signatures[id(node)] = self._signature(node)
+        return self._signatures[id(node)]
+
+    def _signature(self, node: Expr) -> Optional[Hashable]:
+        if isinstance(node, Int):
+            return ("int", node.value)
+        if isinstance(node, EnumInt):
+            return ("enum", node.name)
+        if isinstance(node, Bytes):
+            return ("bytes", node.base, node.byte_str)
+        if isinstance(node, Global):
+            if node.field == GlobalField.opcode_budget:
+                return None
+            return ("global", node.field)
+        if isinstance(node, GtxnaExpr):
+            return self._children("gtxna", node.field, node.txnIndex, node.index)
+        if isinstance(node, TxnaExpr):
+            if node.staticOp not in TXN_OPS:
+                return None
+            return self._children("txna", node.staticOp, node.field, node.index)
+        if isinstance(node, GtxnExpr):
+            return self._children("gtxn", node.field, node.txnIndex)
+        if isinstance(node, TxnExpr):
+            if node.op not in TXN_OPS:
+                return None
+            return ("txn", node.op, node.field)
+        if isinstance(node, App):
+            if node.field != AppField.globalGet or self.writtenKeys is None:
+                return None
+            key = self.signature(node.args[0])
+            if not isinstance(node.args[0], Bytes) or key in self.writtenKeys:
+                return None
+            return ("global_get", key)
+        if isinstance(node, ScratchLoad):
+            if node.slot.id not in self.cacheSlots:
+                return None
+            return ("load", node.slot.id)
+        if isinstance(node, (UnaryExpr, BinaryExpr, TernaryExpr, NaryExpr)):
+            if node.op not in PURE_OPS:
+                return None
+            return self._children(node.op, *(child for _, child in _children(node)))
+        if _isImmediateExtract(node):
+            return self._children("extract", node.stringArg, node.startArg.value, node.lenArg.value)
+        return None
+
+    def _children(self, *parts: Any) -> Optional[Hashable]:
+        signatures = tuple(self.signature(part) for part in parts)
+        if any(signature is None for signature in signatures):
+            return None
+        return signatures
+
+    def cost(self, node: Any) -> int:
+        """Opcodes evaluating a pure expression costs."""
+        if not isinstance(node, Expr):
+            return 0
+        if id(node) not in self._costs:
+            if _isImmediateExtract(node):
+                # the start and length are immediates of a single extract
+                self._costs[id(node)] = self.cost(node.stringArg) + 1
+                return self._costs[id(node)]
+            cost = sum(self.cost(child) for _, child in _children(node))
+            # n-ary expressions apply their op between every pair of arguments
+            cost += max(len(node.args) - 1, 0) if isinstance(node, NaryExpr) else 1
+            self._costs[id(node)] = cost
+        return self._costs[id(node)]
+
+
+def _isImmediateExtract(node: Expr) -> bool:
+    """Whether `node` compiles to an extract with immediate arguments."""
+    return (
+        isinstance(node, ExtractExpr)
+        and isinstance(node.startArg, Int)
+        and isinstance(node.lenArg, Int)
+        and node.startArg.value <= 255
+        and 0 < node.lenArg.value <= 255
+    )
+
+
+def _children(node: Expr) -> List[Tuple[Path, Expr]]:
+    """The expressions directly under `node` in evaluation order, each with
+    its path from `node`."""
+    children: List[Tuple[Path, Expr]] = []
+
+    def visit(path: Path, value: Any) -> None:
+        if isinstance(value, Expr):
+            children.append((path, value))
+        elif isinstance(value, (list, tuple)):
+            for index, item in enumerate(value):
+                visit(path + (index,), item)
+
+    for name, value in vars(node).items():
+        visit((name,), value)
+    return children
+
+
+def _occurrences(root: Expr, analysis: _Analysis) -> List[_Occurrence]:
+    """Every pure expression under `root` costing more than a load, in
+    evaluation order."""
+    found: List[_Occurrence] = []
+
+    def visit(node: Expr, path: Path, region: Path) -> None:
+        if analysis.signature(node) is not None and analysis.cost(node) > 1:
+            found.append(_Occurrence(path, node, region))
+        for childPath, child in _children(node):
+            if isinstance(node, If):
+                straight = childPath == ("cond",)
+            elif isinstance(node, Cond):
+                # only the first condition is always tested
+                straight = childPath == ("args", 0, 0)
+            else:
+                straight = isinstance(node, _STRAIGHT)
+            visit(child, path + childPath, region if straight else path + childPath)
+
+    visit(root, (), ())
+    return found
+
+
+def _writtenKeys(root: Expr) -> Optional[Set[Hashable]]:
+    """Signatures of the global keys `root` and the subroutines it calls
+    put or delete, or None if one of the keys is computed."""
+    keys: Set[Hashable] = set()
+    seen: Set[int] = set()
+    analysis = _Analysis(set(), set())
+
+    def visit(node: Expr) -> bool:
+        if id(node) in seen:
+            return True
+        seen.add(id(node))
+        if isinstance(node, App) and node.field in (AppField.globalPut, AppField.globalDel):
+            if not isinstance(node.args[0], Bytes):
+                return False
+            keys.add(analysis.signature(node.args[0]))
+        if isinstance(node, SubroutineCall):
+            subroutine: SubroutineDefinition = node.subroutine
+            if not visit(subroutine.getDeclaration()):
+                return False
+        return all(visit(child) for _, child in _children(node))
+
+    return keys if visit(root) else None
+
+
+def _replace(node: Any, path: Path, replacement: Expr) -> Any:
+    if not path:
+        return replacement
+    head, rest = path[0], path[1:]
+    if isinstance(node, list):
+        updated = list(node)
+        updated[head] = _replace(node[head], rest, replacement)
+        return updated
+    if isinstance(node, tuple):
+        return node[:head] + (_replace(node[head], rest, replacement),) + node[head + 1:]
+    updated = copy(node)
+    setattr(updated, head, _replace(getattr(node, head), rest, replacement))
+    return updated
+
+
+def cacheRepeatedReads(branch: Expr) -> Expr:
+    """Evaluate each repeated pure expression of `branch` once, keeping its
+    value in a scratch slot for the later occurrences.
+
+    Pure expressions are global state reads of constant keys the branch never
+    writes, fields of the transaction group and constants, and operators and
+    constant extracts applied to them. An expression is cached where it
+    occurs, and the later occurrences that only run once it did, such as
+    those after it in the same If body, load the slot instead, so nothing is
+    evaluated earlier or more often than before. Since a load costs as much
+    as an app_global_get, caching only pays for an expression used often
+    enough: an expression costing `c` opcodes and loaded `k` times saves
+    k * (c - 1) - 2 opcodes. Expressions are cached greedily by their
+    savings, largest first, while anything is saved. The expressions
+    `branch` is built from are left as they are.
+    """
+    writtenKeys = _writtenKeys(branch)
+    cacheSlots: Set[int] = set()
+    while True:
+        # memoized by id, so start over on the rewritten tree
+        analysis = _Analysis(writtenKeys, cacheSlots)
+        groups: Dict[Hashable, List[_Occurrence]] = {}
+        for occurrence in _occurrences(branch, analysis):
+            groups.setdefault(analysis.signature(occurrence.node), []).append(occurrence)
+
+        best: Optional[Tuple[int, _Occurrence, List[_Occurrence]]] = None
+        for occurrences in groups.values():
+            for index, occurrence in enumerate(occurrences):
+                # the later occurrences in its region run after it
+                uses = [use for use in occurrences[index + 1:] if use.within(occurrence.region)]
+                savings = len(uses) * (analysis.cost(occurrence.node) - 1) - 2
+                if savings > 0 and (best is None or savings > best[0]):
+                    best = (savings, occurrence, uses)
+        if best is None:
+            return branch
+
+        _, definition, uses = best
+        cached = ScratchVar(definition.node.type_of())
+        cacheSlots.add(cached.slot.id)
+        for use in uses:
+            branch = _replace(branch, use.path, cached.load())
+        branch = _replace(branch, definition.path, Seq(cached.store(definition.node), cached.load()))
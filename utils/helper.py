@@ -2,11 +2,18 @@ from random import randint
 from typing import List, Tuple, Dict, Any, Optional, Union
 from base64 import b64decode
 
+from algosdk.error import AlgodHTTPError
 from algosdk.future import transaction
 from algosdk.v2client.algod import AlgodClient
 from pyteal import compileTeal, Mode, Expr
 
 from utils.account import Account
+from utils.assembler import assemble, assemblerIdentity
+from utils.avm import UnknownOpcodeError
+from utils.cache import CompileCache, compilerIdentity, getDefaultCompileCache, nodeBuild, programHash
+from utils.opcodes import MAX_TXN_GROUP_SIZE
+from utils.peephole import optimizeTeal
+from utils.params import getSuggestedParams, getSuggestedParamsProvider
 
 
 class PendingTxnResponse:
@@ -35,6 +42,9 @@ def waitForTransaction(
     lastStatus = client.status()
     lastRound = lastStatus["last-round"]
     startRound = lastRound
+    # every new block is a chance to refresh the cached suggested params
+    provider = getSuggestedParamsProvider(client)
+    provider.observeRound(lastRound)
 
     while lastRound < startRound + timeout:
         pending_txn = client.pending_transaction_info(txID)
@@ -46,6 +56,7 @@ def waitForTransaction(
             raise Exception("Pool error: {}".format(pending_txn["pool-error"]))
 
         lastStatus = client.status_after_block(lastRound + 1)
+        provider.observeRound(lastStatus["last-round"])
 
         lastRound += 1
 
@@ -54,10 +65,69 @@ def waitForTransaction(
     )
 
 
-def fullyCompileContract(client: AlgodClient, contract: Expr) -> bytes:
-    teal = compileTeal(contract, mode=Mode.Application, version=5)
-    response = client.compile(teal)
-    return b64decode(response["result"])
+def fullyCompileContract(
+    client: AlgodClient,
+    contract: Expr,
+    cache: Optional[CompileCache] = None,
+    version: int = 5,
+    optimize: bool = True,
+) -> bytes:
+    teal = compileTeal(contract, mode=Mode.Application, version=version)
+    if optimize:
+        teal = optimizeTeal(teal)
+    return fullyCompileTeal(client, teal, cache, version)
+
+
+def assembleCached(teal: str, version: int, cache: CompileCache) -> Optional[bytes]:
+    """Assemble `teal` locally, through `cache`. Programs assembled locally
+    are keyed by the assembler, not the node. Returns None if the local
+    assembler lags behind algod, so the node has to assemble it, see
+    lookupCompiled and storeCompiled."""
+    key = cache.key(teal, version, assemblerIdentity())
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0]
+
+    try:
+        program = assemble(teal)
+    except UnknownOpcodeError:
+        return None
+    cache.put(key, program, programHash(program))
+    return program
+
+
+def lookupCompiled(teal: str, version: int, cache: CompileCache, compiler: str) -> Tuple[str, Optional[bytes]]:
+    """The cache key of `teal` as the node `compiler` compiles it, and the
+    program cached under it, if any."""
+    key = cache.key(teal, version, compiler)
+    cached = cache.get(key)
+    return key, cached[0] if cached is not None else None
+
+
+def storeCompiled(cache: CompileCache, key: str, response: Dict[str, Any]) -> bytes:
+    """Cache the program of a compile response under `key` and return it."""
+    program = b64decode(response["result"])
+    cache.put(key, program, response["hash"])
+    return program
+
+
+def fullyCompileTeal(
+    client: AlgodClient,
+    teal: str,
+    cache: Optional[CompileCache] = None,
+    version: int = 5,
+) -> bytes:
+    if cache is None:
+        cache = getDefaultCompileCache()
+    program = assembleCached(teal, version, cache)
+    if program is not None:
+        return program
+
+    # the local assembler lags behind algod, let the node assemble it
+    key, program = lookupCompiled(teal, version, cache, compilerIdentity(client, nodeBuild(client)))
+    if program is None:
+        program = storeCompiled(cache, key, client.compile(teal))
+    return program
 
 
 def decodeState(stateArray: List[Any]) -> Dict[bytes, Union[int, bytes]]:
@@ -143,7 +213,7 @@ def createDummyAsset(client: AlgodClient, total: int, account: Account = None) -
         asset_name=f"Dummy {randomNumber}",
         url=f"https://dummy.asset/{randomNumber}",
         note=randomNote,
-        sp=client.suggested_params(),
+        sp=getSuggestedParams(client),
     )
     signedTxn = txn.sign(account.getPrivateKey())
 
@@ -151,4 +221,49 @@ def createDummyAsset(client: AlgodClient, total: int, account: Account = None) -
 
     response = waitForTransaction(client, signedTxn.get_txid())
     assert response.assetIndex is not None and response.assetIndex > 0
-    return response.assetIndex
\ No newline at end of file
+    return response.assetIndex
+
+
+def optInToAsset(client: AlgodClient, assetID: int, account: Account) -> PendingTxnResponse:
+    txn = transaction.AssetOptInTxn(
+        sender=account.getAddress(),
+        index=assetID,
+        sp=getSuggestedParams(client),
+    )
+    signedTxn = txn.sign(account.getPrivateKey())
+
+    client.send_transaction(signedTxn)
+    return waitForTransaction(client, signedTxn.get_txid())
+
+
+def sendPacked(
+    client: AlgodClient, signer: Account, txns: List[transaction.Transaction]
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Send independent transactions packed into atomic groups of up to 16.
+
+    If algod rejects a group, its transactions are resent one by one so only
+    the failing ones are lost. Returns a (txID, error) pair per transaction,
+    with txID None when the transaction was rejected.
+    """
+    results: List[Tuple[Optional[str], Optional[str]]] = []
+    for start in range(0, len(txns), MAX_TXN_GROUP_SIZE):
+        chunk = txns[start:start + MAX_TXN_GROUP_SIZE]
+        if len(chunk) > 1:
+            transaction.assign_group_id(chunk)
+            signedTxns = [txn.sign(signer.getPrivateKey()) for txn in chunk]
+            try:
+                client.send_transactions(signedTxns)
+                results += [(signedTxn.get_txid(), None) for signedTxn in signedTxns]
+                continue
+            except AlgodHTTPError:
+                for txn in chunk:
+                    txn.group = None
+
+        for txn in chunk:
+            signedTxn = txn.sign(signer.getPrivateKey())
+            try:
+                client.send_transaction(signedTxn)
+                results.append((signedTxn.get_txid(), None))
+            except AlgodHTTPError as e:
+                results.append((None, str(e)))
+    return results
@@ -0,0 +1,1412 @@
+from base64 import b32encode, b64decode, b64encode
+from copy import deepcopy
+from time import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import msgpack
+from algosdk import account, encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from algosdk.logic import get_application_address
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+
+from utils.account import Account
+from utils.assembler import assembleProgram, disassemble
+from utils.avm import (
+    AVMError,
+    EvalContext,
+    Program,
+    StackValue,
+    TxnFields,
+    ZERO_ADDRESS,
+    evaluate,
+    getTxnField,
+    parseProgram,
+)
+from utils.opcodes import (
+    MAX_APP_ARGS,
+    MAX_APP_KEY_LEN,
+    MAX_APP_PROGRAM_COST,
+    MAX_APP_PROGRAM_LEN,
+    MAX_APP_SUM_KEY_VALUE_LEN,
+    MAX_APP_TOTAL_TXN_REFERENCES,
+    MAX_APP_TXN_ACCOUNTS,
+    MAX_APP_TXN_FOREIGN_APPS,
+    MAX_APP_TXN_FOREIGN_ASSETS,
+    MAX_EXTRA_APP_PROGRAM_PAGES,
+    MAX_GLOBAL_SCHEMA_ENTRIES,
+    MAX_LOCAL_SCHEMA_ENTRIES,
+    MAX_LOGIC_SIG_COST,
+    MAX_TXN_GROUP_SIZE,
+    TXN_TYPE_ENUMS,
+)
+from utils.tracker import msgpackToJson
+
+MIN_TXN_FEE = 1_000
+MIN_BALANCE = 100_000
+MAX_TXN_LIFE = 1_000
+APP_FLAT_PARAMS_MIN_BALANCE = 100_000
+APP_FLAT_OPT_IN_MIN_BALANCE = 100_000
+SCHEMA_MIN_BALANCE_PER_ENTRY = 25_000
+SCHEMA_UINT_MIN_BALANCE = 3_500
+SCHEMA_BYTES_MIN_BALANCE = 25_000
+
+GENESIS_ID = "local-v1"
+GENESIS_HASH = b64encode(encoding.checksum(GENESIS_ID.encode())).decode()
+CONSENSUS_VERSION = "local"
+GENESIS_BALANCE = 10 ** 16
+
+# assets and apps may be referenced by ID from v4, before only by their slot
+# index in the foreign arrays, or directly by the opcodes taking an ID
+DIRECT_REF_VERSION = 4
+# assets and apps created earlier in the group are available from v6
+CREATED_RESOURCES_VERSION = 6
+
+# msgpack key -> TEAL field name for the scalar transaction fields
+_MSGPACK_FIELDS: Dict[str, str] = {
+    "snd": "Sender",
+    "fee": "Fee",
+    "fv": "FirstValid",
+    "lv": "LastValid",
+    "note": "Note",
+    "lx": "Lease",
+    "rcv": "Receiver",
+    "amt": "Amount",
+    "close": "CloseRemainderTo",
+    "votekey": "VotePK",
+    "selkey": "SelectionPK",
+    "votefst": "VoteFirst",
+    "votelst": "VoteLast",
+    "votekd": "VoteKeyDilution",
+    "type": "Type",
+    "xaid": "XferAsset",
+    "aamt": "AssetAmount",
+    "asnd": "AssetSender",
+    "arcv": "AssetReceiver",
+    "aclose": "AssetCloseTo",
+    "apid": "ApplicationID",
+    "apan": "OnCompletion",
+    "apaa": "ApplicationArgs",
+    "apat": "Accounts",
+    "apas": "Assets",
+    "apfa": "Applications",
+    "apap": "ApprovalProgram",
+    "apsu": "ClearStateProgram",
+    "apep": "ExtraProgramPages",
+    "rekey": "RekeyTo",
+    "caid": "ConfigAsset",
+    "faid": "FreezeAsset",
+    "fadd": "FreezeAssetAccount",
+    "afrz": "FreezeAssetFrozen",
+    "nonpart": "Nonparticipation",
+}
+
+_ASSET_PARAMS_FIELDS: Dict[str, str] = {
+    "t": "ConfigAssetTotal",
+    "dc": "ConfigAssetDecimals",
+    "df": "ConfigAssetDefaultFrozen",
+    "un": "ConfigAssetUnitName",
+    "an": "ConfigAssetName",
+    "au": "ConfigAssetURL",
+    "am": "ConfigAssetMetadataHash",
+    "m": "ConfigAssetManager",
+    "r": "ConfigAssetReserve",
+    "f": "ConfigAssetFreeze",
+    "c": "ConfigAssetClawback",
+}
+
+_SCHEMA_FIELDS: Dict[str, Tuple[str, str]] = {
+    "apgs": ("GlobalNumUint", "GlobalNumByteSlice"),
+    "apls": ("LocalNumUint", "LocalNumByteSlice"),
+}
+
+# parsed programs keyed by their bytecode
+_PROGRAMS: Dict[bytes, Program] = {}
+
+
+class LedgerError(Exception):
+    """Raised when a transaction is rejected by the local ledger"""
+
+
+def txnFieldsFromMsgpack(txn: Dict[str, Any]) -> TxnFields:
+    """Convert a msgpack-decoded transaction into AVM field names."""
+    fields: TxnFields = {}
+    for key, value in txn.items():
+        if key in _MSGPACK_FIELDS:
+            name = _MSGPACK_FIELDS[key]
+            if isinstance(value, str):
+                value = value.encode()
+            fields[name] = list(value) if isinstance(value, (list, tuple)) else value
+        elif key == "apar":
+            for paramKey, paramValue in value.items():
+                if isinstance(paramValue, str):
+                    paramValue = paramValue.encode()
+                if isinstance(paramValue, bool):
+                    paramValue = int(paramValue)
+                fields[_ASSET_PARAMS_FIELDS[paramKey]] = paramValue
+        elif key in _SCHEMA_FIELDS:
+            uintField, bytesField = _SCHEMA_FIELDS[key]
+            fields[uintField] = value.get("nui", 0)
+            fields[bytesField] = value.get("nbs", 0)
+        elif key == "grp":
+            fields["Group"] = value
+    for key in ("FreezeAssetFrozen", "Nonparticipation"):
+        if key in fields:
+            fields[key] = int(fields[key])
+    if "Type" in fields:
+        fields["TypeEnum"] = TXN_TYPE_ENUMS.get(fields["Type"].decode(), 0)
+    return fields
+
+
+def txnFieldsToMsgpack(fields: TxnFields) -> Dict[str, Any]:
+    """Convert AVM transaction fields into the canonical msgpack layout,
+    omitting empty values."""
+    out: Dict[str, Any] = {}
+    for key, name in _MSGPACK_FIELDS.items():
+        value = fields.get(name)
+        if not value or value == ZERO_ADDRESS and name != "Sender":
+            continue
+        if name == "Type":
+            value = value.decode()
+        out[key] = value
+    params = {}
+    for key, name in _ASSET_PARAMS_FIELDS.items():
+        value = fields.get(name)
+        if value:
+            params[key] = value.decode() if key in ("un", "an", "au") else value
+    if params:
+        out["apar"] = params
+    for key, (uintField, bytesField) in _SCHEMA_FIELDS.items():
+        schema = {}
+        if fields.get(uintField):
+            schema["nui"] = fields[uintField]
+        if fields.get(bytesField):
+            schema["nbs"] = fields[bytesField]
+        if schema:
+            out[key] = schema
+    if fields.get("Group"):
+        out["grp"] = fields["Group"]
+    return dict(sorted(out.items()))
+
+
+def _rawTxid(txn: Dict[str, Any]) -> bytes:
+    return encoding.checksum(b"TX" + msgpack.packb(txn, use_bin_type=True))
+
+
+def _txid(txn: Dict[str, Any]) -> str:
+    return b32encode(_rawTxid(txn)).decode().strip("=")
+
+
+def _groupID(txns: List[Dict[str, Any]]) -> bytes:
+    txids = []
+    for txn in txns:
+        ungrouped = {k: v for k, v in txn.items() if k != "grp"}
+        txids.append(encoding.checksum(b"TX" + msgpack.packb(ungrouped, use_bin_type=True)))
+    encoded = msgpack.packb({"txlist": txids}, use_bin_type=True)
+    return encoding.checksum(b"TG" + encoded)
+
+
+def _stateValueJson(value: StackValue) -> Dict[str, Any]:
+    if isinstance(value, int):
+        return {"type": 2, "uint": value, "bytes": ""}
+    return {"type": 1, "uint": 0, "bytes": b64encode(value).decode()}
+
+
+def _stateJson(state: Dict[bytes, StackValue]) -> List[Dict[str, Any]]:
+    return [
+        {"key": b64encode(key).decode(), "value": _stateValueJson(value)}
+        for key, value in sorted(state.items())
+    ]
+
+
+def _stateDelta(before: Dict[bytes, StackValue], after: Dict[bytes, StackValue]) -> List[Dict[str, Any]]:
+    delta = []
+    for key in sorted(set(before) | set(after)):
+        if key not in after:
+            delta.append({"key": b64encode(key).decode(), "value": {"action": 3}})
+        elif before.get(key) != after[key]:
+            value = after[key]
+            if isinstance(value, int):
+                entry = {"action": 2, "uint": value}
+            else:
+                entry = {"action": 1, "bytes": b64encode(value).decode()}
+            delta.append({"key": b64encode(key).decode(), "value": entry})
+    return delta
+
+
+def _valueDeltaMsgpack(value: Dict[str, Any]) -> Dict[str, Any]:
+    delta: Dict[str, Any] = {"at": value["action"]}
+    if "bytes" in value:
+        delta["bs"] = b64decode(value["bytes"])
+    if "uint" in value:
+        delta["ui"] = value["uint"]
+    return delta
+
+
+class _AccountState:
+    def __init__(self) -> None:
+        self.amount = 0
+        # asset id -> [amount, frozen]
+        self.assets: Dict[int, List[int]] = {}
+        self.createdAssets: Set[int] = set()
+        # app id -> (global uints, global byte slices, extra pages)
+        self.createdApps: Dict[int, Tuple[int, int, int]] = {}
+        # app id -> (local uints, local byte slices)
+        self.localSchemas: Dict[int, Tuple[int, int]] = {}
+        self.localStates: Dict[int, Dict[bytes, StackValue]] = {}
+        self.authAddr: Optional[bytes] = None
+
+    def isEmpty(self) -> bool:
+        return (
+            self.amount == 0
+            and not self.assets
+            and not self.createdAssets
+            and not self.createdApps
+            and not self.localSchemas
+            and self.authAddr is None
+        )
+
+    def minBalance(self) -> int:
+        total = MIN_BALANCE * (1 + len(self.assets))
+        for numUint, numByteSlice, extraPages in self.createdApps.values():
+            total += APP_FLAT_PARAMS_MIN_BALANCE * (1 + extraPages)
+            total += _schemaCost(numUint, numByteSlice)
+        for numUint, numByteSlice in self.localSchemas.values():
+            total += APP_FLAT_OPT_IN_MIN_BALANCE + _schemaCost(numUint, numByteSlice)
+        return total
+
+
+def _schemaCost(numUint: int, numByteSlice: int) -> int:
+    return (
+        (SCHEMA_MIN_BALANCE_PER_ENTRY + SCHEMA_UINT_MIN_BALANCE) * numUint
+        + (SCHEMA_MIN_BALANCE_PER_ENTRY + SCHEMA_BYTES_MIN_BALANCE) * numByteSlice
+    )
+
+
+class _AppState:
+    def __init__(self, appID: int, creator: bytes, txn: TxnFields) -> None:
+        self.appID = appID
+        self.creator = creator
+        self.approvalProgram: bytes = getTxnField(txn, "ApprovalProgram")
+        self.clearStateProgram: bytes = getTxnField(txn, "ClearStateProgram")
+        self.globalNumUint: int = getTxnField(txn, "GlobalNumUint")
+        self.globalNumByteSlice: int = getTxnField(txn, "GlobalNumByteSlice")
+        self.localNumUint: int = getTxnField(txn, "LocalNumUint")
+        self.localNumByteSlice: int = getTxnField(txn, "LocalNumByteSlice")
+        self.extraPages: int = getTxnField(txn, "ExtraProgramPages")
+        self.globalState: Dict[bytes, StackValue] = {}
+
+
+class _AssetState:
+    def __init__(self, assetID: int, creator: bytes, txn: TxnFields) -> None:
+        self.assetID = assetID
+        self.creator = creator
+        self.params: Dict[str, StackValue] = {
+            "AssetTotal": getTxnField(txn, "ConfigAssetTotal"),
+            "AssetDecimals": getTxnField(txn, "ConfigAssetDecimals"),
+            "AssetDefaultFrozen": getTxnField(txn, "ConfigAssetDefaultFrozen"),
+            "AssetUnitName": getTxnField(txn, "ConfigAssetUnitName"),
+            "AssetName": getTxnField(txn, "ConfigAssetName"),
+            "AssetURL": getTxnField(txn, "ConfigAssetURL"),
+            "AssetMetadataHash": getTxnField(txn, "ConfigAssetMetadataHash"),
+            "AssetManager": getTxnField(txn, "ConfigAssetManager"),
+            "AssetReserve": getTxnField(txn, "ConfigAssetReserve"),
+            "AssetFreeze": getTxnField(txn, "ConfigAssetFreeze"),
+            "AssetClawback": getTxnField(txn, "ConfigAssetClawback"),
+            "AssetCreator": creator,
+        }
+
+
+class _GroupState:
+    """Bookkeeping shared by every transaction evaluated in one outer group"""
+
+    def __init__(self, size: int) -> None:
+        self.budget = 0
+        self.feeCredit = 0
+        self.scratch: List[List[StackValue]] = [[0] * 256 for _ in range(size)]
+        self.createdIDs: List[int] = [0] * size
+        self.createdApps: Set[int] = set()
+        self.createdAssets: Set[int] = set()
+
+
+_MISSING = object()
+
+
+class _AppCallContext(EvalContext):
+    def __init__(
+        self,
+        ledger: "LocalAlgodClient",
+        state: _GroupState,
+        group: List[TxnFields],
+        groupIndex: int,
+        appID: int,
+        version: int,
+        callerAppID: int,
+        programBytes: bytes,
+    ) -> None:
+        self.mode = "application"
+        self.ledger = ledger
+        self.state = state
+        self.group = group
+        self.groupIndex = groupIndex
+        self.appID = appID
+        self.version = version
+        self.callerAppID = callerAppID
+        self.programBytes = programBytes
+        self.args: List[bytes] = []
+        self.logs: List[bytes] = []
+        self.innerResults: List[Dict[str, Any]] = []
+        self.appAddress = encoding.decode_address(get_application_address(appID))
+
+    # -- environment ----------------------------------------------------
+
+    def globalField(self, field: str) -> StackValue:
+        ledger = self.ledger
+        if field == "MinTxnFee":
+            return MIN_TXN_FEE
+        if field == "MinBalance":
+            return MIN_BALANCE
+        if field == "MaxTxnLife":
+            return MAX_TXN_LIFE
+        if field == "ZeroAddress":
+            return ZERO_ADDRESS
+        if field == "GroupSize":
+            return len(self.group)
+        if field == "LogicSigVersion":
+            return 6
+        if field == "Round":
+            return ledger._round + 1
+        if field == "LatestTimestamp":
+            return ledger._blocks[-1]["ts"]
+        if field == "CurrentApplicationID":
+            return self.appID
+        if field == "CreatorAddress":
+            return ledger._apps[self.appID].creator
+        if field == "CurrentApplicationAddress":
+            return self.appAddress
+        if field == "GroupID":
+            return self.txn.get("Group", ZERO_ADDRESS)
+        if field == "CallerApplicationID":
+            return self.callerAppID
+        if field == "CallerApplicationAddress":
+            if self.callerAppID == 0:
+                return ZERO_ADDRESS
+            return encoding.decode_address(get_application_address(self.callerAppID))
+        raise AVMError("invalid global field {}".format(field))
+
+    def consumeBudget(self, cost: int) -> None:
+        self.state.budget -= cost
+        if self.state.budget < 0:
+            raise AVMError("dynamic cost budget exceeded")
+
+    def remainingBudget(self) -> int:
+        return self.state.budget
+
+    def programHash(self) -> bytes:
+        return encoding.checksum(b"Program" + self.programBytes)
+
+    def groupScratch(self, groupIndex: int) -> List[StackValue]:
+        return self.state.scratch[groupIndex]
+
+    def createdID(self, groupIndex: int) -> int:
+        createdID = self.state.createdIDs[groupIndex]
+        if createdID == 0:
+            raise AVMError("txn {} did not create anything".format(groupIndex))
+        return createdID
+
+    # -- resource resolution ----------------------------------------------
+
+    def resolveAccount(self, value: StackValue) -> bytes:
+        accounts = [getTxnField(self.txn, "Sender")] + list(self.txn.get("Accounts", []))
+        if isinstance(value, int):
+            if value >= len(accounts):
+                raise AVMError("invalid Account reference {}".format(value))
+            return accounts[value]
+        if len(value) != 32:
+            raise AVMError("invalid Account reference {!r}".format(value))
+        if value in accounts or value == self.appAddress:
+            return value
+        # apps created earlier in the group are available from v6, the
+        # foreign apps and the calling app only from v7
+        apps = list(self.state.createdApps)
+        if self.version >= 7:
+            apps += list(self.txn.get("Applications", []))
+            if self.callerAppID:
+                apps.append(self.callerAppID)
+        for appID in apps:
+            if value == encoding.decode_address(get_application_address(appID)):
+                return value
+        raise AVMError("invalid Account reference {}".format(encoding.encode_address(value)))
+
+    def resolveAsset(self, value: int, foreign: bool = True) -> int:
+        assets = list(self.txn.get("Assets", []))
+        if self.version < DIRECT_REF_VERSION:
+            if not foreign:
+                return value
+            if value < len(assets):
+                return assets[value]
+            raise AVMError("invalid Asset reference {}".format(value))
+        # as in go-algorand, an available ID wins over a slot index
+        if value in assets:
+            return value
+        if self.version >= CREATED_RESOURCES_VERSION and value in self.state.createdAssets:
+            return value
+        if value < len(assets):
+            return assets[value]
+        raise AVMError("invalid Asset reference {}".format(value))
+
+    def resolveApp(self, value: int, foreign: bool = True) -> int:
+        apps = list(self.txn.get("Applications", []))
+        if value == 0:
+            return self.appID
+        if self.version < DIRECT_REF_VERSION:
+            if not foreign:
+                return value
+            if value <= len(apps):
+                return apps[value - 1]
+            raise AVMError("invalid App reference {}".format(value))
+        # as in go-algorand, an available ID wins over a slot index
+        if value == self.appID or value in apps:
+            return value
+        if self.version >= CREATED_RESOURCES_VERSION and value in self.state.createdApps:
+            return value
+        if value <= len(apps):
+            return apps[value - 1]
+        raise AVMError("invalid App reference {}".format(value))
+
+    # -- ledger reads -----------------------------------------------------
+
+    def balance(self, address: bytes) -> int:
+        acct = self.ledger._accounts.get(address)
+        return acct.amount if acct else 0
+
+    def minBalance(self, address: bytes) -> int:
+        acct = self.ledger._accounts.get(address)
+        return acct.minBalance() if acct else MIN_BALANCE
+
+    def authAddr(self, address: bytes) -> bytes:
+        acct = self.ledger._accounts.get(address)
+        return acct.authAddr if acct and acct.authAddr else ZERO_ADDRESS
+
+    def optedIn(self, address: bytes, appID: int) -> bool:
+        acct = self.ledger._accounts.get(address)
+        return bool(acct) and appID in acct.localSchemas
+
+    def getGlobal(self, appID: int, key: bytes) -> Optional[StackValue]:
+        app = self.ledger._apps.get(appID)
+        return app.globalState.get(key) if app else None
+
+    def getLocal(self, address: bytes, appID: int, key: bytes) -> Optional[StackValue]:
+        acct = self.ledger._accounts.get(address)
+        if acct is None or appID not in acct.localStates:
+            if acct is None or appID not in acct.localSchemas:
+                raise AVMError("{} has not opted in to app {}".format(encoding.encode_address(address), appID))
+            return None
+        return acct.localStates[appID].get(key)
+
+    def assetHolding(self, address: bytes, assetID: int) -> Optional[Dict[str, StackValue]]:
+        acct = self.ledger._accounts.get(address)
+        if acct is None or assetID not in acct.assets:
+            return None
+        amount, frozen = acct.assets[assetID]
+        return {"AssetBalance": amount, "AssetFrozen": frozen}
+
+    def assetParams(self, assetID: int) -> Optional[Dict[str, StackValue]]:
+        asset = self.ledger._assets.get(assetID)
+        return dict(asset.params) if asset else None
+
+    def appParams(self, appID: int) -> Optional[Dict[str, StackValue]]:
+        app = self.ledger._apps.get(appID)
+        if app is None:
+            return None
+        return {
+            "AppApprovalProgram": app.approvalProgram,
+            "AppClearStateProgram": app.clearStateProgram,
+            "AppGlobalNumUint": app.globalNumUint,
+            "AppGlobalNumByteSlice": app.globalNumByteSlice,
+            "AppLocalNumUint": app.localNumUint,
+            "AppLocalNumByteSlice": app.localNumByteSlice,
+            "AppExtraProgramPages": app.extraPages,
+            "AppCreator": app.creator,
+            "AppAddress": encoding.decode_address(get_application_address(appID)),
+        }
+
+    # -- ledger writes ----------------------------------------------------
+
+    def putGlobal(self, key: bytes, value: StackValue) -> None:
+        _checkKeyValue(key, value)
+        app = self.ledger._modifyApp(self.appID)
+        app.globalState[key] = value
+        numUint = sum(1 for v in app.globalState.values() if isinstance(v, int))
+        numByteSlice = len(app.globalState) - numUint
+        if numUint > app.globalNumUint or numByteSlice > app.globalNumByteSlice:
+            raise AVMError(
+                "store {} count {} exceeds schema {} count {}".format(
+                    "integer" if isinstance(value, int) else "bytes",
+                    numUint if isinstance(value, int) else numByteSlice,
+                    "integer" if isinstance(value, int) else "bytes",
+                    app.globalNumUint if isinstance(value, int) else app.globalNumByteSlice,
+                )
+            )
+
+    def delGlobal(self, key: bytes) -> None:
+        self.ledger._modifyApp(self.appID).globalState.pop(key, None)
+
+    def putLocal(self, address: bytes, key: bytes, value: StackValue) -> None:
+        _checkKeyValue(key, value)
+        acct = self.ledger._modifyAccount(address)
+        if self.appID not in acct.localSchemas:
+            raise AVMError("{} has not opted in to app {}".format(encoding.encode_address(address), self.appID))
+        state = acct.localStates.setdefault(self.appID, {})
+        state[key] = value
+        numUint, numByteSlice = acct.localSchemas[self.appID]
+        usedUint = sum(1 for v in state.values() if isinstance(v, int))
+        if usedUint > numUint or len(state) - usedUint > numByteSlice:
+            raise AVMError("local state exceeds schema of app {}".format(self.appID))
+
+    def delLocal(self, address: bytes, key: bytes) -> None:
+        acct = self.ledger._modifyAccount(address)
+        if self.appID not in acct.localSchemas:
+            raise AVMError("{} has not opted in to app {}".format(encoding.encode_address(address), self.appID))
+        acct.localStates.get(self.appID, {}).pop(key, None)
+
+    def log(self, message: bytes) -> None:
+        self.logs.append(message)
+
+    # -- inner transactions -------------------------------------------------
+
+    def newInnerTxn(self) -> TxnFields:
+        ledger = self.ledger
+        txn: TxnFields = {
+            "Sender": self.appAddress,
+            "FirstValid": ledger._round,
+            "LastValid": ledger._round + MAX_TXN_LIFE,
+        }
+        if self.version < 6:
+            txn["Fee"] = MIN_TXN_FEE
+        return txn
+
+    def submitInner(self, group: List[TxnFields]) -> List[TxnFields]:
+        results = self.ledger._applyInnerGroup(self, group)
+        self.innerResults += results
+        return [result["fields"] for result in results]
+
+
+def _checkKeyValue(key: bytes, value: StackValue) -> None:
+    if len(key) > MAX_APP_KEY_LEN:
+        raise AVMError("key too long: length was {}, maximum is {}".format(len(key), MAX_APP_KEY_LEN))
+    if isinstance(value, bytes) and len(key) + len(value) > MAX_APP_SUM_KEY_VALUE_LEN:
+        raise AVMError("key/value total too long for key {!r}".format(key))
+
+
+class _LogicSigContext(EvalContext):
+    def __init__(self, group: List[TxnFields], groupIndex: int, args: List[bytes], programBytes: bytes) -> None:
+        self.mode = "signature"
+        self.group = group
+        self.groupIndex = groupIndex
+        self.args = args
+        self.programBytes = programBytes
+        self.budget = MAX_LOGIC_SIG_COST
+
+    def globalField(self, field: str) -> StackValue:
+        values: Dict[str, StackValue] = {
+            "MinTxnFee": MIN_TXN_FEE,
+            "MinBalance": MIN_BALANCE,
+            "MaxTxnLife": MAX_TXN_LIFE,
+            "ZeroAddress": ZERO_ADDRESS,
+            "GroupSize": len(self.group),
+            "LogicSigVersion": 6,
+            "GroupID": self.txn.get("Group", ZERO_ADDRESS),
+        }
+        if field not in values:
+            raise AVMError("global {} not allowed in current mode".format(field))
+        return values[field]
+
+    def consumeBudget(self, cost: int) -> None:
+        self.budget -= cost
+        if self.budget < 0:
+            raise AVMError("logic sig cost budget exceeded")
+
+    def remainingBudget(self) -> int:
+        return self.budget
+
+    def programHash(self) -> bytes:
+        return encoding.checksum(b"Program" + self.programBytes)
+
+
+class LocalAlgodClient:
+    """An in-process stand-in for AlgodClient backed by a simulated ledger.
+
+    Transactions submitted through send_transaction(s) are validated, their
+    programs evaluated by utils.avm and the whole group committed in a block
+    of its own, so they are confirmed by the time the call returns. The
+    ledger clock only moves when a test asks it to with advanceTo or
+    advanceTime, which makes time dependent contracts testable without
+    sleeping.
+
+    compile() assembles TEAL locally with utils.assembler, and deployed
+    bytecode from any other source is disassembled before it runs.
+    """
+
+    def __init__(self, timestamp: Optional[int] = None) -> None:
+        self._accounts: Dict[bytes, _AccountState] = {}
+        self._apps: Dict[int, _AppState] = {}
+        self._assets: Dict[int, _AssetState] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._costs: Dict[str, int] = {}
+        self._journal: Optional[Dict[Tuple[str, Any], Any]] = None
+        self._counter = 1000
+        self._round = 0
+        self._clock = int(time()) if timestamp is None else timestamp
+        self._blocks: List[Dict[str, Any]] = []
+        self._commitBlock([])
+
+        privateKey, address = account.generate_account()
+        self.faucet = Account(privateKey)
+        self._modifyAccount(encoding.decode_address(address)).amount = GENESIS_BALANCE
+
+    # -- clock --------------------------------------------------------------
+
+    def advanceTo(self, timestamp: int) -> None:
+        """Commit an empty block stamped `timestamp`, so it becomes
+        Global.latest_timestamp() for the next transactions."""
+        if timestamp < self._clock:
+            raise ValueError("cannot move the ledger clock backwards")
+        self._clock = timestamp
+        self._commitBlock([])
+
+    def advanceTime(self, seconds: int) -> None:
+        """Move the ledger clock forward by `seconds`."""
+        self.advanceTo(self._clock + seconds)
+
+    def advanceRounds(self, count: int) -> None:
+        """Commit `count` empty blocks without moving the clock."""
+        for _ in range(count):
+            self._commitBlock([])
+
+    def fund(self, address: str, amount: int) -> str:
+        """Pay `amount` microAlgos to `address` from the genesis faucet."""
+        txn = transaction.PaymentTxn(
+            sender=self.faucet.getAddress(),
+            receiver=address,
+            amt=amount,
+            sp=self.suggested_params(),
+        )
+        return self.send_transaction(txn.sign(self.faucet.getPrivateKey()))
+
+    def getOpcodeCost(self, txID: str) -> int:
+        """Total opcode cost of the programs run by a confirmed transaction,
+        including inner application calls."""
+        if txID not in self._costs:
+            raise AlgodHTTPError("txn does not exist", 404)
+        return self._costs[txID]
+
+    # -- AlgodClient surface ------------------------------------------------
+
+    def health(self, **kwargs: Any) -> None:
+        return None
+
+    def versions(self, **kwargs: Any) -> Dict[str, Any]:
+        return {
+            "build": {
+                "major": 0,
+                "minor": 0,
+                "build_number": 0,
+                "branch": "local",
+                "channel": "local",
+                "commit_hash": "local",
+            },
+            "genesis_id": GENESIS_ID,
+            "genesis_hash_b64": GENESIS_HASH,
+            "versions": ["v2"],
+        }
+
+    def status(self, **kwargs: Any) -> Dict[str, Any]:
+        return {
+            "last-round": self._round,
+            "last-version": CONSENSUS_VERSION,
+            "next-version": CONSENSUS_VERSION,
+            "next-version-round": self._round + 1,
+            "next-version-supported": True,
+            "time-since-last-round": 0,
+            "catchup-time": 0,
+            "stopped-at-unsupported-round": False,
+        }
+
+    def status_after_block(self, block_num: Optional[int] = None, round_num: Optional[int] = None, **kwargs: Any) -> Dict[str, Any]:
+        target = block_num if block_num is not None else round_num
+        if target is None:
+            raise ValueError("block_num or round_num is required")
+        while self._round <= target:
+            self._commitBlock([])
+        return self.status()
+
+    def suggested_params(self, **kwargs: Any) -> transaction.SuggestedParams:
+        return transaction.SuggestedParams(
+            0,
+            self._round,
+            self._round + MAX_TXN_LIFE,
+            GENESIS_HASH,
+            GENESIS_ID,
+            False,
+            CONSENSUS_VERSION,
+            MIN_TXN_FEE,
+        )
+
+    def compile(self, source: str, **kwargs: Any) -> Dict[str, str]:
+        try:
+            program = parseProgram(source)
+        except AVMError as e:
+            raise AlgodHTTPError(str(e), 400)
+        try:
+            programBytes = assembleProgram(program)
+        except AVMError as e:
+            raise AlgodHTTPError(str(e), 400)
+        # keep the parsed source so evaluation errors report TEAL line numbers
+        _PROGRAMS[programBytes] = program
+        address = encoding.encode_address(encoding.checksum(b"Program" + programBytes))
+        return {"hash": address, "result": b64encode(programBytes).decode()}
+
+    def send_transaction(self, txn: Any, **kwargs: Any) -> str:
+        return self.send_raw_transaction(encoding.msgpack_encode(txn), **kwargs)
+
+    def send_transactions(self, txns: List[Any], **kwargs: Any) -> str:
+        serialized = b"".join(b64decode(encoding.msgpack_encode(txn)) for txn in txns)
+        return self.send_raw_transaction(b64encode(serialized), **kwargs)
+
+    def send_raw_transaction(self, txn: Any, **kwargs: Any) -> str:
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(b64decode(txn))
+        signedTxns = list(unpacker)
+        try:
+            self._submitGroup(signedTxns)
+        except (LedgerError, AVMError) as e:
+            raise AlgodHTTPError(
+                "TransactionPool.Remember: transaction {}: {}".format(_txid(signedTxns[0]["txn"]), e),
+                400,
+            )
+        return _txid(signedTxns[0]["txn"])
+
+    def pending_transactions(self, max_txns: int = 0, response_format: str = "json", **kwargs: Any) -> Any:
+        # transactions are confirmed as they are submitted, the pool stays empty
+        pool = {"top-transactions": [], "total-transactions": 0}
+        if response_format == "msgpack":
+            return msgpack.packb(pool, use_bin_type=True)
+        return pool
+
+    def pending_transaction_info(self, transaction_id: str, response_format: str = "json", **kwargs: Any) -> Dict[str, Any]:
+        if transaction_id not in self._pending:
+            raise AlgodHTTPError("txn does not exist", 404)
+        return deepcopy(self._pending[transaction_id])
+
+    def account_info(self, address: str, **kwargs: Any) -> Dict[str, Any]:
+        acct = self._accounts.get(encoding.decode_address(address), _AccountState())
+        return {
+            "address": address,
+            "amount": acct.amount,
+            "amount-without-pending-rewards": acct.amount,
+            "min-balance": acct.minBalance() if not acct.isEmpty() else 0,
+            "pending-rewards": 0,
+            "rewards": 0,
+            "round": self._round,
+            "status": "Offline",
+            "auth-addr": encoding.encode_address(acct.authAddr) if acct.authAddr else None,
+            "assets": [
+                {"asset-id": assetID, "amount": amount, "is-frozen": bool(frozen)}
+                for assetID, (amount, frozen) in sorted(acct.assets.items())
+            ],
+            "created-assets": [self._assetJson(assetID) for assetID in sorted(acct.createdAssets)],
+            "created-apps": [self._appJson(appID) for appID in sorted(acct.createdApps)],
+            "apps-local-state": [
+                {
+                    "id": appID,
+                    "schema": {"num-uint": schema[0], "num-byte-slice": schema[1]},
+                    "key-value": _stateJson(acct.localStates.get(appID, {})),
+                }
+                for appID, schema in sorted(acct.localSchemas.items())
+            ],
+            "total-apps-opted-in": len(acct.localSchemas),
+            "total-assets-opted-in": len(acct.assets),
+            "total-created-apps": len(acct.createdApps),
+            "total-created-assets": len(acct.createdAssets),
+        }
+
+    def application_info(self, application_id: int, **kwargs: Any) -> Dict[str, Any]:
+        if application_id not in self._apps:
+            raise AlgodHTTPError("application does not exist", 404)
+        return self._appJson(application_id)
+
+    def asset_info(self, asset_id: int, **kwargs: Any) -> Dict[str, Any]:
+        if asset_id not in self._assets:
+            raise AlgodHTTPError("asset does not exist", 404)
+        return self._assetJson(asset_id)
+
+    def block_info(self, block: Optional[int] = None, response_format: str = "json", round_num: Optional[int] = None, **kwargs: Any) -> Any:
+        number = block if block is not None else round_num
+        if number is None or number > self._round:
+            raise AlgodHTTPError("failed to retrieve information from the ledger", 404)
+        content = {"block": self._blocks[number]}
+        if response_format == "msgpack":
+            return msgpack.packb(content, use_bin_type=True)
+        return msgpackToJson(content)
+
+    # -- JSON rendering -------------------------------------------------------
+
+    def _appJson(self, appID: int) -> Dict[str, Any]:
+        app = self._apps[appID]
+        return {
+            "id": appID,
+            "params": {
+                "creator": encoding.encode_address(app.creator),
+                "approval-program": b64encode(app.approvalProgram).decode(),
+                "clear-state-program": b64encode(app.clearStateProgram).decode(),
+                "extra-program-pages": app.extraPages,
+                "global-state": _stateJson(app.globalState),
+                "global-state-schema": {"num-uint": app.globalNumUint, "num-byte-slice": app.globalNumByteSlice},
+                "local-state-schema": {"num-uint": app.localNumUint, "num-byte-slice": app.localNumByteSlice},
+            },
+        }
+
+    def _assetJson(self, assetID: int) -> Dict[str, Any]:
+        params = self._assets[assetID].params
+
+        def address(value: bytes) -> Optional[str]:
+            return encoding.encode_address(value) if value != ZERO_ADDRESS else None
+
+        return {
+            "index": assetID,
+            "params": {
+                "creator": encoding.encode_address(params["AssetCreator"]),
+                "total": params["AssetTotal"],
+                "decimals": params["AssetDecimals"],
+                "default-frozen": bool(params["AssetDefaultFrozen"]),
+                "unit-name": params["AssetUnitName"].decode(errors="replace"),
+                "name": params["AssetName"].decode(errors="replace"),
+                "url": params["AssetURL"].decode(errors="replace"),
+                "metadata-hash": b64encode(params["AssetMetadataHash"]).decode() if params["AssetMetadataHash"] else None,
+                "manager": address(params["AssetManager"]),
+                "reserve": address(params["AssetReserve"]),
+                "freeze": address(params["AssetFreeze"]),
+                "clawback": address(params["AssetClawback"]),
+            },
+        }
+
+    # -- journaled state access -----------------------------------------------
+
+    def _save(self, kind: str, key: Any, store: Dict[Any, Any]) -> None:
+        if self._journal is not None and (kind, key) not in self._journal:
+            self._journal[(kind, key)] = deepcopy(store[key]) if key in store else _MISSING
+
+    def _modifyAccount(self, address: bytes) -> _AccountState:
+        self._save("account", address, self._accounts)
+        if address not in self._accounts:
+            self._accounts[address] = _AccountState()
+        return self._accounts[address]
+
+    def _modifyApp(self, appID: int) -> _AppState:
+        self._save("app", appID, self._apps)
+        return self._apps[appID]
+
+    def _modifyAsset(self, assetID: int) -> _AssetState:
+        self._save("asset", assetID, self._assets)
+        return self._assets[assetID]
+
+    def _nextID(self) -> int:
+        if self._journal is not None and ("counter", None) not in self._journal:
+            self._journal[("counter", None)] = self._counter
+        self._counter += 1
+        return self._counter
+
+    def _rollback(self) -> None:
+        assert self._journal is not None
+        stores = {"account": self._accounts, "app": self._apps, "asset": self._assets}
+        for (kind, key), original in self._journal.items():
+            if kind == "counter":
+                self._counter = original
+            elif original is _MISSING:
+                stores[kind].pop(key, None)
+            else:
+                stores[kind][key] = original
+        self._journal = None
+
+    def _touchedAccounts(self) -> List[bytes]:
+        assert self._journal is not None
+        return [key for kind, key in self._journal if kind == "account"]
+
+    # -- blocks ---------------------------------------------------------------
+
+    def _commitBlock(self, txns: List[Dict[str, Any]]) -> int:
+        self._round = len(self._blocks)
+        self._blocks.append(
+            {
+                "rnd": self._round,
+                "ts": self._clock,
+                "gen": GENESIS_ID,
+                "gh": b64decode(GENESIS_HASH),
+                "txns": txns,
+            }
+        )
+        return self._round
+
+    # -- transaction processing -----------------------------------------------
+
+    def _program(self, programBytes: bytes) -> Program:
+        program = _PROGRAMS.get(programBytes)
+        if program is None:
+            try:
+                program = disassemble(programBytes)
+            except AVMError as e:
+                raise LedgerError("invalid program: {}".format(e))
+            _PROGRAMS[programBytes] = program
+        return program
+
+    def _submitGroup(self, signedTxns: List[Dict[str, Any]]) -> None:
+        if not signedTxns or len(signedTxns) > MAX_TXN_GROUP_SIZE:
+            raise LedgerError("group size {} is invalid".format(len(signedTxns)))
+
+        txns = [stxn["txn"] for stxn in signedTxns]
+        txids = [_txid(txn) for txn in txns]
+        group = [txnFieldsFromMsgpack(txn) for txn in txns]
+        for txn, fields in zip(txns, group):
+            fields["TxID"] = _rawTxid(txn)
+
+        for txid, txn in zip(txids, group):
+            if txid in self._pending:
+                raise LedgerError("transaction already in ledger: {}".format(txid))
+            if txn.get("FirstValid", 0) > self._round + 1 or txn.get("LastValid", 0) < self._round + 1:
+                raise LedgerError("txn dead: round {} outside of {}--{}".format(self._round + 1, txn.get("FirstValid", 0), txn.get("LastValid", 0)))
+            if txn.get("LastValid", 0) - txn.get("FirstValid", 0) > MAX_TXN_LIFE:
+                raise LedgerError("transaction window size excessive")
+
+        if len(txns) > 1 or "grp" in txns[0]:
+            expected = _groupID(txns)
+            if any(txn.get("grp") != expected for txn in txns):
+                raise LedgerError("group ID mismatch")
+
+        for index, stxn in enumerate(signedTxns):
+            self._verifySignature(stxn, group, index)
+
+        state = _GroupState(len(group))
+        totalFee = sum(getTxnField(txn, "Fee") for txn in group)
+        state.feeCredit = totalFee - MIN_TXN_FEE * len(group)
+        if state.feeCredit < 0:
+            raise LedgerError("fee too small: group paid {} for {} transactions".format(totalFee, len(group)))
+        state.budget = MAX_APP_PROGRAM_COST * sum(1 for txn in group if getTxnField(txn, "TypeEnum") == 6)
+
+        self._journal = {}
+        results = []
+        try:
+            for index, txn in enumerate(group):
+                results.append(self._applyTxn(state, group, index, 0, depth=0))
+                self._checkMinBalances()
+        except (LedgerError, AVMError):
+            self._rollback()
+            raise
+        self._journal = None
+
+        blockTxns = []
+        confirmedRound = self._commitBlock(blockTxns)
+        for stxn, txid, result in zip(signedTxns, txids, results):
+            blockTxns.append(self._blockTxn(stxn, result))
+            info = self._pendingInfo(msgpackToJson(stxn), result)
+            info["confirmed-round"] = confirmedRound
+            self._pending[txid] = info
+            self._costs[txid] = result["cost"]
+
+    def _verifySignature(self, stxn: Dict[str, Any], group: List[TxnFields], index: int) -> None:
+        txn = group[index]
+        sender = txn["Sender"]
+        acct = self._accounts.get(sender)
+        authAddr = acct.authAddr if acct and acct.authAddr else sender
+        if "sgnr" in stxn and stxn["sgnr"] != authAddr:
+            raise LedgerError("should have been authorized by {}".format(encoding.encode_address(authAddr)))
+
+        if "lsig" in stxn:
+            lsig = stxn["lsig"]
+            programBytes = lsig["l"]
+            programAddress = encoding.checksum(b"Program" + programBytes)
+            if "sig" in lsig:
+                self._verify(authAddr, b"Program" + programBytes, lsig["sig"])
+            elif "msig" in lsig:
+                raise LedgerError("multisig logic signatures are not supported")
+            elif programAddress != authAddr:
+                raise LedgerError("logic sig address does not match sender")
+            program = self._program(programBytes)
+            ctx = _LogicSigContext(group, index, list(lsig.get("arg", [])), programBytes)
+            if not evaluate(program, ctx).approved:
+                raise LedgerError("rejected by logic")
+            return
+
+        if "msig" in stxn:
+            raise LedgerError("multisig transactions are not supported")
+        if "sig" not in stxn:
+            raise LedgerError("transaction is not signed")
+        self._verify(authAddr, b"TX" + msgpack.packb(stxn["txn"], use_bin_type=True), stxn["sig"])
+
+    def _verify(self, address: bytes, message: bytes, signature: bytes) -> None:
+        try:
+            VerifyKey(address).verify(message, signature)
+        except BadSignatureError:
+            raise LedgerError("signature validation failed")
+
+    def _checkMinBalances(self) -> None:
+        for address in self._touchedAccounts():
+            acct = self._accounts.get(address)
+            if acct is None:
+                continue
+            if acct.isEmpty():
+                del self._accounts[address]
+                continue
+            minBalance = acct.minBalance()
+            if acct.amount < minBalance:
+                raise LedgerError(
+                    "account {} balance {} below min {}".format(encoding.encode_address(address), acct.amount, minBalance)
+                )
+
+    def _pay(self, sender: bytes, receiver: bytes, amount: int) -> None:
+        senderAcct = self._modifyAccount(sender)
+        if senderAcct.amount < amount:
+            raise LedgerError(
+                "overspend (account {}, data {}, tried to spend {})".format(encoding.encode_address(sender), senderAcct.amount, amount)
+            )
+        senderAcct.amount -= amount
+        self._modifyAccount(receiver).amount += amount
+
+    def _applyTxn(
+        self,
+        state: _GroupState,
+        group: List[TxnFields],
+        index: int,
+        callerAppID: int,
+        depth: int,
+    ) -> Dict[str, Any]:
+        """Apply group[index] to the ledger and return its apply data."""
+        txn = group[index]
+        sender = txn["Sender"]
+        txnType = getTxnField(txn, "Type").decode()
+        result: Dict[str, Any] = {"fields": txn, "cost": 0, "logs": [], "inner": []}
+
+        fee = getTxnField(txn, "Fee")
+        senderAcct = self._modifyAccount(sender)
+        if senderAcct.amount < fee:
+            raise LedgerError("overspend (account {}, data {}, tried to spend {})".format(encoding.encode_address(sender), senderAcct.amount, fee))
+        senderAcct.amount -= fee
+
+        if txnType == "pay":
+            self._applyPayment(txn, result)
+        elif txnType == "axfer":
+            self._applyAssetTransfer(txn, result)
+        elif txnType == "acfg":
+            self._applyAssetConfig(state, txn, result)
+        elif txnType == "afrz":
+            self._applyAssetFreeze(txn)
+        elif txnType == "appl":
+            self._applyAppCall(state, group, index, callerAppID, depth, result)
+        elif txnType != "keyreg":
+            raise LedgerError("unknown transaction type {}".format(txnType))
+
+        if depth == 0:
+            state.createdIDs[index] = result.get("application-index") or result.get("asset-index") or 0
+        if "RekeyTo" in txn and txn["RekeyTo"] != ZERO_ADDRESS:
+            self._modifyAccount(sender).authAddr = None if txn["RekeyTo"] == sender else txn["RekeyTo"]
+        return result
+
+    def _applyPayment(self, txn: TxnFields, result: Dict[str, Any]) -> None:
+        sender = txn["Sender"]
+        self._pay(sender, getTxnField(txn, "Receiver"), getTxnField(txn, "Amount"))
+        closeTo = getTxnField(txn, "CloseRemainderTo")
+        if closeTo != ZERO_ADDRESS:
+            acct = self._modifyAccount(sender)
+            if acct.assets or acct.createdApps or acct.localSchemas or acct.createdAssets:
+                raise LedgerError("cannot close account {} with assets or applications".format(encoding.encode_address(sender)))
+            result["closing-amount"] = acct.amount
+            self._pay(sender, closeTo, acct.amount)
+            acct.authAddr = None
+
+    def _applyAssetTransfer(self, txn: TxnFields, result: Dict[str, Any]) -> None:
+        assetID = getTxnField(txn, "XferAsset")
+        if assetID not in self._assets:
+            raise LedgerError("asset {} does not exist or has been deleted".format(assetID))
+        asset = self._assets[assetID]
+        sender = txn["Sender"]
+        receiver = getTxnField(txn, "AssetReceiver")
+        amount = getTxnField(txn, "AssetAmount")
+        source = sender
+        clawback = getTxnField(txn, "AssetSender")
+        if clawback != ZERO_ADDRESS:
+            if sender != asset.params["AssetClawback"]:
+                raise LedgerError("clawback not allowed: sender != clawback")
+            source = clawback
+
+        if receiver == sender and amount == 0 and clawback == ZERO_ADDRESS:
+            acct = self._modifyAccount(sender)
+            if assetID not in acct.assets:
+                acct.assets[assetID] = [0, asset.params["AssetDefaultFrozen"]]
+                return
+
+        self._moveAsset(asset, source, receiver, amount, clawback != ZERO_ADDRESS)
+
+        closeTo = getTxnField(txn, "AssetCloseTo")
+        if closeTo != ZERO_ADDRESS:
+            if sender == asset.creator:
+                raise LedgerError("cannot close asset ID in allocating account")
+            remaining = self._accounts[sender].assets[assetID][0]
+            result["asset-closing-amount"] = remaining
+            self._moveAsset(asset, sender, closeTo, remaining, False)
+            del self._modifyAccount(sender).assets[assetID]
+
+    def _moveAsset(self, asset: _AssetState, source: bytes, receiver: bytes, amount: int, clawback: bool) -> None:
+        if amount == 0:
+            return
+        assetID = asset.assetID
+        sourceAcct = self._modifyAccount(source)
+        if assetID not in sourceAcct.assets:
+            raise LedgerError("asset {} missing from {}".format(assetID, encoding.encode_address(source)))
+        receiverAcct = self._modifyAccount(receiver)
+        if assetID not in receiverAcct.assets:
+            raise LedgerError("receiver error: must optin, asset {} missing from {}".format(assetID, encoding.encode_address(receiver)))
+        if not clawback and (sourceAcct.assets[assetID][1] or receiverAcct.assets[assetID][1]):
+            raise LedgerError("asset {} frozen".format(assetID))
+        if sourceAcct.assets[assetID][0] < amount:
+            raise LedgerError("underflow on subtracting {} from sender amount {}".format(amount, sourceAcct.assets[assetID][0]))
+        sourceAcct.assets[assetID][0] -= amount
+        receiverAcct.assets[assetID][0] += amount
+
+    def _applyAssetConfig(self, state: _GroupState, txn: TxnFields, result: Dict[str, Any]) -> None:
+        sender = txn["Sender"]
+        assetID = getTxnField(txn, "ConfigAsset")
+        if assetID == 0:
+            assetID = self._nextID()
+            self._save("asset", assetID, self._assets)
+            self._assets[assetID] = _AssetState(assetID, sender, txn)
+            acct = self._modifyAccount(sender)
+            acct.createdAssets.add(assetID)
+            acct.assets[assetID] = [getTxnField(txn, "ConfigAssetTotal"), 0]
+            result["asset-index"] = assetID
+            result["fields"] = dict(txn, CreatedAssetID=assetID)
+            state.createdAssets.add(assetID)
+            return
+
+        if assetID not in self._assets:
+            raise LedgerError("asset {} does not exist or has been deleted".format(assetID))
+        asset = self._modifyAsset(assetID)
+        if sender != asset.params["AssetManager"]:
+            raise LedgerError("this transaction should be issued by the manager")
+        if not any(getTxnField(txn, name) != ZERO_ADDRESS for name in ("ConfigAssetManager", "ConfigAssetReserve", "ConfigAssetFreeze", "ConfigAssetClawback")):
+            creatorAcct = self._modifyAccount(asset.creator)
+            if creatorAcct.assets.get(assetID, [0])[0] != asset.params["AssetTotal"]:
+                raise LedgerError("cannot destroy asset: creator is holding only part of the supply")
+            del creatorAcct.assets[assetID]
+            creatorAcct.createdAssets.discard(assetID)
+            del self._assets[assetID]
+            return
+        for name in ("Manager", "Reserve", "Freeze", "Clawback"):
+            asset.params["Asset" + name] = getTxnField(txn, "ConfigAsset" + name)
+
+    def _applyAssetFreeze(self, txn: TxnFields) -> None:
+        assetID = getTxnField(txn, "FreezeAsset")
+        if assetID not in self._assets:
+            raise LedgerError("asset {} does not exist or has been deleted".format(assetID))
+        if txn["Sender"] != self._assets[assetID].params["AssetFreeze"]:
+            raise LedgerError("freeze not allowed: sender is not the freeze address")
+        acct = self._modifyAccount(getTxnField(txn, "FreezeAssetAccount"))
+        if assetID not in acct.assets:
+            raise LedgerError("asset {} missing from account".format(assetID))
+        acct.assets[assetID][1] = getTxnField(txn, "FreezeAssetFrozen")
+
+    def _applyAppCall(
+        self,
+        state: _GroupState,
+        group: List[TxnFields],
+        index: int,
+        callerAppID: int,
+        depth: int,
+        result: Dict[str, Any],
+    ) -> None:
+        txn = group[index]
+        sender = txn["Sender"]
+        appID = getTxnField(txn, "ApplicationID")
+        onComplete = getTxnField(txn, "OnCompletion")
+
+        args = txn.get("ApplicationArgs", [])
+        if len(args) > MAX_APP_ARGS or sum(len(a) for a in args) > MAX_APP_PROGRAM_LEN:
+            raise LedgerError("too many application args")
+        numAccounts = len(txn.get("Accounts", []))
+        numApps = len(txn.get("Applications", []))
+        numAssets = len(txn.get("Assets", []))
+        if numAccounts > MAX_APP_TXN_ACCOUNTS:
+            raise LedgerError("tx.Accounts too long, max number of accounts is {}".format(MAX_APP_TXN_ACCOUNTS))
+        if numApps > MAX_APP_TXN_FOREIGN_APPS:
+            raise LedgerError("tx.ForeignApps too long, max number of foreign apps is {}".format(MAX_APP_TXN_FOREIGN_APPS))
+        if numAssets > MAX_APP_TXN_FOREIGN_ASSETS:
+            raise LedgerError("tx.ForeignAssets too long, max number of foreign assets is {}".format(MAX_APP_TXN_FOREIGN_ASSETS))
+        if numAccounts + numApps + numAssets > MAX_APP_TOTAL_TXN_REFERENCES:
+            raise LedgerError("tx references exceed MaxAppTotalTxnReferences = {}".format(MAX_APP_TOTAL_TXN_REFERENCES))
+
+        if appID == 0:
+            appID = self._createApp(state, txn)
+            result["application-index"] = appID
+            result["fields"] = dict(txn, CreatedApplicationID=appID)
+        elif appID not in self._apps:
+            raise LedgerError("application {} does not exist".format(appID))
+
+        app = self._apps[appID]
+        acct = self._modifyAccount(sender)
+        if onComplete == 1:
+            if appID in acct.localSchemas:
+                raise LedgerError("account {} has already opted in to app {}".format(encoding.encode_address(sender), appID))
+            acct.localSchemas[appID] = (app.localNumUint, app.localNumByteSlice)
+        elif onComplete in (2, 3) and appID not in acct.localSchemas:
+            raise LedgerError("account {} is not opted in to app {}".format(encoding.encode_address(sender), appID))
+
+        before = dict(app.globalState)
+        programBytes = app.clearStateProgram if onComplete == 3 else app.approvalProgram
+        program = self._program(programBytes)
+        ctx = _AppCallContext(self, state, group, index, appID, program.version, callerAppID, programBytes)
+        ctx.depth = depth
+        try:
+            outcome = evaluate(program, ctx)
+            approved, cost, scratch = outcome.approved, outcome.cost, outcome.scratch
+        except AVMError as e:
+            if onComplete != 3:
+                raise LedgerError("logic eval error: {}".format(e))
+            approved, cost, scratch = False, 0, [0] * 256
+        if depth == 0:
+            state.scratch[index] = scratch
+
+        result["cost"] = cost + sum(inner["cost"] for inner in ctx.innerResults)
+        if onComplete == 3:
+            acct = self._modifyAccount(sender)
+            acct.localSchemas.pop(appID, None)
+            acct.localStates.pop(appID, None)
+            return
+        if not approved:
+            raise LedgerError("transaction rejected by ApprovalProgram")
+
+        result["logs"] = ctx.logs
+        result["inner"] = ctx.innerResults
+        result["fields"] = dict(result["fields"], Logs=ctx.logs)
+        if appID in self._apps:
+            result["global-state-delta"] = _stateDelta(before, self._apps[appID].globalState)
+
+        if onComplete == 2:
+            acct = self._modifyAccount(sender)
+            acct.localSchemas.pop(appID, None)
+            acct.localStates.pop(appID, None)
+        elif onComplete == 4:
+            app = self._modifyApp(appID)
+            app.approvalProgram = getTxnField(txn, "ApprovalProgram")
+            app.clearStateProgram = getTxnField(txn, "ClearStateProgram")
+        elif onComplete == 5:
+            app = self._apps[appID]
+            self._modifyAccount(app.creator).createdApps.pop(appID, None)
+            self._save("app", appID, self._apps)
+            del self._apps[appID]
+
+    def _createApp(self, state: _GroupState, txn: TxnFields) -> int:
+        extraPages = getTxnField(txn, "ExtraProgramPages")
+        if extraPages > MAX_EXTRA_APP_PROGRAM_PAGES:
+            raise LedgerError("tx.ExtraProgramPages exceeds MaxExtraAppProgramPages")
+        programLength = len(getTxnField(txn, "ApprovalProgram")) + len(getTxnField(txn, "ClearStateProgram"))
+        if programLength > MAX_APP_PROGRAM_LEN * (1 + extraPages):
+            raise LedgerError("app programs too long")
+        numGlobal = getTxnField(txn, "GlobalNumUint") + getTxnField(txn, "GlobalNumByteSlice")
+        numLocal = getTxnField(txn, "LocalNumUint") + getTxnField(txn, "LocalNumByteSlice")
+        if numGlobal > MAX_GLOBAL_SCHEMA_ENTRIES or numLocal > MAX_LOCAL_SCHEMA_ENTRIES:
+            raise LedgerError("tx state schema exceeds the maximum")
+
+        appID = self._nextID()
+        sender = txn["Sender"]
+        self._save("app", appID, self._apps)
+        app = _AppState(appID, sender, txn)
+        self._apps[appID] = app
+        self._modifyAccount(sender).createdApps[appID] = (app.globalNumUint, app.globalNumByteSlice, app.extraPages)
+        state.createdApps.add(appID)
+        return appID
+
+    def _applyInnerGroup(self, ctx: _AppCallContext, group: List[TxnFields]) -> List[Dict[str, Any]]:
+        state = ctx.state
+        results = []
+        for txn in group:
+            sender = txn["Sender"]
+            senderAcct = self._accounts.get(sender)
+            authAddr = senderAcct.authAddr if senderAcct and senderAcct.authAddr else sender
+            if authAddr != ctx.appAddress:
+                raise AVMError("unauthorized inner transaction sender {}".format(encoding.encode_address(sender)))
+
+            if "Fee" not in txn:
+                txn["Fee"] = max(0, MIN_TXN_FEE - state.feeCredit)
+            fee = txn["Fee"]
+            if fee >= MIN_TXN_FEE:
+                state.feeCredit += fee - MIN_TXN_FEE
+            elif ctx.version >= 6 and state.feeCredit >= MIN_TXN_FEE - fee:
+                state.feeCredit -= MIN_TXN_FEE - fee
+            else:
+                raise AVMError("fee too small for inner transaction")
+            if getTxnField(txn, "TypeEnum") == 6:
+                state.budget += MAX_APP_PROGRAM_COST
+            if "Group" in txn:
+                del txn["Group"]
+
+        for index in range(len(group)):
+            try:
+                results.append(self._applyTxn(state, group, index, ctx.appID, ctx.depth + 1))
+            except LedgerError as e:
+                raise AVMError(str(e))
+            group[index] = results[-1]["fields"]
+        return results
+
+    # -- rendering of apply data ----------------------------------------------
+
+    def _pendingInfo(self, stxnJson: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        info: Dict[str, Any] = {"pool-error": "", "txn": stxnJson}
+        for key in ("application-index", "asset-index", "closing-amount", "asset-closing-amount", "global-state-delta"):
+            if key in result and result[key] is not None:
+                info[key] = result[key]
+        if result["logs"]:
+            info["logs"] = [b64encode(log).decode() for log in result["logs"]]
+        if result["inner"]:
+            info["inner-txns"] = [
+                self._pendingInfo({"txn": msgpackToJson(txnFieldsToMsgpack(inner["fields"]))}, inner)
+                for inner in result["inner"]
+            ]
+        return info
+
+    def _blockTxn(self, stxn: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        txn = {k: v for k, v in stxn["txn"].items() if k not in ("gen", "gh")}
+        entry: Dict[str, Any] = dict(stxn, txn=txn)
+        if "gen" in stxn["txn"]:
+            entry["hgi"] = True
+        if "gh" in stxn["txn"]:
+            entry["hgh"] = True
+        if result.get("closing-amount"):
+            entry["ca"] = result["closing-amount"]
+        if result.get("asset-closing-amount"):
+            entry["aca"] = result["asset-closing-amount"]
+        if result.get("application-index"):
+            entry["apid"] = result["application-index"]
+        if result.get("asset-index"):
+            entry["caid"] = result["asset-index"]
+        delta: Dict[str, Any] = {}
+        if result.get("global-state-delta"):
+            delta["gd"] = {
+                b64decode(change["key"]): _valueDeltaMsgpack(change["value"])
+                for change in result["global-state-delta"]
+            }
+        if result["logs"]:
+            delta["lg"] = result["logs"]
+        if result["inner"]:
+            delta["itx"] = [self._blockTxn({"txn": txnFieldsToMsgpack(inner["fields"])}, inner) for inner in result["inner"]]
+        if delta:
+            entry["dt"] = delta
+        return entry
+
+
+def getTemporaryAccount(client: LocalAlgodClient, amount: int = 100_000_000) -> Account:
+    """Create a new account funded with `amount` microAlgos from the local
+    ledger's faucet."""
+    privateKey, _ = account.generate_account()
+    tempAccount = Account(privateKey)
+    client.fund(tempAccount.getAddress(), amount)
+    return tempAccount
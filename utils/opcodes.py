@@ -0,0 +1,398 @@
+from typing import Dict, List, NamedTuple, Tuple
+
+
+# Immediate argument kinds
+IMM_UINT8 = "uint8"
+IMM_INT16_LABEL = "label"
+IMM_VARINT = "varint"
+IMM_BYTES = "bytes"
+IMM_VARINT_BLOCK = "varints"
+IMM_BYTES_BLOCK = "bytess"
+IMM_TXN_FIELD = "txn_field"
+IMM_GLOBAL_FIELD = "global_field"
+IMM_ASSET_HOLDING_FIELD = "asset_holding_field"
+IMM_ASSET_PARAMS_FIELD = "asset_params_field"
+IMM_APP_PARAMS_FIELD = "app_params_field"
+IMM_ACCT_PARAMS_FIELD = "acct_params_field"
+IMM_ECDSA_CURVE = "ecdsa_curve"
+
+
+class OpSpec(NamedTuple):
+    """Description of a single AVM opcode"""
+
+    code: int
+    name: str
+    immediates: Tuple[str, ...]
+    cost: int
+    version: int
+    appOnly: bool
+
+
+def _op(
+    code: int,
+    name: str,
+    immediates: Tuple[str, ...] = (),
+    cost: int = 1,
+    version: int = 1,
+    appOnly: bool = False,
+) -> OpSpec:
+    return OpSpec(code, name, immediates, cost, version, appOnly)
+
+
+U8 = IMM_UINT8
+TF = IMM_TXN_FIELD
+
+OPCODES: List[OpSpec] = [
+    _op(0x00, "err"),
+    _op(0x01, "sha256", cost=35),
+    _op(0x02, "keccak256", cost=130),
+    _op(0x03, "sha512_256", cost=45),
+    _op(0x04, "ed25519verify", cost=1900),
+    _op(0x05, "ecdsa_verify", (IMM_ECDSA_CURVE,), cost=1700, version=5),
+    _op(0x06, "ecdsa_pk_decompress", (IMM_ECDSA_CURVE,), cost=650, version=5),
+    _op(0x07, "ecdsa_pk_recover", (IMM_ECDSA_CURVE,), cost=2000, version=5),
+    _op(0x08, "+"),
+    _op(0x09, "-"),
+    _op(0x0A, "/"),
+    _op(0x0B, "*"),
+    _op(0x0C, "<"),
+    _op(0x0D, ">"),
+    _op(0x0E, "<="),
+    _op(0x0F, ">="),
+    _op(0x10, "&&"),
+    _op(0x11, "||"),
+    _op(0x12, "=="),
+    _op(0x13, "!="),
+    _op(0x14, "!"),
+    _op(0x15, "len"),
+    _op(0x16, "itob"),
+    _op(0x17, "btoi"),
+    _op(0x18, "%"),
+    _op(0x19, "|"),
+    _op(0x1A, "&"),
+    _op(0x1B, "^"),
+    _op(0x1C, "~"),
+    _op(0x1D, "mulw"),
+    _op(0x1E, "addw", version=2),
+    _op(0x1F, "divmodw", cost=20, version=4),
+    _op(0x20, "intcblock", (IMM_VARINT_BLOCK,)),
+    _op(0x21, "intc", (U8,)),
+    _op(0x22, "intc_0"),
+    _op(0x23, "intc_1"),
+    _op(0x24, "intc_2"),
+    _op(0x25, "intc_3"),
+    _op(0x26, "bytecblock", (IMM_BYTES_BLOCK,)),
+    _op(0x27, "bytec", (U8,)),
+    _op(0x28, "bytec_0"),
+    _op(0x29, "bytec_1"),
+    _op(0x2A, "bytec_2"),
+    _op(0x2B, "bytec_3"),
+    _op(0x2C, "arg", (U8,)),
+    _op(0x2D, "arg_0"),
+    _op(0x2E, "arg_1"),
+    _op(0x2F, "arg_2"),
+    _op(0x30, "arg_3"),
+    _op(0x31, "txn", (TF,)),
+    _op(0x32, "global", (IMM_GLOBAL_FIELD,)),
+    _op(0x33, "gtxn", (U8, TF)),
+    _op(0x34, "load", (U8,)),
+    _op(0x35, "store", (U8,)),
+    _op(0x36, "txna", (TF, U8), version=2),
+    _op(0x37, "gtxna", (U8, TF, U8), version=2),
+    _op(0x38, "gtxns", (TF,), version=3),
+    _op(0x39, "gtxnsa", (TF, U8), version=3),
+    _op(0x3A, "gload", (U8, U8), version=4, appOnly=True),
+    _op(0x3B, "gloads", (U8,), version=4, appOnly=True),
+    _op(0x3C, "gaid", (U8,), version=4, appOnly=True),
+    _op(0x3D, "gaids", version=4, appOnly=True),
+    _op(0x3E, "loads", version=5),
+    _op(0x3F, "stores", version=5),
+    _op(0x40, "bnz", (IMM_INT16_LABEL,)),
+    _op(0x41, "bz", (IMM_INT16_LABEL,), version=2),
+    _op(0x42, "b", (IMM_INT16_LABEL,), version=2),
+    _op(0x43, "return", version=2),
+    _op(0x44, "assert", version=3),
+    _op(0x48, "pop"),
+    _op(0x49, "dup"),
+    _op(0x4A, "dup2", version=2),
+    _op(0x4B, "dig", (U8,), version=3),
+    _op(0x4C, "swap", version=3),
+    _op(0x4D, "select", version=3),
+    _op(0x4E, "cover", (U8,), version=5),
+    _op(0x4F, "uncover", (U8,), version=5),
+    _op(0x50, "concat", version=2),
+    _op(0x51, "substring", (U8, U8), version=2),
+    _op(0x52, "substring3", version=2),
+    _op(0x53, "getbit", version=3),
+    _op(0x54, "setbit", version=3),
+    _op(0x55, "getbyte", version=3),
+    _op(0x56, "setbyte", version=3),
+    _op(0x57, "extract", (U8, U8), version=5),
+    _op(0x58, "extract3", version=5),
+    _op(0x59, "extract_uint16", version=5),
+    _op(0x5A, "extract_uint32", version=5),
+    _op(0x5B, "extract_uint64", version=5),
+    _op(0x60, "balance", version=2, appOnly=True),
+    _op(0x61, "app_opted_in", version=2, appOnly=True),
+    _op(0x62, "app_local_get", version=2, appOnly=True),
+    _op(0x63, "app_local_get_ex", version=2, appOnly=True),
+    _op(0x64, "app_global_get", version=2, appOnly=True),
+    _op(0x65, "app_global_get_ex", version=2, appOnly=True),
+    _op(0x66, "app_local_put", version=2, appOnly=True),
+    _op(0x67, "app_global_put", version=2, appOnly=True),
+    _op(0x68, "app_local_del", version=2, appOnly=True),
+    _op(0x69, "app_global_del", version=2, appOnly=True),
+    _op(0x70, "asset_holding_get", (IMM_ASSET_HOLDING_FIELD,), version=2, appOnly=True),
+    _op(0x71, "asset_params_get", (IMM_ASSET_PARAMS_FIELD,), version=2, appOnly=True),
+    _op(0x72, "app_params_get", (IMM_APP_PARAMS_FIELD,), version=5, appOnly=True),
+    _op(0x73, "acct_params_get", (IMM_ACCT_PARAMS_FIELD,), version=6, appOnly=True),
+    _op(0x78, "min_balance", version=3, appOnly=True),
+    _op(0x80, "pushbytes", (IMM_BYTES,), version=3),
+    _op(0x81, "pushint", (IMM_VARINT,), version=3),
+    _op(0x88, "callsub", (IMM_INT16_LABEL,), version=4),
+    _op(0x89, "retsub", version=4),
+    _op(0x90, "shl", version=4),
+    _op(0x91, "shr", version=4),
+    _op(0x92, "sqrt", cost=4, version=4),
+    _op(0x93, "bitlen", version=4),
+    _op(0x94, "exp", version=4),
+    _op(0x95, "expw", cost=10, version=4),
+    _op(0x96, "bsqrt", cost=40, version=6),
+    _op(0x97, "divw", version=6),
+    _op(0xA0, "b+", cost=10, version=4),
+    _op(0xA1, "b-", cost=10, version=4),
+    _op(0xA2, "b/", cost=20, version=4),
+    _op(0xA3, "b*", cost=20, version=4),
+    _op(0xA4, "b<", version=4),
+    _op(0xA5, "b>", version=4),
+    _op(0xA6, "b<=", version=4),
+    _op(0xA7, "b>=", version=4),
+    _op(0xA8, "b==", version=4),
+    _op(0xA9, "b!=", version=4),
+    _op(0xAA, "b%", cost=20, version=4),
+    _op(0xAB, "b|", cost=6, version=4),
+    _op(0xAC, "b&", cost=6, version=4),
+    _op(0xAD, "b^", cost=6, version=4),
+    _op(0xAE, "b~", cost=4, version=4),
+    _op(0xAF, "bzero", version=4),
+    _op(0xB0, "log", version=5, appOnly=True),
+    _op(0xB1, "itxn_begin", version=5, appOnly=True),
+    _op(0xB2, "itxn_field", (TF,), version=5, appOnly=True),
+    _op(0xB3, "itxn_submit", version=5, appOnly=True),
+    _op(0xB4, "itxn", (TF,), version=5, appOnly=True),
+    _op(0xB5, "itxna", (TF, U8), version=5, appOnly=True),
+    _op(0xB6, "itxn_next", version=6, appOnly=True),
+    _op(0xB7, "gitxn", (U8, TF), version=6, appOnly=True),
+    _op(0xB8, "gitxna", (U8, TF, U8), version=6, appOnly=True),
+    _op(0xC0, "txnas", (TF,), version=5),
+    _op(0xC1, "gtxnas", (U8, TF), version=5),
+    _op(0xC2, "gtxnsas", (TF,), version=5),
+    _op(0xC3, "args", version=5),
+    _op(0xC4, "gloadss", version=6, appOnly=True),
+    _op(0xC5, "itxnas", (TF,), version=6, appOnly=True),
+    _op(0xC6, "gitxnas", (U8, TF), version=6, appOnly=True),
+]
+
+OPS_BY_NAME: Dict[str, OpSpec] = {op.name: op for op in OPCODES}
+OPS_BY_CODE: Dict[int, OpSpec] = {op.code: op for op in OPCODES}
+
+# Pseudo-ops accepted by the assembler and expanded into constant references
+PSEUDO_OPS = ("int", "byte", "addr", "method")
+
+# Opcodes that end a basic block without falling through
+TERMINATORS = ("err", "return", "b", "retsub")
+BRANCHES = ("bnz", "bz", "b", "callsub")
+
+
+# (name, minimum version) in field index order
+TXN_FIELDS: List[Tuple[str, int]] = [
+    ("Sender", 1),
+    ("Fee", 1),
+    ("FirstValid", 1),
+    ("FirstValidTime", 1),
+    ("LastValid", 1),
+    ("Note", 1),
+    ("Lease", 1),
+    ("Receiver", 1),
+    ("Amount", 1),
+    ("CloseRemainderTo", 1),
+    ("VotePK", 1),
+    ("SelectionPK", 1),
+    ("VoteFirst", 1),
+    ("VoteLast", 1),
+    ("VoteKeyDilution", 1),
+    ("Type", 1),
+    ("TypeEnum", 1),
+    ("XferAsset", 1),
+    ("AssetAmount", 1),
+    ("AssetSender", 1),
+    ("AssetReceiver", 1),
+    ("AssetCloseTo", 1),
+    ("GroupIndex", 1),
+    ("TxID", 1),
+    ("ApplicationID", 2),
+    ("OnCompletion", 2),
+    ("ApplicationArgs", 2),
+    ("NumAppArgs", 2),
+    ("Accounts", 2),
+    ("NumAccounts", 2),
+    ("ApprovalProgram", 2),
+    ("ClearStateProgram", 2),
+    ("RekeyTo", 2),
+    ("ConfigAsset", 2),
+    ("ConfigAssetTotal", 2),
+    ("ConfigAssetDecimals", 2),
+    ("ConfigAssetDefaultFrozen", 2),
+    ("ConfigAssetUnitName", 2),
+    ("ConfigAssetName", 2),
+    ("ConfigAssetURL", 2),
+    ("ConfigAssetMetadataHash", 2),
+    ("ConfigAssetManager", 2),
+    ("ConfigAssetReserve", 2),
+    ("ConfigAssetFreeze", 2),
+    ("ConfigAssetClawback", 2),
+    ("FreezeAsset", 2),
+    ("FreezeAssetAccount", 2),
+    ("FreezeAssetFrozen", 2),
+    ("Assets", 3),
+    ("NumAssets", 3),
+    ("Applications", 3),
+    ("NumApplications", 3),
+    ("GlobalNumUint", 3),
+    ("GlobalNumByteSlice", 3),
+    ("LocalNumUint", 3),
+    ("LocalNumByteSlice", 3),
+    ("ExtraProgramPages", 4),
+    ("Nonparticipation", 5),
+    ("Logs", 5),
+    ("NumLogs", 5),
+    ("CreatedAssetID", 5),
+    ("CreatedApplicationID", 5),
+    ("LastLog", 6),
+    ("StateProofPK", 6),
+]
+
+# Transaction fields that hold arrays and are indexed by txna and friends
+TXN_ARRAY_FIELDS = ("ApplicationArgs", "Accounts", "Assets", "Applications", "Logs")
+
+GLOBAL_FIELDS: List[Tuple[str, int]] = [
+    ("MinTxnFee", 1),
+    ("MinBalance", 1),
+    ("MaxTxnLife", 1),
+    ("ZeroAddress", 1),
+    ("GroupSize", 1),
+    ("LogicSigVersion", 2),
+    ("Round", 2),
+    ("LatestTimestamp", 2),
+    ("CurrentApplicationID", 2),
+    ("CreatorAddress", 3),
+    ("CurrentApplicationAddress", 5),
+    ("GroupID", 5),
+    ("OpcodeBudget", 6),
+    ("CallerApplicationID", 6),
+    ("CallerApplicationAddress", 6),
+]
+
+ASSET_HOLDING_FIELDS: List[Tuple[str, int]] = [
+    ("AssetBalance", 2),
+    ("AssetFrozen", 2),
+]
+
+ASSET_PARAMS_FIELDS: List[Tuple[str, int]] = [
+    ("AssetTotal", 2),
+    ("AssetDecimals", 2),
+    ("AssetDefaultFrozen", 2),
+    ("AssetUnitName", 2),
+    ("AssetName", 2),
+    ("AssetURL", 2),
+    ("AssetMetadataHash", 2),
+    ("AssetManager", 2),
+    ("AssetReserve", 2),
+    ("AssetFreeze", 2),
+    ("AssetClawback", 2),
+    ("AssetCreator", 5),
+]
+
+APP_PARAMS_FIELDS: List[Tuple[str, int]] = [
+    ("AppApprovalProgram", 5),
+    ("AppClearStateProgram", 5),
+    ("AppGlobalNumUint", 5),
+    ("AppGlobalNumByteSlice", 5),
+    ("AppLocalNumUint", 5),
+    ("AppLocalNumByteSlice", 5),
+    ("AppExtraProgramPages", 5),
+    ("AppCreator", 5),
+    ("AppAddress", 5),
+]
+
+ACCT_PARAMS_FIELDS: List[Tuple[str, int]] = [
+    ("AcctBalance", 6),
+    ("AcctMinBalance", 6),
+    ("AcctAuthAddr", 6),
+]
+
+ECDSA_CURVES: List[Tuple[str, int]] = [
+    ("Secp256k1", 5),
+]
+
+FIELD_TABLES: Dict[str, List[Tuple[str, int]]] = {
+    IMM_TXN_FIELD: TXN_FIELDS,
+    IMM_GLOBAL_FIELD: GLOBAL_FIELDS,
+    IMM_ASSET_HOLDING_FIELD: ASSET_HOLDING_FIELDS,
+    IMM_ASSET_PARAMS_FIELD: ASSET_PARAMS_FIELDS,
+    IMM_APP_PARAMS_FIELD: APP_PARAMS_FIELDS,
+    IMM_ACCT_PARAMS_FIELD: ACCT_PARAMS_FIELDS,
+    IMM_ECDSA_CURVE: ECDSA_CURVES,
+}
+
+FIELD_INDEXES: Dict[str, Dict[str, int]] = {
+    kind: {name: index for index, (name, _) in enumerate(table)}
+    for kind, table in FIELD_TABLES.items()
+}
+
+# Named integer constants understood by the `int` pseudo-op
+NAMED_INTS: Dict[str, int] = {
+    "unknown": 0,
+    "pay": 1,
+    "keyreg": 2,
+    "acfg": 3,
+    "axfer": 4,
+    "afrz": 5,
+    "appl": 6,
+    "NoOp": 0,
+    "OptIn": 1,
+    "CloseOut": 2,
+    "ClearState": 3,
+    "UpdateApplication": 4,
+    "DeleteApplication": 5,
+}
+
+TXN_TYPE_ENUMS: Dict[str, int] = {
+    "pay": 1,
+    "keyreg": 2,
+    "acfg": 3,
+    "axfer": 4,
+    "afrz": 5,
+    "appl": 6,
+}
+
+# Consensus limits used by the AVM and the local ledger
+MAX_STACK_DEPTH = 1000
+MAX_STRING_SIZE = 4096
+MAX_APP_PROGRAM_COST = 700
+MAX_LOGIC_SIG_COST = 20_000
+MAX_INNER_TXNS = 16
+MAX_TXN_GROUP_SIZE = 16
+MAX_APP_ARGS = 16
+MAX_APP_TOTAL_TXN_REFERENCES = 8
+MAX_APP_TXN_ACCOUNTS = 4
+MAX_APP_TXN_FOREIGN_APPS = 8
+MAX_APP_TXN_FOREIGN_ASSETS = 8
+MAX_APP_PROGRAM_LEN = 2048
+MAX_EXTRA_APP_PROGRAM_PAGES = 3
+MAX_GLOBAL_SCHEMA_ENTRIES = 64
+MAX_LOCAL_SCHEMA_ENTRIES = 16
+MAX_APP_KEY_LEN = 64
+MAX_APP_SUM_KEY_VALUE_LEN = 128
+MAX_LOG_CALLS = 32
+MAX_LOG_SIZE = 1024
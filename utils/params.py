@@ -0,0 +1,162 @@
+import asyncio
+import threading
+from copy import copy
+from time import monotonic
+from typing import Any, Callable, Optional
+from weakref import WeakKeyDictionary
+
+from algosdk.future import transaction
+from algosdk.v2client.algod import AlgodClient
+
+# roughly one block; params older than this may miss a fee or round change
+DEFAULT_MAX_AGE = 4.0
+# refresh once the validity window of the cached params has this few rounds left
+DEFAULT_REFRESH_MARGIN = 10
+
+
+class _CachedParams:
+    """Freshness bookkeeping shared by the sync and async providers."""
+
+    def __init__(self, maxAge: float, refreshMargin: int, clock: Callable[[], float]) -> None:
+        self.maxAge = maxAge
+        self.refreshMargin = refreshMargin
+        self.clock = clock
+        self.params: Optional[transaction.SuggestedParams] = None
+        self.fetchedAt = 0.0
+        self.lastRound = 0
+        self.fetches = 0
+
+    def observeRound(self, round: int) -> None:
+        self.lastRound = max(self.lastRound, round)
+
+    def fresh(self) -> Optional[transaction.SuggestedParams]:
+        params = self.params
+        if params is None:
+            return None
+        if self.lastRound > params.first:
+            return None
+        if self.clock() - self.fetchedAt > self.maxAge:
+            return None
+        if params.last - self.lastRound <= self.refreshMargin:
+            return None
+        # builders may adjust the fee, so never hand out the cached object
+        return copy(params)
+
+    def store(self, params: transaction.SuggestedParams) -> transaction.SuggestedParams:
+        self.params = params
+        self.fetchedAt = self.clock()
+        self.lastRound = max(self.lastRound, params.first)
+        self.fetches += 1
+        return copy(params)
+
+
+class SuggestedParamsProvider:
+    """Caches suggested_params for the current round.
+
+    Params are fetched again once a newer round is observed, once they are
+    older than `maxAge` seconds, or once their validity window gets within
+    `refreshMargin` rounds of the latest known round. Threads asking while a
+    fetch is in flight wait for it instead of starting their own.
+    """
+
+    def __init__(
+        self,
+        client: AlgodClient,
+        maxAge: float = DEFAULT_MAX_AGE,
+        refreshMargin: int = DEFAULT_REFRESH_MARGIN,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.client = client
+        self._cache = _CachedParams(maxAge, refreshMargin, clock)
+        self._lock = threading.Lock()
+
+    @property
+    def fetches(self) -> int:
+        return self._cache.fetches
+
+    def observeRound(self, round: int) -> None:
+        """Tell the provider a block for `round` has been seen."""
+        self._cache.observeRound(round)
+
+    def get(self) -> transaction.SuggestedParams:
+        params = self._cache.fresh()
+        if params is not None:
+            return params
+        with self._lock:
+            params = self._cache.fresh()
+            if params is not None:
+                return params
+            return self._cache.store(self.client.suggested_params())
+
+
+class AsyncSuggestedParamsProvider:
+    """SuggestedParamsProvider for AsyncAlgodClient; coroutines asking while
+    a fetch is in flight await that fetch."""
+
+    def __init__(
+        self,
+        client: Any,
+        maxAge: float = DEFAULT_MAX_AGE,
+        refreshMargin: int = DEFAULT_REFRESH_MARGIN,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.client = client
+        self._cache = _CachedParams(maxAge, refreshMargin, clock)
+        self._fetch: Optional[asyncio.Future] = None
+
+    @property
+    def fetches(self) -> int:
+        return self._cache.fetches
+
+    def observeRound(self, round: int) -> None:
+        """Tell the provider a block for `round` has been seen."""
+        self._cache.observeRound(round)
+
+    async def get(self) -> transaction.SuggestedParams:
+        params = self._cache.fresh()
+        if params is not None:
+            return params
+        if self._fetch is None:
+            self._fetch = asyncio.ensure_future(self._refresh())
+        # shield so a cancelled caller does not cancel the fetch others await
+        return copy(await asyncio.shield(self._fetch))
+
+    async def _refresh(self) -> transaction.SuggestedParams:
+        try:
+            return self._cache.store(await self.client.suggested_params())
+        finally:
+            self._fetch = None
+
+
+_PROVIDERS: "WeakKeyDictionary[Any, Any]" = WeakKeyDictionary()
+_PROVIDERS_LOCK = threading.Lock()
+
+
+def getSuggestedParamsProvider(client: Any) -> Any:
+    """The provider shared by every transaction builder using `client`."""
+    with _PROVIDERS_LOCK:
+        provider = _PROVIDERS.get(client)
+        if provider is None:
+            if asyncio.iscoroutinefunction(client.suggested_params):
+                provider = AsyncSuggestedParamsProvider(client)
+            else:
+                provider = SuggestedParamsProvider(client)
+            _PROVIDERS[client] = provider
+        return provider
+
+
+def withFlatFee(suggestedParams: transaction.SuggestedParams, fee: int) -> transaction.SuggestedParams:
+    """A copy of `suggestedParams` paying exactly `fee`, as a call covering
+    the fees of its pooled inner transactions does."""
+    params = copy(suggestedParams)
+    params.flat_fee = True
+    params.fee = fee
+    return params
+
+
+def getSuggestedParams(client: AlgodClient) -> transaction.SuggestedParams:
+    """Suggested params for `client`, fetched at most about once per round.
+
+    For an AsyncAlgodClient this returns an awaitable.
+    """
+    return getSuggestedParamsProvider(client).get()
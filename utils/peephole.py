@@ -0,0 +1,219 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+# opcodes always leaving 0 or 1 on the stack
+BOOLEAN_OPS = {
+    "==", "!=", "<", ">", "<=", ">=", "&&", "||", "!",
+    "b==", "b!=", "b<", "b>", "b<=", "b>=", "app_opted_in", "getbit",
+}
+
+# opcodes without side effects, by the number of values they pop; each
+# pushes a single value. app_global_get counts as one too, since a rule only
+# repeats it where no app_global_put can run in between.
+PURE_OPS = {
+    "int": 0, "byte": 0, "addr": 0, "pushint": 0, "pushbytes": 0,
+    "intc": 0, "intc_0": 0, "intc_1": 0, "intc_2": 0, "intc_3": 0,
+    "bytec": 0, "bytec_0": 0, "bytec_1": 0, "bytec_2": 0, "bytec_3": 0,
+    "arg": 0, "arg_0": 0, "arg_1": 0, "arg_2": 0, "arg_3": 0,
+    "txn": 0, "txna": 0, "gtxn": 0, "gtxna": 0, "global": 0, "load": 0,
+    "btoi": 1, "itob": 1, "len": 1, "!": 1, "~": 1, "extract": 1,
+    "gtxns": 1, "gtxnsa": 1, "app_global_get": 1,
+    "+": 2, "-": 2, "*": 2, "/": 2, "%": 2, "==": 2, "!=": 2, "<": 2, ">": 2, "<=": 2, ">=": 2,
+    "&&": 2, "||": 2, "concat": 2, "getbyte": 2, "getbit": 2, "extract_uint64": 2,
+}
+
+# the longest expression the repeated-expression rule looks for
+MAX_EXPRESSION_LENGTH = 4
+
+# A rule looks at the instructions from an index on and returns how many of
+# them to replace and their replacement, or None when it does not apply
+Rule = Callable[[List[str], int], Optional[Tuple[int, List[str]]]]
+
+
+def _op(line: str) -> Optional[str]:
+    """The opcode of a line, or None for labels and pragmas."""
+    if not line or line.startswith("#") or line.startswith("//") or line.endswith(":"):
+        return None
+    return line.split(None, 1)[0]
+
+
+def _immediate(line: str) -> str:
+    parts = line.split(None, 1)
+    return parts[1] if len(parts) > 1 else ""
+
+
+def _ops(lines: List[str], index: int, count: int) -> List[Optional[str]]:
+    """The opcodes of the `count` lines from `index`, padded with None past
+    the end. A label among them splits the block, so no rule matches
+    across it."""
+    window = [_op(line) for line in lines[index:index + count]]
+    return window + [None] * (count - len(window))
+
+
+def _isPureExpression(lines: List[str]) -> bool:
+    """Whether `lines` compute a single value from nothing below them on the
+    stack, without side effects."""
+    depth = 0
+    for line in lines:
+        pops = PURE_OPS.get(_op(line) or "")
+        if pops is None or depth < pops:
+            return False
+        depth -= pops - 1
+    return depth == 1
+
+
+def andTrue(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`<bool>; int 1; &&` leaves the boolean as it is."""
+    first, second, third = _ops(lines, index, 3)
+    if first in BOOLEAN_OPS and second == "int" and _immediate(lines[index + 1]) == "1" and third == "&&":
+        return 3, [lines[index]]
+    return None
+
+
+def orFalse(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`<bool>; int 0; ||` leaves the boolean as it is."""
+    first, second, third = _ops(lines, index, 3)
+    if first in BOOLEAN_OPS and second == "int" and _immediate(lines[index + 1]) == "0" and third == "||":
+        return 3, [lines[index]]
+    return None
+
+
+def doubleNot(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`<bool>; !; !` leaves the boolean as it is."""
+    first, second, third = _ops(lines, index, 3)
+    if first in BOOLEAN_OPS and second == "!" and third == "!":
+        return 3, [lines[index]]
+    return None
+
+
+def equalsZero(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`int 0; ==` is `!`, which fails on bytes the same way."""
+    first, second = _ops(lines, index, 2)
+    if first == "int" and _immediate(lines[index]) == "0" and second == "==":
+        return 2, ["!"]
+    return None
+
+
+def testNotZero(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`int 0; !=` ahead of a branch or assert tests the value itself."""
+    first, second, third = _ops(lines, index, 3)
+    if first == "int" and _immediate(lines[index]) == "0" and second == "!=" and third in ("bnz", "bz", "assert"):
+        return 2, []
+    return None
+
+
+def negatedBranch(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`!; bnz label` is `bz label`, and `!; bz label` is `bnz label`."""
+    first, second = _ops(lines, index, 2)
+    if first == "!" and second in ("bnz", "bz"):
+        return 2, ["{} {}".format("bz" if second == "bnz" else "bnz", _immediate(lines[index + 1]))]
+    return None
+
+
+def branchOverJump(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`bnz next; b label; next:` is `bz label; next:`."""
+    first, second = _ops(lines, index, 2)
+    if first in ("bnz", "bz") and second == "b" and index + 2 < len(lines):
+        if lines[index + 2] == _immediate(lines[index]) + ":":
+            return 2, ["{} {}".format("bz" if first == "bnz" else "bnz", _immediate(lines[index + 1]))]
+    return None
+
+
+def jumpToNext(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`b label` right ahead of `label:` falls through anyway."""
+    if _op(lines[index]) == "b" and index + 1 < len(lines) and lines[index + 1] == _immediate(lines[index]) + ":":
+        return 1, []
+    return None
+
+
+def unusedValue(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """A value pushed only to be popped, such as `dup; pop`."""
+    first, second = _ops(lines, index, 2)
+    if second == "pop" and (first == "dup" or PURE_OPS.get(first or "") == 0):
+        return 2, []
+    return None
+
+
+def swapSwap(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`swap; swap` puts the stack back as it was."""
+    if _ops(lines, index, 2) == ["swap", "swap"]:
+        return 2, []
+    return None
+
+
+def storeLoad(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """`store n; load n` is `dup; store n`, a byte shorter."""
+    first, second = _ops(lines, index, 2)
+    if first == "store" and second == "load" and _immediate(lines[index]) == _immediate(lines[index + 1]):
+        return 2, ["dup", lines[index]]
+    return None
+
+
+def repeatedExpression(lines: List[str], index: int) -> Optional[Tuple[int, List[str]]]:
+    """A pure expression computed twice in a row, such as
+    `byte "k"; app_global_get; byte "k"; app_global_get`, is computed once
+    and duplicated."""
+    for length in range(MAX_EXPRESSION_LENGTH, 0, -1):
+        expression = lines[index:index + length]
+        if len(expression) < length or lines[index + length:index + 2 * length] != expression:
+            continue
+        # a single constant or load is no longer than dup
+        if length == 1 and PURE_OPS.get(_op(expression[0]) or "") == 0 and _op(expression[0]) not in ("txn", "txna", "gtxn", "gtxna", "global"):
+            continue
+        if _isPureExpression(expression):
+            return 2 * length, expression + ["dup"]
+    return None
+
+
+RULES: List[Tuple[str, Rule]] = [
+    ("and-true", andTrue),
+    ("or-false", orFalse),
+    ("double-not", doubleNot),
+    ("equals-zero", equalsZero),
+    ("test-not-zero", testNotZero),
+    ("negated-branch", negatedBranch),
+    ("branch-over-jump", branchOverJump),
+    ("jump-to-next", jumpToNext),
+    ("unused-value", unusedValue),
+    ("swap-swap", swapSwap),
+    ("store-load", storeLoad),
+    ("repeated-expression", repeatedExpression),
+]
+
+
+def optimizeTeal(
+    teal: str,
+    rules: Optional[List[Tuple[str, Rule]]] = None,
+    applied: Optional[Dict[str, int]] = None,
+) -> str:
+    """Rewrite short sequences of a compiled TEAL program into cheaper ones
+    with the same effect on the stack, scratch space and state.
+
+    Rules only match instructions of a single basic block, so a rewrite can
+    never change what a jump into the block sees. They are applied until
+    none matches anymore; `applied` counts how often each one was.
+    """
+    if rules is None:
+        rules = RULES
+    lines = [line.strip() for line in teal.splitlines() if line.strip()]
+
+    changed = True
+    while changed:
+        changed = False
+        index = 0
+        while index < len(lines):
+            for name, rule in rules:
+                if _op(lines[index]) is None:
+                    break
+                match = rule(lines, index)
+                if match is None:
+                    continue
+                count, replacement = match
+                lines[index:index + count] = replacement
+                if applied is not None:
+                    applied[name] = applied.get(name, 0) + 1
+                changed = True
+                # look again at the instructions the rewrite joined up
+                index = max(index - MAX_EXPRESSION_LENGTH * 2, -1)
+                break
+            index += 1
+    return "\n".join(lines)
@@ -0,0 +1,174 @@
+import base64
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, List, Mapping, Tuple, Union
+
+from algosdk import encoding
+
+from utils.assembler import assemble, constantBlock, decodeUvarint, encodeUvarint
+from utils.avm import AVMError, parseProgram
+
+# constants referencing a template variable, such as "int TMPL_PRICE"
+_TEMPLATE_LINE = re.compile(r"^\s*(int|pushint|byte|pushbytes|addr)\s+(TMPL_\w+)\s*$")
+_TEMPLATE_NAME = re.compile(r"\bTMPL_\w+")
+
+_INTCBLOCK = 0x20
+_BYTECBLOCK = 0x26
+
+INT = "int"
+BYTES = "bytes"
+
+TemplateValue = Union[int, bytes, str]
+
+try:
+    hashlib.new("sha512_256")
+
+    def _checksum(data: bytes) -> bytes:
+        return hashlib.new("sha512_256", data).digest()
+except ValueError:
+    # an OpenSSL without SHA-512/256, hash the slower way the SDK does
+    _checksum = encoding.checksum
+
+
+@lru_cache(maxsize=1024)
+def _decodeAddress(address: str) -> bytes:
+    # the same few sellers and fee receivers are filled in over and over
+    return encoding.decode_address(address)
+
+
+def programAddress(program: bytes) -> str:
+    """The address of a program's account, the hash algod reports for it;
+    the same as utils.cache.programHash."""
+    digest = _checksum(b"Program" + program)
+    return base64.b32encode(digest + _checksum(digest)[-4:]).decode().rstrip("=")
+
+
+class ProgramTemplate:
+    """A TEAL program with TMPL_ variables, assembled once and filled in by
+    patching its bytecode.
+
+    Every variable is placed in the intcblock or bytecblock at the start of
+    the program, ahead of any code, so a value of another length shifts the
+    whole program and no branch offset changes. Filling the variables in
+    takes a few splices of the bytecode and no compilation or network call.
+    """
+
+    def __init__(self, teal: str) -> None:
+        self.variables: Dict[str, str] = {}
+        lines = teal.splitlines()
+        for line in lines:
+            match = _TEMPLATE_LINE.match(line)
+            if match is not None:
+                kind = INT if match.group(1) in ("int", "pushint") else BYTES
+                if self.variables.setdefault(match.group(2), kind) != kind:
+                    raise AVMError("{} is used both as an int and as bytes".format(match.group(2)))
+            elif _TEMPLATE_NAME.search(line):
+                raise AVMError("template variables may only be int, byte or addr constants: {}".format(line.strip()))
+
+        sentinels = self._sentinels(teal)
+        substituted = self._substitute(lines, sentinels)
+        parsed = parseProgram("\n".join(substituted))
+        intBlock = [sentinels[name] for name, kind in self.variables.items() if kind == INT]
+        byteBlock = [sentinels[name] for name, kind in self.variables.items() if kind == BYTES]
+        # followed by the constants the assembler would have put in the blocks
+        if intBlock:
+            intBlock += constantBlock(
+                [i.args[0] for i in parsed.instructions if i.op == "int" and i.args[0] not in intBlock],
+                parsed.version,
+            )
+        if byteBlock:
+            byteBlock += constantBlock(
+                [i.args[0] for i in parsed.instructions if i.op == "byte" and i.args[0] not in byteBlock],
+                parsed.version,
+            )
+
+        # the blocks go first, right after the version pragma
+        blocks = []
+        if intBlock:
+            blocks.append("intcblock " + " ".join(str(value) for value in intBlock))
+        if byteBlock:
+            blocks.append("bytecblock " + " ".join("0x" + value.hex() for value in byteBlock))
+        pragma = next(index for index, line in enumerate(substituted) if line.strip().startswith("#pragma"))
+        self.program = assemble("\n".join(substituted[:pragma + 1] + blocks + substituted[pragma + 1:]))
+        self.slots = self._slots(sentinels)
+
+    def _sentinels(self, teal: str) -> Dict[str, Union[int, bytes]]:
+        """A placeholder value for every variable, unique in the program."""
+        sentinels: Dict[str, Union[int, bytes]] = {}
+        nextInt = 2 ** 64 - 1
+        for name, kind in self.variables.items():
+            if kind == INT:
+                while str(nextInt) in teal:
+                    nextInt -= 1
+                sentinels[name] = nextInt
+                nextInt -= 1
+            else:
+                sentinels[name] = hashlib.sha256(name.encode()).digest()
+        return sentinels
+
+    def _substitute(self, lines: List[str], sentinels: Mapping[str, Union[int, bytes]]) -> List[str]:
+        substituted = []
+        for line in lines:
+            match = _TEMPLATE_LINE.match(line)
+            if match is None:
+                substituted.append(line)
+            elif self.variables[match.group(2)] == INT:
+                substituted.append("int {}".format(sentinels[match.group(2)]))
+            else:
+                substituted.append("byte 0x{}".format(sentinels[match.group(2)].hex()))
+        return substituted
+
+    def _slots(self, sentinels: Mapping[str, Union[int, bytes]]) -> List[Tuple[int, int, str]]:
+        """The offset, length and variable of every constant of the leading
+        constant blocks holding a variable, in program order."""
+        names = {value: name for name, value in sentinels.items()}
+        slots: List[Tuple[int, int, str]] = []
+        _, offset = decodeUvarint(self.program, 0)
+        while offset < len(self.program) and self.program[offset] in (_INTCBLOCK, _BYTECBLOCK):
+            isInt = self.program[offset] == _INTCBLOCK
+            count, offset = decodeUvarint(self.program, offset + 1)
+            for _ in range(count):
+                start = offset
+                value, offset = decodeUvarint(self.program, offset)
+                if not isInt:
+                    value, offset = self.program[offset:offset + value], offset + value
+                if value in names:
+                    slots.append((start, offset - start, names[value]))
+        missing = set(self.variables) - {name for _, _, name in slots}
+        if missing:
+            raise AVMError("template variables missing from the constant blocks: {}".format(", ".join(sorted(missing))))
+        return slots
+
+    def fill(self, values: Mapping[str, TemplateValue]) -> bytes:
+        """The bytecode with `values` for its variables: integers for int
+        variables, and bytes or addresses for byte variables."""
+        missing = set(self.variables) - set(values)
+        if missing:
+            raise ValueError("no value for {}".format(", ".join(sorted(missing))))
+        encoded = {name: self._encode(name, values[name]) for name in self.variables}
+        chunks = []
+        position = 0
+        for offset, length, name in self.slots:
+            chunks.append(self.program[position:offset])
+            chunks.append(encoded[name])
+            position = offset + length
+        chunks.append(self.program[position:])
+        return b"".join(chunks)
+
+    def fillWithHash(self, values: Mapping[str, TemplateValue]) -> Tuple[bytes, str]:
+        """The filled bytecode and its program hash, the address of the
+        program's account."""
+        program = self.fill(values)
+        return program, programAddress(program)
+
+    def _encode(self, name: str, value: TemplateValue) -> bytes:
+        if self.variables[name] == INT:
+            if not isinstance(value, int) or not 0 <= value < 2 ** 64:
+                raise ValueError("{} must be a uint64".format(name))
+            return encodeUvarint(value)
+        if isinstance(value, str):
+            value = _decodeAddress(value)
+        if not isinstance(value, bytes):
+            raise ValueError("{} must be bytes or an address".format(name))
+        return encodeUvarint(len(value)) + value
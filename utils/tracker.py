@@ -0,0 +1,237 @@
+from base64 import b32encode, b64encode
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import msgpack
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.v2client.algod import AlgodClient
+
+from utils.helper import PendingTxnResponse
+from utils.params import getSuggestedParamsProvider
+
+# msgpack keys whose values are addresses, rendered as base32 in JSON responses
+ADDRESS_KEYS = ("snd", "rcv", "close", "asnd", "arcv", "aclose", "rekey", "fadd", "m", "r", "f", "c", "apat", "sgnr")
+
+# ApplyData fields of a block transaction and their pending_transaction_info names
+_APPLY_DATA_FIELDS = {
+    "apid": "application-index",
+    "caid": "asset-index",
+    "ca": "closing-amount",
+    "aca": "asset-closing-amount",
+    "rs": "sender-rewards",
+    "rr": "receiver-rewards",
+    "rc": "close-rewards",
+}
+
+_SIGNED_TXN_FIELDS = ("sig", "msig", "lsig", "sgnr", "txn")
+
+
+def msgpackToJson(value: Any, key: str = "") -> Any:
+    """Render msgpack-decoded values the way algod's JSON endpoints do."""
+    if isinstance(value, dict):
+        return {k: msgpackToJson(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [msgpackToJson(v, key) for v in value]
+    if isinstance(value, bytes):
+        if key in ADDRESS_KEYS and len(value) == 32:
+            return encoding.encode_address(value)
+        return b64encode(value).decode()
+    return value
+
+
+def _rawKey(key: Any) -> bytes:
+    # state keys are msgpack strings holding arbitrary bytes
+    if isinstance(key, bytes):
+        return key
+    return key.encode("utf-8", "surrogateescape")
+
+
+def _valueDeltaJson(delta: Dict[str, Any]) -> Dict[str, Any]:
+    value: Dict[str, Any] = {"action": delta.get("at", 0)}
+    if "bs" in delta:
+        value["bytes"] = b64encode(_rawKey(delta["bs"])).decode()
+    if "ui" in delta:
+        value["uint"] = delta["ui"]
+    return value
+
+
+def _stateDeltaJson(delta: Dict[Any, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {"key": b64encode(_rawKey(key)).decode(), "value": _valueDeltaJson(change)}
+        for key, change in delta.items()
+    ]
+
+
+def restoreBlockTxn(entry: Dict[str, Any], block: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the transaction of a block entry with the genesis fields that
+    blocks leave out put back, in canonical key order."""
+    txn = dict(entry["txn"])
+    if entry.get("hgi"):
+        txn["gen"] = block["gen"]
+    if entry.get("hgh", True) and "gh" in block:
+        txn["gh"] = block["gh"]
+    return dict(sorted(txn.items()))
+
+
+def txIDFromMsgpack(txn: Dict[str, Any]) -> str:
+    raw = encoding.checksum(b"TX" + msgpack.packb(txn, use_bin_type=True))
+    return b32encode(raw).decode().strip("=")
+
+
+def pendingInfoFromBlock(entry: Dict[str, Any], block: Dict[str, Any], txn: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build the pending_transaction_info response of a confirmed transaction
+    from its block entry."""
+    stxn = {key: entry[key] for key in _SIGNED_TXN_FIELDS if key in entry}
+    if txn is not None:
+        stxn["txn"] = txn
+
+    info: Dict[str, Any] = {
+        "pool-error": "",
+        "txn": msgpackToJson(stxn),
+        "confirmed-round": block["rnd"],
+    }
+    for key, name in _APPLY_DATA_FIELDS.items():
+        if entry.get(key):
+            info[name] = entry[key]
+
+    delta = entry.get("dt", {})
+    if delta.get("gd"):
+        info["global-state-delta"] = _stateDeltaJson(delta["gd"])
+    if delta.get("ld"):
+        accounts = [stxn["txn"]["snd"]] + list(stxn["txn"].get("apat", []))
+        info["local-state-delta"] = [
+            {"address": encoding.encode_address(accounts[index]), "delta": _stateDeltaJson(changes)}
+            for index, changes in delta["ld"].items()
+        ]
+    if delta.get("lg"):
+        info["logs"] = [b64encode(_rawKey(log)).decode() for log in delta["lg"]]
+    if delta.get("itx"):
+        info["inner-txns"] = [pendingInfoFromBlock(inner, block) for inner in delta["itx"]]
+    return info
+
+
+class _Tracked:
+    def __init__(self, future: Future) -> None:
+        self.future = future
+        # set once the tracker next learns the latest round
+        self.deadline: Optional[int] = None
+
+
+class ConfirmationTracker:
+    """Confirms many transactions by following blocks once.
+
+    Each call to track() returns a Future that resolves to the transaction's
+    PendingTxnResponse once a block containing it is seen. It fails as soon as
+    algod drops the transaction from its pool, like waitForTransaction, or
+    once `timeout` rounds past the latest round at the next poll go by
+    without it. Following the chain costs one status_after_block, one
+    block_info and one listing of the pool per round no matter how many
+    transactions are being tracked.
+
+    Transactions must be tracked from a round no later than the one they are
+    confirmed in, so create the tracker before submitting. Anything that
+    confirmed earlier is found by the pending_transaction_info lookup made
+    once it is missing from the pool.
+    """
+
+    def __init__(self, client: AlgodClient, timeout: int = 10) -> None:
+        self.client = client
+        self.timeout = timeout
+        self.lastRound: int = client.status()["last-round"]
+        self._tracked: Dict[str, _Tracked] = {}
+
+    def __len__(self) -> int:
+        return len(self._tracked)
+
+    def track(self, txID: str, callback: Optional[Callable[[Future], Any]] = None) -> Future:
+        """Follow `txID`; `callback` is called with the Future once resolved."""
+        tracked = self._tracked.get(txID)
+        if tracked is None:
+            tracked = _Tracked(Future())
+            self._tracked[txID] = tracked
+        if callback is not None:
+            tracked.future.add_done_callback(callback)
+        return tracked.future
+
+    def poll(self) -> None:
+        """Resolve transactions from every block committed since the last poll."""
+        self._scanTo(self.client.status()["last-round"])
+
+    def waitForBlock(self) -> None:
+        """Wait for the next block and resolve transactions from it."""
+        status = self.client.status_after_block(self.lastRound)
+        self._scanTo(status["last-round"])
+
+    def wait(self) -> None:
+        """Follow blocks until every tracked transaction is resolved."""
+        self.poll()
+        while self._tracked:
+            self.waitForBlock()
+
+    def _scanTo(self, lastRound: int) -> None:
+        getSuggestedParamsProvider(self.client).observeRound(lastRound)
+        for tracked in self._tracked.values():
+            if tracked.deadline is None:
+                tracked.deadline = lastRound + self.timeout
+        while self.lastRound < lastRound and self._tracked:
+            self.lastRound += 1
+            self._scanBlock(self.lastRound)
+            self._expire()
+        # nothing to resolve, skip ahead without fetching blocks
+        self.lastRound = max(self.lastRound, lastRound)
+        self._failDropped()
+
+    def _scanBlock(self, round: int) -> None:
+        raw = self.client.block_info(round, response_format="msgpack")
+        block = msgpack.unpackb(raw, raw=False, strict_map_key=False, unicode_errors="surrogateescape")["block"]
+        for entry in block.get("txns") or []:
+            txn = restoreBlockTxn(entry, block)
+            tracked = self._tracked.pop(txIDFromMsgpack(txn), None)
+            if tracked is not None:
+                tracked.future.set_result(PendingTxnResponse(pendingInfoFromBlock(entry, block, txn)))
+
+    def _lookup(self, txID: str) -> Dict[str, Any]:
+        try:
+            return self.client.pending_transaction_info(txID)
+        except AlgodHTTPError:
+            return {}
+
+    def _settle(self, txID: str, pending: Dict[str, Any]) -> bool:
+        """Resolve `txID` from its pending_transaction_info, if confirmed or
+        dropped with a pool error, the same way waitForTransaction does."""
+        if pending.get("confirmed-round", 0) > 0:
+            self._tracked.pop(txID).future.set_result(PendingTxnResponse(pending))
+            return True
+        if pending.get("pool-error"):
+            self._tracked.pop(txID).future.set_exception(Exception("Pool error: {}".format(pending["pool-error"])))
+            return True
+        return False
+
+    def _failDropped(self) -> None:
+        if not self._tracked:
+            return
+        raw = self.client.pending_transactions(0, response_format="msgpack")
+        pool = msgpack.unpackb(raw, raw=False, strict_map_key=False, unicode_errors="surrogateescape")
+        inPool = {txIDFromMsgpack(stxn["txn"]) for stxn in pool.get("top-transactions") or []}
+        # only transactions missing from the pool are looked up one by one
+        for txID in [txID for txID in self._tracked if txID not in inPool]:
+            self._settle(txID, self._lookup(txID))
+
+    def _expire(self) -> None:
+        expired = [txID for txID, tracked in self._tracked.items() if tracked.deadline is not None and tracked.deadline <= self.lastRound]
+        for txID in expired:
+            if not self._settle(txID, self._lookup(txID)):
+                future = self._tracked.pop(txID).future
+                future.set_exception(Exception("Transaction {} not confirmed after {} rounds".format(txID, self.timeout)))
+
+
+def waitForTransactions(client: AlgodClient, txIDs: Iterable[str], timeout: int = 10) -> List[PendingTxnResponse]:
+    """Wait for several transactions at once; see ConfirmationTracker."""
+    tracker = ConfirmationTracker(client, timeout)
+    # start from the round before submission so already confirmed
+    # transactions are found in their block
+    tracker.lastRound = max(0, tracker.lastRound - 1)
+    futures = [tracker.track(txID) for txID in txIDs]
+    tracker.wait()
+    return [future.result() for future in futures]